@@ -0,0 +1,191 @@
+from datetime import datetime, timedelta
+
+from dimensions import normalize_label
+from reliability import TIMESTAMP_FORMAT
+
+
+RULE_TYPES = ['taux_panne', 'pannes_repetees', 'test_etancheite', 'cycle_incomplet']
+RULE_SCOPES = ['global', 'designation', 'localisation']
+SEVERITIES = ['critique', 'avertissement']
+
+
+def normalize_scope_value(value):
+    """Scope values are matched like the dashboard groups them: on the dimension norm_key"""
+    return normalize_label(value)
+
+
+class AlertRuleEngine:
+    """Evaluate alert rules at write time against maintained counters.
+
+    alert_counters keeps (total, en_panne) per global / designation /
+    localisation scope and is updated on every inventory write, so a rate
+    rule is a primary-key read. Report rules only look at the report being
+    written plus an indexed range count of that serial's recent failures.
+    Fired alerts land in the alerts table, which the dashboard reads by
+    index instead of rescanning the inventory.
+    """
+
+    def ensure_initialized(self, conn):
+        """Build the counters from the inventory the first time they are used"""
+        cursor = conn.cursor()
+        cursor.execute("SELECT 1 FROM alert_counters LIMIT 1")
+        if cursor.fetchone():
+            return
+        cursor.execute("SELECT EXISTS(SELECT 1 FROM endoscopes)")
+        if cursor.fetchone()[0]:
+            self.rebuild_counters(conn)
+
+    def rebuild_counters(self, conn):
+        """Recompute every counter from the inventory"""
+        cursor = conn.cursor()
+        cursor.execute("DELETE FROM alert_counters")
+        cursor.execute(
+            """INSERT INTO alert_counters (scope, scope_value, total, en_panne)
+               SELECT 'global', '', COUNT(*), COALESCE(SUM(etat = 'en panne'), 0) FROM endoscopes""")
+        for scope in ('designation', 'localisation'):
+            cursor.execute(
+                f"""INSERT INTO alert_counters (scope, scope_value, total, en_panne)
+                    SELECT '{scope}', d.norm_key, c.total, c.en_panne FROM
+                    (SELECT {scope}_id, COUNT(*) AS total, SUM(etat = 'en panne') AS en_panne
+                     FROM endoscopes GROUP BY {scope}_id) c
+                    JOIN dim_{scope} d ON d.id = c.{scope}_id""")
+        self.evaluate_rates(conn)
+
+    def _rules(self, cursor, rule_type):
+        cursor.execute(
+            """SELECT id, scope, scope_value, threshold, window_days, severity
+               FROM alert_rules WHERE rule_type = ? AND enabled = 1""",
+            (rule_type, ))
+        return [dict(zip(['id', 'scope', 'scope_value', 'threshold', 'window_days', 'severity'], row))
+                for row in cursor.fetchall()]
+
+    @staticmethod
+    def _matching_rule(rules, designation, localisation):
+        """Most specific rule for a device: designation, then localisation, then global"""
+        for scope, value in (('designation', designation), ('localisation', localisation), ('global', '')):
+            for rule in rules:
+                if rule['scope'] == scope and rule['scope_value'] == normalize_scope_value(value):
+                    return rule
+        return None
+
+    def _active_alert(self, cursor, rule_id, scope_value, numero_serie=None):
+        cursor.execute(
+            """SELECT id FROM alerts
+               WHERE status = 'active' AND rule_id = ? AND scope_value = ?
+                     AND COALESCE(numero_serie, '') = ?
+               LIMIT 1""",
+            (rule_id, scope_value, numero_serie or ''))
+        row = cursor.fetchone()
+        return row[0] if row else None
+
+    def _fire(self, cursor, rule, message, numero_serie=None, report_id=None):
+        cursor.execute(
+            """INSERT INTO alerts (rule_id, rule_type, severity, scope, scope_value,
+                                   numero_serie, message, report_id)
+               SELECT id, rule_type, severity, scope, scope_value, ?, ?, ?
+               FROM alert_rules WHERE id = ?""",
+            (numero_serie, message, report_id, rule['id']))
+        return cursor.lastrowid
+
+    # --- Inventory writes -------------------------------------------------
+
+    def on_endoscope_change(self, conn, before, after):
+        """Update counters for an inventory insert/update/delete.
+
+        before / after are (designation, localisation, etat) tuples or None.
+        Returns the rate alerts fired by the change.
+        """
+        if before == after:
+            return []
+        cursor = conn.cursor()
+        touched = set()
+        for row, sign in ((before, -1), (after, 1)):
+            if row is None:
+                continue
+            designation, localisation, etat = row
+            broken = 1 if etat == 'en panne' else 0
+            for scope, value in (('global', ''), ('designation', normalize_scope_value(designation)),
+                                 ('localisation', normalize_scope_value(localisation))):
+                cursor.execute(
+                    """INSERT INTO alert_counters (scope, scope_value, total, en_panne)
+                       VALUES (?, ?, ?, ?)
+                       ON CONFLICT(scope, scope_value) DO UPDATE SET
+                           total = total + excluded.total,
+                           en_panne = en_panne + excluded.en_panne""",
+                    (scope, value, sign, sign * broken))
+                touched.add((scope, value))
+        return self.evaluate_rates(conn, touched)
+
+    def evaluate_rates(self, conn, scopes=None):
+        """Fire or resolve 'taux_panne' alerts for the given (scope, value) pairs"""
+        cursor = conn.cursor()
+        fired = []
+        for rule in self._rules(cursor, 'taux_panne'):
+            key = (rule['scope'], rule['scope_value'])
+            if scopes is not None and key not in scopes:
+                continue
+            cursor.execute(
+                "SELECT total, en_panne FROM alert_counters WHERE scope = ? AND scope_value = ?", key)
+            row = cursor.fetchone()
+            total, en_panne = row if row else (0, 0)
+            percentage = en_panne * 100.0 / total if total else 0.0
+            active_id = self._active_alert(cursor, rule['id'], rule['scope_value'])
+            if percentage > rule['threshold'] and active_id is None:
+                label = "des endoscopes" if rule['scope'] == 'global' else f"({rule['scope']} « {rule['scope_value']} »)"
+                message = (f"Taux de panne {label} : {percentage:.1f}% "
+                           f"({en_panne}/{total}), seuil {rule['threshold']:g}%")
+                alert_id = self._fire(cursor, rule, message)
+                fired.append({'id': alert_id, 'rule': rule, 'percentage': percentage,
+                              'broken_count': en_panne, 'total_count': total})
+            elif percentage <= rule['threshold'] and active_id is not None:
+                cursor.execute(
+                    "UPDATE alerts SET status = 'resolue', closed_at = CURRENT_TIMESTAMP WHERE id = ?",
+                    (active_id, ))
+        return fired
+
+    # --- Sterilisation report writes --------------------------------------
+
+    def on_sterilisation_report(self, conn, report, previous=None):
+        """Evaluate report rules for a new or edited report.
+
+        report / previous are dicts with id, numero_serie, etat_endoscope,
+        test_etancheite, cycle and date_desinfection. Conditions already
+        present in the previous version of an edited report do not fire again.
+        """
+        cursor = conn.cursor()
+        previous = previous or {}
+        cursor.execute("SELECT designation, localisation FROM endoscopes WHERE numero_serie = ?",
+                       (report['numero_serie'], ))
+        designation, localisation = cursor.fetchone() or (None, None)
+        fired = []
+
+        checks = [
+            ('test_etancheite', 'test_etancheite', 'échoué',
+             f"Test d'étanchéité échoué pour {report['numero_serie']} (rapport #{report['id']})"),
+            ('cycle_incomplet', 'cycle', 'incomplet',
+             f"Cycle de désinfection incomplet pour {report['numero_serie']} (rapport #{report['id']})"),
+        ]
+        for rule_type, field, failing_value, message in checks:
+            if report.get(field) != failing_value or previous.get(field) == failing_value:
+                continue
+            rule = self._matching_rule(self._rules(cursor, rule_type), designation, localisation)
+            if rule:
+                fired.append(self._fire(cursor, rule, message, report['numero_serie'], report['id']))
+
+        if report.get('etat_endoscope') == 'en panne' and previous.get('etat_endoscope') != 'en panne':
+            rule = self._matching_rule(self._rules(cursor, 'pannes_repetees'), designation, localisation)
+            if rule and self._active_alert(cursor, rule['id'], rule['scope_value'], report['numero_serie']) is None:
+                window_days = int(rule['window_days'] or 30)
+                since = (datetime.strptime(str(report['date_desinfection'])[:10], '%Y-%m-%d')
+                         - timedelta(days=window_days)).strftime(TIMESTAMP_FORMAT)
+                cursor.execute(
+                    """SELECT COUNT(*) FROM etat_events
+                       WHERE numero_serie = ? AND event_at >= ?
+                             AND source = 'sterilisation' AND etat = 'en panne'""",
+                    (report['numero_serie'], since))
+                failures = cursor.fetchone()[0]
+                if failures >= rule['threshold']:
+                    message = (f"{failures} pannes en {window_days} jours pour l'endoscope "
+                               f"{report['numero_serie']} (seuil {rule['threshold']:g})")
+                    fired.append(self._fire(cursor, rule, message, report['numero_serie'], report['id']))
+        return fired
@@ -1,29 +1,28 @@
 import streamlit as st
 import pandas as pd
-import plotly.express as px
-import plotly.graph_objects as go
+import pyarrow as pa
+import pyarrow.compute as pc
 from datetime import datetime
 import datetime as dt
 
 import io
-
-
-import qrcode
-from io import BytesIO
-import base64
-
-from reportlab.lib.pagesizes import letter, A4
-from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer, Image, HRFlowable
-from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
-from reportlab.lib import colors
-from reportlab.lib.units import inch, cm
-from reportlab.lib.enums import TA_CENTER, TA_LEFT, TA_RIGHT
-import base64
+import itertools
+import functools
 import os
+import sqlite3
 
 from database import DatabaseManager
 from auth import check_authentication, login_form, logout, get_user_role, get_username, require_role
-from email_alerts import EmailAlertManager
+from email_alerts import EmailAlertManager, EmailAlertDispatcher
+from scan_intake import parse_scan_payload, is_qr_payload
+from qr_codes import generate_qr_code, qr_thumbnail_url, qr_thumbnail_data_uri
+from pdf_reports import generate_professional_pdf_report
+from charts import availability_figure, status_pie, location_bar, profile_icicle
+from page_profiler import PAGE_PROFILER
+from federation import FederatedDatabaseManager, merge_site_status, parse_sites
+from risk_scoring import RISK_FACTOR_LABELS
+from maintenance import MAINTENANCE_WINDOW, MaintenanceScheduler
+from backup import BACKUP_DIR, BackupError, create_snapshot, list_snapshots, verify_snapshot
 
 
 # Page configuration
@@ -41,218 +40,39 @@ def init_database():
 db = init_database()
 
 
-def generate_qr_code(endoscope_id, designation, numero_serie):
-    """Generate QR code for endoscope"""
-    try:
-        # Create QR code data
-        qr_data = f"ENDOSCOPE_ID:{endoscope_id}|DESIGNATION:{designation}|SERIE:{numero_serie}"
-        
-        # Generate QR code
-        qr = qrcode.QRCode(
-            version=1,
-            error_correction=qrcode.constants.ERROR_CORRECT_L,
-            box_size=10,
-            border=4,
-        )
-        qr.add_data(qr_data)
-        qr.make(fit=True)
-        
-        # Create QR code image
-        qr_img = qr.make_image(fill_color="black", back_color="white")
-        
-        # Convert to base64 for display
-        buffer = BytesIO()
-        qr_img.save(buffer, format='PNG')
-        buffer.seek(0)
-        qr_base64 = base64.b64encode(buffer.getvalue()).decode()
-        
-        return qr_base64
-    except Exception as e:
-        print(f"Error generating QR code: {e}")
-        return None
-
-def generate_professional_pdf_report(data, title, report_type="sterilisation"):
-    """Generate a professional medical PDF report like the example provided"""
-    buffer = io.BytesIO()
-    doc = SimpleDocTemplate(
-        buffer, 
-        pagesize=A4,
-        rightMargin=2*cm,
-        leftMargin=2*cm,
-        topMargin=2*cm,
-        bottomMargin=2*cm
-    )
-    
-    # Get styles
-    styles = getSampleStyleSheet()
-    
-    # Custom styles for medical report
-    title_style = ParagraphStyle(
-        'MedicalTitle',
-        parent=styles['Heading1'],
-        fontSize=18,
-        spaceAfter=20,
-        spaceBefore=10,
-        alignment=TA_LEFT,  # Left aligned like medical reports
-        textColor=colors.black,
-        fontName='Helvetica-Bold'
-    )
-    
-    record_header_style = ParagraphStyle(
-        'RecordHeader',
-        parent=styles['Heading2'],
-        fontSize=14,
-        spaceAfter=10,
-        spaceBefore=15,
-        textColor=colors.HexColor('#1f4e79'),
-        fontName='Helvetica-Bold'
-    )
-    
-    field_style = ParagraphStyle(
-        'FieldStyle',
-        parent=styles['Normal'],
-        fontSize=11,
-        spaceAfter=4,
-        fontName='Helvetica',
-        leftIndent=0
-    )
-    
-    # Content story
-    story = []
+@st.cache_resource
+def get_alert_dispatcher():
+    """One background email dispatcher per server process"""
+    dispatcher = EmailAlertDispatcher(DatabaseManager())
+    if os.getenv("EMAIL_ALERTS_ENABLED", "false").lower() == "true":
+        dispatcher.start()
+    return dispatcher
 
-    title_style = styles["Title"]
+alert_dispatcher = get_alert_dispatcher()
 
-    # Load and resize the logo (centered)
-    try:
-        logo_path = r'attached_assets\logo.webp'
-        if os.path.exists(logo_path):
-            logo = Image(logo_path)
-            logo.drawHeight = 1 * inch
-            logo.drawWidth = 1 * inch * logo.imageWidth / logo.imageHeight  # Maintain aspect ratio
-            logo.hAlign = 'CENTER'
-            story.append(logo)
-            story.append(Spacer(1, 10))
-    except Exception as e:
-        print(f"Logo loading error: {e}")
-
-    # Choose title
-    if report_type == "sterilisation":
-        title_text = "Rapports de Stérilisation et Désinfection"
-    elif report_type == "inventaire":
-        title_text = "Rapport d'Inventaire des Endoscopes"
-    else:
-        title_text = title
 
-    # Add centered title
-    title_paragraph = Paragraph(f"<b>{title_text}</b>", title_style)
-    title_paragraph.hAlign = 'CENTER'
-    story.append(title_paragraph)
-    story.append(Spacer(1, 6))
+MAINTENANCE_ENABLED = os.getenv("MAINTENANCE_ENABLED", "false").lower() == "true"
 
-    # Add horizontal line
-    story.append(HRFlowable(width="100%", thickness=1.2, color=colors.black))
-    story.append(Spacer(1, 15))
-    
 
-    # Main content
-    if isinstance(data, pd.DataFrame) and not data.empty:
-        # Process each record
-        for i, (_, row) in enumerate(data.iterrows(), start=1):
-            # Construire le titre de l'enregistrement
-            record_title = f"• ENREGISTREMENT {i}"
-            if report_type == "sterilisation" and 'endoscope' in row:
-                record_title += f" - {row['endoscope']}"
-            elif report_type == "inventaire" and 'designation' in row:
-                record_title += f" - {row['designation']}"
-
-            story.append(Paragraph(record_title, record_header_style))
-
-            # Générer et insérer le QR Code seulement pour les rapports d'inventaire
-            if report_type == "inventaire":
-                qr_code_base64 = generate_qr_code(row.get('id'), row.get('designation'), row.get('numero_serie'))
-                if qr_code_base64:
-                    try:
-                        qr_buffer = BytesIO(base64.b64decode(qr_code_base64))
-                        qr_img = Image(qr_buffer, width=2*cm, height=2*cm)
-                        qr_img.hAlign = 'LEFT'
-                        story.append(qr_img)
-                    except Exception as e:
-                        print(f"Erreur QR: {e}")
-
-            story.append(Spacer(1, 10))
+@st.cache_resource
+def get_maintenance_scheduler():
+    """One off-peak maintenance worker per server process (started with MAINTENANCE_ENABLED=true)"""
+    scheduler = MaintenanceScheduler(DatabaseManager())
+    if MAINTENANCE_ENABLED:
+        scheduler.start()
+    return scheduler
+
+maintenance_scheduler = get_maintenance_scheduler()
+
+
+@st.cache_resource
+def get_federation():
+    """Regional view over the site databases listed in FEDERATION_SITES (None when unset)"""
+    sites = parse_sites(os.getenv("FEDERATION_SITES"))
+    return FederatedDatabaseManager(sites) if sites else None
+
+federation = get_federation()
 
-            
-            # Create simple field entries (no squares, just text)
-            for col, val in row.items():
-                if pd.notna(val) and str(val).strip():
-                    if col.lower() in ['qr', 'qr_code', 'qr_img', 'qr code']:
-                        continue  # Empêche l'affichage d'un QR code en double
-                    # Format column names in French
-                    formatted_col = col.replace('_', ' ').title()
-                    if col == 'id':
-                        formatted_col = "Id"
-                    elif col == 'date_desinfection':
-                        formatted_col = "Date de Désinfection"
-                    elif col == 'nom_operateur':
-                        formatted_col = "Nom de l'Opérateur"
-                    elif col == 'numero_serie':
-                        formatted_col = "Numéro de Série"
-                    elif col == 'medecin_responsable':
-                        formatted_col = "Médecin Responsable"
-                    elif col == 'type_desinfection':
-                        formatted_col = "Type de Désinfection"
-                    elif col == 'test_etancheite':
-                        formatted_col = "Test d'Étanchéité"
-                    elif col == 'etat_endoscope':
-                        formatted_col = "État de l'Endoscope"
-                    elif col == 'nature_panne':
-                        formatted_col = "Nature de la Panne"
-                    elif col == 'heure_debut':
-                        formatted_col = "Heure de Début"
-                    elif col == 'heure_fin':
-                        formatted_col = "Heure de Fin"
-                    elif col == 'type_acte':
-                        formatted_col = "Type d'Acte"
-                    elif col == 'salle':
-                        formatted_col = "Salle"
-                    elif col == 'cycle':
-                        formatted_col = "Cycle"
-                    elif col == 'marque':
-                        formatted_col = "Marque"
-                    elif col == 'modele':
-                        formatted_col = "Modèle"
-                    elif col == 'localisation':
-                        formatted_col = "Localisation"
-                    elif col == 'observation':
-                        formatted_col = "Observations"
-                    elif col == 'created_by':
-                        formatted_col = "Créé par"
-                    elif col == 'created_at':
-                        formatted_col = "Date de Création"
-                    elif col == 'endoscope':
-                        formatted_col = "Endoscope"
-                    elif col == 'procedure_medicale':
-                        formatted_col = "Procédure Médicale"
-                    elif col == 'designation':
-                        formatted_col = "Désignation"
-                    elif col == 'etat':
-                        formatted_col = "État"
-                    
-                    formatted_val = str(val)
-                    
-                    # Simple format like the example: ■ Field: Value
-                    # Simple clean format like medical reports: Field: Value
-                    field_text = f"<b>{formatted_col}:</b> {formatted_val}" 
-                    story.append(Paragraph(field_text, field_style))
-            
-            story.append(Spacer(1, 20))  # Space between records
-    else:
-        story.append(Paragraph("Aucune donnée disponible", field_style))
-    
-    # Build PDF
-    doc.build(story)
-    buffer.seek(0)
-    return buffer.getvalue()
 
 def load_css_file(css_file_path):
     """Load CSS from external file"""
@@ -265,31 +85,36 @@ def load_css_file(css_file_path):
 def main():
     # Check authentication
     if not check_authentication():
+        PAGE_PROFILER.set_page("Connexion")
         login_form()
         return
     
     
     # Sidebar navigation
-    st.sidebar.image('attached_assets/logo.webp', use_container_width=True)
-    st.sidebar.title(f"Bonjour {get_username()}")
-    st.sidebar.write(f"**Rôle:** {get_user_role()}")
-    
-    # Navigation menu based on role
-    user_role = get_user_role()
-    
-    if user_role == 'admin':
-        menu_options = ["Dashboard", "Gestion des Utilisateurs", "Archives"]
-    elif user_role == 'biomedical':
-        menu_options = ["Dashboard", "Gestion Inventaire", "Archives"]
-    elif user_role == 'sterilisation':
-        menu_options = ["Dashboard", "Rapports de Stérilisation", "Archives"]
-    else:
-        menu_options = ["Dashboard"]
-    
-    selected_page = st.sidebar.selectbox("Navigation", menu_options)
-    
-    if st.sidebar.button("Déconnexion"):
-        logout()
+    with PAGE_PROFILER.phase("Barre latérale"):
+        st.sidebar.image('attached_assets/logo.webp', use_container_width=True)
+        st.sidebar.title(f"Bonjour {get_username()}")
+        st.sidebar.write(f"**Rôle:** {get_user_role()}")
+
+        # Navigation menu based on role
+        user_role = get_user_role()
+
+        if user_role == 'admin':
+            menu_options = ["Dashboard", "Gestion des Utilisateurs", "Archives", "Diagnostics"]
+        elif user_role == 'biomedical':
+            menu_options = ["Dashboard", "Gestion Inventaire", "Archives"]
+        elif user_role == 'sterilisation':
+            menu_options = ["Dashboard", "Rapports de Stérilisation", "Archives"]
+        else:
+            menu_options = ["Dashboard"]
+        if federation is not None and user_role in ['admin', 'biomedical']:
+            menu_options.insert(1, "Vue Régionale")
+
+        selected_page = st.sidebar.selectbox("Navigation", menu_options)
+        PAGE_PROFILER.set_page(selected_page)
+
+        if st.sidebar.button("Déconnexion"):
+            logout()
     
     # Main content based on selected page
     if selected_page == "Dashboard":
@@ -302,16 +127,168 @@ def main():
         show_sterilization_interface()
     elif selected_page == "Archives":
         show_archives_interface()
+    elif selected_page == "Diagnostics":
+        show_diagnostics_interface()
+    elif selected_page == "Vue Régionale":
+        show_regional_interface()
+
+
+DASHBOARD_REFRESH_INTERVALS = [5, 10, 30, 60]
+RISK_WATCHLIST_SIZE = int(os.getenv("RISK_WATCHLIST_SIZE", "10"))
+
+ENDOSCOPE_PICKER_LIMIT = 50
+
+ENDOSCOPE_LOCATIONS = ['En utilisation', 'En stock', 'En zone de stérilisation', 'En externe', 'En réforme']
+
+# Inventory columns shown in the batch editor, in display order
+BATCH_EDIT_COLUMNS = ['designation', 'marque', 'modele', 'numero_serie', 'etat', 'localisation', 'observation']
+
+ALERT_RULE_LABELS = {
+    'taux_panne': "Taux de panne",
+    'pannes_repetees': "Pannes répétées d'un même endoscope",
+    'test_etancheite': "Test d'étanchéité échoué",
+    'cycle_incomplet': "Cycle incomplet",
+}
+
+
+@st.cache_data(ttl=1, show_spinner=False)
+def get_table_versions():
+    """Change counters of every table, shared by all sessions polling the dashboard"""
+    return db.get_table_versions()
+
+
+def invalidate_table_versions():
+    """Drop the cached change counters so the rerun after a write sees fresh data"""
+    get_table_versions.clear()
+
+
+def section_version(*tables):
+    """Cache key for a dashboard section: the change counters of its source tables"""
+    versions = get_table_versions()
+    return tuple(versions.get(table, 0) for table in tables)
+
+
+# Dashboard loaders are keyed on the source tables' change counters, so a
+# refresh only queries the database when one of those tables was written to.
+@st.cache_data(show_spinner=False, max_entries=4)
+def load_recent_breakdowns(version, day):
+    return db.get_recent_breakdowns(days=7)
+
+
+@st.cache_data(show_spinner=False, max_entries=4)
+def load_active_alerts(version):
+    return db.get_active_alerts(limit=20)
+
+
+@st.cache_data(show_spinner=False, max_entries=4)
+def load_malfunction_percentage(version):
+    return db.get_malfunction_percentage()
+
+
+@st.cache_data(show_spinner=False, max_entries=4)
+def load_availability_by_type(version):
+    return db.get_endoscope_availability_by_type()
+
+
+@st.cache_data(ttl=300, show_spinner=False, max_entries=4)
+def load_reliability_by_device(version):
+    return db.get_reliability_by_device()
+
+
+@st.cache_data(ttl=300, show_spinner=False, max_entries=4)
+def load_failure_risk(version):
+    return db.get_failure_risk()
+
+
+@st.cache_data(show_spinner=False, max_entries=4)
+def load_dashboard_stats(version):
+    return db.get_dashboard_stats()
+
+
+# Archive and management tables stay in Arrow from the database to st.dataframe
+@st.cache_data(show_spinner=False, max_entries=4)
+def load_inventory_table(version):
+    return db.get_all_endoscopes_arrow()
+
+
+@st.cache_data(show_spinner=False, max_entries=4)
+def load_sterilisation_table(version):
+    return db.get_all_sterilisation_reports_arrow()
+
+
+@st.cache_data(show_spinner=False, max_entries=2)
+def load_qr_thumbnails(version):
+    """{endoscope id: QR thumbnail} for the inventory: static file URLs, or data URIs without static serving"""
+    thumbnail = qr_thumbnail_url if st.get_option("server.enableStaticServing") else qr_thumbnail_data_uri
+    inventory = load_inventory_table(version).select(['id', 'designation', 'numero_serie']).to_pydict()
+    return {endoscope_id: thumbnail(endoscope_id, designation, numero_serie)
+            for endoscope_id, designation, numero_serie
+            in zip(inventory['id'], inventory['designation'], inventory['numero_serie'])}
+
+
+def arrow_options(column):
+    """Distinct values of an Arrow column in order of appearance, for filter widgets"""
+    return pc.unique(column.cast(pa.string())).drop_null().to_pylist()
+
+
+def arrow_filter(table, conditions):
+    """Rows of an Arrow table matching every boolean condition"""
+    return table.filter(functools.reduce(pc.and_, conditions)) if conditions else table
+
+
+def arrow_sort(table, column, ascending):
+    """Sort an Arrow table on one column; dictionary columns sort on their values"""
+    key = table[column]
+    if pa.types.is_dictionary(key.type):
+        key = key.cast(key.type.value_type)
+    order = 'ascending' if ascending else 'descending'
+    return table.take(pc.sort_indices(pa.table({'key': key}), sort_keys=[('key', order)]))
+
+
+@st.cache_data(show_spinner=False, max_entries=4)
+def load_endoscope_index(version):
+    return db.get_endoscope_index()
+
 
 def show_dashboard():
     """Display dashboard with analytics"""
     col1, col2, col3 = st.columns([1, 2, 1])
     with col2:
             st.title("EndocarePro")    
+    with col3:
+        # Wall screens can open the dashboard with ?refresh=<seconds>
+        requested_interval = st.query_params.get("refresh", "")
+        auto_refresh = st.toggle("Actualisation automatique", key="dashboard_auto_refresh",
+                                 value=bool(requested_interval))
+        run_every = None
+        if auto_refresh:
+            default_interval = int(requested_interval) if requested_interval.isdigit() else 10
+            if default_interval not in DASHBOARD_REFRESH_INTERVALS:
+                default_interval = 10
+            run_every = st.select_slider("Intervalle (secondes)", options=DASHBOARD_REFRESH_INTERVALS,
+                                         value=default_interval, key="dashboard_refresh_interval")
+
+    # Each section is an independent fragment: in auto-refresh mode it reruns on
+    # its own timer and is served from cache unless its source tables changed.
+
+    st.fragment(show_breakdown_alerts, run_every=run_every)()
+    st.fragment(show_active_alerts, run_every=run_every)()
+    st.divider()
+    st.fragment(show_key_metrics, run_every=run_every)()
+    st.divider()
+    st.fragment(show_availability_chart, run_every=run_every)()
+    st.fragment(show_reliability_overview, run_every=run_every)()
+    st.fragment(show_risk_watchlist, run_every=run_every)()
+    st.fragment(show_distribution_charts, run_every=run_every)()
+
+
+@PAGE_PROFILER.phase("Alertes de panne")
+def show_breakdown_alerts():
+    """Recent breakdown alerts (source: sterilisation_reports)"""
     # --- Section for new breakdown alerts ---
     with st.container(border=True):
         st.subheader(" Alertes de Pannes Récentes")
-        recent_breakdowns = db.get_recent_breakdowns(days=7)
+        recent_breakdowns = load_recent_breakdowns(section_version('sterilisation_reports'), str(dt.date.today()))
 
         if not recent_breakdowns.empty:
             # Show notification count
@@ -350,15 +327,37 @@ def show_dashboard():
         else:
             st.success(" **AUCUNE PANNE RÉCENTE** - Tous les endoscopes fonctionnent correctement au cours des 7 derniers jours.")
 
-    st.divider()
 
+@PAGE_PROFILER.phase("Alertes actives")
+def show_active_alerts():
+    """Alerts fired by the rule engine at write time (source: alerts)"""
+    active_alerts = load_active_alerts(section_version('alerts'))
+    if active_alerts.empty:
+        return
+
+    with st.container(border=True):
+        st.subheader("Alertes Actives")
+        can_acknowledge = get_user_role() in ['admin', 'biomedical']
+        for _, alert in active_alerts.iterrows():
+            col1, col2 = st.columns([5, 1])
+            with col1:
+                alert_text = f"**{alert['severity'].upper()}** - {alert['message']} ({alert['created_at']})"
+                if alert['severity'] == 'critique':
+                    st.error(alert_text)
+                else:
+                    st.warning(alert_text)
+            with col2:
+                if can_acknowledge and st.button("Acquitter", key=f"ack_alert_{alert['id']}"):
+                    db.acknowledge_alert(alert['id'], get_username())
+                    invalidate_table_versions()
+                    st.rerun(scope="fragment")
+
+
+@PAGE_PROFILER.phase("Indicateurs")
+def show_key_metrics():
+    """Key metric cards (source: endoscopes)"""
     # Get statistics
-    stats = db.get_dashboard_stats()
-    malfunction_percentage, broken_count, total_count = db.get_malfunction_percentage()
-    
-    # Affichage simple de l'alerte critique si besoin, sans email
-    if malfunction_percentage > 50:
-        st.error(f"**ALERTE CRITIQUE**: {malfunction_percentage:.1f}% des endoscopes sont en panne!")
+    malfunction_percentage, broken_count, total_count = load_malfunction_percentage(section_version('endoscopes'))
 
     # Key metrics
     col1, col2, col3, col4 = st.columns(4)
@@ -397,99 +396,17 @@ def show_dashboard():
                 <h1 style="margin: 10px 0 0 0; color: white; font-size: 36px;">{:.1f}%</h1>
             </div>
             """.format(malfunction_percentage), unsafe_allow_html=True)
-    # Replace the existing availability chart section in show_dashboard() function
-    # Starting from "# NEW: Availability Chart by Endoscope Type" until the end of that section
 
-# Replace your availability chart section in show_dashboard() with this:
 
+@PAGE_PROFILER.phase("Disponibilité")
+def show_availability_chart():
+    """Availability by designation (source: endoscopes)"""
     # NEW: Availability Chart by Endoscope Type
-    st.divider()
     with st.container(border=True):
-        availability_stats = db.get_endoscope_availability_by_type()
+        availability_stats = load_availability_by_type(section_version('endoscopes'))
 
         if not availability_stats.empty:
-            # Create the grouped bar chart with proper side-by-side grouping
-            fig_availability = go.Figure()
-            
-            # Add availability bars (dark green)
-            fig_availability.add_trace(go.Bar(
-                name='Disponibilité (%)',
-                x=availability_stats['type'],
-                y=availability_stats['disponibilite_pct'],
-                marker_color='#2E7D32',  # Dark green
-                text=availability_stats['disponibilite_pct'].apply(lambda x: f'{x}%'),
-                textposition='auto',
-                textfont=dict(color='white', size=12, family='Arial', weight='bold'),
-                width=0.4,  # Make bars thinner for better grouping
-                offset=-0.2,  # Position for grouping
-            ))
-            
-            # Add unavailability bars (coral red)
-            fig_availability.add_trace(go.Bar(
-                name='Indisponibilité (%)',
-                x=availability_stats['type'],
-                y=availability_stats['indisponibilite_pct'],
-                marker_color='#E57373',  # Coral red
-                text=availability_stats['indisponibilite_pct'].apply(lambda x: f'{x}%' if x > 0 else ''),
-                textposition='auto',
-                textfont=dict(color='white', size=12, family='Arial', weight='bold'),
-                width=0.4,  # Make bars thinner for better grouping
-                offset=0.2,  # Position for grouping
-            ))
-            
-            # Update layout for proper grouping (NOT stacking)
-            fig_availability.update_layout(
-                title=dict(
-                    text="Taux de disponibilité et d'indisponibilité des endoscopes",
-                    font=dict(size=16, color='black', family='Arial'),
-                    x=0.5,
-                    xanchor='center'
-                ),
-                xaxis=dict(
-                    title="",
-                    tickangle=45,
-                    tickfont=dict(size=11, color='black', family='Arial'),
-                    showgrid=False,
-                    showline=True,
-                    linecolor='black',
-                    linewidth=1
-                ),
-                yaxis=dict(
-                    title="Taux (%)",
-                    title_font=dict(size=12, color='black', family='Arial'),
-                    tickfont=dict(size=11, color='black', family='Arial'),
-                    showgrid=True,
-                    gridcolor='lightgray',
-                    gridwidth=0.5,
-                    showline=True,
-                    linecolor='black',
-                    linewidth=1,
-                    range=[0, 110]
-                ),
-                barmode='group',  # THIS IS KEY - Group bars side by side, not stack
-                bargap=0.6,  # Space between groups
-                bargroupgap=0.15,  # Space between bars in the same group
-                height=500,
-                showlegend=True,
-                legend=dict(
-                    orientation="v",
-                    yanchor="top",
-                    y=0.98,
-                    xanchor="right",
-                    x=0.98,
-                    bgcolor="rgba(255,255,255,0.8)",
-                    bordercolor="black",
-                    borderwidth=1,
-                    font=dict(size=11, color='black', family='Arial')
-                ),
-                plot_bgcolor='white',
-                paper_bgcolor='white',
-                margin=dict(l=60, r=60, t=80, b=120)
-            )
-            
-            # Add borders around the plot area
-            fig_availability.update_xaxes(mirror=True)
-            fig_availability.update_yaxes(mirror=True)
+            fig_availability = availability_figure(availability_stats)
             
             st.plotly_chart(fig_availability, use_container_width=True, key="plotly_availability")
             
@@ -503,20 +420,86 @@ def show_dashboard():
         else:
             st.info("Aucune donnée disponible pour le graphique de disponibilité")
 
-    # Original charts (keep existing ones)
-     # Original charts (keep existing ones)
+
+@PAGE_PROFILER.phase("Fiabilité")
+def show_reliability_overview():
+    """MTBF / MTTR tables (source: endoscopes, sterilisation_reports)"""
+    # Reliability (MTBF / MTTR) derived from the état history of each endoscope
+    with st.container(border=True):
+        st.subheader("Fiabilité des Endoscopes (MTBF / MTTR)")
+        reliability_by_device = load_reliability_by_device(section_version('endoscopes', 'sterilisation_reports'))
+
+        if not reliability_by_device.empty:
+            reliability_columns = {
+                'endoscopes': 'Endoscopes', 'failures': 'Pannes', 'repairs': 'Réparations',
+                'mtbf_jours': 'MTBF (jours)', 'mttr_heures': 'MTTR (heures)',
+                'disponibilite_pct': 'Disponibilité (%)'
+            }
+            tab_designation, tab_marque, tab_device = st.tabs(["Par Désignation", "Par Marque", "Par Endoscope"])
+            with tab_designation:
+                by_designation = db.reliability.group_metrics(reliability_by_device, 'designation')
+                display_reliability = by_designation[['designation'] + list(reliability_columns)].rename(
+                    columns={'designation': 'Désignation', **reliability_columns})
+                st.dataframe(display_reliability, use_container_width=True, hide_index=True)
+            with tab_marque:
+                by_marque = db.reliability.group_metrics(reliability_by_device, 'marque')
+                display_reliability = by_marque[['marque'] + list(reliability_columns)].rename(
+                    columns={'marque': 'Marque', **reliability_columns})
+                st.dataframe(display_reliability, use_container_width=True, hide_index=True)
+            with tab_device:
+                display_reliability = reliability_by_device[
+                    ['numero_serie', 'designation', 'etat', 'failures', 'repairs',
+                     'mtbf_jours', 'mttr_heures', 'disponibilite_pct']].rename(
+                    columns={'numero_serie': 'Numéro de série', 'designation': 'Désignation',
+                             'etat': 'État actuel', **reliability_columns})
+                st.dataframe(display_reliability, use_container_width=True, hide_index=True)
+            st.caption("MTBF : temps moyen de bon fonctionnement entre deux pannes. "
+                       "MTTR : durée moyenne d'immobilisation. Calculés à partir des rapports de stérilisation et des changements d'état de l'inventaire.")
+        else:
+            st.info("Aucun historique d'état disponible pour calculer la fiabilité")
+
+
+RISK_COLUMN_LABELS = {
+    'numero_serie': 'Numéro de série', 'designation': 'Désignation', 'localisation': 'Localisation',
+    'score': 'Score de risque', 'facteur_principal': 'Facteur principal',
+    'cycles_since_breakdown': 'Cycles depuis la panne', 'failed_leak_tests': "Tests d'étanchéité échoués",
+    'incomplete_cycles': 'Cycles incomplets', 'manual_ratio': 'Part manuelle (%)', 'breakdowns': 'Pannes',
+    'age_years': 'Ancienneté (ans)',
+}
+
+
+@PAGE_PROFILER.phase("Risque de panne")
+def show_risk_watchlist():
+    """Endoscopes to pull for preventive maintenance (source: endoscopes, sterilisation_reports)"""
+    with st.container(border=True):
+        st.subheader("Surveillance Préventive")
+        risk = load_failure_risk(section_version('endoscopes', 'sterilisation_reports'))
+        if risk.empty:
+            st.info("Aucun endoscope à évaluer")
+            return
+        watchlist = risk[risk['etat'] == 'fonctionnel'].head(RISK_WATCHLIST_SIZE).copy()
+        watchlist['facteur_principal'] = watchlist['facteur_principal'].map(RISK_FACTOR_LABELS)
+        watchlist['manual_ratio'] = (watchlist['manual_ratio'] * 100).round(0)
+        st.dataframe(
+            watchlist[list(RISK_COLUMN_LABELS)].rename(columns=RISK_COLUMN_LABELS),
+            use_container_width=True, hide_index=True,
+            column_config={'Score de risque': st.column_config.ProgressColumn(
+                "Score de risque", format="%.1f", min_value=0, max_value=100)})
+        st.caption("Endoscopes fonctionnels les plus à risque de panne, d'après leurs rapports de stérilisation "
+                   "depuis la dernière panne (cycles, tests d'étanchéité échoués, cycles incomplets, part de "
+                   "désinfections manuelles), leurs pannes antérieures et leur ancienneté.")
+
+
+@PAGE_PROFILER.phase("Répartition")
+def show_distribution_charts():
+    """État and localisation charts (source: endoscopes)"""
+    stats = load_dashboard_stats(section_version('endoscopes'))
     col1, col2 = st.columns(2)
     with col1:
         with st.container(border=True):
             st.subheader("État des Endoscopes")
             if not stats['status_stats'].empty:
-                fig_status = px.pie(
-                    stats['status_stats'], 
-                    values='count', 
-                    names='etat',
-                    title="Répartition par État",
-                    color_discrete_map={'fonctionnel': '#4CAF50', 'en panne': '#F44336'}
-                )
+                fig_status = status_pie(stats['status_stats'])
                 st.plotly_chart(fig_status, use_container_width=True, key="plotly_status")
             else:
                 st.info("Aucune donnée disponible")
@@ -525,14 +508,7 @@ def show_dashboard():
         with st.container(border=True):
             st.subheader("Localisation des Endoscopes")
             if not stats['location_stats'].empty:
-                fig_location = px.bar(
-                    stats['location_stats'], 
-                    x='localisation', 
-                    y='count',
-                    title="Répartition par Localisation",
-                    color='count',
-                    color_continuous_scale=["#1a3b5e", "#385EA4", '#415a77', "#155dbb", "#57b3ff"] 
-                )       
+                fig_location = location_bar(stats['location_stats'])
                 st.plotly_chart(fig_location, use_container_width=True, key="plotly_location")
             else:
                 st.info("Aucune donnée disponible")
@@ -541,7 +517,7 @@ def show_admin_interface():
     """Admin interface for user management"""
     st.title("Administration des Utilisateurs")
     
-    tab1, tab2 = st.tabs(["Gestion des Utilisateurs", "Ajouter un Utilisateur"])
+    tab1, tab2, tab3 = st.tabs(["Gestion des Utilisateurs", "Ajouter un Utilisateur", "Règles d'Alerte"])
     
     with tab1:
         st.subheader("Liste des Utilisateurs")
@@ -633,166 +609,363 @@ def show_admin_interface():
                 else:
                     st.error("Veuillez remplir tous les champs")
 
+    with tab3:
+        st.subheader("Règles d'Alerte")
+        st.caption("Les règles sont évaluées à chaque enregistrement (inventaire et rapports de stérilisation). "
+                   "Seuil en % pour le taux de panne, en nombre de pannes pour les pannes répétées.")
+        rules_df = db.get_alert_rules()
+
+        if not rules_df.empty:
+            for idx, rule in rules_df.iterrows():
+                col1, col2, col3 = st.columns([4, 2, 1])
+                with col1:
+                    scope_label = "Global" if rule['scope'] == 'global' else f"{rule['scope']} = {rule['scope_value']}"
+                    st.write(f"**{ALERT_RULE_LABELS[rule['rule_type']]}** ({scope_label})")
+                with col2:
+                    details = []
+                    if pd.notna(rule['threshold']):
+                        details.append(f"seuil {rule['threshold']:g}")
+                    if pd.notna(rule['window_days']):
+                        details.append(f"sur {int(rule['window_days'])} jours")
+                    details.append(rule['severity'])
+                    if not rule['enabled']:
+                        details.append("désactivée")
+                    st.write(", ".join(details))
+                with col3:
+                    if st.button(" Supprimer", key=f"delete_rule_{rule['id']}"):
+                        if db.delete_alert_rule(rule['id']):
+                            st.success("Règle supprimée")
+                            st.rerun()
+                        else:
+                            st.error("Erreur lors de la suppression de la règle")
+        else:
+            st.info("Aucune règle d'alerte configurée")
+
+        st.divider()
+        st.write("**Ajouter ou modifier une règle**")
+        with st.form("alert_rule_form"):
+            col1, col2 = st.columns(2)
+            with col1:
+                rule_type = st.selectbox("Type de règle", list(ALERT_RULE_LABELS),
+                                         format_func=ALERT_RULE_LABELS.get)
+                scope = st.selectbox("Portée", ['global', 'designation', 'localisation'])
+                scope_value = st.text_input("Désignation / localisation concernée",
+                                            help="Ignoré pour une règle globale")
+            with col2:
+                threshold = st.number_input("Seuil", min_value=0.0, value=50.0, step=1.0)
+                window_days = st.number_input("Fenêtre (jours)", min_value=1, value=30, step=1,
+                                              help="Utilisée pour les pannes répétées")
+                severity = st.selectbox("Sévérité", ['critique', 'avertissement'])
+                enabled = st.checkbox("Active", value=True)
+
+            if st.form_submit_button("Enregistrer la règle"):
+                if scope != 'global' and not scope_value.strip():
+                    st.error("Veuillez préciser la désignation ou la localisation concernée")
+                elif db.save_alert_rule(rule_type, scope, scope_value,
+                                        threshold if rule_type in ['taux_panne', 'pannes_repetees'] else None,
+                                        window_days if rule_type == 'pannes_repetees' else None,
+                                        severity, enabled):
+                    st.success("Règle enregistrée")
+                    st.rerun()
+                else:
+                    st.error("Erreur lors de l'enregistrement de la règle")
+
+INVENTORY_SUMMARY_COLUMNS = {
+    'designation': "Désignation", 'numero_serie': "N° de série", 'marque': "Marque",
+    'modele': "Modèle", 'etat': "État", 'localisation': "Localisation",
+}
+
+
+@st.fragment
+def show_inventory_list(inventory):
+    """Summary table of the inventory; QR code, details and forms are built for the selected row only"""
+    st.caption(f"{inventory.num_rows} endoscope(s) - sélectionnez une ligne pour afficher sa fiche")
+    # The selection is a row position: key the table on the endoscopes shown, so that a filter change
+    # or an inserted/deleted endoscope clears it instead of moving the pane to another endoscope
+    shown_ids = tuple(inventory['id'].to_pylist())
+    event = st.dataframe(
+        inventory.select(list(INVENTORY_SUMMARY_COLUMNS)).rename_columns(list(INVENTORY_SUMMARY_COLUMNS.values())),
+        on_select="rerun",
+        selection_mode="single-row",
+        hide_index=True,
+        use_container_width=True,
+        key=f"inventory_list_{hash(shown_ids)}"
+    )
+    rows = [row for row in event.selection.rows if row < inventory.num_rows]
+    if not rows:
+        st.info("Sélectionnez un endoscope dans la liste pour afficher son QR code et ses actions.")
+        return
+    show_endoscope_detail(inventory.slice(rows[0], 1).to_pylist()[0])
+
+
+def show_endoscope_detail(endoscope):
+    """Detail pane of one endoscope: QR code, reliability, edit and delete actions"""
+    qr_code = generate_qr_code(endoscope['id'], endoscope['designation'], endoscope['numero_serie'])
+    reliability_df = load_reliability_by_device(section_version('endoscopes', 'sterilisation_reports'))
+    reliability = None
+    if not reliability_df.empty:
+        matches = reliability_df[reliability_df['numero_serie'] == endoscope['numero_serie']]
+        reliability = matches.iloc[0] if not matches.empty else None
+
+    with st.container(border=True):
+        st.write(f"**📱 {endoscope['designation']} - {endoscope['numero_serie']} (QR: {endoscope['id']})**")
+        # --- Affichage des détails ---
+        col1, col2, col3 = st.columns([2, 1, 1])
+        with col1:
+            st.write(f"**Marque:** {endoscope['marque']}")
+            st.write(f"**Modèle:** {endoscope['modele']}")
+            st.write(f"**État:** {endoscope['etat']}")
+            st.write(f"**Localisation:** {endoscope['localisation']}")
+            if endoscope.get('last_report_id') is not None:
+                st.write(f"**Dernier retraitement:** {endoscope['last_reprocessed_at']} "
+                         f"(rapport #{endoscope['last_report_id']})")
+            obs_value = endoscope.get('observation')
+            if obs_value and pd.notna(obs_value) and str(obs_value).strip():
+                st.write(f"**Observation:** {obs_value}")
+            st.write(f"**Créé par:** {endoscope.get('created_by', 'N/A')} le {endoscope['created_at']}")
+            if reliability is not None:
+                mtbf = f"{reliability['mtbf_jours']} j" if pd.notna(reliability['mtbf_jours']) else "aucune panne"
+                mttr = f"{reliability['mttr_heures']} h" if pd.notna(reliability['mttr_heures']) else "N/A"
+                availability = f"{reliability['disponibilite_pct']}%" if pd.notna(reliability['disponibilite_pct']) else "N/A"
+                st.write(f"**Fiabilité:** {reliability['failures']} panne(s) — MTBF {mtbf} — MTTR {mttr} — Disponibilité {availability}")
+
+        # --- Boutons d'action ---
+        with col2:
+            edit_key = f"edit_mode_{endoscope['id']}"
+            if st.button(" Modifier", key=f"edit_btn_{endoscope['id']}"):
+                st.session_state[edit_key] = True
+                st.rerun(scope="fragment")
+
+            if st.button(" Supprimer", key=f"delete_btn_{endoscope['id']}", type="secondary"):
+                if db.delete_endoscope(endoscope['id']):
+                    invalidate_table_versions()
+                    st.success(" Endoscope supprimé avec succès!")
+                    st.rerun()
+                else:
+                    st.error(" Erreur lors de la suppression.")
+
+        with col3:
+            # Display QR Code
+            if qr_code:
+                st.write("**QR Code:**")
+                st.image(f"data:image/png;base64,{qr_code}", width=120)
+            else:
+                st.write("QR Code non disponible")
+
+        # --- Formulaire de modification (si activé) ---
+        if st.session_state.get(edit_key, False):
+            st.info(f"Modification de : {endoscope['designation']}")
+            with st.form(f"update_form_{endoscope['id']}"):
+                new_designation = st.text_input("Désignation", value=endoscope['designation'])
+                new_marque = st.text_input("Marque", value=endoscope['marque'])
+                new_modele = st.text_input("Modèle", value=endoscope['modele'])
+                new_numero_serie = st.text_input("Numéro de série", value=endoscope['numero_serie'])
+                new_etat = st.selectbox("État", ['fonctionnel', 'en panne'],
+                                      index=0 if endoscope['etat'] == 'fonctionnel' else 1)
+                new_observation = st.text_area("Observation", value=str(endoscope.get('observation', '')))
+
+                current_location_index = ENDOSCOPE_LOCATIONS.index(endoscope['localisation']) if endoscope['localisation'] in ENDOSCOPE_LOCATIONS else 0
+                new_localisation = st.selectbox("Localisation", options=ENDOSCOPE_LOCATIONS, index=current_location_index)
+
+                col_f1, col_f2 = st.columns(2)
+                with col_f1:
+                    if st.form_submit_button(" Mettre à jour"):
+                        update_data = {
+                            'designation': new_designation, 'marque': new_marque, 'modele': new_modele,
+                            'numero_serie': new_numero_serie, 'etat': new_etat,
+                            'observation': new_observation, 'localisation': new_localisation
+                        }
+                        if db.update_endoscope(endoscope['id'], **update_data):
+                            invalidate_table_versions()
+                            st.success("Endoscope mis à jour!")
+                            st.session_state.pop(edit_key, None)
+                            st.rerun()
+                        else:
+                            st.error("Erreur lors de la mise à jour.")
+                with col_f2:
+                    if st.form_submit_button("Annuler"):
+                        st.session_state.pop(edit_key, None)
+                        st.rerun(scope="fragment")
+
+def diff_inventory_edits(snapshot, edited):
+    """{endoscope_id: {column: new_value}} for the cells changed in the batch editor"""
+    def normalize(value):
+        return '' if value is None or (isinstance(value, float) and pd.isna(value)) else str(value).strip()
+
+    changes = {}
+    for endoscope_id, row in edited[BATCH_EDIT_COLUMNS].iterrows():
+        before = snapshot.loc[endoscope_id]
+        fields = {column: normalize(row[column]) for column in BATCH_EDIT_COLUMNS
+                  if normalize(row[column]) != normalize(before[column])}
+        if fields:
+            changes[int(endoscope_id)] = fields
+    return changes
+
+
+@st.fragment
+def show_batch_inventory_editor():
+    """Grid editor for the inventory: every change is saved in one transaction"""
+    st.subheader("Modification Groupée de l'Inventaire")
+    endoscopes_df = db.get_all_endoscopes()
+    if endoscopes_df.empty:
+        st.info("Aucun endoscope dans l'inventaire.")
+        return
+
+    col_f1, col_f2 = st.columns(2)
+    with col_f1:
+        filter_status = st.selectbox("Filtrer par état", ['Tous', 'fonctionnel', 'en panne'], key="batch_filter_etat")
+    with col_f2:
+        filter_location = st.selectbox("Filtrer par localisation", ['Tous'] + ENDOSCOPE_LOCATIONS,
+                                       key="batch_filter_localisation")
+    if filter_status != 'Tous':
+        endoscopes_df = endoscopes_df[endoscopes_df['etat'] == filter_status]
+    if filter_location != 'Tous':
+        endoscopes_df = endoscopes_df[endoscopes_df['localisation'] == filter_location]
+
+    # Snapshot the editor diffs against; id is the index so it cannot be edited
+    snapshot = endoscopes_df.set_index('id')[BATCH_EDIT_COLUMNS]
+    grid = snapshot.copy()
+    grid.insert(0, 'selection', False)
+    edited = st.data_editor(
+        grid,
+        column_config={
+            'selection': st.column_config.CheckboxColumn("Sélection"),
+            'designation': st.column_config.TextColumn("Désignation", required=True),
+            'marque': st.column_config.TextColumn("Marque", required=True),
+            'modele': st.column_config.TextColumn("Modèle", required=True),
+            'numero_serie': st.column_config.TextColumn("N° de série", required=True),
+            'etat': st.column_config.SelectboxColumn("État", options=['fonctionnel', 'en panne'], required=True),
+            'localisation': st.column_config.SelectboxColumn("Localisation", options=ENDOSCOPE_LOCATIONS, required=True),
+            'observation': st.column_config.TextColumn("Observation"),
+        },
+        hide_index=True,
+        use_container_width=True,
+        key="batch_inventory_editor"
+    )
+
+    # Apply one value to every selected row, e.g. move a whole campaign to sterilisation
+    selected = edited['selection']
+    col_a1, col_a2 = st.columns(2)
+    with col_a1:
+        bulk_location = st.selectbox(f"Localisation des {int(selected.sum())} endoscope(s) sélectionné(s)",
+                                     ['Inchangée'] + ENDOSCOPE_LOCATIONS, key="batch_bulk_localisation")
+    with col_a2:
+        bulk_status = st.selectbox("État des endoscopes sélectionnés", ['Inchangé', 'fonctionnel', 'en panne'],
+                                   key="batch_bulk_etat")
+    if bulk_location != 'Inchangée':
+        edited.loc[selected, 'localisation'] = bulk_location
+    if bulk_status != 'Inchangé':
+        edited.loc[selected, 'etat'] = bulk_status
+
+    changes = diff_inventory_edits(snapshot, edited)
+    st.write(f"**Endoscopes modifiés: {len(changes)}**")
+    if st.button(" Enregistrer les modifications", type="primary", disabled=not changes, key="batch_save"):
+        updated = db.bulk_update_endoscopes(changes)
+        if updated is None:
+            st.error("Erreur lors de la mise à jour - aucune modification n'a été enregistrée "
+                     "(numéro de série déjà existant ?)")
+        else:
+            invalidate_table_versions()
+            st.session_state.pop("batch_inventory_editor", None)
+            st.success(f"{updated} endoscope(s) mis à jour")
+            st.rerun()
+
+
+@st.fragment
+def show_inventory_tab():
+    """Inventory filters, print actions and list, rerun on their own"""
+    st.subheader("Liste des Endoscopes")
+    endoscopes = load_inventory_table(section_version('endoscopes'))
+
+    if endoscopes.num_rows:
+        # Add Print/Export section at the top
+        col_print1, col_print2, col_print3 = st.columns([2, 2, 2])
+
+        with col_print1:
+            if st.button(" Imprimer Rapport Inventaire", key="print_inventory_biomedical", type="secondary"):
+                try:
+                    with st.spinner("Génération du rapport d'inventaire..."):
+                        pdf_bytes = generate_professional_pdf_report(
+                            endoscopes.to_pandas(), 
+                            "Rapport d'Inventaire des Endoscopes",
+                            "inventaire"
+                        )
+                        st.download_button(
+                            label="Télécharger le Rapport PDF",
+                            data=pdf_bytes,
+                            file_name=f"inventaire_endoscopes_{datetime.now().strftime('%Y%m%d_%H%M%S')}.pdf",
+                            mime="application/pdf",
+                            key="download_inventory_biomedical"
+                        )
+                        st.success("Rapport d'inventaire généré avec succès!")
+                except Exception as e:
+                    st.error(f"Erreur lors de la génération du PDF: {str(e)}")
+
+        with col_print2:
+            # Filter by status for printing
+            filter_status = st.selectbox("Filtrer par état", ['Tous', 'fonctionnel', 'en panne'], key="filter_print")
+
+        with col_print3:
+            # Filter by location for printing
+            filter_location = st.selectbox("Filtrer par localisation", 
+                                        ['Tous', 'En utilisation', 'En stock', 'En zone de stérilisation', 'En externe', 'En réforme'], 
+                                        key="filter_location_print")
+
+        # Apply filters if any are selected
+        conditions = []
+        if filter_status != 'Tous':
+            conditions.append(pc.equal(endoscopes['etat'].cast(pa.string()), filter_status))
+        if filter_location != 'Tous':
+            conditions.append(pc.equal(endoscopes['localisation'].cast(pa.string()), filter_location))
+        filtered = arrow_filter(endoscopes, conditions)
+
+        # Show filtered count
+        if filter_status != 'Tous' or filter_location != 'Tous':
+            st.info(f"Affichage de {filtered.num_rows} endoscope(s) sur {endoscopes.num_rows} total")
+            if st.button(" Imprimer Sélection Filtrée", key="print_filtered", type="primary"):
+                try:
+                    with st.spinner("Génération du rapport filtré..."):
+                        filter_title = f"Rapport d'Inventaire des Endoscopes"
+                        if filter_status != 'Tous':
+                            filter_title += f" - État: {filter_status}"
+                        if filter_location != 'Tous':
+                            filter_title += f" - Localisation: {filter_location}"
+
+                        pdf_bytes = generate_professional_pdf_report(
+                            filtered.to_pandas(), 
+                            filter_title,
+                            "inventaire"
+                        )
+                        st.download_button(
+                            label=" Télécharger le Rapport Filtré",
+                            data=pdf_bytes,
+                            file_name=f"inventaire_filtre_{datetime.now().strftime('%Y%m%d_%H%M%S')}.pdf",
+                            mime="application/pdf",
+                            key="download_filtered_inventory"
+                        )
+                        st.success("Rapport filtré généré avec succès!")
+                except Exception as e:
+                    st.error(f" Erreur lors de la génération du PDF: {str(e)}")
+
+        st.divider()
+
+        show_inventory_list(filtered)
+    else:
+        st.info("Aucun endoscope dans l'inventaire.")
+
+
 @require_role(['biomedical'])
 def show_biomedical_interface():
     user_role = get_user_role()
     st.title("Gestion de l'Inventaire des Endoscopes")
     
-    tab1, tab2 = st.tabs(["Inventaire", "Ajouter Endoscope"])
-    
-    with tab1:
-        st.subheader("Liste des Endoscopes")
-        endoscopes_df = db.get_all_endoscopes()
-        
-        if not endoscopes_df.empty:
-            # Add Print/Export section at the top
-            col_print1, col_print2, col_print3 = st.columns([2, 2, 2])
-            
-            with col_print1:
-                if st.button(" Imprimer Rapport Inventaire", key="print_inventory_biomedical", type="secondary"):
-                    try:
-                        with st.spinner("Génération du rapport d'inventaire..."):
-                            pdf_bytes = generate_professional_pdf_report(
-                                endoscopes_df, 
-                                "Rapport d'Inventaire des Endoscopes",
-                                "inventaire"
-                            )
-                            st.download_button(
-                                label="Télécharger le Rapport PDF",
-                                data=pdf_bytes,
-                                file_name=f"inventaire_endoscopes_{datetime.now().strftime('%Y%m%d_%H%M%S')}.pdf",
-                                mime="application/pdf",
-                                key="download_inventory_biomedical"
-                            )
-                            st.success("Rapport d'inventaire généré avec succès!")
-                    except Exception as e:
-                        st.error(f"Erreur lors de la génération du PDF: {str(e)}")
-            
-            with col_print2:
-                # Filter by status for printing
-                filter_status = st.selectbox("Filtrer par état", ['Tous', 'fonctionnel', 'en panne'], key="filter_print")
-            
-            with col_print3:
-                # Filter by location for printing
-                filter_location = st.selectbox("Filtrer par localisation", 
-                                            ['Tous', 'En utilisation', 'En stock', 'En zone de stérilisation', 'En externe', 'En réforme'], 
-                                            key="filter_location_print")
-            
-            # Apply filters if any are selected
-            filtered_df = endoscopes_df.copy()
-            if filter_status != 'Tous':
-                filtered_df = filtered_df[filtered_df['etat'] == filter_status]
-            if filter_location != 'Tous':
-                filtered_df = filtered_df[filtered_df['localisation'] == filter_location]
-            
-            # Show filtered count
-            if filter_status != 'Tous' or filter_location != 'Tous':
-                st.info(f"Affichage de {len(filtered_df)} endoscope(s) sur {len(endoscopes_df)} total")
-                if st.button(" Imprimer Sélection Filtrée", key="print_filtered", type="primary"):
-                    try:
-                        with st.spinner("Génération du rapport filtré..."):
-                            filter_title = f"Rapport d'Inventaire des Endoscopes"
-                            if filter_status != 'Tous':
-                                filter_title += f" - État: {filter_status}"
-                            if filter_location != 'Tous':
-                                filter_title += f" - Localisation: {filter_location}"
-                            
-                            pdf_bytes = generate_professional_pdf_report(
-                                filtered_df, 
-                                filter_title,
-                                "inventaire"
-                            )
-                            st.download_button(
-                                label=" Télécharger le Rapport Filtré",
-                                data=pdf_bytes,
-                                file_name=f"inventaire_filtre_{datetime.now().strftime('%Y%m%d_%H%M%S')}.pdf",
-                                mime="application/pdf",
-                                key="download_filtered_inventory"
-                            )
-                            st.success("Rapport filtré généré avec succès!")
-                    except Exception as e:
-                        st.error(f" Erreur lors de la génération du PDF: {str(e)}")
-            
-            st.divider()
-            
-            # Use filtered_df for display
-            current_df = filtered_df
-            
-            for idx, endoscope in current_df.iterrows():
-                # Generate QR code for this endoscope
-                qr_code = generate_qr_code(endoscope['id'], endoscope['designation'], endoscope['numero_serie'])
-    
-                with st.expander(f"📱 {endoscope['designation']} - {endoscope['numero_serie']} (QR: {endoscope['id']})"):
-                    # --- Affichage des détails ---
-                    col1, col2, col3 = st.columns([2, 1, 1])
-                    with col1:
-                        st.write(f"**Marque:** {endoscope['marque']}")
-                        st.write(f"**Modèle:** {endoscope['modele']}")
-                        st.write(f"**État:** {endoscope['etat']}")
-                        st.write(f"**Localisation:** {endoscope['localisation']}")
-                        obs_value = endoscope.get('observation')
-                        if obs_value and pd.notna(obs_value) and str(obs_value).strip():
-                            st.write(f"**Observation:** {obs_value}")
-                        st.write(f"**Créé par:** {endoscope.get('created_by', 'N/A')} le {endoscope['created_at']}")
-
-                    # --- Boutons d'action ---
-                    with col2:
-                        edit_key = f"edit_mode_{endoscope['id']}"
-                        if st.button(" Modifier", key=f"edit_btn_{endoscope['id']}"):
-                            st.session_state[edit_key] = True
-                            st.rerun()
+    tab1, tab_batch, tab2 = st.tabs(["Inventaire", "Modification Groupée", "Ajouter Endoscope"])
 
-                        if st.button(" Supprimer", key=f"delete_btn_{endoscope['id']}", type="secondary"):
-                            if db.delete_endoscope(endoscope['id']):
-                                st.success(" Endoscope supprimé avec succès!")
-                                st.rerun()
-                            else:
-                                st.error(" Erreur lors de la suppression.")
+    with tab1:
+        show_inventory_tab()
 
-                    with col3:
-                        # Display QR Code
-                        if qr_code:
-                            st.write("**QR Code:**")
-                            st.image(f"data:image/png;base64,{qr_code}", width=120)
-                        else:
-                            st.write("QR Code non disponible")
-
-                    # --- Formulaire de modification (si activé) ---
-                    if st.session_state.get(edit_key, False):
-                        st.info(f"Modification de : {endoscope['designation']}")
-                        with st.form(f"update_form_{endoscope['id']}"):
-                            new_designation = st.text_input("Désignation", value=endoscope['designation'])
-                            new_marque = st.text_input("Marque", value=endoscope['marque'])
-                            new_modele = st.text_input("Modèle", value=endoscope['modele'])
-                            new_numero_serie = st.text_input("Numéro de série", value=endoscope['numero_serie'])
-                            new_etat = st.selectbox("État", ['fonctionnel', 'en panne'], 
-                                                  index=0 if endoscope['etat'] == 'fonctionnel' else 1)
-                            new_observation = st.text_area("Observation", value=str(endoscope.get('observation', '')))
-                            
-                            location_options = ['En utilisation', 'En stock', 'En zone de stérilisation', 'En externe', 'En réforme']
-                            current_location_index = location_options.index(endoscope['localisation']) if endoscope['localisation'] in location_options else 0
-                            new_localisation = st.selectbox("Localisation", options=location_options, index=current_location_index)
-                                                        
-                            col_f1, col_f2 = st.columns(2)
-                            with col_f1:
-                                if st.form_submit_button(" Mettre à jour"):
-                                    update_data = {
-                                        'designation': new_designation, 'marque': new_marque, 'modele': new_modele,
-                                        'numero_serie': new_numero_serie, 'etat': new_etat,
-                                        'observation': new_observation, 'localisation': new_localisation
-                                    }
-                                    if db.update_endoscope(endoscope['id'], **update_data):
-                                        st.success("Endoscope mis à jour!")
-                                        st.session_state.pop(edit_key, None)
-                                        st.rerun()
-                                    else:
-                                        st.error("Erreur lors de la mise à jour.")
-                            with col_f2:
-                                if st.form_submit_button("Annuler"):
-                                    st.session_state.pop(edit_key, None)
-                                    st.rerun()
-        else:
-            st.info("Aucun endoscope dans l'inventaire.")
+    with tab_batch:
+        show_batch_inventory_editor()
 
     with tab2:
         st.subheader("Ajouter un Nouvel Endoscope")
@@ -809,237 +982,931 @@ def show_biomedical_interface():
             if submitted:
                 if all([designation, marque, modele, numero_serie, localisation]):
                     if db.add_endoscope(designation, marque, modele, numero_serie, etat, observation, localisation, get_username()):
+                        invalidate_table_versions()
                         st.success(" Endoscope ajouté avec succès!")
                     else:
                         st.error(" Erreur: Numéro de série déjà existant.")
                 else:
                     st.error(" Veuillez remplir tous les champs obligatoires (*)")
 
+def queue_scanned_endoscope():
+    """on_change callback of the scan field: resolve the payload and queue a cycle"""
+    parsed = parse_scan_payload(st.session_state.get("scan_input"))
+    st.session_state.scan_input = ""
+    if not parsed:
+        return
+    endoscope = db.find_endoscope(parsed['endoscope_id'], parsed['numero_serie'])
+    if not endoscope:
+        st.session_state.scan_message = ('error', f"Endoscope introuvable : {parsed['numero_serie'] or parsed['endoscope_id']}")
+        return
+    queue = st.session_state.setdefault("scan_queue", [])
+    if any(item['id'] == endoscope['id'] for item in queue):
+        st.session_state.scan_message = ('warning', f"{endoscope['numero_serie']} est déjà dans le lot")
+        return
+    queue.append({'id': endoscope['id'], 'endoscope': endoscope['designation'],
+                  'numero_serie': endoscope['numero_serie'], 'etat_endoscope': 'fonctionnel',
+                  'nature_panne': ''})
+    st.session_state.scan_message = ('success', f"{endoscope['designation']} - {endoscope['numero_serie']} ajouté au lot")
+
+
+@st.fragment
+def show_scan_intake():
+    """Scanner intake: scan endoscopes one after another, then save the whole batch at once"""
+    st.subheader("Saisie Rapide par Scan")
+    st.caption("Scannez le QR code (ou le N° de série) de chaque endoscope traité. "
+               "Les cycles sont mis en attente puis enregistrés ensemble.")
+
+    col1, col2 = st.columns(2)
+    with col1:
+        medecin_responsable = st.text_input("Médecin responsable*", key="scan_medecin")
+        date_desinfection = st.date_input("Date de désinfection*", key="scan_date")
+        type_desinfection = st.selectbox("Type de désinfection*", ['manuel', 'automatique'], key="scan_type")
+        cycle = st.selectbox("Cycle*", ['complet', 'incomplet'], key="scan_cycle")
+        test_etancheite = st.selectbox("Test d'étanchéité*", ['réussi', 'échoué'], key="scan_test")
+    with col2:
+        col_t1, col_t2 = st.columns(2)
+        with col_t1:
+            heure_debut_time = st.time_input("Heure de début*", value=dt.time(8, 0), key="scan_debut")
+        with col_t2:
+            heure_fin_time = st.time_input("Heure de fin*", value=dt.time(17, 0), key="scan_fin")
+        salle = st.text_input("Salle*", key="scan_salle")
+        type_acte = st.text_input("Type d'acte*", key="scan_type_acte")
+
+    # The scanner types the payload and presses Enter: the callback queues it and clears the field
+    st.text_input("Scanner le prochain endoscope", key="scan_input", on_change=queue_scanned_endoscope,
+                  placeholder="ENDOSCOPE_ID:...|DESIGNATION:...|SERIE:...")
+    message = st.session_state.pop("scan_message", None)
+    if message:
+        getattr(st, message[0])(message[1])
+
+    queue = st.session_state.get("scan_queue", [])
+    if not queue:
+        st.info("Aucun endoscope scanné pour le moment")
+        return
+
+    st.write(f"**Endoscopes dans le lot: {len(queue)}**")
+    edited = st.data_editor(
+        pd.DataFrame(queue),
+        column_config={
+            'id': None,
+            'endoscope': st.column_config.TextColumn("Endoscope", disabled=True),
+            'numero_serie': st.column_config.TextColumn("N° de série", disabled=True),
+            'etat_endoscope': st.column_config.SelectboxColumn("État", options=['fonctionnel', 'en panne'], required=True),
+            'nature_panne': st.column_config.TextColumn("Nature de la panne / Observations"),
+        },
+        num_rows="dynamic",
+        hide_index=True,
+        use_container_width=True,
+        key="scan_queue_editor"
+    )
+    # Keep the edits (state, removed rows) in the queue so the next scan does not discard them
+    queue = [dict(row, id=int(row['id']), nature_panne=row['nature_panne'] if isinstance(row['nature_panne'], str) else '')
+             for row in edited.dropna(subset=['id']).to_dict('records')]
+    st.session_state.scan_queue = queue
+
+    col_save, col_clear = st.columns(2)
+    with col_save:
+        save = st.button(" Enregistrer le lot", type="primary", disabled=not queue)
+    with col_clear:
+        if st.button(" Vider le lot"):
+            st.session_state.scan_queue = []
+            st.rerun()
+
+    if save:
+        if not medecin_responsable or not salle or not type_acte:
+            st.error("Veuillez remplir tous les champs obligatoires (*)")
+        elif heure_debut_time >= heure_fin_time:
+            st.error("L'heure de fin doit être postérieure à l'heure de début")
+        elif any(row['etat_endoscope'] == 'en panne' and not row['nature_panne'].strip() for row in queue):
+            st.error("Veuillez spécifier la nature de la panne pour chaque endoscope en panne")
+        else:
+            nom_operateur = get_username()
+            reports = [{
+                'nom_operateur': nom_operateur, 'endoscope': row['endoscope'], 'numero_serie': row['numero_serie'],
+                'medecin_responsable': medecin_responsable, 'date_desinfection': date_desinfection,
+                'type_desinfection': type_desinfection, 'cycle': cycle, 'test_etancheite': test_etancheite,
+                'heure_debut': heure_debut_time.strftime("%H:%M"), 'heure_fin': heure_fin_time.strftime("%H:%M"),
+                'procedure_medicale': "N/A", 'salle': salle, 'type_acte': type_acte,
+                'etat_endoscope': row['etat_endoscope'],
+                'nature_panne': row['nature_panne'].strip() or None, 'created_by': nom_operateur
+            } for row in queue]
+            if db.add_sterilisation_reports(reports) is not None:
+                alert_dispatcher.notify()
+                invalidate_table_versions()
+                st.session_state.scan_queue = []
+                st.session_state.scan_message = ('success', f"{len(reports)} rapports de stérilisation enregistrés")
+                st.rerun()
+            else:
+                st.error("Erreur lors de l'enregistrement du lot - aucun rapport n'a été enregistré")
+
+
+def category_mask(series, values):
+    """Rows of a categorical column whose value is in values, compared on the integer codes"""
+    categories = series.cat.categories
+    codes = [categories.get_loc(value) for value in values if value in categories]
+    return series.cat.codes.isin(codes)
+
+
+def frame_records(df):
+    """Rows of a typed frame as dicts, with missing values as None"""
+    return df.astype(object).where(df.notna(), None).to_dict('records')
+
+
+def format_day(value):
+    """YYYY-MM-DD of a typed date, '—' when it is missing or could not be parsed at load"""
+    return f"{value:%Y-%m-%d}" if pd.notna(value) else "—"
+
+
+@st.fragment
+def show_report_management():
+    """Report list with its filters and edit forms, rerun on its own"""
+    st.subheader("Gérer les Rapports de Stérilisation")
+    col1, col2, col3 = st.columns(3)
+    with col1:
+        filter_by_user = st.checkbox("Mes rapports uniquement", value=(get_user_role() == 'sterilisation'))
+    with col2:
+        filter_date = st.date_input("Filtrer par date", value=None)
+    with col3:
+        filter_etat = st.selectbox("Filtrer par état", ['Tous', 'fonctionnel', 'en panne'])
+    if filter_by_user or get_user_role() == 'sterilisation':
+        steril_reports = db.get_user_sterilisation_reports(get_username(), typed=True)
+    else:
+        steril_reports = db.get_all_sterilisation_reports(typed=True)
+    if not steril_reports.empty:
+        with PAGE_PROFILER.phase("Filtrage"):
+            if filter_date:
+                steril_reports = steril_reports[steril_reports['date_desinfection'] == pd.Timestamp(filter_date)]
+            if filter_etat != 'Tous':
+                steril_reports = steril_reports[category_mask(steril_reports['etat_endoscope'], [filter_etat])]
+        if not steril_reports.empty:
+            st.write(f"**Rapports trouvés: {len(steril_reports)}**")
+            for report in frame_records(steril_reports):
+                with st.expander(f"Rapport #{report['id']} - {report['endoscope']} ({format_day(report['date_desinfection'])})"):
+                    col1, col2 = st.columns([3, 1])
+                    with col1:
+                        st.write(f"**Opérateur:** {report['nom_operateur']}")
+                        st.write(f"**Médecin:** {report['medecin_responsable']}")
+                        st.write(f"**Désinfection:** {report['type_desinfection']} - {report['cycle']}")
+                        st.write(f"**Test étanchéité:** {report['test_etancheite']}")
+                        st.write(f"**Horaires:** {report['heure_debut']} - {report['heure_fin']}")
+                        st.write(f"**Salle:** {report['salle']}")
+                        st.write(f"**État:** {report['etat_endoscope']}")
+                        try:
+                            nature_panne = str(report['nature_panne'])
+                            if nature_panne not in ['nan', 'None', '']:
+                                st.write(f"**Nature panne:** {nature_panne}")
+                        except:
+                            pass
+                    with col2:
+                        can_modify = db.can_user_modify_sterilisation_report(get_user_role(), report['id'], get_username())
+                        if can_modify:
+                            edit_key = f"edit_steril_{report['id']}"
+                            if st.button(" Modifier", key=f"edit_btn_steril_{report['id']}"):
+                                st.session_state[edit_key] = True
+                                st.rerun(scope="fragment")
+                            if st.button(" Supprimer", key=f"del_btn_steril_{report['id']}"):
+                                try:
+                                    if db.delete_sterilisation_report(report['id']):
+                                        invalidate_table_versions()
+                                        st.success(" Rapport supprimé avec succès!")
+                                        st.rerun()
+                                    else:
+                                        st.error("Erreur lors de la suppression du rapport")
+                                except Exception as e:
+                                    st.error(f" Erreur lors de la suppression: {str(e)}")
+                        else:
+                            st.info("Lecture seule")
+                    edit_key = f"edit_steril_{report['id']}"
+                    if st.session_state.get(edit_key, False):
+                        st.info("Modification du rapport en cours...")
+                        with st.form(f"edit_sterilisation_report_form_{report['id']}"):
+                            new_nom_operateur = st.text_input("Nom de l'opérateur*", value=report['nom_operateur'])
+                            new_endoscope = st.text_input("Endoscope*", value=report['endoscope'])
+                            new_numero_serie = st.text_input("Numéro de série*", value=report['numero_serie'])
+                            new_medecin_responsable = st.text_input("Médecin responsable*", value=report['medecin_responsable'])
+                            # A date that could not be parsed at load is left empty for the agent to fill in
+                            new_date_desinfection = st.date_input(
+                                "Date de désinfection*",
+                                value=report['date_desinfection'].date() if pd.notna(report['date_desinfection']) else None)
+                            new_type_desinfection = st.selectbox("Type de désinfection*", ['manuel', 'automatique'], index=0 if report['type_desinfection']=='manuel' else 1)
+                            new_cycle = st.selectbox("Cycle*", ['complet', 'incomplet'], index=0 if report['cycle']=='complet' else 1)
+                            new_test_etancheite = st.selectbox("Test d'étanchéité*", ['réussi', 'échoué'], index=0 if report['test_etancheite']=='réussi' else 1)
+                            new_heure_debut = st.text_input("Heure de début* (HH:MM)", value=report['heure_debut'])
+                            new_heure_fin = st.text_input("Heure de fin* (HH:MM)", value=report['heure_fin'])
+                            new_salle = st.text_input("Salle*", value=report['salle'])
+                            new_type_acte = st.text_input("Type d'acte*", value=report['type_acte'])
+                            new_etat_endoscope = st.selectbox("État de l'endoscope*", ['fonctionnel', 'en panne'], index=0 if report['etat_endoscope']=='fonctionnel' else 1)
+                            new_nature_panne = st.text_area("Nature de la panne*", value=report['nature_panne'] if report['etat_endoscope']=='en panne' else '') if new_etat_endoscope=='en panne' else None
+                            if st.form_submit_button("Enregistrer les modifications"):
+                                try:
+                                    # Validate required fields
+                                    required_fields = [new_nom_operateur, new_endoscope, new_numero_serie, 
+                                                     new_medecin_responsable, new_date_desinfection, new_salle,
+                                                     new_type_acte, new_heure_debut, new_heure_fin]
+
+                                    if not all(required_fields):
+                                        st.error(" Veuillez remplir tous les champs obligatoires (*)")
+                                    elif new_etat_endoscope == 'en panne' and not new_nature_panne:
+                                        st.error(" Veuillez spécifier la nature de la panne")
+                                    elif ":" not in new_heure_debut or ":" not in new_heure_fin:
+                                        st.error("Format d'heure invalide. Utilisez HH:MM (ex: 14:30)")
+                                    else:
+                                        update_fields = {
+                                            'nom_operateur': new_nom_operateur,
+                                            'endoscope': new_endoscope,
+                                            'numero_serie': new_numero_serie,
+                                            'medecin_responsable': new_medecin_responsable,
+                                            'date_desinfection': str(new_date_desinfection),
+                                            'type_desinfection': new_type_desinfection,
+                                            'cycle': new_cycle,
+                                            'test_etancheite': new_test_etancheite,
+                                            'heure_debut': new_heure_debut,
+                                            'heure_fin': new_heure_fin,
+                                            'salle': new_salle,
+                                            'type_acte': new_type_acte,
+                                            'etat_endoscope': new_etat_endoscope,
+                                            'nature_panne': new_nature_panne,
+                                            'procedure_medicale': report.get('procedure_medicale', 'N/A')
+                                        }
+
+                                        if db.update_sterilisation_report(report['id'], **update_fields):
+                                            invalidate_table_versions()
+                                            st.success("Rapport modifié avec succès!")
+                                            st.session_state.pop(edit_key, None)
+                                            st.rerun()
+                                        else:
+                                            st.error(" Erreur lors de la modification du rapport.")
+                                except Exception as e:
+                                    st.error(f" Erreur lors de la modification: {str(e)}")
+                        if st.button(" Annuler la modification", key=f"cancel_edit_{report['id']}"):
+                            st.session_state.pop(edit_key, None)
+                            st.rerun(scope="fragment")
+        else:
+            st.info("Aucun rapport correspondant aux filtres")
+    else:
+        st.info("Aucun rapport de stérilisation disponible")
+
+
+@st.fragment
+def show_sterilisation_report_form():
+    """Endoscope picker and report form, rerun on their own"""
+    st.subheader("Enregistrer un Rapport de Stérilisation")
+
+    # Compact {id: (designation, numero_serie)} index, reloaded only when the inventory changes
+    endoscope_index = load_endoscope_index(section_version('endoscopes'))
+
+    if not endoscope_index:
+        st.warning(" Aucun endoscope n'est disponible dans l'inventaire. Veuillez en ajouter un avant de créer un rapport.")
+        return
+
+    # Search-as-you-type picker: the selectbox only ever holds the first matches
+    col_search, col_select = st.columns(2)
+    with col_search:
+        search_text = st.text_input("Rechercher un endoscope", placeholder="Début du N° de série, désignation ou scan QR",
+                                    key="steril_endoscope_search")
+    if is_qr_payload(search_text):
+        # A scanned QR code resolves to exactly one endoscope, which pre-fills the form
+        scan = parse_scan_payload(search_text)
+        scanned = db.find_endoscope(scan['endoscope_id'], scan['numero_serie'])
+        endoscope_choices = [scanned['id']] if scanned else []
+    elif search_text.strip():
+        endoscope_choices = db.search_endoscopes(search_text, limit=ENDOSCOPE_PICKER_LIMIT)
+    else:
+        endoscope_choices = list(itertools.islice(endoscope_index, ENDOSCOPE_PICKER_LIMIT))
+    with col_select:
+        selected_id = st.selectbox(
+            "Endoscope*",
+            options=endoscope_choices,
+            format_func=lambda x: " - ".join(endoscope_index.get(x, ("Inconnu", ""))),
+            key="steril_endoscope_id"
+        )
+    if not endoscope_choices:
+        st.info("Aucun endoscope ne correspond à la recherche")
+    elif len(endoscope_choices) == ENDOSCOPE_PICKER_LIMIT:
+        st.caption(f"Seuls les {ENDOSCOPE_PICKER_LIMIT} premiers endoscopes sont proposés - affinez la recherche.")
+
+    with st.form("sterilisation_report_form", clear_on_submit=True):
+        col1, col2 = st.columns(2)
+
+        with col1:
+            st.write("**Informations Générales**")
+
+            # Operator name is auto-filled and disabled
+            st.text_input("Nom de l'opérateur*", value=get_username(), disabled=True)
+
+            if selected_id in endoscope_index:
+                st.text_input("Endoscope*", value=endoscope_index[selected_id][0], disabled=True)
+                st.text_input("Numéro de série*", value=endoscope_index[selected_id][1], disabled=True)
+
+            medecin_responsable = st.text_input("Médecin responsable*")
+
+            st.write("**Désinfection**")
+            date_desinfection = st.date_input("Date de désinfection*")
+            type_desinfection = st.selectbox("Type de désinfection*", ['manuel', 'automatique'])
+            cycle = st.selectbox("Cycle*", ['complet', 'incomplet'])
+            test_etancheite = st.selectbox("Test d'étanchéité*", ['réussi', 'échoué'])
+
+        with col2:
+            st.write("**Horaires**")
+            col_t1, col_t2 = st.columns(2)
+
+            with col_t1:
+                heure_debut_time = st.time_input("Heure de début*", value=dt.time(8, 0))
+            with col_t2:
+                heure_fin_time = st.time_input("Heure de fin*", value=dt.time(17, 0))
+
+            # Convertir en format string HH:MM
+            heure_debut = heure_debut_time.strftime("%H:%M")
+            heure_fin = heure_fin_time.strftime("%H:%M")
+
+            salle = st.text_input("Salle*")
+            type_acte = st.text_input("Type d'acte*")
+
+            st.write("**    État**")
+            etat_endoscope = st.selectbox("État de l'endoscope*", ['fonctionnel', 'en panne'])
+
+            # Toujours afficher nature de la panne, mais avec validation conditionnelle
+            if etat_endoscope == 'en panne':
+                nature_panne = st.text_area("Nature de la panne*", 
+                                        placeholder="Décrivez la nature de la panne...",
+                                        help="Ce champ est obligatoire pour les endoscopes en panne")
+            else:
+                nature_panne = st.text_area("Observations sur l'état", 
+                                        placeholder="Optionnel - Observations générales",
+                                        help="Champ optionnel quand l'endoscope est fonctionnel")
+
+        if st.form_submit_button(" Enregistrer Rapport de Stérilisation"):
+            # Re-fetch details by primary key on submit to be safe
+            selected_endoscope_details = db.get_endoscope(selected_id) if selected_id else None
+            # Validation
+            if not selected_endoscope_details or not medecin_responsable or not salle or not type_acte:
+                st.error("Veuillez remplir tous les champs obligatoires (*)")
+            elif etat_endoscope == 'en panne' and (not nature_panne or not nature_panne.strip()):
+                st.error("Veuillez spécifier la nature de la panne pour un endoscope en panne")
+            elif heure_debut_time >= heure_fin_time:
+                st.error("L'heure de fin doit être postérieure à l'heure de début")
+            else:
+                nom_operateur = get_username()
+                endoscope_name = selected_endoscope_details['designation']
+                numero_serie_val = selected_endoscope_details['numero_serie']
+
+                # Nettoyer la valeur nature_panne
+                nature_panne_cleaned = nature_panne.strip() if nature_panne else None
+                if etat_endoscope == 'fonctionnel' and not nature_panne_cleaned:
+                    nature_panne_cleaned = None
+
+                if db.add_sterilisation_report(
+                    nom_operateur, endoscope_name, numero_serie_val, medecin_responsable,
+                    date_desinfection, type_desinfection, cycle, test_etancheite,
+                    heure_debut, heure_fin, "N/A", salle, type_acte,
+                    etat_endoscope, nature_panne_cleaned, nom_operateur
+                ):
+                    alert_dispatcher.notify()
+                    invalidate_table_versions()
+                    st.success("Rapport de stérilisation enregistré avec succès!")
+                    st.rerun()
+                else:
+                    st.error("Erreur lors de l'enregistrement - Vérifiez le format des données")
+
+
 @require_role(['sterilisation', 'biomedical'])
 def show_sterilization_interface():
     """Sterilization agent interface for sterilization reports"""
     st.title(" Rapports de Stérilisation et Désinfection")
-    tab1, tab2 = st.tabs(["Nouveau Rapport Stérilisation", "Gérer Rapports"])
-    
+    tab1, tab_scan, tab2 = st.tabs(["Nouveau Rapport Stérilisation", "Saisie par Scan", "Gérer Rapports"])
+
     with tab1:
-        st.subheader("Enregistrer un Rapport de Stérilisation")
-        
-        endoscopes_df = db.get_all_endoscopes()
-        
-        if endoscopes_df.empty:
-            st.warning(" Aucun endoscope n'est disponible dans l'inventaire. Veuillez en ajouter un avant de créer un rapport.")
-            return
+        show_sterilisation_report_form()
+
+    with tab_scan:
+        show_scan_intake()
+
+    with tab2:
+        show_report_management()
+
+
+@st.fragment
+def show_inventory_archive():
+    """Inventory history table with its filters, rerun on its own"""
+    st.subheader("Historique de l'Inventaire des Endoscopes")
+    inventory = load_inventory_table(section_version('endoscopes'))
+
+    if inventory.num_rows:
+        # Ajout des filtres et tri pour l'inventaire
+        with st.expander("Filtres et Tri pour l'Inventaire"):
+            col1, col2, col3 = st.columns(3)
 
-        with st.form("sterilisation_report_form", clear_on_submit=True):
-            col1, col2 = st.columns(2)
-            
             with col1:
-                st.write("**Informations Générales**")
-                
-                # Operator name is auto-filled and disabled
-                st.text_input("Nom de l'opérateur*", value=get_username(), disabled=True)
-                
-                # Dropdown for endoscope selection
-                endoscope_options = {row['id']: f"{row['designation']} - {row['numero_serie']}" for index, row in endoscopes_df.iterrows()}
-                selected_id = st.selectbox(
-                    "Endoscope*",
-                    options=list(endoscope_options.keys()),
-                    format_func=lambda x: endoscope_options.get(x, "Inconnu")
-                )
-                
-                selected_endoscope_details = None
-                if selected_id:
-                    selected_endoscope_details = endoscopes_df[endoscopes_df['id'] == selected_id].iloc[0]
-                    st.text_input("Numéro de série*", value=selected_endoscope_details['numero_serie'], disabled=True)
+                # Filtres par état
+                etats = st.multiselect("État", 
+                                    options=arrow_options(inventory['etat']), 
+                                    key="inv_etat_filter")
+
+                # Filtres par marque
+                marques = st.multiselect("Marque", 
+                                    options=arrow_options(inventory['marque']), 
+                                    key="inv_marque_filter")
 
-                medecin_responsable = st.text_input("Médecin responsable*")
-                
-                st.write("**Désinfection**")
-                date_desinfection = st.date_input("Date de désinfection*")
-                type_desinfection = st.selectbox("Type de désinfection*", ['manuel', 'automatique'])
-                cycle = st.selectbox("Cycle*", ['complet', 'incomplet'])
-                test_etancheite = st.selectbox("Test d'étanchéité*", ['réussi', 'échoué'])
-            
             with col2:
-                st.write("**Horaires**")
-                col_t1, col_t2 = st.columns(2)
+                # Filtres par localisation
+                localisations = st.multiselect("Localisation", 
+                                            options=arrow_options(inventory['localisation']), 
+                                            key="inv_localisation_filter")
 
-                with col_t1:
-                    heure_debut_time = st.time_input("Heure de début*", value=dt.time(8, 0))
-                with col_t2:
-                    heure_fin_time = st.time_input("Heure de fin*", value=dt.time(17, 0))
+                # Filtres par créateur
+                createurs = st.multiselect("Créé par", 
+                                        options=arrow_options(inventory['created_by']), 
+                                        key="inv_createur_filter")
 
-                # Convertir en format string HH:MM
-                heure_debut = heure_debut_time.strftime("%H:%M")
-                heure_fin = heure_fin_time.strftime("%H:%M")
-                
-                salle = st.text_input("Salle*")
-                type_acte = st.text_input("Type d'acte*")
-                
-                st.write("**    État**")
-                etat_endoscope = st.selectbox("État de l'endoscope*", ['fonctionnel', 'en panne'])
-
-                # Toujours afficher nature de la panne, mais avec validation conditionnelle
-                if etat_endoscope == 'en panne':
-                    nature_panne = st.text_area("Nature de la panne*", 
-                                            placeholder="Décrivez la nature de la panne...",
-                                            help="Ce champ est obligatoire pour les endoscopes en panne")
-                else:
-                    nature_panne = st.text_area("Observations sur l'état", 
-                                            placeholder="Optionnel - Observations générales",
-                                            help="Champ optionnel quand l'endoscope est fonctionnel")
-            
-            if st.form_submit_button(" Enregistrer Rapport de Stérilisation"):
-                # Validation
-                if not selected_id or not medecin_responsable or not salle or not type_acte:
-                    st.error("Veuillez remplir tous les champs obligatoires (*)")
-                elif etat_endoscope == 'en panne' and (not nature_panne or not nature_panne.strip()):
-                    st.error("Veuillez spécifier la nature de la panne pour un endoscope en panne")
-                elif heure_debut_time >= heure_fin_time:
-                    st.error("L'heure de fin doit être postérieure à l'heure de début")
-                else:
-                    nom_operateur = get_username()
-                    # Re-fetch details inside the submit block to be safe
-                    selected_endoscope_details = endoscopes_df[endoscopes_df['id'] == selected_id].iloc[0]
-                    endoscope_name = selected_endoscope_details['designation']
-                    numero_serie_val = selected_endoscope_details['numero_serie']
-                    
-                    # Nettoyer la valeur nature_panne
-                    nature_panne_cleaned = nature_panne.strip() if nature_panne else None
-                    if etat_endoscope == 'fonctionnel' and not nature_panne_cleaned:
-                        nature_panne_cleaned = None
-
-                    if db.add_sterilisation_report(
-                        nom_operateur, endoscope_name, numero_serie_val, medecin_responsable,
-                        date_desinfection, type_desinfection, cycle, test_etancheite,
-                        heure_debut, heure_fin, "N/A", salle, type_acte,
-                        etat_endoscope, nature_panne_cleaned, nom_operateur
-                    ):
-                        st.success("Rapport de stérilisation enregistré avec succès!")
-                        st.rerun()
-                    else:
-                        st.error("Erreur lors de l'enregistrement - Vérifiez le format des données")
-    
-    with tab2:
-        st.subheader("Gérer les Rapports de Stérilisation")
-        col1, col2, col3 = st.columns(3)
+            with col3:
+                # Options de tri
+                sort_by_inv = st.selectbox("Trier par", 
+                                        options=['designation', 'marque', 'modele', 'numero_serie', 
+                                                'etat', 'localisation', 'created_at', 'created_by'], 
+                                        index=0, 
+                                        key="sort_inv_col")
+
+                sort_order_inv = st.radio("Ordre", ["Descendant", "Ascendant"], key="sort_inv_order")
+
+                # Recherche par texte
+                search_text = st.text_input("Rechercher (désignation, modèle, N° série)", 
+                                        key="inv_search_text")
+
+        with PAGE_PROFILER.phase("Filtrage"):
+            # Application des filtres
+            conditions = [pc.is_in(inventory[column], value_set=pa.array(values))
+                          for column, values in (('etat', etats), ('marque', marques),
+                                                 ('localisation', localisations), ('created_by', createurs))
+                          if values]
+
+            # Recherche par texte
+            if search_text:
+                conditions.append(functools.reduce(pc.or_, [
+                    pc.fill_null(pc.match_substring(inventory[column].cast(pa.string()), search_text, ignore_case=True), False)
+                    for column in ('designation', 'modele', 'numero_serie')]))
+            filtered_inventory = arrow_filter(inventory, conditions)
+
+            # Application du tri
+            if sort_by_inv:
+                filtered_inventory = arrow_sort(filtered_inventory, sort_by_inv, sort_order_inv == 'Ascendant')
+
+        # Affichage du nombre de résultats
+        st.info(f"Affichage de {filtered_inventory.num_rows} endoscope(s) sur {inventory.num_rows} total")
+
+        # Thumbnails are cached per inventory version; the table only carries their URLs
+        with PAGE_PROFILER.phase("Vignettes QR"):
+            qr_thumbnails = load_qr_thumbnails(section_version('endoscopes'))
+        display_inventory = filtered_inventory.drop_columns(['id']).add_column(
+            0, 'QR Code', pa.array([qr_thumbnails.get(i) for i in filtered_inventory['id'].to_pylist()], pa.string()))
+
+        st.dataframe(
+            display_inventory,
+            column_config={'QR Code': st.column_config.ImageColumn("QR Code", width="small")},
+            hide_index=True,
+            use_container_width=True
+        )
+
+        # Single PDF Download Button for Inventory (avec données filtrées)
+        if st.button(" Télécharger Rapport Inventaire PDF", key="download_pdf_inventory", type="primary"):
+            try:
+                with st.spinner("Génération du rapport d'inventaire PDF en cours..."):
+                    # Utiliser les données filtrées pour le PDF
+                    pdf_title = "Historique de l'Inventaire des Endoscopes"
+                    if filtered_inventory.num_rows < inventory.num_rows:
+                        pdf_title += f" (Filtré - {filtered_inventory.num_rows} sur {inventory.num_rows})"
+
+                    pdf_bytes = generate_professional_pdf_report(
+                        filtered_inventory.to_pandas(),  # Utiliser les données filtrées
+                        pdf_title,
+                        "inventaire"
+                    )
+                    st.download_button(
+                        label="Télécharger le Rapport Inventaire PDF",
+                        data=pdf_bytes,
+                        file_name=f"rapport_inventaire_filtre_{datetime.now().strftime('%Y%m%d_%H%M%S')}.pdf",
+                        mime="application/pdf",
+                        key="download_inventory_final"
+                    )
+                    st.success("Rapport d'inventaire PDF généré avec succès!")
+            except Exception as e:
+                st.error(f"Erreur lors de la génération du PDF: {str(e)}")
+    else:
+        st.info("Aucun endoscope dans l'inventaire.")
+
+
+@st.fragment
+def show_sterilisation_archive():
+    """Sterilisation report archive with its filters, rerun on its own"""
+    st.subheader("Historique des Rapports de Stérilisation")
+    steril_reports = load_sterilisation_table(section_version('sterilisation_reports'))
+
+    if steril_reports.num_rows:
+        with st.expander("Filtres et Tri pour les Rapports"):
+            col1, col2, col3 = st.columns(3)
+            with col1:
+                operators = st.multiselect("Opérateur", options=arrow_options(steril_reports['nom_operateur']), key="op_filter")
+                medecins = st.multiselect("Médecin", options=arrow_options(steril_reports['medecin_responsable']), key="med_filter")
+            with col2:
+                states = st.multiselect("État de l'endoscope", options=arrow_options(steril_reports['etat_endoscope']), key="state_filter")
+                start_date = st.date_input("Du", None, key="steril_start")
+                end_date = st.date_input("Au", None, key="steril_end")
+            with col3:
+                sort_by_steril = st.selectbox("Trier par", options=steril_reports.column_names, index=5, key="sort_steril_col")
+                sort_order_steril = st.radio("Ordre", ["Descendant", "Ascendant"], key="sort_steril_order")
+
+        # Apply filters
+        with PAGE_PROFILER.phase("Filtrage"):
+            conditions = []
+            if operators: conditions.append(pc.is_in(steril_reports['nom_operateur'], value_set=pa.array(operators)))
+            if medecins: conditions.append(pc.is_in(steril_reports['medecin_responsable'], value_set=pa.array(medecins)))
+            if states: conditions.append(pc.is_in(steril_reports['etat_endoscope'], value_set=pa.array(states)))
+            if start_date: conditions.append(pc.greater_equal(steril_reports['date_desinfection'], pa.scalar(start_date, pa.date32())))
+            if end_date: conditions.append(pc.less_equal(steril_reports['date_desinfection'], pa.scalar(end_date, pa.date32())))
+            filtered_steril = arrow_filter(steril_reports, conditions).drop_columns(['procedure_medicale'])
+            if sort_by_steril in filtered_steril.column_names:
+                filtered_steril = arrow_sort(filtered_steril, sort_by_steril, sort_order_steril == 'Ascendant')
+
+        st.dataframe(filtered_steril, use_container_width=True)
+
+        # Single PDF Download Button
+        if st.button(" Télécharger Rapport PDF", key="download_pdf_steril", type="primary"):
+            try:
+                with st.spinner("Génération du rapport PDF en cours..."):
+                    # Prepare data for PDF
+                    pdf_data = filtered_steril.to_pandas()
+
+                    # Generate professional PDF
+                    pdf_bytes = generate_professional_pdf_report(
+                        pdf_data, 
+                        "Rapports de Stérilisation et Désinfection",
+                        "sterilisation"
+                    )
+
+                    # Download button
+                    st.download_button(
+                        label="Télécharger le Rapport PDF",
+                        data=pdf_bytes,
+                        file_name=f"rapport_sterilisation_{datetime.now().strftime('%Y%m%d_%H%M%S')}.pdf",
+                        mime="application/pdf",
+                        key="download_steril_final"
+                    )
+                    st.success(" Rapport PDF généré avec succès!")
+            except Exception as e:
+                st.error(f" Erreur lors de la génération du PDF: {str(e)}")
+
+
+RECALL_COLUMN_LABELS = {
+    'event_at': "Date / heure", 'source': "Source", 'lien': "Lien", 'report_id': "Rapport",
+    'numero_serie': "Numéro de série", 'endoscope': "Endoscope", 'salle': "Salle", 'type_acte': "Type d'acte",
+    'medecin': "Médecin", 'nom_operateur': "Opérateur", 'type_desinfection': "Désinfection", 'cycle': "Cycle",
+    'test_etancheite': "Test étanchéité", 'etat': "État", 'nature_panne': "Nature panne",
+}
+
+
+@st.fragment
+def show_recall_trace():
+    """Contamination recall: every report that touched one endoscope, plus the same-room cycles"""
+    st.subheader("Rappel / Traçabilité d'un endoscope")
+    with st.form("recall_form"):
+        col1, col2, col3, col4 = st.columns([2, 1, 1, 1])
         with col1:
-            filter_by_user = st.checkbox("Mes rapports uniquement", value=(get_user_role() == 'sterilisation'))
+            serial_text = st.text_input("Numéro de série (ou scan QR)", key="recall_serial")
         with col2:
-            filter_date = st.date_input("Filtrer par date", value=None)
+            start = st.date_input("Du", value=dt.date.today() - dt.timedelta(days=90), key="recall_start")
         with col3:
-            filter_etat = st.selectbox("Filtrer par état", ['Tous', 'fonctionnel', 'en panne'])
-        if filter_by_user or get_user_role() == 'sterilisation':
-            steril_reports = db.get_user_sterilisation_reports(get_username())
-        else:
-            steril_reports = db.get_all_sterilisation_reports()
-        if not steril_reports.empty:
-            if filter_date:
-                steril_reports = steril_reports[steril_reports['date_desinfection'] == str(filter_date)]
-            if filter_etat != 'Tous':
-                steril_reports = steril_reports[steril_reports['etat_endoscope'] == filter_etat]
-            if not steril_reports.empty:
-                st.write(f"**Rapports trouvés: {len(steril_reports)}**")
-                for idx, report in steril_reports.iterrows():
-                    with st.expander(f"Rapport #{report['id']} - {report['endoscope']} ({report['date_desinfection']})"):
-                        col1, col2 = st.columns([3, 1])
-                        with col1:
-                            st.write(f"**Opérateur:** {report['nom_operateur']}")
-                            st.write(f"**Médecin:** {report['medecin_responsable']}")
-                            st.write(f"**Désinfection:** {report['type_desinfection']} - {report['cycle']}")
-                            st.write(f"**Test étanchéité:** {report['test_etancheite']}")
-                            st.write(f"**Horaires:** {report['heure_debut']} - {report['heure_fin']}")
-                            st.write(f"**Salle:** {report['salle']}")
-                            st.write(f"**État:** {report['etat_endoscope']}")
-                            try:
-                                nature_panne = str(report['nature_panne'])
-                                if nature_panne not in ['nan', 'None', '']:
-                                    st.write(f"**Nature panne:** {nature_panne}")
-                            except:
-                                pass
-                        with col2:
-                            can_modify = db.can_user_modify_sterilisation_report(get_user_role(), report['id'], get_username())
-                            if can_modify:
-                                edit_key = f"edit_steril_{report['id']}"
-                                if st.button(" Modifier", key=f"edit_btn_steril_{report['id']}"):
-                                    st.session_state[edit_key] = True
-                                    st.rerun()
-                                if st.button(" Supprimer", key=f"del_btn_steril_{report['id']}"):
-                                    try:
-                                        if db.delete_sterilisation_report(report['id']):
-                                            st.success(" Rapport supprimé avec succès!")
-                                            st.rerun()
-                                        else:
-                                            st.error("Erreur lors de la suppression du rapport")
-                                    except Exception as e:
-                                        st.error(f" Erreur lors de la suppression: {str(e)}")
-                            else:
-                                st.info("Lecture seule")
-                        edit_key = f"edit_steril_{report['id']}"
-                        if st.session_state.get(edit_key, False):
-                            st.info("Modification du rapport en cours...")
-                            with st.form(f"edit_sterilisation_report_form_{report['id']}"):
-                                new_nom_operateur = st.text_input("Nom de l'opérateur*", value=report['nom_operateur'])
-                                new_endoscope = st.text_input("Endoscope*", value=report['endoscope'])
-                                new_numero_serie = st.text_input("Numéro de série*", value=report['numero_serie'])
-                                new_medecin_responsable = st.text_input("Médecin responsable*", value=report['medecin_responsable'])
-                                new_date_desinfection = st.date_input("Date de désinfection*", value=pd.to_datetime(report['date_desinfection']).date())
-                                new_type_desinfection = st.selectbox("Type de désinfection*", ['manuel', 'automatique'], index=0 if report['type_desinfection']=='manuel' else 1)
-                                new_cycle = st.selectbox("Cycle*", ['complet', 'incomplet'], index=0 if report['cycle']=='complet' else 1)
-                                new_test_etancheite = st.selectbox("Test d'étanchéité*", ['réussi', 'échoué'], index=0 if report['test_etancheite']=='réussi' else 1)
-                                new_heure_debut = st.text_input("Heure de début* (HH:MM)", value=report['heure_debut'])
-                                new_heure_fin = st.text_input("Heure de fin* (HH:MM)", value=report['heure_fin'])
-                                new_salle = st.text_input("Salle*", value=report['salle'])
-                                new_type_acte = st.text_input("Type d'acte*", value=report['type_acte'])
-                                new_etat_endoscope = st.selectbox("État de l'endoscope*", ['fonctionnel', 'en panne'], index=0 if report['etat_endoscope']=='fonctionnel' else 1)
-                                new_nature_panne = st.text_area("Nature de la panne*", value=report['nature_panne'] if report['etat_endoscope']=='en panne' else '') if new_etat_endoscope=='en panne' else None
-                                if st.form_submit_button("Enregistrer les modifications"):
-                                    try:
-                                        # Validate required fields
-                                        required_fields = [new_nom_operateur, new_endoscope, new_numero_serie, 
-                                                         new_medecin_responsable, new_salle, new_type_acte, 
-                                                         new_heure_debut, new_heure_fin]
-                                        
-                                        if not all(required_fields):
-                                            st.error(" Veuillez remplir tous les champs obligatoires (*)")
-                                        elif new_etat_endoscope == 'en panne' and not new_nature_panne:
-                                            st.error(" Veuillez spécifier la nature de la panne")
-                                        elif ":" not in new_heure_debut or ":" not in new_heure_fin:
-                                            st.error("Format d'heure invalide. Utilisez HH:MM (ex: 14:30)")
-                                        else:
-                                            update_fields = {
-                                                'nom_operateur': new_nom_operateur,
-                                                'endoscope': new_endoscope,
-                                                'numero_serie': new_numero_serie,
-                                                'medecin_responsable': new_medecin_responsable,
-                                                'date_desinfection': str(new_date_desinfection),
-                                                'type_desinfection': new_type_desinfection,
-                                                'cycle': new_cycle,
-                                                'test_etancheite': new_test_etancheite,
-                                                'heure_debut': new_heure_debut,
-                                                'heure_fin': new_heure_fin,
-                                                'salle': new_salle,
-                                                'type_acte': new_type_acte,
-                                                'etat_endoscope': new_etat_endoscope,
-                                                'nature_panne': new_nature_panne,
-                                                'procedure_medicale': report.get('procedure_medicale', 'N/A')
-                                            }
-                                            
-                                            if db.update_sterilisation_report(report['id'], **update_fields):
-                                                st.success("Rapport modifié avec succès!")
-                                                st.session_state.pop(edit_key, None)
-                                                st.rerun()
-                                            else:
-                                                st.error(" Erreur lors de la modification du rapport.")
-                                    except Exception as e:
-                                        st.error(f" Erreur lors de la modification: {str(e)}")
-                            if st.button(" Annuler la modification", key=f"cancel_edit_{report['id']}"):
-                                st.session_state.pop(edit_key, None)
-                                st.rerun()
+            end = st.date_input("Au", value=dt.date.today(), key="recall_end")
+        with col4:
+            neighbour_days = st.number_input("Voisinage salle (± jours)", min_value=0, max_value=30, value=0,
+                                             key="recall_neighbour_days")
+        if st.form_submit_button("Tracer", type="primary"):
+            parsed = parse_scan_payload(serial_text)
+            if not parsed:
+                st.error("Veuillez saisir ou scanner un numéro de série")
+            elif start > end:
+                st.error("La date de début doit précéder la date de fin")
             else:
-                st.info("Aucun rapport correspondant aux filtres")
+                # Reports of a device removed from the inventory can still be traced by serial
+                endoscope = db.find_endoscope(parsed['endoscope_id'], parsed['numero_serie'])
+                numero_serie = endoscope['numero_serie'] if endoscope else parsed['numero_serie']
+                st.session_state.recall_query = (numero_serie, start, end, int(neighbour_days))
+
+    query = st.session_state.get("recall_query")
+    if not query or not query[0]:
+        return
+    numero_serie, start, end, neighbour_days = query
+    trace = db.get_recall_trace(numero_serie, start, end, neighbour_days)
+    if trace.empty:
+        st.info(f"Aucun rapport pour {numero_serie} entre le {start} et le {end}")
+        return
+
+    device = trace[trace['lien'] == 'appareil']
+    col1, col2, col3, col4 = st.columns(4)
+    col1.metric("Passages de l'endoscope", len(device))
+    col2.metric("Cycles voisins (même salle)", len(trace) - len(device))
+    col3.metric("Salles", device['salle'].nunique())
+    col4.metric("Médecins", device['medecin'].nunique())
+    st.dataframe(trace.rename(columns=RECALL_COLUMN_LABELS), use_container_width=True, hide_index=True)
+
+    export = io.StringIO()
+    db.export_recall_trace_csv(numero_serie, start, end, export, neighbour_days)
+    st.download_button("Exporter la trace (CSV)", data=export.getvalue().encode('utf-8-sig'),
+                       file_name=f"rappel_{numero_serie}_{start}_{end}.csv", mime="text/csv",
+                       key="recall_export")
+
+
+QUERY_LOG_GROUPINGS = {
+    "Page et méthode": ['page', 'method'],
+    "Méthode": ['method'],
+    "Requête": ['sql'],
+}
+
+QUERY_LOG_COLUMN_LABELS = {
+    'logged_at': "Heure", 'page': "Page", 'method': "Méthode", 'sql': "Requête", 'duration_ms': "Durée (ms)",
+    'rows': "Lignes", 'plan': "Plan", 'count': "Appels", 'total_ms': "Total (ms)", 'p50_ms': "p50 (ms)",
+    'p95_ms': "p95 (ms)", 'p99_ms': "p99 (ms)", 'max_ms': "Max (ms)", 'mean_rows': "Lignes (moy.)",
+    'slow': "Lentes",
+}
+
+
+@require_role(['admin'])
+def show_diagnostics_interface():
+    """Admin diagnostics: database statistics, query log, page profile and backups"""
+    st.title("Diagnostics")
+
+    st.subheader("Base de données")
+    stats = db.get_database_statistics()
+    col1, col2, col3 = st.columns(3)
+    col1.metric("Utilisateurs", stats['total_users'])
+    col2.metric("Endoscopes", stats['total_endoscopes'])
+    col3.metric("Rapports d'utilisation", stats['total_reports'])
+    st.dataframe(stats['users_by_role'].rename(columns={'role': "Rôle", 'count': "Utilisateurs"}),
+                 hide_index=True)
+    show_storage(stats)
+
+    st.divider()
+    tab_queries, tab_pages, tab_backups = st.tabs(["Journal des requêtes", "Profil des pages", "Sauvegardes"])
+    with tab_queries:
+        show_query_log()
+    with tab_pages:
+        show_page_profile()
+    with tab_backups:
+        show_backups()
+
+
+def show_query_log():
+    """Per page / method query timings and the slow queries with their plans"""
+    query_log = db.query_log
+    col1, col2, col3 = st.columns([1, 1, 1])
+    with col1:
+        query_log.enabled = st.toggle("Activer le journal", value=query_log.enabled, key="query_log_enabled")
+    with col2:
+        query_log.slow_ms = st.number_input("Seuil requête lente (ms)", min_value=0.0, value=float(query_log.slow_ms),
+                                            step=10.0, key="query_log_slow_ms")
+    with col3:
+        if st.button("Vider le journal"):
+            query_log.clear()
+    st.caption(f"Les {query_log.size} dernières requêtes de toutes les sessions du serveur sont conservées ; "
+               f"le plan d'exécution est enregistré pour les requêtes plus lentes que le seuil.")
+
+    entries = query_log.entries()
+    if entries.empty:
+        st.info("Aucune requête enregistrée" if query_log.enabled else "Le journal des requêtes est désactivé")
+        return
+
+    grouping = st.selectbox("Regrouper par", list(QUERY_LOG_GROUPINGS), key="query_log_grouping")
+    summary = query_log.summary(QUERY_LOG_GROUPINGS[grouping])
+    st.dataframe(summary.rename(columns=QUERY_LOG_COLUMN_LABELS), use_container_width=True, hide_index=True)
+
+    slow = query_log.slow_queries()
+    st.write(f"**Requêtes lentes** ({len(slow)})")
+    for _, query in slow.head(20).iterrows():
+        with st.expander(f"{query['duration_ms']:.1f} ms - {query['method'] or '-'} "
+                         f"({query['page'] or '-'}) - {query['logged_at']:%H:%M:%S}"):
+            st.code(query['sql'], language='sql')
+            if query['plan']:
+                st.code(query['plan'], language='text')
+
+    with st.expander(f"Dernières requêtes ({len(entries)})"):
+        st.dataframe(entries.drop(columns=['plan']).rename(columns=QUERY_LOG_COLUMN_LABELS),
+                     use_container_width=True, hide_index=True)
+
+
+PAGE_PROFILE_COLUMN_LABELS = {
+    'phase': "Phase", 'reruns': "Exécutions", 'calls': "Appels", 'p50_ms': "p50 (ms)", 'p95_ms': "p95 (ms)",
+    'max_ms': "Max (ms)", 'total_ms': "Total (ms)",
+}
+
+
+def show_page_profile():
+    """Phase timings of the page reruns, as a table and an icicle chart, and the slowest cProfile dumps"""
+    col1, col2, col3 = st.columns([1, 1, 1])
+    with col1:
+        PAGE_PROFILER.enabled = st.toggle("Activer le profilage", value=PAGE_PROFILER.enabled,
+                                          key="page_profiler_enabled")
+    with col2:
+        cprofile = st.toggle("cProfile des reruns les plus lents", value=bool(PAGE_PROFILER.cprofile_dir),
+                             key="page_profiler_cprofile",
+                             help="Ralentit chaque rerun ; seuls les profils les plus lents sont conservés")
+        if not cprofile:
+            PAGE_PROFILER.cprofile_dir = None
+        elif not PAGE_PROFILER.cprofile_dir:
+            PAGE_PROFILER.cprofile_dir = PAGE_PROFILER.default_cprofile_dir()
+    with col3:
+        if st.button("Réinitialiser le profil"):
+            PAGE_PROFILER.clear()
+    st.caption(f"Durées des {PAGE_PROFILER.size} derniers reruns de chaque page, toutes sessions confondues. "
+               "Une section de fragment rafraîchie seule apparaît comme une page « (fragment) ».")
+
+    pages = PAGE_PROFILER.pages()
+    if not pages:
+        st.info("Aucun rerun profilé" if PAGE_PROFILER.enabled else "Le profilage des pages est désactivé")
+        return
+
+    page = st.selectbox("Page", pages, key="page_profile_page")
+    summary = PAGE_PROFILER.summary(page)
+    st.dataframe(summary.drop(columns=['page', 'depth']).rename(columns=PAGE_PROFILE_COLUMN_LABELS),
+                 use_container_width=True, hide_index=True)
+
+    flame = PAGE_PROFILER.flame(page)
+    if len(flame) > 1:
+        st.plotly_chart(profile_icicle(flame), use_container_width=True)
+
+    profiles = PAGE_PROFILER.profiles()
+    if not profiles.empty:
+        st.write(f"**Reruns les plus lents (cProfile)** - {PAGE_PROFILER.cprofile_dir}")
+        for _, dump in profiles.iterrows():
+            if not os.path.exists(dump['path']):
+                continue
+            with st.expander(f"{dump['duration_ms']:.0f} ms - {dump['page']} - {dump['recorded_at']:%H:%M:%S}"):
+                st.code(PAGE_PROFILER.profile_report(dump['path']), language='text')
+                with open(dump['path'], 'rb') as f:
+                    st.download_button("Télécharger le profil (.prof)", data=f.read(),
+                                       file_name=os.path.basename(dump['path']), key=f"profile_{dump['path']}")
+
+
+OBJECT_SIZE_COLUMN_LABELS = {
+    'name': "Objet", 'type': "Type", 'pages': "Pages", 'mb': "Taille (Mo)", 'unused_mb': "Inutilisé (Mo)",
+}
+MAINTENANCE_COLUMN_LABELS = {
+    'task': "Tâche", 'started_at': "Début", 'finished_at': "Fin", 'duration_ms': "Durée (ms)", 'steps': "Étapes",
+    'longest_step_ms': "Étape max (ms)", 'status': "Statut", 'detail': "Détail",
+}
+
+
+def show_storage(stats):
+    """File size, free pages and WAL of the database, per-object sizes and the maintenance runs"""
+    storage = stats['storage']
+    col1, col2, col3, col4 = st.columns(4)
+    col1.metric("Taille du fichier", f"{storage['db_bytes'] / 1e6:.1f} Mo")
+    col2.metric("Pages libres", f"{storage['freelist_count']} / {storage['page_count']}",
+                f"{storage['free_ratio']:.1%}", delta_color="off")
+    col3.metric("WAL", f"{storage['wal_bytes'] / 1e6:.1f} Mo")
+    col4.metric("Auto-vacuum", storage['auto_vacuum'])
+    st.caption(f"Journal : {storage['journal_mode']} - pages de {storage['page_size']} octets")
+
+    with st.expander("Taille des tables et index"):
+        sizes = stats['object_sizes']
+        if sizes is None:
+            st.info("dbstat n'est pas disponible dans cette version de SQLite")
         else:
-            st.info("Aucun rapport de stérilisation disponible")
+            sizes['mb'] = (sizes['bytes'] / 1e6).round(2)
+            sizes['unused_mb'] = (sizes['unused_bytes'] / 1e6).round(2)
+            st.dataframe(sizes[list(OBJECT_SIZE_COLUMN_LABELS)].rename(columns=OBJECT_SIZE_COLUMN_LABELS),
+                         use_container_width=True, hide_index=True)
+
+    with st.expander(f"Maintenance (fenêtre {MAINTENANCE_WINDOW})"):
+        if not MAINTENANCE_ENABLED:
+            st.caption("Maintenance automatique désactivée (MAINTENANCE_ENABLED=true pour l'activer)")
+        if storage['auto_vacuum'] != 'incremental':
+            st.warning("Auto-vacuum incrémental inactif : les pages libres ne sont pas rendues. Lancer "
+                       "`python maintenance.py --convert-vacuum` (VACUUM complet, base bloquée pendant la "
+                       "conversion) hors des heures d'activité.")
+        if st.button("Lancer la maintenance maintenant"):
+            maintenance_scheduler.request_run()
+            st.info("Maintenance lancée en arrière-plan")
+        if stats['maintenance'].empty:
+            st.info("Aucune maintenance exécutée")
+        else:
+            st.dataframe(stats['maintenance'].rename(columns=MAINTENANCE_COLUMN_LABELS),
+                         use_container_width=True, hide_index=True)
+
+
+BACKUP_COLUMN_LABELS = {
+    'taken_at': "Date", 'snapshot': "Fichier", 'db_mb': "Base (Mo)", 'mb': "Compressé (Mo)",
+    'backup_s': "Copie (s)", 'compress_s': "Compression (s)",
+}
+
+
+def show_backups():
+    """Online snapshots of the database: list, create and verify (restores go through backup.py)"""
+    col1, col2 = st.columns([1, 1])
+    with col1:
+        if st.button("Créer une sauvegarde"):
+            with st.spinner("Sauvegarde en cours..."):
+                try:
+                    manifest = create_snapshot(db.db_path, BACKUP_DIR, keep_last=7, keep_daily=30)
+                    st.success(f"Sauvegarde {manifest['snapshot']} créée en {manifest['backup_s']} s")
+                except (BackupError, OSError, sqlite3.Error) as e:
+                    st.error(f"Erreur lors de la sauvegarde : {e}")
+    snapshots = list_snapshots(BACKUP_DIR)
+    with col2:
+        if snapshots and st.button("Vérifier la dernière sauvegarde"):
+            with st.spinner("Vérification en cours..."):
+                try:
+                    verify_snapshot(os.path.join(BACKUP_DIR, snapshots[0]['snapshot']))
+                    st.success(f"{snapshots[0]['snapshot']} : somme de contrôle et intégrité OK")
+                except (BackupError, OSError, sqlite3.Error) as e:
+                    st.error(f"Sauvegarde invalide : {e}")
+    st.caption(f"Répertoire : {os.path.abspath(BACKUP_DIR)}. Restauration : "
+               "python backup.py restore <fichier> (ou --at \"AAAA-MM-JJ HH:MM\").")
+
+    if not snapshots:
+        st.info("Aucune sauvegarde")
+        return
+    table = pd.DataFrame(snapshots)
+    table['db_mb'] = (table['db_bytes'] / 1e6).round(1)
+    table['mb'] = (table['bytes'] / 1e6).round(1)
+    st.dataframe(table[list(BACKUP_COLUMN_LABELS)].rename(columns=BACKUP_COLUMN_LABELS),
+                 use_container_width=True, hide_index=True)
+
+
+SITE_STATUS_LABELS = {'ok': "OK", 'timeout': "Délai dépassé", 'error': "Erreur"}
+
+
+@st.cache_data(ttl=30, show_spinner=False)
+def load_regional_overview(days):
+    """Merged dashboard figures of every site, with the worst outcome of each site over all the queries"""
+    stats, stats_status = federation.get_dashboard_stats()
+    malfunction, malfunction_status = federation.get_malfunction_percentage()
+    availability, availability_status = federation.get_endoscope_availability_by_type()
+    by_site, by_site_status = federation.get_endoscope_availability_by_type(by_site=True)
+    breakdowns, breakdowns_status = federation.get_recent_breakdowns(days)
+    return {
+        'stats': stats,
+        'malfunction': malfunction,
+        'availability': availability,
+        'availability_by_site': by_site,
+        'breakdowns': breakdowns,
+        'status': merge_site_status(stats_status, malfunction_status, availability_status, by_site_status,
+                                    breakdowns_status),
+    }
+
+
+@require_role(['admin', 'biomedical'])
+def show_regional_interface():
+    """Combined dashboard and archive search over the site databases"""
+    st.title("Vue Régionale")
+
+    overview = load_regional_overview(7)
+    status = overview['status']
+    missing = status[status['status'] != 'ok']
+    if not missing.empty:
+        st.warning("Sites absents des résultats : " + ", ".join(
+            f"{row['site']} ({SITE_STATUS_LABELS[row['status']]})" for _, row in missing.iterrows()))
+
+    percentage, broken, total = overview['malfunction']
+    col1, col2, col3, col4 = st.columns(4)
+    col1.metric("Sites", f"{len(status) - len(missing)} / {len(status)}")
+    col2.metric("Endoscopes", total)
+    col3.metric("En panne", broken)
+    col4.metric("Taux de panne", f"{percentage:.1f}%")
+
+    tab_overview, tab_sites, tab_search = st.tabs(["Disponibilité", "Par site", "Recherche archives"])
+    with tab_overview:
+        if not overview['availability'].empty:
+            st.plotly_chart(availability_figure(overview['availability']), use_container_width=True)
+        st.subheader("Pannes des 7 derniers jours")
+        if overview['breakdowns'].empty:
+            st.info("Aucune panne signalée")
+        else:
+            st.dataframe(overview['breakdowns'], use_container_width=True, hide_index=True)
+    with tab_sites:
+        st.dataframe(status.assign(status=status['status'].map(SITE_STATUS_LABELS)).rename(columns={
+            'site': "Site", 'status': "Statut", 'ms': "Durée (ms)", 'error': "Erreur"}), hide_index=True)
+        st.dataframe(overview['availability_by_site'], use_container_width=True, hide_index=True)
+    with tab_search:
+        show_regional_search()
+
+
+@st.fragment
+def show_regional_search():
+    """Sterilisation reports of every site matching a serial number / designation prefix and dates"""
+    with st.form("regional_search"):
+        col1, col2, col3, col4 = st.columns([2, 1, 1, 1])
+        text = col1.text_input("Numéro de série ou endoscope")
+        start = col2.date_input("Du", value=dt.date.today() - dt.timedelta(days=30))
+        end = col3.date_input("Au", value=dt.date.today())
+        etat = col4.selectbox("État", ["Tous", "fonctionnel", "en panne"])
+        submitted = st.form_submit_button("Rechercher", type="primary")
+    if submitted:
+        reports, status = federation.search_sterilisation_reports(text, start, end, None if etat == "Tous" else etat)
+        status = merge_site_status(status)
+        missing = status[status['status'] != 'ok']
+        if not missing.empty:
+            st.warning(f"Résultats partiels : {', '.join(missing['site'])} n'ont pas répondu")
+        st.write(f"**{len(reports)} rapports**")
+        st.dataframe(reports, use_container_width=True, hide_index=True)
+
 
 def show_archives_interface():
     """Archives interface for all users with filtering and sorting"""
@@ -1049,189 +1916,22 @@ def show_archives_interface():
     
     tab_titles = ["Rapports de Stérilisation"]
     if user_role in ['biomedical', 'admin']:
-        tab_titles.append("Historique Inventaire")
+        tab_titles.extend(["Historique Inventaire", "Rappel / Traçabilité"])
     
     tabs = st.tabs(tab_titles)
     
     # --- Tab 1: Sterilization Reports ---
     with tabs[0]:
-        st.subheader("Historique des Rapports de Stérilisation")
-        steril_reports = db.get_all_sterilisation_reports()
-        
-        if not steril_reports.empty:
-            filtered_steril = steril_reports.copy()
-            with st.expander("Filtres et Tri pour les Rapports"):
-                col1, col2, col3 = st.columns(3)
-                with col1:
-                    operators = st.multiselect("Opérateur", options=steril_reports['nom_operateur'].unique(), key="op_filter")
-                    medecins = st.multiselect("Médecin", options=steril_reports['medecin_responsable'].unique(), key="med_filter")
-                with col2:
-                    states = st.multiselect("État de l'endoscope", options=steril_reports['etat_endoscope'].unique(), key="state_filter")
-                    start_date = st.date_input("Du", None, key="steril_start")
-                    end_date = st.date_input("Au", None, key="steril_end")
-                with col3:
-                    sort_by_steril = st.selectbox("Trier par", options=list(steril_reports.columns), index=5, key="sort_steril_col")
-                    sort_order_steril = st.radio("Ordre", ["Descendant", "Ascendant"], key="sort_steril_order")
-
-            # Apply filters
-            if operators: filtered_steril = filtered_steril[filtered_steril['nom_operateur'].isin(operators)]
-            if medecins: filtered_steril = filtered_steril[filtered_steril['medecin_responsable'].isin(medecins)]
-            if states: filtered_steril = filtered_steril[filtered_steril['etat_endoscope'].isin(states)]
-            if start_date: filtered_steril = filtered_steril[pd.to_datetime(filtered_steril['date_desinfection']).dt.date >= start_date]
-            if end_date: filtered_steril = filtered_steril[pd.to_datetime(filtered_steril['date_desinfection']).dt.date <= end_date]
-            if sort_by_steril: filtered_steril = filtered_steril.sort_values(by=sort_by_steril, ascending=(sort_order_steril == 'Ascendant'))
-            
-            st.dataframe(filtered_steril.drop(columns=['procedure_medicale'], errors='ignore'), use_container_width=True)
-            
-            # Single PDF Download Button
-            if st.button(" Télécharger Rapport PDF", key="download_pdf_steril", type="primary"):
-                try:
-                    with st.spinner("Génération du rapport PDF en cours..."):
-                        # Prepare data for PDF
-                        pdf_data = filtered_steril.drop(columns=['procedure_medicale'], errors='ignore')
-                        
-                        # Generate professional PDF
-                        pdf_bytes = generate_professional_pdf_report(
-                            pdf_data, 
-                            "Rapports de Stérilisation et Désinfection",
-                            "sterilisation"
-                        )
-                        
-                        # Download button
-                        st.download_button(
-                            label="Télécharger le Rapport PDF",
-                            data=pdf_bytes,
-                            file_name=f"rapport_sterilisation_{datetime.now().strftime('%Y%m%d_%H%M%S')}.pdf",
-                            mime="application/pdf",
-                            key="download_steril_final"
-                        )
-                        st.success(" Rapport PDF généré avec succès!")
-                except Exception as e:
-                    st.error(f" Erreur lors de la génération du PDF: {str(e)}")
+        show_sterilisation_archive()
 
     # --- Tab 2: Inventory History ---
     if user_role in ['biomedical', 'admin']:
         with tabs[1]:
-            st.subheader("Historique de l'Inventaire des Endoscopes")
-            inventory_df = db.get_all_endoscopes()
-            
-            if not inventory_df.empty:
-                filtered_inventory = inventory_df.copy()
-                
-                # Ajout des filtres et tri pour l'inventaire
-                with st.expander("Filtres et Tri pour l'Inventaire"):
-                    col1, col2, col3 = st.columns(3)
-                    
-                    with col1:
-                        # Filtres par état
-                        etats = st.multiselect("État", 
-                                            options=inventory_df['etat'].unique(), 
-                                            key="inv_etat_filter")
-                        
-                        # Filtres par marque
-                        marques = st.multiselect("Marque", 
-                                            options=inventory_df['marque'].unique(), 
-                                            key="inv_marque_filter")
-                    
-                    with col2:
-                        # Filtres par localisation
-                        localisations = st.multiselect("Localisation", 
-                                                    options=inventory_df['localisation'].unique(), 
-                                                    key="inv_localisation_filter")
-                        
-                        # Filtres par créateur
-                        createurs = st.multiselect("Créé par", 
-                                                options=inventory_df['created_by'].unique(), 
-                                                key="inv_createur_filter")
-                    
-                    with col3:
-                        # Options de tri
-                        sort_by_inv = st.selectbox("Trier par", 
-                                                options=['designation', 'marque', 'modele', 'numero_serie', 
-                                                        'etat', 'localisation', 'created_at', 'created_by'], 
-                                                index=0, 
-                                                key="sort_inv_col")
-                        
-                        sort_order_inv = st.radio("Ordre", ["Descendant", "Ascendant"], key="sort_inv_order")
-                        
-                        # Recherche par texte
-                        search_text = st.text_input("Rechercher (désignation, modèle, N° série)", 
-                                                key="inv_search_text")
-
-                # Application des filtres
-                if etats: 
-                    filtered_inventory = filtered_inventory[filtered_inventory['etat'].isin(etats)]
-                if marques: 
-                    filtered_inventory = filtered_inventory[filtered_inventory['marque'].isin(marques)]
-                if localisations: 
-                    filtered_inventory = filtered_inventory[filtered_inventory['localisation'].isin(localisations)]
-                if createurs: 
-                    filtered_inventory = filtered_inventory[filtered_inventory['created_by'].isin(createurs)]
-                
-                # Recherche par texte
-                if search_text:
-                    mask = (
-                        filtered_inventory['designation'].str.contains(search_text, case=False, na=False) |
-                        filtered_inventory['modele'].str.contains(search_text, case=False, na=False) |
-                        filtered_inventory['numero_serie'].str.contains(search_text, case=False, na=False)
-                    )
-                    filtered_inventory = filtered_inventory[mask]
-                
-                # Application du tri
-                if sort_by_inv: 
-                    filtered_inventory = filtered_inventory.sort_values(
-                        by=sort_by_inv, 
-                        ascending=(sort_order_inv == 'Ascendant')
-                    )
-                
-                # Affichage du nombre de résultats
-                st.info(f"Affichage de {len(filtered_inventory)} endoscope(s) sur {len(inventory_df)} total")
-                
-                display_inventory = filtered_inventory.copy()
+            show_inventory_archive()
+        with tabs[2]:
+            show_recall_trace()
 
-                # Remplacer la colonne 'id' par une image QR Code
-                display_inventory['QR Code'] = display_inventory.apply(
-                    lambda row: f'<img src="data:image/png;base64,{generate_qr_code(row["id"], row["designation"], row["numero_serie"])}" width="80"/>',
-                    axis=1
-                )
-
-                # Optionnel : retirer l'ID si tu ne veux plus le voir
-                display_inventory.drop(columns=['id'], inplace=True, errors='ignore')
-
-                # Réorganisation des colonnes : QR Code en premier
-                cols = ['QR Code'] + [col for col in display_inventory.columns if col != 'QR Code']
-                display_inventory = display_inventory[cols]
-
-                # Affichage en HTML pour voir les images
-                st.write(display_inventory.to_html(escape=False, index=False), unsafe_allow_html=True)
-
-                
-                # Single PDF Download Button for Inventory (avec données filtrées)
-                if st.button(" Télécharger Rapport Inventaire PDF", key="download_pdf_inventory", type="primary"):
-                    try:
-                        with st.spinner("Génération du rapport d'inventaire PDF en cours..."):
-                            # Utiliser les données filtrées pour le PDF
-                            pdf_title = "Historique de l'Inventaire des Endoscopes"
-                            if len(filtered_inventory) < len(inventory_df):
-                                pdf_title += f" (Filtré - {len(filtered_inventory)} sur {len(inventory_df)})"
-                            
-                            pdf_bytes = generate_professional_pdf_report(
-                                filtered_inventory,  # Utiliser les données filtrées
-                                pdf_title,
-                                "inventaire"
-                            )
-                            st.download_button(
-                                label="Télécharger le Rapport Inventaire PDF",
-                                data=pdf_bytes,
-                                file_name=f"rapport_inventaire_filtre_{datetime.now().strftime('%Y%m%d_%H%M%S')}.pdf",
-                                mime="application/pdf",
-                                key="download_inventory_final"
-                            )
-                            st.success("Rapport d'inventaire PDF généré avec succès!")
-                    except Exception as e:
-                        st.error(f"Erreur lors de la génération du PDF: {str(e)}")
-            else:
-                st.info("Aucun endoscope dans l'inventaire.")
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    with PAGE_PROFILER.rerun():
+        main()
\ No newline at end of file
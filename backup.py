@@ -0,0 +1,283 @@
+"""Online backups of the EndoTrace database.
+
+Snapshots are taken with the sqlite3 online backup API while the app and the
+sterilisation stations keep writing. The backup connection holds a read
+transaction for the whole copy, so the pages are copied in small steps from
+that fixed point in time and the backup never restarts because of a writer.
+The journal mode of the database is left as it is: in WAL mode (set by the
+ingest service's connection pool) writers keep appending to the WAL during
+the copy; in rollback-journal mode they wait for it, up to their busy
+timeout. The mode in use is recorded in the manifest.
+
+Each snapshot is integrity-checked, gzip-compressed and described by a JSON
+manifest with its SHA-256, so it can be verified before it is restored.
+
+Usage: python backup.py snapshot [--db endotrace.db] [--dir backups] [--keep-last 7] [--keep-daily 30]
+       python backup.py list [--dir backups]
+       python backup.py verify SNAPSHOT
+       python backup.py restore (SNAPSHOT | --at "2026-10-19 08:00") [--db endotrace.db] [--dir backups]
+"""
+import argparse
+import gzip
+import hashlib
+import json
+import os
+import shutil
+import socket
+import sqlite3
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+BACKUP_DIR = os.getenv("BACKUP_DIR", "backups")
+SNAPSHOT_SUFFIX = '.db.gz'
+MANIFEST_SUFFIX = '.json'
+# Microseconds keep the names of snapshots taken within the same second apart
+TIME_FORMAT = "%Y%m%d-%H%M%S-%f"
+CHUNK_SIZE = 1024 * 1024
+
+
+class BackupError(Exception):
+    """A snapshot that cannot be taken, verified or restored"""
+
+
+def online_backup(db_path, dest_path, pages=1024, sleep=0.0, progress=None):
+    """Copy db_path to dest_path page by page from a consistent point in time.
+
+    Returns {'pages', 'steps', 'duration_s', 'journal_mode'}. progress(remaining, total) is
+    called after each step of `pages` pages.
+    """
+    source = sqlite3.connect(db_path, timeout=30)
+    dest = sqlite3.connect(dest_path)
+    steps = 0
+
+    def on_step(status, remaining, total):
+        nonlocal steps
+        steps += 1
+        if progress is not None:
+            progress(remaining, total)
+
+    try:
+        journal_mode = source.execute("PRAGMA journal_mode").fetchone()[0]
+        started = time.perf_counter()
+        # The open read transaction pins the snapshot the backup copies from
+        source.execute("BEGIN")
+        total_pages = source.execute("PRAGMA page_count").fetchone()[0]
+        source.backup(dest, pages=pages, progress=on_step, sleep=sleep)
+        source.rollback()
+        # A file copy stays in rollback-journal mode: it is read and restored as a single file
+        dest.execute("PRAGMA journal_mode=DELETE")
+        return {'pages': total_pages, 'steps': steps, 'duration_s': time.perf_counter() - started,
+                'journal_mode': journal_mode}
+    finally:
+        dest.close()
+        source.close()
+
+
+def integrity_check(db_path):
+    """Problems reported by PRAGMA integrity_check; empty when the file is sound"""
+    conn = sqlite3.connect(f"file:{db_path}?mode=ro", uri=True)
+    try:
+        rows = [row[0] for row in conn.execute("PRAGMA integrity_check")]
+        return [] if rows == ['ok'] else rows
+    finally:
+        conn.close()
+
+
+def _sha256(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(CHUNK_SIZE), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def create_snapshot(db_path, directory=BACKUP_DIR, pages=1024, sleep=0.0, compresslevel=6, keep_last=None,
+                    keep_daily=None):
+    """Back up, check and compress db_path into directory; returns the manifest of the new snapshot"""
+    os.makedirs(directory, exist_ok=True)
+    taken_at = datetime.now()
+    name = f"endotrace-{taken_at.strftime(TIME_FORMAT)}"
+    snapshot_path = os.path.join(directory, name + SNAPSHOT_SUFFIX)
+    fd, raw_path = tempfile.mkstemp(suffix='.db', dir=directory)
+    os.close(fd)
+    try:
+        backup = online_backup(db_path, raw_path, pages=pages, sleep=sleep)
+        problems = integrity_check(raw_path)
+        if problems:
+            raise BackupError(f"Integrity check failed on the copy of {db_path}: {problems[:5]}")
+        started = time.perf_counter()
+        with open(raw_path, 'rb') as raw, gzip.open(snapshot_path + '.tmp', 'wb', compresslevel=compresslevel) as out:
+            shutil.copyfileobj(raw, out, CHUNK_SIZE)
+        os.replace(snapshot_path + '.tmp', snapshot_path)
+        manifest = {
+            'snapshot': os.path.basename(snapshot_path),
+            'taken_at': taken_at.strftime("%Y-%m-%d %H:%M:%S"),
+            'source': os.path.abspath(db_path),
+            'host': socket.gethostname(),
+            'pages': backup['pages'],
+            'steps': backup['steps'],
+            'journal_mode': backup['journal_mode'],
+            'db_bytes': os.path.getsize(raw_path),
+            'bytes': os.path.getsize(snapshot_path),
+            'sha256': _sha256(snapshot_path),
+            'backup_s': round(backup['duration_s'], 3),
+            'compress_s': round(time.perf_counter() - started, 3),
+        }
+        with open(os.path.join(directory, name + MANIFEST_SUFFIX), 'w', encoding='utf-8') as f:
+            json.dump(manifest, f, indent=2)
+    finally:
+        for path in (raw_path, snapshot_path + '.tmp'):
+            if os.path.exists(path):
+                os.remove(path)
+    if keep_last is not None or keep_daily is not None:
+        apply_retention(directory, keep_last or 0, keep_daily or 0)
+    return manifest
+
+
+def list_snapshots(directory=BACKUP_DIR):
+    """Manifests of the snapshots in directory, newest first"""
+    if not os.path.isdir(directory):
+        return []
+    manifests = []
+    for name in os.listdir(directory):
+        if name.endswith(MANIFEST_SUFFIX):
+            try:
+                with open(os.path.join(directory, name), encoding='utf-8') as f:
+                    manifests.append(json.load(f))
+            except (OSError, ValueError):
+                continue
+    # Names carry the microseconds: they order snapshots taken within the same second
+    return sorted(manifests, key=lambda manifest: (manifest['taken_at'], manifest['snapshot']), reverse=True)
+
+
+def apply_retention(directory=BACKUP_DIR, keep_last=7, keep_daily=30):
+    """Keep the keep_last newest snapshots and the newest of each of the last keep_daily days; returns the removed"""
+    snapshots = list_snapshots(directory)
+    keep = {manifest['snapshot'] for manifest in snapshots[:keep_last]}
+    oldest_day = (datetime.now() - timedelta(days=keep_daily)).strftime("%Y-%m-%d")
+    days = set()
+    for manifest in snapshots:
+        day = manifest['taken_at'][:10]
+        if day > oldest_day and day not in days:
+            days.add(day)
+            keep.add(manifest['snapshot'])
+    removed = []
+    for manifest in snapshots:
+        if manifest['snapshot'] not in keep:
+            name = manifest['snapshot'][:-len(SNAPSHOT_SUFFIX)]
+            for path in (name + SNAPSHOT_SUFFIX, name + MANIFEST_SUFFIX):
+                if os.path.exists(os.path.join(directory, path)):
+                    os.remove(os.path.join(directory, path))
+            removed.append(manifest['snapshot'])
+    return removed
+
+
+def find_snapshot(directory, at):
+    """Path of the newest snapshot taken at or before `at` (datetime or 'YYYY-MM-DD HH:MM[:SS]')"""
+    at = at if isinstance(at, str) else at.strftime("%Y-%m-%d %H:%M:%S")
+    for manifest in list_snapshots(directory):
+        if manifest['taken_at'] <= at:
+            return os.path.join(directory, manifest['snapshot'])
+    raise BackupError(f"No snapshot taken before {at} in {directory}")
+
+
+def _manifest_for(snapshot_path):
+    path = snapshot_path[:-len(SNAPSHOT_SUFFIX)] + MANIFEST_SUFFIX
+    try:
+        with open(path, encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError) as e:
+        raise BackupError(f"Manifest of {snapshot_path} unreadable: {e}") from None
+
+
+def _expand(snapshot_path, dest_path):
+    manifest = _manifest_for(snapshot_path)
+    if _sha256(snapshot_path) != manifest['sha256']:
+        raise BackupError(f"Checksum mismatch for {snapshot_path}")
+    with gzip.open(snapshot_path, 'rb') as compressed, open(dest_path, 'wb') as out:
+        shutil.copyfileobj(compressed, out, CHUNK_SIZE)
+    problems = integrity_check(dest_path)
+    if problems:
+        raise BackupError(f"Integrity check failed on {snapshot_path}: {problems[:5]}")
+    return manifest
+
+
+def verify_snapshot(snapshot_path):
+    """Check the checksum and the integrity of a snapshot; returns its manifest or raises BackupError"""
+    fd, raw_path = tempfile.mkstemp(suffix='.db', dir=os.path.dirname(os.path.abspath(snapshot_path)))
+    os.close(fd)
+    try:
+        return _expand(snapshot_path, raw_path)
+    finally:
+        os.remove(raw_path)
+
+
+def restore_snapshot(snapshot_path, db_path):
+    """Verify a snapshot and copy it over db_path in one transaction; returns its manifest.
+
+    The restore goes through the backup API too, so connections already open
+    on db_path see the restored content instead of a replaced file.
+    """
+    fd, raw_path = tempfile.mkstemp(suffix='.db', dir=os.path.dirname(os.path.abspath(db_path)))
+    os.close(fd)
+    try:
+        manifest = _expand(snapshot_path, raw_path)
+        source = sqlite3.connect(raw_path)
+        dest = sqlite3.connect(db_path, timeout=60)
+        try:
+            source.backup(dest)
+        finally:
+            dest.close()
+            source.close()
+        return manifest
+    finally:
+        os.remove(raw_path)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    commands = parser.add_subparsers(dest='command', required=True)
+    snapshot = commands.add_parser('snapshot', help="take a snapshot")
+    snapshot.add_argument('--db', default='endotrace.db')
+    snapshot.add_argument('--dir', default=BACKUP_DIR)
+    snapshot.add_argument('--pages', type=int, default=1024, help="pages copied per step")
+    snapshot.add_argument('--sleep', type=float, default=0.0, help="pause between steps in seconds")
+    snapshot.add_argument('--keep-last', type=int, default=7)
+    snapshot.add_argument('--keep-daily', type=int, default=30)
+    listing = commands.add_parser('list', help="list the snapshots")
+    listing.add_argument('--dir', default=BACKUP_DIR)
+    verify = commands.add_parser('verify', help="check a snapshot")
+    verify.add_argument('snapshot')
+    restore = commands.add_parser('restore', help="restore a snapshot over the database")
+    restore.add_argument('snapshot', nargs='?')
+    restore.add_argument('--at', help="restore the newest snapshot taken at or before this time")
+    restore.add_argument('--db', default='endotrace.db')
+    restore.add_argument('--dir', default=BACKUP_DIR)
+    args = parser.parse_args()
+
+    try:
+        if args.command == 'snapshot':
+            manifest = create_snapshot(args.db, args.dir, args.pages, args.sleep, keep_last=args.keep_last,
+                                       keep_daily=args.keep_daily)
+            print(f"{manifest['snapshot']}: {manifest['db_bytes'] / 1e6:.1f} MB copied in {manifest['backup_s']} s "
+                  f"({manifest['steps']} steps), {manifest['bytes'] / 1e6:.1f} MB compressed")
+        elif args.command == 'list':
+            for manifest in list_snapshots(args.dir):
+                print(f"{manifest['taken_at']}  {manifest['snapshot']}  {manifest['bytes'] / 1e6:.1f} MB")
+        elif args.command == 'verify':
+            manifest = verify_snapshot(args.snapshot)
+            print(f"{manifest['snapshot']}: checksum and integrity OK")
+        elif args.command == 'restore':
+            if not args.snapshot and not args.at:
+                parser.error("restore needs a snapshot or --at")
+            path = args.snapshot or find_snapshot(args.dir, args.at)
+            manifest = restore_snapshot(path, args.db)
+            print(f"{args.db} restored from {manifest['snapshot']} (taken {manifest['taken_at']})")
+    except BackupError as e:
+        print(f"Error: {e}")
+        raise SystemExit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,100 @@
+"""Payload and build time of the Archives inventory table, before and after.
+
+before      : one full-size QR PNG per row inlined as <img> in DataFrame.to_html
+data URI    : st.dataframe with 1-bit thumbnails inlined as data URIs
+static URL  : st.dataframe with thumbnails written once under static/qr
+
+Payload is what reaches the browser for the table: the HTML string for the
+old path, the Arrow bytes st.dataframe sends for the new ones.
+
+Usage: python benchmarks/bench_archive_table.py [--endoscopes 1000]
+"""
+import argparse
+import base64
+import os
+import sys
+import tempfile
+import time
+from io import BytesIO
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pandas as pd  # noqa: E402
+import qrcode  # noqa: E402
+from streamlit import dataframe_util  # noqa: E402
+
+import qr_codes  # noqa: E402
+from scan_intake import format_qr_payload  # noqa: E402
+
+
+def previous_qr_code(endoscope_id, designation, numero_serie):
+    """QR code as app.generate_qr_code renders it for the detail pane (box_size=10)"""
+    qr = qrcode.QRCode(version=1, error_correction=qrcode.constants.ERROR_CORRECT_L, box_size=10, border=4)
+    qr.add_data(format_qr_payload(endoscope_id, designation, numero_serie))
+    qr.make(fit=True)
+    buffer = BytesIO()
+    qr.make_image(fill_color="black", back_color="white").save(buffer, format='PNG')
+    return base64.b64encode(buffer.getvalue()).decode()
+
+
+def inventory(n):
+    return pd.DataFrame({
+        'id': range(1, n + 1),
+        'designation': [f"Gastroscope {i % 7}" for i in range(n)],
+        'marque': 'OLYMPUS',
+        'modele': [f"GIF-{i % 11}" for i in range(n)],
+        'numero_serie': [f"SN{i:06d}" for i in range(n)],
+        'etat': 'fonctionnel',
+        'observation': '',
+        'localisation': 'En utilisation',
+        'created_by': 'bio_eng',
+        'created_at': '2025-01-01 08:00:00',
+    })
+
+
+def render_before(df):
+    display = df.copy()
+    display['QR Code'] = display.apply(
+        lambda row: f'<img src="data:image/png;base64,{previous_qr_code(row["id"], row["designation"], row["numero_serie"])}" width="80"/>',
+        axis=1)
+    display = display.drop(columns=['id'])
+    display = display[['QR Code'] + [c for c in display.columns if c != 'QR Code']]
+    return len(display.to_html(escape=False, index=False).encode('utf-8'))
+
+
+def render_after(df, thumbnail):
+    thumbnails = {row.id: thumbnail(row.id, row.designation, row.numero_serie) for row in df.itertuples()}
+    display = df.copy()
+    display.insert(0, 'QR Code', display['id'].map(thumbnails))
+    display = display.drop(columns=['id'])
+    return len(dataframe_util.convert_pandas_df_to_arrow_bytes(display))
+
+
+def timed(func, *args):
+    start = time.perf_counter()
+    result = func(*args)
+    return result, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--endoscopes', type=int, default=1000)
+    args = parser.parse_args()
+
+    df = inventory(args.endoscopes)
+    with tempfile.TemporaryDirectory() as tmp:
+        qr_codes.QR_STATIC_DIR = tmp
+        results = [('before (HTML + inline QR)', *timed(render_before, df))]
+        results.append(('data URI thumbnails', *timed(render_after, df, qr_codes.qr_thumbnail_data_uri)))
+        results.append(('static URL thumbnails (cold)', *timed(render_after, df, qr_codes.qr_thumbnail_url)))
+        results.append(('static URL thumbnails (files cached)', *timed(render_after, df, qr_codes.qr_thumbnail_url)))
+
+    baseline = results[0][1]
+    print(f"Inventory: {args.endoscopes} endoscopes")
+    print(f"{'Rendering':<40} {'payload KB':>11} {'vs before':>10} {'build ms':>10}")
+    for label, size, elapsed in results:
+        print(f"{label:<40} {size / 1024:>11.1f} {baseline / size:>9.1f}x {elapsed * 1000:>10.1f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,71 @@
+"""Compare the pandas and Arrow read paths for the sterilisation archive.
+
+For each path: time to load all reports, time to serialize them the way
+st.dataframe does, peak Python memory while loading (tracemalloc) and the
+in-memory size of the result.
+
+Usage: python benchmarks/bench_arrow_reads.py [--endoscopes 300] [--years 1]
+(the defaults produce ~110k reports)
+"""
+import argparse
+import gc
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from streamlit import dataframe_util  # noqa: E402
+
+from database import DatabaseManager  # noqa: E402
+from bench_reliability import populate  # noqa: E402
+
+
+def measure(load, serialize, size_of, repeat=3):
+    best_load = best_serialize = float('inf')
+    for _ in range(repeat):
+        gc.collect()
+        start = time.perf_counter()
+        result = load()
+        best_load = min(best_load, time.perf_counter() - start)
+        start = time.perf_counter()
+        serialize(result)
+        best_serialize = min(best_serialize, time.perf_counter() - start)
+    gc.collect()
+    tracemalloc.start()
+    result = load()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return best_load, best_serialize, peak, size_of(result)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--endoscopes', type=int, default=300)
+    parser.add_argument('--years', type=int, default=1)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db = DatabaseManager(os.path.join(tmp, 'bench.db'))
+        n_reports = populate(db, args.endoscopes, args.years)
+        print(f"Sterilisation reports: {n_reports}")
+
+        paths = [
+            ('pandas (read_sql_query)', db.get_all_sterilisation_reports,
+             dataframe_util.convert_pandas_df_to_arrow_bytes,
+             lambda df: df.memory_usage(deep=True).sum()),
+            ('arrow (cursor batches)', db.get_all_sterilisation_reports_arrow,
+             dataframe_util.convert_arrow_table_to_arrow_bytes,
+             lambda table: table.nbytes),
+        ]
+        print(f"{'Path':<26} {'load ms':>9} {'serialize ms':>13} {'total ms':>9} {'peak MB':>9} {'result MB':>10}")
+        for label, load, serialize, size_of in paths:
+            load_time, serialize_time, peak, size = measure(load, serialize, size_of)
+            print(f"{label:<26} {load_time * 1000:>9.1f} {serialize_time * 1000:>13.1f} "
+                  f"{(load_time + serialize_time) * 1000:>9.1f} {peak / 2**20:>9.1f} {size / 2**20:>10.1f}")
+
+
+if __name__ == '__main__':
+    main()
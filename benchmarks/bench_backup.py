@@ -0,0 +1,174 @@
+"""Backup duration and writer stall of online snapshots on a multi-GB database.
+
+Grows a synthetic database to the requested size by replicating its
+sterilisation history, then, while a writer thread keeps adding reports
+through DatabaseManager as a sterilisation station would, takes online
+backups with several step sizes. Reports the backup duration and the
+writer latency (p50 / p99 / max) during each backup against an idle
+baseline, then the full snapshot (backup + integrity check + gzip), verify
+and restore times. First checks, on a small database in rollback-journal
+mode, that a snapshot leaves the journal mode alone and that two snapshots
+taken within the same second get distinct names.
+
+Usage: python benchmarks/bench_backup.py [--size-gb 2] [--steps 256 1024 8192] [--baseline 5]
+                                         [--output bench_backup.json]
+"""
+import argparse
+import json
+import os
+import sqlite3
+import statistics
+import sys
+import tempfile
+import threading
+import time
+from datetime import date
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from backup import create_snapshot, list_snapshots, online_backup, restore_snapshot, verify_snapshot  # noqa: E402
+from database import DatabaseManager  # noqa: E402
+from synthetic_data import generate  # noqa: E402
+
+
+def grow(db_path, size_bytes):
+    """Replicate the sterilisation history (shifted serials) until the file reaches size_bytes"""
+    conn = sqlite3.connect(db_path)
+    conn.execute("PRAGMA journal_mode=WAL")
+    generation = 0
+    while os.path.getsize(db_path) < size_bytes:
+        generation += 1
+        conn.execute(
+            """INSERT INTO sterilisation_reports
+               (nom_operateur, endoscope, numero_serie, medecin_responsable, date_desinfection,
+                type_desinfection, cycle, test_etancheite, heure_debut, heure_fin, procedure_medicale,
+                salle, type_acte, salle_id, type_acte_id, etat_endoscope, nature_panne, created_by)
+               SELECT nom_operateur, endoscope, numero_serie || '-' || ?, medecin_responsable, date_desinfection,
+                      type_desinfection, cycle, test_etancheite, heure_debut, heure_fin, procedure_medicale,
+                      salle, type_acte, salle_id, type_acte_id, etat_endoscope, nature_panne, created_by
+               FROM sterilisation_reports WHERE numero_serie NOT LIKE '%-%'""", (generation, ))
+        conn.commit()
+        conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+    count = conn.execute("SELECT COUNT(*) FROM sterilisation_reports").fetchone()[0]
+    conn.close()
+    return count
+
+
+class Writer:
+    """Adds one sterilisation report at a time and records each commit latency"""
+
+    def __init__(self, db_path):
+        self.db = DatabaseManager(db_path)
+        conn = self.db.get_connection()
+        self.serial = conn.execute("SELECT numero_serie FROM endoscopes LIMIT 1").fetchone()[0]
+        conn.close()
+        self.latencies = []
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def _run(self):
+        while not self._stop.is_set():
+            start = time.perf_counter()
+            self.db.add_sterilisation_report(
+                'bench', 'Gastroscope', self.serial, 'Dr bench', date.today(), 'automatique', 'complet',
+                'réussi', '08:00', '08:40', 'N/A', 'Bloc 1', 'Gastroscopie', 'fonctionnel', None, 'bench')
+            self.latencies.append((time.perf_counter() - start) * 1000)
+            self._stop.wait(0.01)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def take(self):
+        """Latencies recorded since the previous call"""
+        latencies, self.latencies = self.latencies, []
+        return latencies
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+
+def summarize(latencies):
+    quantiles = statistics.quantiles(latencies, n=100, method='inclusive') if len(latencies) > 1 else latencies * 99
+    return {'writes': len(latencies), 'p50_ms': round(quantiles[49], 1), 'p99_ms': round(quantiles[98], 1),
+            'max_ms': round(max(latencies), 1)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--size-gb', type=float, default=2.0)
+    parser.add_argument('--steps', type=int, nargs='+', default=[256, 1024, 8192], help="pages per backup step")
+    parser.add_argument('--baseline', type=float, default=5.0, help="seconds of writes without backup")
+    parser.add_argument('--output', default='bench_backup.json')
+    args = parser.parse_args()
+
+    results = {'size_gb': args.size_gb, 'backups': []}
+    with tempfile.TemporaryDirectory() as workdir:
+        small = os.path.join(workdir, 'small.db')
+        DatabaseManager(small)
+        with sqlite3.connect(small) as conn:
+            conn.execute("PRAGMA journal_mode=DELETE")
+        first, second = (create_snapshot(small, os.path.join(workdir, 'small-backups')) for _ in range(2))
+        with sqlite3.connect(small) as conn:
+            journal_mode = conn.execute("PRAGMA journal_mode").fetchone()[0]
+        listed = [manifest['snapshot'] for manifest in list_snapshots(os.path.join(workdir, 'small-backups'))]
+        results['small'] = {'journal_mode_after': journal_mode, 'names': listed,
+                            'distinct': first['snapshot'] != second['snapshot'] and len(listed) == 2,
+                            'newest_first': listed[:1] == [second['snapshot']]}
+        print(f"Small database: journal mode after two snapshots {journal_mode}, snapshots {listed}")
+
+        db_path = os.path.join(workdir, 'bench.db')
+        print("Generating database...")
+        generate(db_path, scale=10)
+        start = time.perf_counter()
+        results['reports'] = grow(db_path, int(args.size_gb * 1024 ** 3))
+        results['db_bytes'] = os.path.getsize(db_path)
+        print(f"Grown to {results['db_bytes'] / 1024 ** 3:.2f} GB ({results['reports']} reports) "
+              f"in {time.perf_counter() - start:.0f} s")
+
+        writer = Writer(db_path).start()
+        time.sleep(args.baseline)
+        results['baseline'] = summarize(writer.take())
+        print(f"Baseline writes: {results['baseline']}")
+
+        for pages in args.steps:
+            dest = os.path.join(workdir, f"copy-{pages}.db")
+            writer.take()
+            backup = online_backup(db_path, dest, pages=pages)
+            stall = summarize(writer.take())
+            os.remove(dest)
+            results['backups'].append({'pages_per_step': pages, 'steps': backup['steps'],
+                                       'duration_s': round(backup['duration_s'], 2), 'writes': stall})
+            print(f"Backup with {pages} pages/step: {backup['duration_s']:.1f} s in {backup['steps']} steps; "
+                  f"writes during backup: {stall}")
+
+        writer.take()
+        start = time.perf_counter()
+        manifest = create_snapshot(db_path, os.path.join(workdir, 'backups'), compresslevel=1)
+        snapshot_s = time.perf_counter() - start
+        results['snapshot'] = {**manifest, 'total_s': round(snapshot_s, 2), 'writes': summarize(writer.take())}
+        print(f"Snapshot: {snapshot_s:.1f} s (backup {manifest['backup_s']} s, compress {manifest['compress_s']} s), "
+              f"{manifest['bytes'] / 1024 ** 2:.0f} MB; writes: {results['snapshot']['writes']}")
+        writer.stop()
+
+        snapshot_path = os.path.join(workdir, 'backups', manifest['snapshot'])
+        start = time.perf_counter()
+        verify_snapshot(snapshot_path)
+        results['verify_s'] = round(time.perf_counter() - start, 2)
+        start = time.perf_counter()
+        restore_snapshot(snapshot_path, db_path)
+        results['restore_s'] = round(time.perf_counter() - start, 2)
+        print(f"Verify: {results['verify_s']} s, restore: {results['restore_s']} s")
+
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump(results, f, indent=2)
+    print(f"Results written to {args.output}")
+    small = results['small']
+    if small['journal_mode_after'] != 'delete' or not small['distinct'] or not small['newest_first']:
+        print("FAILED")
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
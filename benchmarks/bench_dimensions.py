@@ -0,0 +1,143 @@
+"""Row size and grouping cost of free-text categories vs dimension keys.
+
+Builds a database with the previous schema (salle / type_acte text on every
+report, no keys on endoscopes) filled with spelling variants, times the
+text aggregations the dashboard used to run, then opens it with
+DatabaseManager (which adds the keys next to the text) and times the same
+aggregations on the integer keys. Table sizes (dbstat) are measured after
+VACUUM: the keys are added next to the text, so both tables grow slightly.
+
+Usage: python benchmarks/bench_dimensions.py [--endoscopes 20000] [--reports 200000]
+"""
+import argparse
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from database import DatabaseManager  # noqa: E402
+
+LEGACY_SCHEMA = """
+CREATE TABLE endoscopes (
+    id INTEGER PRIMARY KEY AUTOINCREMENT, designation TEXT NOT NULL, marque TEXT NOT NULL,
+    modele TEXT NOT NULL, numero_serie TEXT UNIQUE NOT NULL, etat TEXT NOT NULL, observation TEXT,
+    localisation TEXT NOT NULL, created_by TEXT NOT NULL,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP, updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP);
+CREATE TABLE sterilisation_reports (
+    id INTEGER PRIMARY KEY AUTOINCREMENT, nom_operateur TEXT NOT NULL, endoscope TEXT NOT NULL,
+    numero_serie TEXT NOT NULL, medecin_responsable TEXT NOT NULL, date_desinfection DATE NOT NULL,
+    type_desinfection TEXT NOT NULL, cycle TEXT NOT NULL, test_etancheite TEXT NOT NULL,
+    heure_debut TIME NOT NULL, heure_fin TIME NOT NULL, procedure_medicale TEXT NOT NULL,
+    salle TEXT NOT NULL, type_acte TEXT NOT NULL, etat_endoscope TEXT NOT NULL, nature_panne TEXT,
+    created_by TEXT NOT NULL, created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP);
+"""
+
+LOCALISATIONS = ['En utilisation', 'en utilisation ', 'En stock', 'stock', 'En réforme', 'En externe']
+DESIGNATIONS = ['Gastroscope', 'gastroscope ', 'Coloscope', 'Duodénoscope', 'Bronchoscope']
+SALLES = ['Bloc opératoire 04', 'bloc opératoire 04', 'BLOC OPERATOIRE 01', 'Salle d\'endoscopie 2']
+TYPES_ACTE = ['Coloscopie diagnostique', 'coloscopie diagnostique ', 'Gastroscopie', 'CPRE']
+
+QUERIES = {
+    'before': {
+        'localisation counts': "SELECT TRIM(LOWER(localisation)), COUNT(*) FROM endoscopes "
+                               "GROUP BY TRIM(LOWER(localisation))",
+        'availability by designation': "SELECT TRIM(designation), COUNT(*), SUM(etat = 'en panne') "
+                                       "FROM endoscopes GROUP BY TRIM(designation)",
+        'reports by salle': "SELECT TRIM(LOWER(salle)), COUNT(*) FROM sterilisation_reports "
+                            "GROUP BY TRIM(LOWER(salle))",
+    },
+    'after': {
+        'localisation counts': "SELECT l.label, c.n FROM (SELECT localisation_id, COUNT(*) AS n FROM endoscopes "
+                               "GROUP BY localisation_id) c JOIN dim_localisation l ON l.id = c.localisation_id",
+        'availability by designation': "SELECT d.label, c.n, c.en_panne FROM (SELECT designation_id, COUNT(*) AS n, "
+                                       "SUM(etat = 'en panne') AS en_panne FROM endoscopes GROUP BY designation_id) c "
+                                       "JOIN dim_designation d ON d.id = c.designation_id",
+        'reports by salle': "SELECT s.label, c.n FROM (SELECT salle_id, COUNT(*) AS n FROM sterilisation_reports "
+                            "GROUP BY salle_id) c JOIN dim_salle s ON s.id = c.salle_id",
+    },
+}
+
+
+def build_legacy(path, n_endoscopes, n_reports, seed=42):
+    rng = random.Random(seed)
+    conn = sqlite3.connect(path)
+    conn.executescript(LEGACY_SCHEMA)
+    conn.executemany(
+        """INSERT INTO endoscopes (designation, marque, modele, numero_serie, etat, observation,
+                                   localisation, created_by) VALUES (?, ?, ?, ?, ?, '', ?, 'bench')""",
+        [(rng.choice(DESIGNATIONS), 'OLYMPUS', f"M-{i % 17}", f"SN{i:06d}",
+          'en panne' if rng.random() < 0.05 else 'fonctionnel', rng.choice(LOCALISATIONS))
+         for i in range(n_endoscopes)])
+    conn.executemany(
+        """INSERT INTO sterilisation_reports
+           (nom_operateur, endoscope, numero_serie, medecin_responsable, date_desinfection,
+            type_desinfection, cycle, test_etancheite, heure_debut, heure_fin, procedure_medicale,
+            salle, type_acte, etat_endoscope, nature_panne, created_by)
+           VALUES ('bench', 'Gastroscope', ?, 'Dr Bench', '2025-01-01', 'automatique', 'complet', 'réussi',
+                   '08:00', '09:00', 'N/A', ?, ?, 'fonctionnel', NULL, 'bench')""",
+        [(f"SN{rng.randrange(n_endoscopes):06d}", rng.choice(SALLES), rng.choice(TYPES_ACTE))
+         for _ in range(n_reports)])
+    conn.commit()
+    conn.close()
+
+
+def table_bytes(conn, table):
+    """Bytes of the table b-tree, or None when SQLite is built without dbstat"""
+    try:
+        return conn.execute("SELECT SUM(pgsize) FROM dbstat WHERE name = ?", (table, )).fetchone()[0]
+    except sqlite3.OperationalError:
+        return None
+
+
+def measure(path, queries, repeat=5):
+    conn = sqlite3.connect(path)
+    try:
+        conn.execute("VACUUM")
+        sizes = {table: table_bytes(conn, table) for table in ('endoscopes', 'sterilisation_reports')}
+        timings = {}
+        for label, sql in queries.items():
+            best = float('inf')
+            for _ in range(repeat):
+                start = time.perf_counter()
+                conn.execute(sql).fetchall()
+                best = min(best, time.perf_counter() - start)
+            timings[label] = (best, len(conn.execute(sql).fetchall()))
+        return sizes, timings
+    finally:
+        conn.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--endoscopes', type=int, default=20000)
+    parser.add_argument('--reports', type=int, default=200000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'bench.db')
+        build_legacy(path, args.endoscopes, args.reports)
+        before = measure(path, QUERIES['before'])
+        start = time.perf_counter()
+        DatabaseManager(path)
+        migration = time.perf_counter() - start
+        after = measure(path, QUERIES['after'])
+
+    print(f"Data: {args.endoscopes} endoscopes, {args.reports} reports; migration {migration:.1f} s "
+          f"(includes the reliability backfill)")
+    print(f"{'Table size':<32} {'before KB':>10} {'after KB':>10}")
+    for table in ('endoscopes', 'sterilisation_reports'):
+        if before[0][table] is not None:
+            print(f"{table:<32} {before[0][table] / 1024:>10.0f} {after[0][table] / 1024:>10.0f}")
+    print(f"{'Aggregation':<32} {'before ms':>10} {'groups':>7} {'after ms':>10} {'groups':>7}")
+    for label in QUERIES['before']:
+        (t_before, g_before), (t_after, g_after) = before[1][label], after[1][label]
+        print(f"{label:<32} {t_before * 1000:>10.1f} {g_before:>7} {t_after * 1000:>10.1f} {g_after:>7}")
+
+
+if __name__ == '__main__':
+    main()
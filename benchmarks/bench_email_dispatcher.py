@@ -0,0 +1,261 @@
+"""Email alert dispatcher against a local SMTP sink.
+
+Starts an in-process SMTP server (aiosmtpd is not needed: a minimal stdlib
+sink answering EHLO/AUTH/MAIL/RCPT/DATA/RSET/NOOP/QUIT), queues breakdown
+alerts in a fresh outbox and checks the dispatcher behaviours:
+
+- login: against a sink advertising AUTH, the client sends EHLO and logs in
+  with the configured account before sending;
+- rule: a malfunction-rate alert fired by a designation rule states the
+  rule's scope, threshold and measured rate;
+- send: a batch goes out over one SMTP session, with the agent-typed fields
+  HTML-escaped in the body;
+- reconnect: when the server drops the idle session, the next batch opens a
+  new one and nothing is lost;
+- retry: a delivery refused with a 451 is rescheduled and sent on the next
+  pass; an alert refused max_attempts times is marked failed;
+- lease: alerts claimed by one worker are not handed to another until the
+  lease expires.
+
+Then times the delivery of a larger batch.
+
+Usage: python benchmarks/bench_email_dispatcher.py [--alerts 200] [--output bench_email_dispatcher.json]
+"""
+import argparse
+import base64
+import email
+import json
+import os
+import socket
+import socketserver
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from database import DatabaseManager  # noqa: E402
+from email_alerts import EmailAlertDispatcher, EmailAlertManager  # noqa: E402
+
+
+class SMTPSink(socketserver.ThreadingTCPServer):
+    """Local SMTP server keeping the messages it receives"""
+
+    daemon_threads = True
+    allow_reuse_address = True
+
+    def __init__(self, auth=False):
+        super().__init__(('127.0.0.1', 0), SMTPHandler)
+        self.auth = auth
+        self.messages = []
+        self.logins = []
+        self.commands = []
+        self.sessions = 0
+        self.refuse = 0
+        self._handlers = set()
+        self._lock = threading.Lock()
+        threading.Thread(target=self.serve_forever, daemon=True).start()
+
+    @property
+    def port(self):
+        return self.server_address[1]
+
+    def drop_sessions(self):
+        """Close every open client connection, as a relay restarting would"""
+        with self._lock:
+            handlers = list(self._handlers)
+        for handler in handlers:
+            handler.connection.shutdown(socket.SHUT_RDWR)
+
+    def close(self):
+        self.shutdown()
+        self.server_close()
+
+
+class SMTPHandler(socketserver.StreamRequestHandler):
+
+    def reply(self, line):
+        self.wfile.write(f"{line}\r\n".encode())
+
+    def handle(self):
+        sink = self.server
+        with sink._lock:
+            sink.sessions += 1
+            sink._handlers.add(self)
+        try:
+            self.reply("220 sink ready")
+            while True:
+                line = self.rfile.readline()
+                if not line:
+                    return
+                command, _, argument = line.decode(errors='replace').strip().partition(' ')
+                command = command.upper()
+                with sink._lock:
+                    sink.commands.append(command)
+                if command == 'EHLO' and sink.auth:
+                    self.reply("250-sink")
+                    self.reply("250 AUTH PLAIN")
+                elif command in ('EHLO', 'HELO'):
+                    self.reply("250 sink")
+                elif command == 'AUTH' and sink.auth:
+                    mechanism, _, response = argument.partition(' ')
+                    _, user, password = base64.b64decode(response).decode().split('\0')
+                    with sink._lock:
+                        sink.logins.append((mechanism.upper(), user, password))
+                    self.reply("235 authenticated")
+                elif command == 'MAIL':
+                    with sink._lock:
+                        refused = sink.refuse > 0
+                        sink.refuse -= refused
+                    self.reply("451 try again later" if refused else "250 ok")
+                elif command in ('RCPT', 'RSET', 'NOOP'):
+                    self.reply("250 ok")
+                elif command == 'DATA':
+                    self.reply("354 end with .")
+                    data = []
+                    for data_line in iter(self.rfile.readline, b''):
+                        if data_line in (b'.\r\n', b'.\n'):
+                            break
+                        data.append(data_line[1:] if data_line.startswith(b'..') else data_line)
+                    with sink._lock:
+                        sink.messages.append(email.message_from_bytes(b''.join(data)))
+                    self.reply("250 queued")
+                elif command == 'QUIT':
+                    self.reply("221 bye")
+                    return
+                else:
+                    self.reply("502 not implemented")
+        except OSError:
+            return
+        finally:
+            with sink._lock:
+                sink._handlers.discard(self)
+
+
+def html_body(message):
+    part = next(part for part in message.walk() if part.get_content_type() == 'text/html')
+    return part.get_payload(decode=True).decode(part.get_content_charset() or 'utf-8')
+
+
+def queue(db, count, prefix):
+    return [db.enqueue_email_alert(
+        'breakdown',
+        {'endoscope': 'Gastroscope', 'numero_serie': f"{prefix}{i:04d}", 'date_desinfection': '2026-10-19',
+         'nom_operateur': 'agent', 'nature_panne': '<b>canal</b> & "gaine"', 'salle': 'Bloc 1'},
+        f"{prefix}:{i}") for i in range(count)]
+
+
+def outbox(db):
+    return {row['id']: row for row in db.get_email_outbox(limit=100000).to_dict('records')}
+
+
+def check(results, name, ok, detail):
+    results['checks'][name] = {'ok': bool(ok), 'detail': detail}
+    print(f"{'ok  ' if ok else 'FAIL'} {name}: {detail}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--alerts', type=int, default=200)
+    parser.add_argument('--output', default='bench_email_dispatcher.json')
+    args = parser.parse_args()
+
+    results = {'checks': {}}
+    sink = SMTPSink()
+    with tempfile.TemporaryDirectory() as workdir:
+        db = DatabaseManager(os.path.join(workdir, 'bench.db'))
+        manager = EmailAlertManager('127.0.0.1', sink.port, use_starttls=False)
+        dispatcher = EmailAlertDispatcher(db, manager, batch_size=50, max_attempts=2, base_delay=0)
+
+        auth_sink = SMTPSink(auth=True)
+        auth_manager = EmailAlertManager('127.0.0.1', auth_sink.port, use_starttls=False)
+        auth_manager.email_user, auth_manager.email_password = 'alertes@hopital.test', 'secret'
+        sent_ok = auth_manager.send_malfunction_alert(60.0, 6, 10, 40, 'designation', 'gastroscope')
+        auth_sink.close()
+        check(results, 'login', sent_ok and auth_sink.logins == [('PLAIN', 'alertes@hopital.test', 'secret')]
+              and auth_sink.commands[:2] == ['EHLO', 'AUTH'] and len(auth_sink.messages) == 1,
+              f"commands {' '.join(auth_sink.commands)}, {len(auth_sink.logins)} login(s)")
+
+        # A critical designation rule fires when the third gastroscope breaks
+        rule_db = DatabaseManager(os.path.join(workdir, 'rule.db'))
+        rule_db.save_alert_rule('taux_panne', 'designation', 'Gastroscope', 30, None, 'critique')
+        for i, etat in enumerate(['fonctionnel', 'fonctionnel', 'en panne']):
+            rule_db.add_endoscope('Gastroscope', 'OLYMPUS', 'GIF-H190', f"RULE-{i}", etat, '', 'En stock', 'bench')
+        rule_sink = SMTPSink()
+        rule_manager = EmailAlertManager('127.0.0.1', rule_sink.port, use_starttls=False)
+        rule_dispatcher = EmailAlertDispatcher(rule_db, rule_manager, base_delay=0)
+        rule_dispatcher.run_once()
+        rule_dispatcher.stop()
+        rule_sink.close()
+        body = html_body(rule_sink.messages[0]) if rule_sink.messages else ''
+        check(results, 'rule', "designation « gastroscope »" in body and "30%" in body and "33.3%" in body
+              and "50%" not in body,
+              f"{len(rule_sink.messages)} mail(s) stating the scope, 30% threshold and 33.3% rate")
+
+        queue(db, 5, 'SEND')
+        sent = dispatcher.run_once()
+        body = html_body(sink.messages[-1])
+        check(results, 'send', sent == 5 and len(sink.messages) == 5 and sink.sessions == 1,
+              f"{sent} sent, {len(sink.messages)} received over {sink.sessions} session(s)")
+        check(results, 'escape', '&lt;b&gt;canal&lt;/b&gt; &amp; &quot;gaine&quot;' in body and '<b>canal' not in body,
+              "nature_panne HTML-escaped in the body")
+
+        sink.drop_sessions()
+        time.sleep(0.1)
+        queue(db, 3, 'RECONNECT')
+        sent = dispatcher.run_once()
+        check(results, 'reconnect', sent == 3 and len(sink.messages) == 8 and sink.sessions == 2,
+              f"{sent} sent after the session was dropped, {sink.sessions} sessions")
+
+        sink.refuse = 1
+        [retried] = queue(db, 1, 'RETRY')
+        first = dispatcher.run_once()
+        attempts_after_refusal = outbox(db)[retried]['attempts']
+        second = dispatcher.run_once()
+        status = outbox(db)[retried]['status']
+        check(results, 'retry', first == 0 and attempts_after_refusal == 1 and second == 1 and status == 'sent',
+              f"refused then sent on the next pass (status {status})")
+
+        sink.refuse = 2
+        [given_up] = queue(db, 1, 'GIVEUP')
+        dispatcher.run_once()
+        dispatcher.run_once()
+        entry = outbox(db)[given_up]
+        check(results, 'give up', entry['status'] == 'failed' and entry['attempts'] == 2,
+              f"status {entry['status']} after {entry['attempts']} attempts, last error {entry['last_error']!r}")
+
+        leased = set(queue(db, 4, 'LEASE'))
+        claimed = {alert['id'] for alert in db.claim_due_email_alerts(limit=10, lease_seconds=2)}
+        other_worker = {alert['id'] for alert in db.claim_due_email_alerts(limit=10)}
+        check(results, 'lease', claimed == leased and not other_worker,
+              f"{len(claimed)} claimed, {len(other_worker)} handed to a second worker")
+        # The first worker never reports back (it died): once the lease is over the alerts are due again
+        time.sleep(3)
+        reclaimed = {alert['id'] for alert in db.claim_due_email_alerts(limit=10)}
+        check(results, 'lease expiry', reclaimed == leased, f"{len(reclaimed)} reclaimed after the lease expired")
+        dispatcher._close_server()
+
+        queue(db, args.alerts, 'BULK')
+        dispatcher = EmailAlertDispatcher(db, manager, batch_size=args.alerts)
+        before = len(sink.messages)
+        start = time.perf_counter()
+        sent = dispatcher.run_once()
+        elapsed = time.perf_counter() - start
+        dispatcher.stop()
+        results['bulk'] = {'alerts': args.alerts, 'sent': sent, 'duration_s': round(elapsed, 3),
+                           'per_second': round(sent / elapsed, 1)}
+        check(results, 'bulk', sent == args.alerts and len(sink.messages) - before == args.alerts,
+              f"{sent} alerts in {elapsed:.2f} s ({sent / elapsed:.0f}/s) over one session")
+    sink.close()
+
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump(results, f, indent=2)
+    print(f"Results written to {args.output}")
+    if not all(result['ok'] for result in results['checks'].values()):
+        print("FAILED")
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,157 @@
+"""Federated reads over synthetic site databases, sequential against parallel.
+
+Generates N site databases (different seeds), then times the regional
+dashboard and archive queries through FederatedDatabaseManager with one
+worker (each site in turn) and with the default thread pool, on local files
+and with a per-query latency standing for site databases reached over the
+network, and checks the merged totals against the per-site ones. Then the
+sites are given by path, with one path that does not exist and one copy of a
+site on an older schema, to check that the files are read without being
+modified and that both are reported as errors over all the page's queries.
+Finally one site is made slow and the federated dashboard is timed again, to
+check that it answers within the site timeout with the other sites' results.
+
+Usage: python benchmarks/bench_federation.py [--sites 20] [--scale 1] [--repeat 5] [--latency 0.02]
+                                             [--slow-delay 3] [--timeout 1] [--output bench_federation.json]
+"""
+import argparse
+import json
+import os
+import shutil
+import sqlite3
+import statistics
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from database import DatabaseManager  # noqa: E402
+from federation import FederatedDatabaseManager, merge_site_status  # noqa: E402
+from synthetic_data import generate  # noqa: E402
+
+QUERIES = {
+    'get_dashboard_stats': (),
+    'get_malfunction_percentage': (),
+    'get_endoscope_availability_by_type': (),
+    'get_recent_breakdowns': (30, ),
+    'search_sterilisation_reports': ('Gastro', None, None, None, 500),
+}
+
+
+class SlowSite:
+    """A site database answering after a delay, as over a network link"""
+
+    def __init__(self, db, delay):
+        self.db = db
+        self.delay = delay
+
+    def __getattr__(self, name):
+        method = getattr(self.db, name)
+        if not callable(method):
+            return method
+
+        def slow(*args, **kwargs):
+            time.sleep(self.delay)
+            return method(*args, **kwargs)
+        return slow
+
+
+def timed(fn, repeat):
+    durations = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        durations.append((time.perf_counter() - start) * 1000)
+    return round(statistics.median(durations), 1)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sites', type=int, default=20)
+    parser.add_argument('--scale', type=int, default=1)
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--latency', type=float, default=0.02, help="seconds added to each site query")
+    parser.add_argument('--slow-delay', type=float, default=3.0)
+    parser.add_argument('--timeout', type=float, default=1.0)
+    parser.add_argument('--output', default='bench_federation.json')
+    args = parser.parse_args()
+
+    results = {'sites': args.sites, 'scale': args.scale, 'queries': {}}
+    with tempfile.TemporaryDirectory() as workdir:
+        print(f"Generating {args.sites} sites at scale {args.scale}...")
+        sites, paths = {}, {}
+        for i in range(args.sites):
+            path = os.path.join(workdir, f"site{i:02d}.db")
+            generate(path, scale=args.scale, seed=i)
+            sites[f"Site {i:02d}"] = DatabaseManager(path)
+            paths[f"Site {i:02d}"] = path
+
+        for latency in sorted({0.0, args.latency}):
+            remote = {label: SlowSite(db, latency) for label, db in sites.items()} if latency else sites
+            sequential = FederatedDatabaseManager(remote, timeout=30, max_workers=1)
+            parallel = FederatedDatabaseManager(remote, timeout=30)
+            for method, query_args in QUERIES.items():
+                one = timed(lambda: getattr(sequential, method)(*query_args), args.repeat)
+                pool = timed(lambda: getattr(parallel, method)(*query_args), args.repeat)
+                results['queries'][f"{method}@{latency * 1000:.0f}ms"] = {'sequential_ms': one, 'parallel_ms': pool}
+                print(f"{method} (latency {latency * 1000:.0f} ms): sequential {one} ms, parallel {pool} ms "
+                      f"({one / pool:.1f}x)")
+            sequential.close()
+            parallel.close()
+
+        federation = FederatedDatabaseManager(sites)
+        expected = sum(db.get_malfunction_percentage()[2] for db in sites.values())
+        total = federation.get_dashboard_stats()[0]['total_endoscopes']
+        results['totals_match'] = bool(total == expected)
+        print(f"Total endoscopes: {total} federated, {expected} summed per site")
+        federation.close()
+
+        missing = os.path.join(workdir, "absent.db")
+        old = os.path.join(workdir, "old_schema.db")
+        shutil.copy(next(iter(paths.values())), old)
+        with sqlite3.connect(old) as conn:
+            # get_recent_breakdowns reads nature_panne and returns an empty frame when it fails
+            conn.execute("ALTER TABLE sterilisation_reports DROP COLUMN nature_panne")
+        modified = {path: os.stat(path).st_mtime_ns for path in [*paths.values(), old]}
+        federation = FederatedDatabaseManager({**paths, 'Absent': missing, 'Ancien': old})
+        statuses = [federation.get_dashboard_stats()[1], federation.get_recent_breakdowns(30)[1],
+                    federation.search_sterilisation_reports('Gastro')[1]]
+        status = merge_site_status(*statuses).set_index('site')['status']
+        federation.close()
+        untouched = all(os.stat(path).st_mtime_ns == mtime for path, mtime in modified.items())
+        results['read_only'] = {'untouched': untouched, 'missing_status': status['Absent'],
+                                'old_schema_status': status['Ancien'], 'missing_created': os.path.exists(missing),
+                                'answered': int((status == 'ok').sum())}
+        print(f"Sites by path: files untouched {untouched}, missing site {status['Absent']} "
+              f"(file created: {os.path.exists(missing)}), older schema {status['Ancien']}, "
+              f"{results['read_only']['answered']} sites answered")
+
+        slow_label = next(iter(sites))
+        slow_sites = {**sites, slow_label: SlowSite(sites[slow_label], args.slow_delay)}
+        federation = FederatedDatabaseManager(slow_sites, timeout=args.timeout)
+        start = time.perf_counter()
+        stats, status = federation.get_dashboard_stats()
+        elapsed = time.perf_counter() - start
+        status = merge_site_status(status)
+        answered = int((status['status'] == 'ok').sum())
+        results['slow_site'] = {'delay_s': args.slow_delay, 'timeout_s': args.timeout, 'elapsed_s': round(elapsed, 2),
+                                'answered': answered, 'total_endoscopes': int(stats['total_endoscopes'])}
+        print(f"One site {args.slow_delay} s slow, timeout {args.timeout} s: answered in {elapsed:.2f} s "
+              f"with {answered}/{args.sites} sites")
+        federation.close()
+
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump(results, f, indent=2)
+    print(f"Results written to {args.output}")
+
+    read_only = results['read_only']
+    if (not results['totals_match'] or answered != args.sites - 1 or elapsed > args.timeout + 0.5
+            or not read_only['untouched'] or read_only['missing_status'] != 'error' or read_only['missing_created']
+            or read_only['old_schema_status'] != 'error' or read_only['answered'] != args.sites):
+        print("FAILED")
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,161 @@
+"""Sustained insert rate of the ingestion API under concurrent clients.
+
+Starts ingest_api on a scratch copy of a synthetic database, then N client
+threads each post batches of cycles over a keep-alive connection for the
+given number of batches. Reports cycles inserted per second and request
+latency percentiles, then resends every batch and checks that nothing was
+created twice.
+
+Usage: python benchmarks/bench_ingest_api.py [--scale 1] [--clients 8] [--batches 50] [--batch-size 100]
+                                             [--pool-size 4] [--output bench_ingest_api.json]
+"""
+import argparse
+import http.client
+import json
+import os
+import random
+import sqlite3
+import statistics
+import sys
+import tempfile
+import threading
+import time
+from datetime import date, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from ingest_api import API_PATH, create_server  # noqa: E402
+from synthetic_data import MEDECINS, OPERATEURS, PANNES, SALLES, TYPES_ACTE, generate  # noqa: E402
+
+TOKEN = 'bench-token'
+SOURCE = 'laveur-bench'
+
+
+def make_batches(serials, clients, batches, batch_size, seed=42):
+    """batches[client][i]: list of cycles with unique keys, ~0.3% breakdowns"""
+    rng = random.Random(seed)
+    today = date.today()
+    plan = []
+    for client in range(clients):
+        client_batches = []
+        for batch in range(batches):
+            cycles = []
+            for i in range(batch_size):
+                start = rng.randrange(6 * 60, 19 * 60)
+                broken = rng.random() < 0.003
+                cycles.append({
+                    'idempotency_key': f"{client}-{batch}-{i}",
+                    'numero_serie': rng.choice(serials),
+                    'nom_operateur': rng.choice(OPERATEURS),
+                    'medecin_responsable': rng.choice(MEDECINS),
+                    'date_desinfection': (today - timedelta(days=rng.randrange(30))).isoformat(),
+                    'type_desinfection': 'automatique',
+                    'cycle': 'complet',
+                    'test_etancheite': 'échoué' if broken else 'réussi',
+                    'heure_debut': f"{start // 60:02d}:{start % 60:02d}",
+                    'heure_fin': f"{(start + 40) // 60:02d}:{(start + 40) % 60:02d}",
+                    'salle': rng.choice(SALLES),
+                    'type_acte': rng.choice(TYPES_ACTE),
+                    'etat_endoscope': 'en panne' if broken else 'fonctionnel',
+                    'nature_panne': rng.choice(PANNES) if broken else None,
+                })
+            client_batches.append(cycles)
+        plan.append(client_batches)
+    return plan
+
+
+def run_clients(port, plan):
+    """Post every batch; returns (elapsed seconds, latencies in ms, responses)"""
+    latencies, responses = [], []
+    lock = threading.Lock()
+    barrier = threading.Barrier(len(plan) + 1)
+
+    def client(batches):
+        conn = http.client.HTTPConnection('127.0.0.1', port, timeout=120)
+        headers = {'Authorization': f"Bearer {TOKEN}", 'Content-Type': 'application/json'}
+        barrier.wait()
+        for cycles in batches:
+            body = json.dumps({'cycles': cycles})
+            start = time.perf_counter()
+            conn.request('POST', API_PATH, body=body, headers=headers)
+            response = conn.getresponse()
+            payload = json.loads(response.read())
+            with lock:
+                latencies.append((time.perf_counter() - start) * 1000)
+                responses.append((response.status, payload))
+        conn.close()
+
+    threads = [threading.Thread(target=client, args=(batches, )) for batches in plan]
+    for thread in threads:
+        thread.start()
+    barrier.wait()
+    start = time.perf_counter()
+    for thread in threads:
+        thread.join()
+    return time.perf_counter() - start, latencies, responses
+
+
+def summarize(elapsed, latencies, responses):
+    created = sum(payload.get('created', 0) for _, payload in responses)
+    duplicates = sum(payload.get('duplicates', 0) for _, payload in responses)
+    quantiles = statistics.quantiles(latencies, n=100)
+    return {
+        'requests': len(responses), 'errors': sum(1 for status, _ in responses if status != 200),
+        'created': created, 'duplicates': duplicates, 'elapsed_s': round(elapsed, 2),
+        'cycles_per_s': round((created + duplicates) / elapsed, 1),
+        'p50_ms': round(quantiles[49], 1), 'p95_ms': round(quantiles[94], 1), 'p99_ms': round(quantiles[98], 1),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--scale', type=int, default=1)
+    parser.add_argument('--clients', type=int, default=8)
+    parser.add_argument('--batches', type=int, default=50)
+    parser.add_argument('--batch-size', type=int, default=100)
+    parser.add_argument('--pool-size', type=int, default=4)
+    parser.add_argument('--output', default='bench_ingest_api.json')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as workdir:
+        db_path = os.path.join(workdir, 'bench.db')
+        print(f"Generating scale {args.scale} database...")
+        generate(db_path, scale=args.scale)
+        with sqlite3.connect(db_path) as conn:
+            serials = [row[0] for row in conn.execute("SELECT numero_serie FROM endoscopes")]
+            reports_before = conn.execute("SELECT COUNT(*) FROM sterilisation_reports").fetchone()[0]
+
+        server = create_server(db_path, '127.0.0.1', 0, args.pool_size, tokens={TOKEN: SOURCE})
+        port = server.server_address[1]
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        plan = make_batches(serials, args.clients, args.batches, args.batch_size)
+        try:
+            first = summarize(*run_clients(port, plan))
+            print(f"First submission: {first['created']} cycles in {first['elapsed_s']} s = "
+                  f"{first['cycles_per_s']:.0f} cycles/s (p50 {first['p50_ms']} ms, p95 {first['p95_ms']} ms, "
+                  f"p99 {first['p99_ms']} ms, {first['errors']} errors)")
+            replay = summarize(*run_clients(port, plan))
+            print(f"Resubmission: {replay['created']} created, {replay['duplicates']} duplicates in "
+                  f"{replay['elapsed_s']} s = {replay['cycles_per_s']:.0f} cycles/s")
+        finally:
+            server.shutdown()
+            server.server_close()
+            server.service.db.pool.close()
+
+        with sqlite3.connect(db_path) as conn:
+            inserted = conn.execute("SELECT COUNT(*) FROM sterilisation_reports").fetchone()[0] - reports_before
+
+    expected = args.clients * args.batches * args.batch_size
+    results = {'clients': args.clients, 'batch_size': args.batch_size, 'pool_size': args.pool_size,
+               'first': first, 'replay': replay, 'inserted': inserted, 'expected': expected}
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump(results, f, indent=2)
+    print(f"Results written to {args.output}")
+
+    if first['errors'] or replay['errors'] or inserted != expected or replay['created']:
+        print(f"FAILED: {inserted} reports inserted for {expected} cycles, {replay['created']} created on resubmission")
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
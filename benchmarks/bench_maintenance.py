@@ -0,0 +1,94 @@
+"""Off-peak maintenance on a purged database with a concurrent writer.
+
+Generates a synthetic database, purges the usage reports and the oldest
+sterilisation reports as an administrator would, then runs every
+maintenance task while a writer adds usage reports for the first seconds.
+Reports the free pages and file size before and after, the longest
+maintenance step, the back-offs caused by the writer and the writer latency.
+
+Usage: python benchmarks/bench_maintenance.py [--scale 10] [--busy 5] [--vacuum-pages 256]
+                                              [--output bench_maintenance.json]
+"""
+import argparse
+import json
+import os
+import statistics
+import sys
+import tempfile
+import threading
+import time
+from datetime import date, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from database import DatabaseManager  # noqa: E402
+from maintenance import MaintenanceScheduler  # noqa: E402
+from synthetic_data import generate  # noqa: E402
+
+
+def writer(db, seconds, latencies):
+    serial = db.get_endoscope_index().popitem()[1][1]
+    deadline = time.monotonic() + seconds
+    while time.monotonic() < deadline:
+        start = time.perf_counter()
+        db.add_usage_report('bench', 'Gastroscope', serial, 'Dr bench', 'fonctionnel', None, 'bench')
+        latencies.append((time.perf_counter() - start) * 1000)
+        time.sleep(0.05)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--scale', type=int, default=10)
+    parser.add_argument('--busy', type=float, default=5.0, help="seconds of user writes at the start")
+    parser.add_argument('--vacuum-pages', type=int, default=256)
+    parser.add_argument('--output', default='bench_maintenance.json')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as workdir:
+        db_path = os.path.join(workdir, 'bench.db')
+        print(f"Generating scale {args.scale} database...")
+        generate(db_path, scale=args.scale)
+        db = DatabaseManager(db_path)
+        conn = db.get_connection()
+        conn.execute("DELETE FROM sterilisation_reports WHERE date_desinfection < ?",
+                     (str(date.today() - timedelta(days=180)), ))
+        conn.commit()
+        conn.close()
+        purged = db.purge_all_usage_reports()
+        before = db.get_database_statistics()['storage']
+        print(f"After purge ({purged} usage reports + old sterilisation reports): "
+              f"{before['db_bytes'] / 1e6:.1f} MB, {before['freelist_count']} free pages of {before['page_count']}")
+
+        latencies = []
+        thread = threading.Thread(target=writer, args=(db, args.busy, latencies))
+        scheduler = MaintenanceScheduler(db, vacuum_pages=args.vacuum_pages, base_backoff=0.5, max_backoff=2.0)
+        thread.start()
+        time.sleep(0.2)
+        start = time.perf_counter()
+        results = scheduler.run_once(force=True)
+        elapsed = time.perf_counter() - start
+        thread.join()
+
+        stats = db.get_database_statistics()
+        after = stats['storage']
+        runs = stats['maintenance'].to_dict('records')
+
+    for task, detail in results.items():
+        print(f"  {task}: {detail}")
+    longest = max(run['longest_step_ms'] for run in runs)
+    print(f"Maintenance: {elapsed:.1f} s with {scheduler.backoffs} back-offs, longest step {longest:.0f} ms")
+    print(f"After maintenance: {after['db_bytes'] / 1e6:.1f} MB, {after['freelist_count']} free pages of "
+          f"{after['page_count']}")
+    quantiles = statistics.quantiles(latencies, n=100, method='inclusive')
+    print(f"Writer: {len(latencies)} writes, p50 {quantiles[49]:.1f} ms, max {max(latencies):.1f} ms")
+
+    output = {'scale': args.scale, 'vacuum_pages': args.vacuum_pages, 'before': before, 'after': after,
+              'duration_s': round(elapsed, 2), 'backoffs': scheduler.backoffs, 'longest_step_ms': longest,
+              'runs': runs, 'writer_p50_ms': round(quantiles[49], 1), 'writer_max_ms': round(max(latencies), 1)}
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump(output, f, indent=2, default=str)
+    print(f"Results written to {args.output}")
+
+
+if __name__ == '__main__':
+    main()
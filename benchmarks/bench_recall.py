@@ -0,0 +1,121 @@
+"""Time recall traces on a large history against filtering a full pandas dump.
+
+Fills a database with daily sterilisation reports spread over several rooms
+plus usage reports, then traces random devices over 90 days and one year
+(device rows + same-day room neighbours) and checks the query plans use the
+range-scan indexes.
+
+Usage: python benchmarks/bench_recall.py [--endoscopes 1000] [--years 3] [--salles 20]
+(the defaults produce ~1.1M sterilisation reports)
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import date, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from database import DatabaseManager  # noqa: E402
+
+
+def populate(db, n_endoscopes, years, n_salles, seed=42):
+    rng = random.Random(seed)
+    start = date.today() - timedelta(days=365 * years)
+    conn = db.get_connection()
+    cursor = conn.cursor()
+    salles = db.dimensions.resolve(cursor, 'salle', [f"Salle {i}" for i in range(n_salles)])
+    type_acte_id = db.dimensions.resolve(cursor, 'type_acte', ['endoscopie'])['endoscopie']
+    salle_names = list(salles)
+    reports, usages = [], []
+    day = start
+    while day < date.today():
+        for i in range(n_endoscopes):
+            reports.append(('bench', 'Gastroscope', f"SN{i:06d}", f"Dr {i % 40}", str(day), 'automatique',
+                            'complet', 'réussi', f"{rng.randint(7, 18):02d}:{rng.choice(['00', '30'])}", '23:00',
+                            'N/A', (salle := rng.choice(salle_names)), 'endoscopie', salles[salle], type_acte_id,
+                            'fonctionnel', None, 'bench'))
+            if rng.random() < 0.1:
+                usages.append(('bench', 'Gastroscope', f"SN{i:06d}", f"Dr {i % 40}", 'fonctionnel', None,
+                               f"{day} {rng.randint(7, 18):02d}:00:00", 'bench'))
+        if len(reports) > 200000:
+            _insert(conn, reports, usages)
+            reports, usages = [], []
+        day += timedelta(days=1)
+    _insert(conn, reports, usages)
+    count = conn.execute("SELECT COUNT(*) FROM sterilisation_reports").fetchone()[0]
+    conn.close()
+    return count
+
+
+def _insert(conn, reports, usages):
+    conn.executemany(
+        """INSERT INTO sterilisation_reports
+           (nom_operateur, endoscope, numero_serie, medecin_responsable, date_desinfection,
+            type_desinfection, cycle, test_etancheite, heure_debut, heure_fin, procedure_medicale,
+            salle, type_acte, salle_id, type_acte_id, etat_endoscope, nature_panne, created_by)
+           VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)""", reports)
+    conn.executemany(
+        """INSERT INTO usage_reports (nom_operateur, endoscope, numero_serie, medecin, etat, nature_panne,
+                                      date_utilisation, created_by)
+           VALUES (?, ?, ?, ?, ?, ?, ?, ?)""", usages)
+    conn.commit()
+
+
+def query_plans(db):
+    conn = db.get_connection()
+    try:
+        plans = []
+        for sql in ("SELECT * FROM sterilisation_reports WHERE numero_serie = ? AND date_desinfection BETWEEN ? AND ?",
+                    "SELECT * FROM sterilisation_reports WHERE salle_id = ? AND date_desinfection BETWEEN ? AND ?",
+                    "SELECT * FROM usage_reports WHERE numero_serie = ? AND date_utilisation >= ? AND date_utilisation < ?"):
+            plans.extend(row[-1] for row in conn.execute(f"EXPLAIN QUERY PLAN {sql}", ('x', 'a', 'b')))
+        return plans
+    finally:
+        conn.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--endoscopes', type=int, default=1000)
+    parser.add_argument('--years', type=int, default=3)
+    parser.add_argument('--salles', type=int, default=20)
+    parser.add_argument('--traces', type=int, default=10)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db = DatabaseManager(os.path.join(tmp, 'bench.db'))
+        start = time.perf_counter()
+        n_reports = populate(db, args.endoscopes, args.years, args.salles)
+        print(f"Data: {n_reports} sterilisation reports over {args.salles} rooms "
+              f"(generated in {time.perf_counter() - start:.0f} s)")
+        for plan in query_plans(db):
+            print(f"  plan: {plan}")
+
+        rng = random.Random(7)
+        end = date.today()
+        print(f"{'Trace':<28} {'avg ms':>8} {'max ms':>8} {'rows':>8}")
+        for label, days in (('90 days', 90), ('1 year', 365)):
+            timings, rows = [], 0
+            for _ in range(args.traces):
+                serie = f"SN{rng.randrange(args.endoscopes):06d}"
+                t0 = time.perf_counter()
+                trace = db.get_recall_trace(serie, end - timedelta(days=days), end)
+                timings.append(time.perf_counter() - t0)
+                rows += len(trace)
+            print(f"{'recall ' + label:<28} {sum(timings) / len(timings) * 1000:>8.1f} "
+                  f"{max(timings) * 1000:>8.1f} {rows // args.traces:>8}")
+
+        serie = f"SN{rng.randrange(args.endoscopes):06d}"
+        t0 = time.perf_counter()
+        reports = db.get_all_sterilisation_reports()
+        first = str(end - timedelta(days=90))
+        device = reports[(reports['numero_serie'] == serie) & (reports['date_desinfection'] >= first)]
+        reports[reports['salle'].isin(device['salle']) & reports['date_desinfection'].isin(device['date_desinfection'])]
+        print(f"{'pandas dump + filter 90 days':<28} {(time.perf_counter() - t0) * 1000:>8.1f}")
+
+
+if __name__ == '__main__':
+    main()
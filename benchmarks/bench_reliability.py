@@ -0,0 +1,119 @@
+"""Benchmark the incremental reliability engine on a multi-year synthetic history.
+
+Usage: python benchmarks/bench_reliability.py [--endoscopes 300] [--years 3]
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import date, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from database import DatabaseManager  # noqa: E402
+
+DESIGNATIONS = ['Gastroscope', 'Coloscope', 'Duodénoscope', 'Bronchoscope', 'Cystoscope']
+MARQUES = ['OLYMPUS', 'FUJINON', 'PENTAX', 'STORZ']
+
+
+def populate(db, n_endoscopes, years, seed=42):
+    """Insert an inventory and a daily reprocessing history with breakdown/repair episodes"""
+    rng = random.Random(seed)
+    start = date.today() - timedelta(days=365 * years)
+    conn = db.get_connection()
+    cursor = conn.cursor()
+    salle_id = db.dimensions.resolve(cursor, 'salle', ['Salle 1'])['Salle 1']
+    type_acte_id = db.dimensions.resolve(cursor, 'type_acte', ['endoscopie'])['endoscopie']
+    endoscopes, reports = [], []
+    for i in range(n_endoscopes):
+        serie = f"SN{i:06d}"
+        designation = rng.choice(DESIGNATIONS)
+        endoscopes.append((designation, rng.choice(MARQUES), f"M-{i % 17}", serie, 'fonctionnel',
+                           '', 'En utilisation', 'bench', f"{start} 08:00:00"))
+        broken_until = None
+        day = start
+        while day < date.today():
+            if broken_until and day < broken_until:
+                day += timedelta(days=1)
+                continue
+            etat = 'en panne' if rng.random() < 0.004 else 'fonctionnel'
+            if etat == 'en panne':
+                broken_until = day + timedelta(days=rng.randint(2, 21))
+            reports.append(('bench', designation, serie, 'Dr Bench', str(day), 'automatique', 'complet',
+                            'réussi', '08:00', f"{rng.randint(9, 17):02d}:{rng.randint(0, 59):02d}", 'N/A',
+                            'Salle 1', 'endoscopie', salle_id, type_acte_id, etat,
+                            'usure' if etat == 'en panne' else None, 'bench'))
+            day += timedelta(days=1)
+    conn.executemany(
+        """INSERT INTO endoscopes (designation, marque, modele, numero_serie, etat, observation,
+                                   localisation, created_by, created_at)
+           VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)""", endoscopes)
+    db.dimensions.link_endoscopes(conn)
+    conn.executemany(
+        """INSERT INTO sterilisation_reports
+           (nom_operateur, endoscope, numero_serie, medecin_responsable, date_desinfection,
+            type_desinfection, cycle, test_etancheite, heure_debut, heure_fin, procedure_medicale,
+            salle, type_acte, salle_id, type_acte_id, etat_endoscope, nature_panne, created_by)
+           VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)""", reports)
+    conn.commit()
+    conn.close()
+    return len(reports)
+
+
+def snapshot(db):
+    conn = db.get_connection()
+    try:
+        return conn.execute(
+            """SELECT numero_serie, etat, etat_since, uptime_seconds, downtime_seconds, failures, repairs
+               FROM reliability_state ORDER BY numero_serie""").fetchall()
+    finally:
+        conn.close()
+
+
+def timed(label, func, *args, **kwargs):
+    start = time.perf_counter()
+    result = func(*args, **kwargs)
+    elapsed = time.perf_counter() - start
+    print(f"{label:<45} {elapsed * 1000:10.1f} ms")
+    return result, elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--endoscopes', type=int, default=300)
+    parser.add_argument('--years', type=int, default=3)
+    parser.add_argument('--appends', type=int, default=200)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db = DatabaseManager(os.path.join(tmp, 'bench.db'))
+        n_reports = populate(db, args.endoscopes, args.years)
+        print(f"History: {args.endoscopes} endoscopes, {n_reports} reports over {args.years} years")
+
+        timed("Full rebuild (backfill + replay)", db.rebuild_reliability, backfill=True)
+
+        rng = random.Random(7)
+        start = time.perf_counter()
+        for i in range(args.appends):
+            serie = f"SN{rng.randrange(args.endoscopes):06d}"
+            etat = 'en panne' if i % 10 == 0 else 'fonctionnel'
+            db.add_sterilisation_report('bench', 'Gastroscope', serie, 'Dr Bench', date.today(), 'manuel',
+                                        'complet', 'réussi', '08:00', '23:00', 'N/A', 'Salle 1', 'endoscopie',
+                                        etat, 'usure' if etat == 'en panne' else None, 'bench')
+        incremental = (time.perf_counter() - start) / args.appends
+        print(f"{'Incremental add_sterilisation_report (avg)':<45} {incremental * 1000:10.2f} ms")
+
+        incremental_state = snapshot(db)
+        _, rebuild_time = timed("Full rebuild after appends (replay only)", db.rebuild_reliability)
+        print(f"Incremental state matches rebuild: {incremental_state == snapshot(db)}")
+        print(f"Rebuild / incremental update ratio: {rebuild_time / incremental:,.0f}x")
+
+        devices, _ = timed("get_reliability_by_device", db.get_reliability_by_device)
+        timed("group_metrics by designation", db.reliability.group_metrics, devices, 'designation')
+        timed("group_metrics by marque", db.reliability.group_metrics, devices, 'marque')
+
+
+if __name__ == '__main__':
+    main()
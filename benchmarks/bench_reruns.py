@@ -0,0 +1,162 @@
+"""Count and time the reruns caused by widget interactions: full app vs fragment.
+
+Each scenario opens a page, changes one widget and reruns twice: once as a
+full app run (what every interaction cost before the pages were split into
+fragments) and once scoped to the fragment that owns the widget, which is
+what the browser now requests. For both runs it reports the number of full
+script executions, the DatabaseManager calls and the wall time.
+
+Usage: python benchmarks/bench_reruns.py [--endoscopes 300] [--years 1]
+"""
+import argparse
+import inspect
+import os
+import shutil
+import sys
+import tempfile
+import time
+from collections import Counter
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from streamlit.runtime.fragment import MemoryFragmentStorage  # noqa: E402
+from streamlit.runtime.scriptrunner_utils.script_requests import RerunData  # noqa: E402
+from streamlit.testing.v1 import AppTest, local_script_runner  # noqa: E402
+from streamlit.testing.v1.element_tree import parse_tree_from_messages  # noqa: E402
+
+import auth  # noqa: E402
+import database  # noqa: E402
+from bench_reliability import populate  # noqa: E402
+
+# (role, page, fragment function, widget key or label, value for the app run, value for the fragment run)
+SCENARIOS = [
+    ('biomedical', 'Archives', 'show_sterilisation_archive', 'state_filter', ['en panne'], []),
+    ('biomedical', 'Archives', 'show_inventory_archive', 'inv_search_text', 'SN0001', 'SN0002'),
+    ('biomedical', 'Gestion Inventaire', 'show_inventory_tab', 'filter_print', 'en panne', 'Tous'),
+    ('sterilisation', 'Rapports de Stérilisation', 'show_sterilisation_report_form', 'steril_endoscope_search',
+     'SN00', 'SN01'),
+    ('sterilisation', 'Rapports de Stérilisation', 'show_report_management', 'Filtrer par état', 'en panne', 'Tous'),
+    ('admin', 'Dashboard', 'show_breakdown_alerts', None, None, None),
+]
+
+USERNAMES = {'admin': 'admin', 'biomedical': 'bio_eng', 'sterilisation': 'steril_agent'}
+
+counters = Counter()
+shared_storage = MemoryFragmentStorage()
+pending_fragment = []
+
+
+def instrument():
+    """Count full script runs and DatabaseManager calls; keep fragments across AppTest runs"""
+    original_check = auth.check_authentication
+
+    def counted_check(*args, **kwargs):
+        # main() checks authentication once per full run; role guards call it too
+        if sys._getframe(1).f_code.co_name == 'main':
+            counters['full_runs'] += 1
+        return original_check(*args, **kwargs)
+    auth.check_authentication = counted_check
+
+    for name, method in inspect.getmembers(database.DatabaseManager, inspect.isfunction):
+        if name.startswith('_'):
+            continue
+
+        def counted(self, *args, __method=method, **kwargs):
+            counters['db_calls'] += 1
+            return __method(self, *args, **kwargs)
+        setattr(database.DatabaseManager, name, counted)
+
+    local_script_runner.MemoryFragmentStorage = lambda: shared_storage
+    original_run = local_script_runner.LocalScriptRunner.run
+
+    def run(self, widget_state=None, query_params=None, timeout=3, page_hash=""):
+        if not pending_fragment:
+            return original_run(self, widget_state, query_params, timeout, page_hash)
+        self.request_rerun(RerunData(widget_states=widget_state, page_script_hash=page_hash,
+                                     fragment_id_queue=[pending_fragment.pop()],
+                                     is_fragment_scoped_rerun=True))
+        if not self._script_thread:
+            self.start()
+        local_script_runner.require_widgets_deltas(self, timeout)
+        return parse_tree_from_messages(self.forward_msgs())
+    local_script_runner.LocalScriptRunner.run = run
+
+
+def fragment_id(name):
+    """Id of the registered fragment wrapping the app function `name`"""
+    for fid, wrapped in shared_storage._fragments.items():
+        for cell in wrapped.__closure__ or ():
+            contents = cell.cell_contents
+            if inspect.isfunction(contents) and contents.__name__ == name:
+                return fid
+    raise LookupError(f"Fragment {name} was not registered")
+
+
+def open_page(role, page):
+    at = AppTest.from_file(os.path.join(os.getcwd(), 'app.py'), default_timeout=120)
+    at.session_state.authenticated = True
+    at.session_state.user_role = role
+    at.session_state.username = USERNAMES[role]
+    at.run()
+    if page != 'Dashboard':
+        at.sidebar.selectbox[0].set_value(page).run()
+    return at
+
+
+def set_widget(at, key, value):
+    if key is None:
+        return
+    for widget in (at.multiselect, at.selectbox, at.text_input, at.checkbox):
+        try:
+            element = widget(key=key)
+        except KeyError:
+            element = next((w for w in widget if w.label == key), None)
+        if element is not None:
+            element.set_value(value)
+            return
+    raise LookupError(f"Widget {key} not found")
+
+
+def measure(at, fragment=None):
+    counters.clear()
+    if fragment:
+        pending_fragment.append(fragment)
+    start = time.perf_counter()
+    at.run()
+    elapsed = time.perf_counter() - start
+    errors = [e.value for e in at.exception]
+    if errors:
+        raise RuntimeError(errors)
+    return counters['full_runs'], counters['db_calls'], elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--endoscopes', type=int, default=300)
+    parser.add_argument('--years', type=int, default=1)
+    args = parser.parse_args()
+
+    instrument()
+    with tempfile.TemporaryDirectory() as tmp:
+        for name in ('app.py', 'attached_assets'):
+            source = os.path.join(ROOT, name)
+            (shutil.copytree if os.path.isdir(source) else shutil.copy)(source, os.path.join(tmp, name))
+        os.chdir(tmp)
+        n_reports = populate(database.DatabaseManager('endotrace.db'), args.endoscopes, args.years)
+        print(f"Data: {args.endoscopes} endoscopes, {n_reports} reports")
+        print(f"{'Interaction':<72} {'full runs':>9} {'DB calls':>9} {'ms':>9}")
+
+        for role, page, fragment, key, app_value, fragment_value in SCENARIOS:
+            label = f"{page} / {fragment}"
+            at = open_page(role, page)
+            set_widget(at, key, app_value)
+            full = measure(at)
+            set_widget(at, key, fragment_value)
+            scoped = measure(at, fragment_id(fragment))
+            for mode, (runs, calls, elapsed) in (('app', full), ('fragment', scoped)):
+                print(f"{label + ' [' + mode + ']':<72} {runs:>9} {calls:>9} {elapsed * 1000:>9.1f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,124 @@
+"""Failure risk scoring of the whole fleet: vectorized against a per-report loop.
+
+Generates a synthetic database, then times the feature computation from all
+sterilisation reports (device_features) against a plain Python loop over the
+reports, the scoring of the fleet, and get_failure_risk after each report
+added one at a time as a sterilisation station would (incremental refresh),
+each time from a new DatabaseManager as a full rerun of the app builds one.
+Finally checks the incrementally kept features against a full recomputation.
+
+Usage: python benchmarks/bench_risk_scoring.py [--scale 10] [--appends 200] [--repeat 5]
+                                               [--output bench_risk_scoring.json]
+"""
+import argparse
+import json
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+from datetime import date
+
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from database import DatabaseManager  # noqa: E402
+from risk_scoring import COUNTERS, RiskScorer, _REPORTS, device_features, score_devices  # noqa: E402
+from synthetic_data import generate  # noqa: E402
+
+
+def loop_features(reports):
+    """Reference implementation: one pass over the reports in time order, device by device"""
+    counters = {}
+    for row in sorted(reports.itertuples(index=False), key=lambda row: (row.numero_serie, row.event_at, row.id)):
+        device = counters.setdefault(row.numero_serie, dict.fromkeys(COUNTERS, 0))
+        if row.etat_endoscope == 'en panne':
+            device.update(dict.fromkeys(COUNTERS[:-1], 0), breakdowns=device['breakdowns'] + 1)
+            continue
+        device['cycles_since_breakdown'] += 1
+        device['failed_leak_tests'] += row.test_etancheite == 'échoué'
+        device['incomplete_cycles'] += row.cycle == 'incomplet'
+        device['manual_cycles'] += row.type_desinfection == 'manuel'
+    return pd.DataFrame.from_dict(counters, orient='index')[COUNTERS]
+
+
+def timed(fn, repeat):
+    durations, result = [], None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        durations.append((time.perf_counter() - start) * 1000)
+    return result, round(statistics.median(durations), 2)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--scale', type=int, default=10)
+    parser.add_argument('--appends', type=int, default=200)
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--output', default='bench_risk_scoring.json')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as workdir:
+        db_path = os.path.join(workdir, 'bench.db')
+        print(f"Generating scale {args.scale} database...")
+        generate(db_path, scale=args.scale)
+        db = DatabaseManager(db_path)
+        conn = db.get_connection()
+        reports = pd.read_sql_query(_REPORTS, conn)
+        devices = pd.read_sql_query(
+            "SELECT id AS endoscope_id, numero_serie, designation, marque, localisation, etat, created_at "
+            "FROM endoscopes", conn)
+        conn.close()
+        print(f"{len(devices)} endoscopes, {len(reports)} sterilisation reports")
+
+        features, vectorized_ms = timed(lambda: device_features(reports), args.repeat)
+        loop, loop_ms = timed(lambda: loop_features(reports), 1)
+        same = bool((features[COUNTERS].sort_index() == loop.sort_index()).all().all())
+        print(f"Features: vectorized {vectorized_ms} ms, loop {loop_ms} ms ({loop_ms / vectorized_ms:.0f}x), "
+              f"same counters: {same}")
+        _, score_ms = timed(lambda: score_devices(devices, features), args.repeat)
+        print(f"Fleet scoring: {score_ms} ms")
+
+        _, first_ms = timed(db.get_failure_risk, 1)
+        serials = devices['numero_serie'].tolist()
+        rng = random.Random(7)
+        latencies = []
+        for i in range(args.appends):
+            etat = 'en panne' if i % 25 == 0 else 'fonctionnel'
+            db.add_sterilisation_report(
+                'bench', 'Gastroscope', rng.choice(serials), 'Dr bench', date.today(),
+                rng.choice(['manuel', 'automatique']), rng.choice(['complet', 'complet', 'incomplet']),
+                rng.choice(['réussi', 'réussi', 'échoué']), '08:00', '23:59', 'N/A', 'Bloc 1', 'Gastroscopie',
+                etat, 'usure' if etat == 'en panne' else None, 'bench')
+            db = DatabaseManager(db_path)
+            start = time.perf_counter()
+            db.get_failure_risk()
+            latencies.append((time.perf_counter() - start) * 1000)
+        incremental_ms = round(statistics.median(latencies), 2)
+        print(f"get_failure_risk: first call {first_ms} ms, after each new report {incremental_ms} ms "
+              f"(median of {args.appends}; {db.risk.incremental_refreshes} incremental, "
+              f"{db.risk.full_refreshes} full refreshes)")
+
+        conn = db.get_connection()
+        reference = RiskScorer().refresh(conn)
+        conn.close()
+        matches = bool(db.risk._features[COUNTERS].sort_index().equals(reference[COUNTERS].sort_index()))
+        print(f"Incremental features match a full recomputation: {matches}")
+
+    results = {'scale': args.scale, 'endoscopes': len(devices), 'reports': len(reports),
+               'features_vectorized_ms': vectorized_ms, 'features_loop_ms': loop_ms, 'same_counters': same,
+               'fleet_scoring_ms': score_ms, 'first_call_ms': first_ms, 'incremental_call_ms': incremental_ms,
+               'incremental_matches': matches, 'full_refreshes': db.risk.full_refreshes}
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump(results, f, indent=2)
+    print(f"Results written to {args.output}")
+    if not (same and matches and db.risk.full_refreshes == 1):
+        print("FAILED")
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,123 @@
+"""Time-to-first-render of the login page in a fresh interpreter.
+
+Each run starts `python -X importtime`, imports Streamlit's AppTest and
+times the first run of app.py until login_form() has rendered (app
+imports, database initialisation, login page), in a scratch directory so
+the repository's endotrace.db is not touched. The importtime log gives
+the cost of each top-level import. The run fails (exit status 1) when a
+module that should load lazily (plotly.express, reportlab, qrcode) was
+imported for the login page, or, with --baseline, when the median render
+time is more than --tolerance slower than the baseline.
+
+Usage: python benchmarks/bench_startup.py [--runs 5] [--output bench_startup.json]
+                                          [--baseline previous.json] [--tolerance 0.2]
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Modules the login page must not import
+LAZY_MODULES = ['plotly.express', 'reportlab', 'reportlab.platypus', 'qrcode']
+# Regressions below this many milliseconds are noise
+MIN_REGRESSION_MS = 20.0
+
+CHILD = """
+import json, sys, time
+from streamlit.testing.v1 import AppTest
+start = time.perf_counter()
+at = AppTest.from_file({app!r}, default_timeout=120)
+at.run()
+print(json.dumps({{
+    'first_render_ms': (time.perf_counter() - start) * 1000,
+    'exception': [str(e.value) for e in at.exception],
+    'login_form': any(button.label == "Se connecter" for button in at.button),
+    'lazy_loaded': [name for name in {lazy!r} if name in sys.modules],
+}}))
+"""
+
+
+def parse_importtime(stderr):
+    """{module: cumulative ms} of the top-level imports in a -X importtime log"""
+    imports = {}
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative, name = line[len('import time:'):].split('|')
+        if not name.startswith('  '):
+            imports[name.strip()] = int(cumulative) / 1000
+    return imports
+
+
+def run_once(workdir):
+    child = CHILD.format(app=os.path.join(ROOT, 'app.py'), lazy=LAZY_MODULES)
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join(filter(None, [ROOT, os.getenv('PYTHONPATH')])))
+    start = time.perf_counter()
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', child], cwd=workdir, env=env,
+                            capture_output=True, text=True, check=True)
+    wall_ms = (time.perf_counter() - start) * 1000
+    run = json.loads(result.stdout.strip().splitlines()[-1])
+    run['process_ms'] = wall_ms
+    run['imports'] = parse_importtime(result.stderr)
+    return run
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--output', default='bench_startup.json')
+    parser.add_argument('--baseline')
+    parser.add_argument('--tolerance', type=float, default=0.2)
+    args = parser.parse_args()
+
+    runs = []
+    for i in range(args.runs):
+        # A new directory per run: every start creates its database from init.sql
+        with tempfile.TemporaryDirectory() as workdir:
+            os.symlink(os.path.join(ROOT, 'attached_assets'), os.path.join(workdir, 'attached_assets'))
+            run = run_once(workdir)
+        runs.append(run)
+        print(f"run {i + 1}: first render {run['first_render_ms']:.0f} ms, process {run['process_ms']:.0f} ms")
+
+    imports = runs[-1]['imports']
+    results = {
+        'python': sys.version.split()[0],
+        'runs': args.runs,
+        'first_render_ms': round(statistics.median(run['first_render_ms'] for run in runs), 1),
+        'process_ms': round(statistics.median(run['process_ms'] for run in runs), 1),
+        'lazy_loaded': sorted({name for run in runs for name in run['lazy_loaded']}),
+        'exceptions': sorted({error for run in runs for error in run['exception']}),
+        'top_imports_ms': dict(sorted(imports.items(), key=lambda item: -item[1])[:15]),
+    }
+    print(f"Median first render of the login page: {results['first_render_ms']:.0f} ms "
+          f"(process {results['process_ms']:.0f} ms)")
+    for name, ms in results['top_imports_ms'].items():
+        print(f"  {name:<40} {ms:>8.1f} ms")
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump(results, f, indent=2)
+    print(f"Results written to {args.output}")
+
+    failures = []
+    if results['exceptions'] or not all(run['login_form'] for run in runs):
+        failures.append(f"login page did not render: {results['exceptions']}")
+    if results['lazy_loaded']:
+        failures.append(f"imported for the login page: {', '.join(results['lazy_loaded'])}")
+    if args.baseline:
+        with open(args.baseline, encoding='utf-8') as f:
+            before = json.load(f)['first_render_ms']
+        if results['first_render_ms'] > before * (1 + args.tolerance) + MIN_REGRESSION_MS:
+            failures.append(f"first render {before:.0f} ms -> {results['first_render_ms']:.0f} ms")
+    for failure in failures:
+        print(f"REGRESSION {failure}")
+    if failures:
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,301 @@
+"""Time every DatabaseManager method, generate_qr_code and generate_professional_pdf_report.
+
+For each scale (1x = 50 endoscopes and a year of reports, see
+synthetic_data.py) a fresh database is generated, every read is run
+--repeat times and every write once, in an order that leaves the data
+consistent. Results go to a JSON file; with --baseline, timings more than
+--tolerance slower than the baseline are listed and the exit status is 1.
+A public DatabaseManager method missing from the suite also fails the run.
+
+Usage: python benchmarks/bench_suite.py [--scales 1 10 100] [--repeat 3] [--output bench_suite.json]
+                                        [--baseline previous.json] [--tolerance 0.25]
+"""
+import argparse
+import inspect
+import io
+import json
+import os
+import platform
+import sqlite3
+import statistics
+import sys
+import tempfile
+import time
+from datetime import date, datetime, timedelta
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from database import DatabaseManager  # noqa: E402
+from pdf_reports import generate_professional_pdf_report  # noqa: E402
+from qr_codes import generate_qr_code  # noqa: E402
+from synthetic_data import generate  # noqa: E402
+
+# Not benchmarked: plumbing used by every other method
+SKIPPED_METHODS = {'get_connection'}
+# Regressions below this many milliseconds are noise
+MIN_REGRESSION_MS = 1.0
+
+
+def timed(func, repeat):
+    runs = []
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        runs.append((time.perf_counter() - start) * 1000)
+    return result, {'best_ms': round(min(runs), 3), 'median_ms': round(statistics.median(runs), 3),
+                    'runs': len(runs)}
+
+
+def sample(db):
+    """Ids and values of existing rows used as arguments"""
+    conn = db.get_connection()
+    try:
+        endoscope_id, numero_serie = conn.execute(
+            "SELECT id, numero_serie FROM endoscopes ORDER BY id LIMIT 1 OFFSET 1").fetchone()
+        report_id = conn.execute("SELECT MAX(id) FROM sterilisation_reports").fetchone()[0]
+        return {'endoscope_id': endoscope_id, 'numero_serie': numero_serie, 'report_id': report_id}
+    finally:
+        conn.close()
+
+
+def read_calls(db, s):
+    today = date.today()
+    return {
+        'authenticate_user': lambda: db.authenticate_user('admin', 'admin123'),
+        'get_all_users': db.get_all_users,
+        'get_all_endoscopes': db.get_all_endoscopes,
+        'get_all_endoscopes_arrow': db.get_all_endoscopes_arrow,
+        'get_endoscope_index': db.get_endoscope_index,
+        'search_endoscopes': lambda: db.search_endoscopes(s['numero_serie'][:5]),
+        'get_endoscope': lambda: db.get_endoscope(s['endoscope_id']),
+        'find_endoscope': lambda: db.find_endoscope(None, s['numero_serie']),
+        'get_all_usage_reports': db.get_all_usage_reports,
+        'get_user_usage_reports': lambda: db.get_user_usage_reports('steril_agent'),
+        'can_user_modify_endoscope': lambda: db.can_user_modify_endoscope('biomedical', s['endoscope_id'], 'bio_eng'),
+        'can_user_modify_usage_report': lambda: db.can_user_modify_usage_report('sterilisation', 1, 'steril_agent'),
+        'can_user_modify_sterilisation_report':
+            lambda: db.can_user_modify_sterilisation_report('sterilisation', s['report_id'], 'steril_agent'),
+        'get_dashboard_stats': db.get_dashboard_stats,
+        'get_malfunction_percentage': db.get_malfunction_percentage,
+        'get_table_versions': db.get_table_versions,
+        'get_database_statistics': db.get_database_statistics,
+        'get_all_sterilisation_reports': db.get_all_sterilisation_reports,
+        'get_all_sterilisation_reports_arrow': db.get_all_sterilisation_reports_arrow,
+        'search_sterilisation_reports':
+            lambda: db.search_sterilisation_reports(s['numero_serie'][:5], today - timedelta(days=90), today),
+        'get_user_sterilisation_reports': lambda: db.get_user_sterilisation_reports('steril_agent'),
+        'get_user_sterilisation_reports_arrow': lambda: db.get_user_sterilisation_reports_arrow('steril_agent'),
+        'get_recall_trace': lambda: db.get_recall_trace(s['numero_serie'], today - timedelta(days=90), today),
+        'export_recall_trace_csv':
+            lambda: db.export_recall_trace_csv(s['numero_serie'], today - timedelta(days=90), today, io.StringIO()),
+        'get_recent_breakdowns': db.get_recent_breakdowns,
+        'get_endoscope_availability_by_type': db.get_endoscope_availability_by_type,
+        'get_reliability_by_device': db.get_reliability_by_device,
+        'get_reliability_by_group': db.get_reliability_by_group,
+        'get_failure_risk': db.get_failure_risk,
+        'get_alert_rules': db.get_alert_rules,
+        'get_active_alerts': db.get_active_alerts,
+        'get_email_outbox': db.get_email_outbox,
+        'get_washer_log_checkpoints': db.get_washer_log_checkpoints,
+    }
+
+
+def write_calls(db, s):
+    """Writes in execution order; each step may use the state left by the previous ones"""
+    state = {}
+    today = date.today()
+    report = {'nom_operateur': 'bench', 'endoscope': 'Gastroscope', 'numero_serie': s['numero_serie'],
+              'medecin_responsable': 'Dr Bench', 'date_desinfection': today, 'type_desinfection': 'automatique',
+              'cycle': 'complet', 'test_etancheite': 'réussi', 'heure_debut': '08:00', 'heure_fin': '09:00',
+              'procedure_medicale': 'N/A', 'salle': 'Bloc 1', 'type_acte': 'Gastroscopie',
+              'etat_endoscope': 'fonctionnel', 'nature_panne': None, 'created_by': 'steril_agent'}
+
+    def remember(key, query, *params):
+        conn = db.get_connection()
+        try:
+            state[key] = conn.execute(query, params).fetchone()[0]
+        finally:
+            conn.close()
+
+    def add_endoscope():
+        result = db.add_endoscope('Gastroscope', 'OLYMPUS', 'GIF-H190', 'BENCH-0001', 'fonctionnel', '',
+                                  'En stock', 'bio_eng')
+        remember('endoscope_id', "SELECT id FROM endoscopes WHERE numero_serie = 'BENCH-0001'")
+        return result
+
+    def add_sterilisation_report():
+        result = db.add_sterilisation_report(**report)
+        remember('report_id', "SELECT MAX(id) FROM sterilisation_reports")
+        return result
+
+    def add_usage_report():
+        result = db.add_usage_report('bench', 'Gastroscope', s['numero_serie'], 'Dr Bench', 'fonctionnel', None,
+                                     'steril_agent')
+        remember('usage_id', "SELECT MAX(id) FROM usage_reports")
+        return result
+
+    def add_user():
+        result = db.add_user('bench_user', 'bench123', 'sterilisation')
+        remember('user_id', "SELECT id FROM users WHERE username = 'bench_user'")
+        return result
+
+    def save_alert_rule():
+        result = db.save_alert_rule('taux_panne', 'designation', 'Gastroscope', 40, None, 'avertissement')
+        remember('rule_id', "SELECT id FROM alert_rules WHERE scope = 'designation' AND scope_value = 'gastroscope'")
+        return result
+
+    def enqueue_email_alert():
+        return db.enqueue_email_alert('breakdown', {'endoscope': 'bench'}, f"bench:{time.time()}", 0)
+
+    def claim_due_email_alerts():
+        claimed = db.claim_due_email_alerts()
+        state['claimed'] = [alert['id'] for alert in claimed] if claimed else []
+        return claimed
+
+    def acknowledge_alert():
+        alerts = db.get_active_alerts(limit=1)
+        return db.acknowledge_alert(int(alerts.iloc[0]['id']), 'admin') if not alerts.empty else None
+
+    def ingest_washer_log_batch():
+        checkpoint = {'path': 'bench/day.csv', 'position': 4096, 'size': 4096, 'mtime': time.time(),
+                      'cycles': 20, 'rejected': 1, 'finished': 1, 'generation': 0}
+        return db.ingest_washer_log_batch(
+            [{**report, 'idempotency_key': f"bench/day.csv@{i}"} for i in range(20)], 'bench_washer',
+            [checkpoint], [('bench/day.csv', 4000, ['cycle inconnu'], {'cycle': '?'})])
+
+    bulk_ids = [s['endoscope_id'] + i for i in range(50)]
+    keyed = [{**report, 'idempotency_key': f"bench-{i}"} for i in range(20)]
+    return [
+        ('init_database', db.init_database),
+        ('add_endoscope', add_endoscope),
+        ('update_endoscope', lambda: db.update_endoscope(state['endoscope_id'], localisation='En utilisation')),
+        ('bulk_update_endoscopes',
+         lambda: db.bulk_update_endoscopes({i: {'observation': 'contrôle annuel'} for i in bulk_ids})),
+        ('add_sterilisation_report', add_sterilisation_report),
+        ('add_sterilisation_reports', lambda: db.add_sterilisation_reports([report] * 20)),
+        ('update_sterilisation_report',
+         lambda: db.update_sterilisation_report(state['report_id'], etat_endoscope='en panne',
+                                                nature_panne='Gaine endommagée')),
+        ('delete_sterilisation_report', lambda: db.delete_sterilisation_report(state['report_id'])),
+        ('ingest_sterilisation_reports', lambda: db.ingest_sterilisation_reports(keyed, 'bench')),
+        ('ingest_washer_log_batch', ingest_washer_log_batch),
+        ('add_usage_report', add_usage_report),
+        ('update_usage_report', lambda: db.update_usage_report(state['usage_id'], etat='en panne')),
+        ('delete_usage_report', lambda: db.delete_usage_report(state['usage_id'])),
+        ('delete_endoscope', lambda: db.delete_endoscope(state['endoscope_id'])),
+        ('add_user', add_user),
+        ('update_user_role', lambda: db.update_user_role(state['user_id'], 'biomedical')),
+        ('update_user_password', lambda: db.update_user_password(state['user_id'], 'bench456')),
+        ('delete_user', lambda: db.delete_user(state['user_id'])),
+        ('save_alert_rule', save_alert_rule),
+        ('delete_alert_rule', lambda: db.delete_alert_rule(state['rule_id'])),
+        ('acknowledge_alert', acknowledge_alert),
+        ('enqueue_email_alert', enqueue_email_alert),
+        ('claim_due_email_alerts', claim_due_email_alerts),
+        ('reschedule_email_alert',
+         lambda: db.reschedule_email_alert(state['claimed'][0], 'bench') if state['claimed'] else None),
+        ('mark_email_alerts_sent', lambda: db.mark_email_alerts_sent(state['claimed'][1:])),
+        ('rebuild_reliability', lambda: db.rebuild_reliability(backfill=True)),
+        ('purge_all_usage_reports', db.purge_all_usage_reports),
+        ('purge_all_endoscopes', db.purge_all_endoscopes),
+    ]
+
+
+def report_calls(db):
+    """One QR code, and the PDF of the last week of reports"""
+    endoscopes = db.get_all_endoscopes().head(1)
+    reports = db.get_all_sterilisation_reports()
+    week = reports[reports['date_desinfection'] >= str(date.today() - timedelta(days=7))]
+    row = endoscopes.iloc[0]
+    return {
+        'generate_qr_code': lambda: generate_qr_code(row['id'], row['designation'], row['numero_serie']),
+        'generate_professional_pdf_report':
+            lambda: generate_professional_pdf_report(week, "Rapports de Stérilisation", "sterilisation"),
+    }, len(week)
+
+
+def run_scale(scale, years, seed, repeat, workdir):
+    db_path = os.path.join(workdir, f"scale_{scale}.db")
+    start = time.perf_counter()
+    counts = generate(db_path, scale, years, seed)
+    result = {'scale': scale, 'data': counts, 'generate_s': round(time.perf_counter() - start, 2), 'timings': {}}
+    db = DatabaseManager(db_path)
+    s = sample(db)
+
+    calls, pdf_rows = report_calls(db)
+    result['data']['pdf_rows'] = pdf_rows
+    calls.update(read_calls(db, s))
+    for name, func in calls.items():
+        _, timing = timed(func, repeat)
+        result['timings'][name] = timing
+        print(f"  {scale:>4}x {name:<40} {timing['median_ms']:>10.2f} ms", flush=True)
+    for name, func in write_calls(db, s):
+        value, timing = timed(func, 1)
+        # Writes report failure as False; None is a plain return (init_database, nothing to acknowledge)
+        timing['ok'] = value is not False
+        result['timings'][name] = timing
+        print(f"  {scale:>4}x {name:<40} {timing['median_ms']:>10.2f} ms{'' if timing['ok'] else '  (failed)'}",
+              flush=True)
+    return result
+
+
+def regressions(results, baseline, tolerance):
+    """(scale, name, baseline ms, current ms) for timings slower than the baseline by more than tolerance"""
+    previous = {(run['scale'], name): timing['median_ms']
+                for run in baseline['scales'] for name, timing in run['timings'].items()}
+    slower = []
+    for run in results['scales']:
+        for name, timing in run['timings'].items():
+            before = previous.get((run['scale'], name))
+            if before is not None and timing['median_ms'] > before * (1 + tolerance) + MIN_REGRESSION_MS:
+                slower.append((run['scale'], name, before, timing['median_ms']))
+    return slower
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--scales', type=int, nargs='+', default=[1, 10, 100])
+    parser.add_argument('--years', type=int, default=1)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--output', default='bench_suite.json')
+    parser.add_argument('--baseline')
+    parser.add_argument('--tolerance', type=float, default=0.25)
+    args = parser.parse_args()
+    output = os.path.abspath(args.output)
+
+    with tempfile.TemporaryDirectory() as workdir:
+        runs = [run_scale(scale, args.years, args.seed, args.repeat, workdir) for scale in args.scales]
+
+    covered = set(runs[0]['timings'])
+    uncovered = sorted(name for name, _ in inspect.getmembers(DatabaseManager, inspect.isfunction)
+                       if not name.startswith('_') and name not in covered | SKIPPED_METHODS)
+    if uncovered:
+        print(f"Methods without a benchmark: {', '.join(uncovered)}")
+    results = {
+        'generated_at': datetime.now().isoformat(timespec='seconds'),
+        'python': platform.python_version(), 'sqlite': sqlite3.sqlite_version, 'platform': platform.platform(),
+        'seed': args.seed, 'years': args.years, 'repeat': args.repeat, 'uncovered': uncovered, 'scales': runs,
+    }
+
+    with open(output, 'w', encoding='utf-8') as f:
+        json.dump(results, f, indent=2, ensure_ascii=False)
+    print(f"Results written to {output}")
+
+    if args.baseline:
+        with open(args.baseline, encoding='utf-8') as f:
+            slower = regressions(results, json.load(f), args.tolerance)
+        for scale, name, before, after in slower:
+            print(f"REGRESSION {scale}x {name}: {before:.2f} ms -> {after:.2f} ms")
+        if slower:
+            sys.exit(1)
+        print(f"No regression beyond {args.tolerance:.0%} against {args.baseline}")
+    if uncovered:
+        print("FAILED: every public DatabaseManager method needs a benchmark")
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,66 @@
+"""Memory per session of the loaded tables: object frames vs typed frames.
+
+Every session holds its own copy of the frames it loads (st.cache_data hands
+out a copy per call), so the in-memory size below is paid once per open tab.
+For each loader: load time, deep memory usage and the time of the state
+filter of the report list (string comparison vs category codes).
+
+Usage: python benchmarks/bench_typed_frames.py [--endoscopes 300] [--years 1]
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from database import DatabaseManager  # noqa: E402
+from bench_reliability import populate  # noqa: E402
+
+
+def best_of(func, repeat=3):
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = func()
+        best = min(best, time.perf_counter() - start)
+    return result, best
+
+
+def filter_state(df):
+    column = df['etat_endoscope']
+    if hasattr(column, 'cat'):
+        code = column.cat.categories.get_loc('en panne')
+        return df[column.cat.codes == code]
+    return df[column == 'en panne']
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--endoscopes', type=int, default=300)
+    parser.add_argument('--years', type=int, default=1)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        db = DatabaseManager(os.path.join(tmp, 'bench.db'))
+        n_reports = populate(db, args.endoscopes, args.years)
+        print(f"Data: {args.endoscopes} endoscopes, {n_reports} reports")
+
+        loaders = [
+            ('reports (object)', lambda: db.get_all_sterilisation_reports()),
+            ('reports (typed)', lambda: db.get_all_sterilisation_reports(typed=True)),
+            ('endoscopes (object)', lambda: db.get_all_endoscopes()),
+            ('endoscopes (typed)', lambda: db.get_all_endoscopes(typed=True)),
+        ]
+        print(f"{'Frame':<22} {'load ms':>9} {'memory MB':>10} {'filter ms':>10}")
+        for label, load in loaders:
+            df, load_time = best_of(load)
+            memory = df.memory_usage(deep=True).sum()
+            filter_time = best_of(lambda: filter_state(df))[1] if 'etat_endoscope' in df else None
+            filter_label = f"{filter_time * 1000:>10.2f}" if filter_time is not None else f"{'-':>10}"
+            print(f"{label:<22} {load_time * 1000:>9.1f} {memory / 2**20:>10.2f} {filter_label}")
+
+
+if __name__ == '__main__':
+    main()
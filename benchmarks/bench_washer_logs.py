@@ -0,0 +1,176 @@
+"""Throughput of the washer log watcher on a backlog of cycle log files.
+
+Writes a backlog of washer logs (mostly one-cycle CSV files, some XML files
+and some multi-cycle daily CSV files) next to a synthetic database, then:
+
+1. reads part of the backlog in a `washer_logs.py --once` process that is
+   killed mid-run, as a crash would;
+2. reads the rest with a new watcher and reports files and cycles per second;
+3. appends cycles to some files and checks only those are read again;
+4. rewrites some daily files with fewer cycles, as a washer rotating its log
+   would, and checks their new cycles are read;
+5. checks every cycle was inserted exactly once.
+
+Usage: python benchmarks/bench_washer_logs.py [--files 100000] [--batch-size 500] [--kill-after 5]
+                                              [--output bench_washer_logs.json]
+"""
+import argparse
+import json
+import os
+import random
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import date, timedelta
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from database import DatabaseManager  # noqa: E402
+from synthetic_data import OPERATEURS, SALLES, generate  # noqa: E402
+from washer_logs import WasherLogWatcher  # noqa: E402
+
+SOURCE = 'laveurs-bench'
+CSV_HEADER = "Laveur;N° série;Début;Fin;Résultat;Test d'étanchéité;Salle;Opérateur\n"
+DAILY_EVERY = 50
+XML_EVERY = 10
+
+
+def _cycle(rng, serials, day):
+    start = rng.randrange(6 * 60, 19 * 60)
+    return (f"LAV-{rng.randrange(1, 9)}", rng.choice(serials), f"{day}T{start // 60:02d}:{start % 60:02d}:00",
+            f"{day}T{(start + 35) // 60:02d}:{(start + 35) % 60:02d}:00",
+            'OK' if rng.random() > 0.01 else 'ABORTED', 'PASS' if rng.random() > 0.003 else 'FAIL',
+            rng.choice(SALLES), rng.choice(OPERATEURS))
+
+
+def _csv_line(cycle):
+    return ';'.join(cycle) + '\n'
+
+
+def _xml_cycle(cycle):
+    washer, serial, start, end, result, leak, salle, operator = cycle
+    return (f'  <cycle washer="{washer}">\n    <serial>{serial}</serial><start>{start}</start><end>{end}</end>\n'
+            f'    <result>{result}</result><leak_test>{leak}</leak_test><room>{salle}</room>'
+            f'<operator>{operator}</operator>\n  </cycle>\n')
+
+
+def write_backlog(directory, serials, n_files, seed=42):
+    """Write n_files logs in per-day sub-directories; returns the number of cycles"""
+    rng = random.Random(seed)
+    today = date.today()
+    cycles = 0
+    for i in range(n_files):
+        day = today - timedelta(days=90 - i * 90 // n_files)
+        folder = os.path.join(directory, str(day))
+        os.makedirs(folder, exist_ok=True)
+        count = rng.randrange(20, 60) if i % DAILY_EVERY == 0 else 1
+        rows = [_cycle(rng, serials, day) for _ in range(count)]
+        cycles += count
+        if i % XML_EVERY == 1:
+            with open(os.path.join(folder, f"cycle_{i:06d}.xml"), 'w', encoding='utf-8') as f:
+                f.write('<?xml version="1.0" encoding="UTF-8"?>\n<cycles>\n')
+                f.writelines(_xml_cycle(row) for row in rows)
+                f.write('</cycles>\n')
+        else:
+            with open(os.path.join(folder, f"cycle_{i:06d}.csv"), 'w', encoding='utf-8') as f:
+                f.write(CSV_HEADER)
+                f.writelines(_csv_line(row) for row in rows)
+    return cycles
+
+
+def count(db_path, sql):
+    with sqlite3.connect(db_path) as conn:
+        return conn.execute(sql).fetchone()[0]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--files', type=int, default=100000)
+    parser.add_argument('--batch-size', type=int, default=500)
+    parser.add_argument('--kill-after', type=float, default=5.0, help="seconds before the first reader is killed")
+    parser.add_argument('--output', default='bench_washer_logs.json')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as workdir:
+        db_path = os.path.join(workdir, 'bench.db')
+        logs = os.path.join(workdir, 'laveurs')
+        print("Generating scale 1 database...")
+        generate(db_path, scale=1)
+        with sqlite3.connect(db_path) as conn:
+            serials = [row[0] for row in conn.execute("SELECT numero_serie FROM endoscopes")]
+        reports_before = count(db_path, "SELECT COUNT(*) FROM sterilisation_reports")
+
+        start = time.perf_counter()
+        expected = write_backlog(logs, serials, args.files)
+        print(f"Wrote {args.files} log files ({expected} cycles) in {time.perf_counter() - start:.1f} s")
+
+        process = subprocess.Popen(
+            [sys.executable, os.path.join(ROOT, 'washer_logs.py'), logs, '--db', db_path, '--source', SOURCE,
+             '--batch-size', str(args.batch_size), '--settle', '0', '--once'], stdout=subprocess.DEVNULL)
+        time.sleep(args.kill_after)
+        process.kill()
+        process.wait()
+        files_before_restart = count(db_path, "SELECT COUNT(*) FROM washer_log_files")
+        print(f"Reader killed after {args.kill_after} s with {files_before_restart} files checkpointed")
+
+        watcher = WasherLogWatcher(DatabaseManager(db_path), logs, SOURCE, batch_size=args.batch_size,
+                                   settle_seconds=0)
+        start = time.perf_counter()
+        stats = watcher.run_once()
+        elapsed = time.perf_counter() - start
+        print(f"Restart: {stats['files']} files, {stats['created']} cycles created, {stats['rejected']} rejected "
+              f"in {elapsed:.1f} s = {stats['files'] / elapsed:.0f} files/s, "
+              f"{(stats['created'] + stats['rejected']) / elapsed:.0f} cycles/s")
+
+        start = time.perf_counter()
+        idle = watcher.run_once()
+        idle_s = time.perf_counter() - start
+        print(f"Idle poll over {args.files} files: {idle['files']} read in {idle_s * 1000:.0f} ms")
+
+        rng = random.Random(7)
+        appended = 0
+        for root, _, names in list(os.walk(logs))[1:21]:
+            name = sorted(n for n in names if n.endswith('.csv'))[0]
+            with open(os.path.join(root, name), 'a', encoding='utf-8') as f:
+                f.write(_csv_line(_cycle(rng, serials, os.path.basename(root))))
+            appended += 1
+        time.sleep(0.01)
+        grown = watcher.run_once()
+        print(f"Appended 1 cycle to {appended} files: {grown['files']} files read, {grown['created']} created")
+
+        rotated = 0
+        for i in range(0, min(args.files, 20 * DAILY_EVERY), DAILY_EVERY):
+            day = date.today() - timedelta(days=90 - i * 90 // args.files)
+            with open(os.path.join(logs, str(day), f"cycle_{i:06d}.csv"), 'w', encoding='utf-8') as f:
+                f.write(CSV_HEADER)
+                f.writelines(_csv_line(_cycle(rng, serials, day)) for _ in range(2))
+            rotated += 1
+        time.sleep(0.01)
+        rewritten = watcher.run_once()
+        print(f"Rewrote {rotated} daily files with 2 cycles: {rewritten['files']} files read, "
+              f"{rewritten['created']} created")
+
+        inserted = count(db_path, "SELECT COUNT(*) FROM sterilisation_reports") - reports_before
+        rejected = count(db_path, "SELECT COUNT(*) FROM washer_log_rejects")
+        keys = count(db_path, f"SELECT COUNT(*) FROM ingestion_keys WHERE source = '{SOURCE}'")
+
+    total = expected + appended + 2 * rotated
+    results = {'files': args.files, 'cycles': total, 'batch_size': args.batch_size,
+               'checkpointed_before_kill': files_before_restart, 'restart': stats, 'restart_s': round(elapsed, 2),
+               'files_per_s': round(stats['files'] / elapsed, 1), 'idle_poll_ms': round(idle_s * 1000, 1),
+               'grown': grown, 'rewritten': rewritten, 'inserted': inserted, 'rejected': rejected, 'keys': keys}
+    with open(args.output, 'w', encoding='utf-8') as f:
+        json.dump(results, f, indent=2)
+    print(f"Results written to {args.output}")
+
+    if (inserted + rejected != total or keys != inserted or idle['files'] or grown['created'] != appended
+            or rewritten['created'] + rewritten['rejected'] != 2 * rotated):
+        print(f"FAILED: {inserted} inserted + {rejected} rejected for {total} cycles")
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
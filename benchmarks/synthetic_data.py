@@ -0,0 +1,149 @@
+"""Deterministic synthetic hospital data for benchmarks and load tests.
+
+Scale 1 is a 50-endoscope department; every other scale multiplies the
+inventory. Each device is used on most weekdays and reprocessed after every
+use (one sterilisation report, and a usage report for a quarter of them);
+about 0.3% of cycles end in a breakdown that keeps the device out for 3 to
+30 days. The same seed and scale always produce the same database.
+
+Rows are inserted in bulk and the derived state (dimension keys, reliability
+history, alert counters, latest-report pointers) is then built by reopening
+the database with DatabaseManager, as for a migrated database.
+
+Usage: python benchmarks/synthetic_data.py out.db [--scale 10] [--years 1] [--seed 42]
+"""
+import argparse
+import os
+import random
+import sys
+from datetime import date, timedelta
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from database import DatabaseManager  # noqa: E402
+
+BASE_ENDOSCOPES = 50
+
+# (designation, marque, modele)
+CATALOGUE = [
+    ('Gastroscope', 'OLYMPUS', 'GIF-H190'),
+    ('Coloscope', 'OLYMPUS', 'CF-H190L'),
+    ('Duodénoscope', 'OLYMPUS', 'TJF-Q190V'),
+    ('Bronchoscope', 'PENTAX', 'EB-1990i'),
+    ('Gastroscope', 'FUJINON', 'EG-760R'),
+    ('Coloscope', 'FUJINON', 'EC-760R'),
+    ('Cystoscope', 'STORZ', '27005BA'),
+    ('Nasofibroscope', 'STORZ', '11101RP'),
+]
+LOCALISATIONS = [('En utilisation', 60), ('En stock', 20), ('En zone de stérilisation', 10),
+                 ('En externe', 5), ('En réforme', 5)]
+SALLES = ['Bloc 1', 'Bloc 2', 'Bloc 3', 'Salle endoscopie 1', 'Salle endoscopie 2', 'Salle endoscopie 3',
+          'Réanimation', 'Urgences']
+TYPES_ACTE = ['Gastroscopie', 'Coloscopie', 'CPRE', 'Bronchoscopie', 'Cystoscopie', 'Écho-endoscopie']
+MEDECINS = [f"Dr {name}" for name in ('Martin', 'Bernard', 'Dubois', 'Thomas', 'Robert', 'Richard', 'Petit',
+                                       'Durand', 'Leroy', 'Moreau', 'Simon', 'Laurent')]
+OPERATEURS = ['Agent A', 'Agent B', 'Agent C', 'Agent D', 'Agent E']
+PANNES = ['Fuite au test d\'étanchéité', 'Gaine endommagée', 'Optique rayée', 'Canal opérateur obstrué',
+          'Béquillage défectueux', 'Image absente']
+
+USE_PROBABILITY = {'weekday': 0.7, 'weekend': 0.1}
+BREAKDOWN_PROBABILITY = 0.003
+REPORTS_PER_INSERT = 100000
+
+
+def generate(db_path, scale=1, years=1, seed=42):
+    """Fill db_path with a synthetic history; returns the row counts"""
+    rng = random.Random(seed)
+    db = DatabaseManager(db_path)
+    conn = db.get_connection()
+    cursor = conn.cursor()
+    salles = db.dimensions.resolve(cursor, 'salle', SALLES)
+    types_acte = db.dimensions.resolve(cursor, 'type_acte', TYPES_ACTE)
+    end = date.today()
+    start = end - timedelta(days=365 * years)
+    localisations = [name for name, weight in LOCALISATIONS for _ in range(weight)]
+
+    endoscopes, reports, usages = [], [], []
+    counts = {'endoscopes': 0, 'sterilisation_reports': 0, 'usage_reports': 0, 'breakdowns': 0}
+    for i in range(BASE_ENDOSCOPES * scale):
+        designation, marque, modele = CATALOGUE[i % len(CATALOGUE)]
+        serie = f"{marque[:3]}{i:07d}"
+        etat = 'fonctionnel'
+        broken_until = None
+        day = start
+        while day < end:
+            if broken_until:
+                if day < broken_until:
+                    day += timedelta(days=1)
+                    continue
+                broken_until = None
+                etat = 'fonctionnel'
+            if rng.random() < USE_PROBABILITY['weekday' if day.weekday() < 5 else 'weekend']:
+                hour = rng.randint(7, 17)
+                salle = rng.choice(SALLES)
+                medecin = rng.choice(MEDECINS)
+                if rng.random() < BREAKDOWN_PROBABILITY:
+                    etat = 'en panne'
+                    broken_until = day + timedelta(days=rng.randint(3, 30))
+                    counts['breakdowns'] += 1
+                panne = rng.choice(PANNES) if etat == 'en panne' else None
+                reports.append((
+                    rng.choice(OPERATEURS), designation, serie, medecin, str(day), 'automatique',
+                    'incomplet' if rng.random() < 0.01 else 'complet',
+                    'échoué' if etat == 'en panne' and rng.random() < 0.3 else 'réussi',
+                    f"{hour:02d}:{rng.choice(['00', '15', '30', '45'])}", f"{hour + 1:02d}:{rng.randint(0, 59):02d}",
+                    'N/A', salle, (type_acte := rng.choice(TYPES_ACTE)), salles[salle], types_acte[type_acte], etat,
+                    panne, 'steril_agent'))
+                if rng.random() < 0.25:
+                    usages.append((rng.choice(OPERATEURS), designation, serie, medecin, etat, panne,
+                                   f"{day} {hour:02d}:00:00", 'steril_agent'))
+            day += timedelta(days=1)
+        endoscopes.append((designation, marque, modele, serie, etat, '', rng.choice(localisations), 'bio_eng',
+                           f"{start} 08:00:00"))
+        if len(reports) >= REPORTS_PER_INSERT:
+            _insert(conn, [], reports, usages, counts)
+            reports, usages = [], []
+    _insert(conn, endoscopes, reports, usages, counts)
+    conn.close()
+
+    # Reopening builds dimension keys, reliability history, alert counters and report pointers
+    DatabaseManager(db_path)
+    return counts
+
+
+def _insert(conn, endoscopes, reports, usages, counts):
+    conn.executemany(
+        """INSERT INTO endoscopes (designation, marque, modele, numero_serie, etat, observation,
+                                   localisation, created_by, created_at)
+           VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)""", endoscopes)
+    conn.executemany(
+        """INSERT INTO sterilisation_reports
+           (nom_operateur, endoscope, numero_serie, medecin_responsable, date_desinfection,
+            type_desinfection, cycle, test_etancheite, heure_debut, heure_fin, procedure_medicale,
+            salle, type_acte, salle_id, type_acte_id, etat_endoscope, nature_panne, created_by)
+           VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)""", reports)
+    conn.executemany(
+        """INSERT INTO usage_reports (nom_operateur, endoscope, numero_serie, medecin, etat, nature_panne,
+                                      date_utilisation, created_by)
+           VALUES (?, ?, ?, ?, ?, ?, ?, ?)""", usages)
+    conn.commit()
+    counts['endoscopes'] += len(endoscopes)
+    counts['sterilisation_reports'] += len(reports)
+    counts['usage_reports'] += len(usages)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('db_path')
+    parser.add_argument('--scale', type=int, default=1)
+    parser.add_argument('--years', type=int, default=1)
+    parser.add_argument('--seed', type=int, default=42)
+    args = parser.parse_args()
+    if os.path.exists(args.db_path):
+        parser.error(f"{args.db_path} already exists")
+    counts = generate(args.db_path, args.scale, args.years, args.seed)
+    print(', '.join(f"{name}: {count}" for name, count in counts.items()))
+
+
+if __name__ == '__main__':
+    main()
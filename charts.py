@@ -0,0 +1,128 @@
+# plotly.express takes ~65 ms to import: each builder loads plotly when first called
+
+
+def availability_figure(availability_stats):
+    """Grouped availability / unavailability bars per endoscope type"""
+    import plotly.graph_objects as go
+
+    # Create the grouped bar chart with proper side-by-side grouping
+    fig_availability = go.Figure()
+    
+    # Add availability bars (dark green)
+    fig_availability.add_trace(go.Bar(
+        name='Disponibilité (%)',
+        x=availability_stats['type'],
+        y=availability_stats['disponibilite_pct'],
+        marker_color='#2E7D32',  # Dark green
+        text=availability_stats['disponibilite_pct'].apply(lambda x: f'{x}%'),
+        textposition='auto',
+        textfont=dict(color='white', size=12, family='Arial', weight='bold'),
+        width=0.4,  # Make bars thinner for better grouping
+        offset=-0.2,  # Position for grouping
+    ))
+    
+    # Add unavailability bars (coral red)
+    fig_availability.add_trace(go.Bar(
+        name='Indisponibilité (%)',
+        x=availability_stats['type'],
+        y=availability_stats['indisponibilite_pct'],
+        marker_color='#E57373',  # Coral red
+        text=availability_stats['indisponibilite_pct'].apply(lambda x: f'{x}%' if x > 0 else ''),
+        textposition='auto',
+        textfont=dict(color='white', size=12, family='Arial', weight='bold'),
+        width=0.4,  # Make bars thinner for better grouping
+        offset=0.2,  # Position for grouping
+    ))
+    
+    # Update layout for proper grouping (NOT stacking)
+    fig_availability.update_layout(
+        title=dict(
+            text="Taux de disponibilité et d'indisponibilité des endoscopes",
+            font=dict(size=16, color='black', family='Arial'),
+            x=0.5,
+            xanchor='center'
+        ),
+        xaxis=dict(
+            title="",
+            tickangle=45,
+            tickfont=dict(size=11, color='black', family='Arial'),
+            showgrid=False,
+            showline=True,
+            linecolor='black',
+            linewidth=1
+        ),
+        yaxis=dict(
+            title="Taux (%)",
+            title_font=dict(size=12, color='black', family='Arial'),
+            tickfont=dict(size=11, color='black', family='Arial'),
+            showgrid=True,
+            gridcolor='lightgray',
+            gridwidth=0.5,
+            showline=True,
+            linecolor='black',
+            linewidth=1,
+            range=[0, 110]
+        ),
+        barmode='group',  # THIS IS KEY - Group bars side by side, not stack
+        bargap=0.6,  # Space between groups
+        bargroupgap=0.15,  # Space between bars in the same group
+        height=500,
+        showlegend=True,
+        legend=dict(
+            orientation="v",
+            yanchor="top",
+            y=0.98,
+            xanchor="right",
+            x=0.98,
+            bgcolor="rgba(255,255,255,0.8)",
+            bordercolor="black",
+            borderwidth=1,
+            font=dict(size=11, color='black', family='Arial')
+        ),
+        plot_bgcolor='white',
+        paper_bgcolor='white',
+        margin=dict(l=60, r=60, t=80, b=120)
+    )
+    
+    # Add borders around the plot area
+    fig_availability.update_xaxes(mirror=True)
+    fig_availability.update_yaxes(mirror=True)
+    return fig_availability
+
+
+def status_pie(status_stats):
+    """Share of endoscopes per état"""
+    import plotly.express as px
+
+    return px.pie(
+        status_stats,
+        values='count',
+        names='etat',
+        title="Répartition par État",
+        color_discrete_map={'fonctionnel': '#4CAF50', 'en panne': '#F44336'}
+    )
+
+
+def location_bar(location_stats):
+    """Endoscope count per localisation"""
+    import plotly.express as px
+
+    return px.bar(
+        location_stats,
+        x='localisation',
+        y='count',
+        title="Répartition par Localisation",
+        color='count',
+        color_continuous_scale=["#1a3b5e", "#385EA4", '#415a77', "#155dbb", "#57b3ff"]
+    )
+
+
+def profile_icicle(flame):
+    """Icicle chart of a page's cumulative phase times (PageProfiler.flame)"""
+    import plotly.express as px
+
+    fig = px.icicle(flame, ids='id', parents='parent', names='label', values='total_ms',
+                    branchvalues='total', title="Répartition du temps cumulé (ms)")
+    fig.update_traces(root_color="lightgrey", texttemplate="%{label}<br>%{value:.0f} ms")
+    fig.update_layout(margin=dict(t=40, l=0, r=0, b=0))
+    return fig
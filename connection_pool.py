@@ -0,0 +1,88 @@
+import queue
+import sqlite3
+import threading
+
+
+class PooledConnection(sqlite3.Connection):
+    """Connection that goes back to its pool on close()"""
+
+    pool = None
+
+    def close(self):
+        if self.pool is None:
+            super().close()
+        else:
+            self.pool.release(self)
+
+    def dispose(self):
+        sqlite3.Connection.close(self)
+
+
+class ConnectionPool:
+    """Bounded pool of SQLite connections shared between threads.
+
+    DatabaseManager methods open and close a connection per call; with a
+    pool, close() hands the connection back instead, so a long-running
+    service keeps at most `size` connections open. Connections use WAL so
+    writers do not block the Streamlit app's readers, and wait up to
+    busy_timeout seconds for the write lock.
+    """
+
+    def __init__(self, db_path, size=4, busy_timeout=30.0, acquire_timeout=60.0):
+        self.db_path = db_path
+        self.size = size
+        self.busy_timeout = busy_timeout
+        self.acquire_timeout = acquire_timeout
+        self._idle = queue.LifoQueue()
+        self._opened = 0
+        self._lock = threading.Lock()
+
+    def _open(self):
+        conn = sqlite3.connect(self.db_path, timeout=self.busy_timeout, check_same_thread=False,
+                               factory=PooledConnection)
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.pool = self
+        return conn
+
+    def acquire(self):
+        """An idle connection, a new one while under size, or the next one released"""
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            pass
+        with self._lock:
+            if self._opened < self.size:
+                self._opened += 1
+                try:
+                    return self._open()
+                except Exception:
+                    self._opened -= 1
+                    raise
+        try:
+            return self._idle.get(timeout=self.acquire_timeout)
+        except queue.Empty:
+            raise sqlite3.OperationalError("No database connection available in the pool") from None
+
+    def release(self, conn):
+        """Return a connection, rolling back whatever its user left uncommitted"""
+        try:
+            if conn.in_transaction:
+                conn.rollback()
+        except sqlite3.Error:
+            with self._lock:
+                self._opened -= 1
+            conn.dispose()
+            return
+        self._idle.put(conn)
+
+    def close(self):
+        """Close the idle connections"""
+        while True:
+            try:
+                conn = self._idle.get_nowait()
+            except queue.Empty:
+                return
+            with self._lock:
+                self._opened -= 1
+            conn.dispose()
@@ -1,23 +1,155 @@
 import sqlite3
 import os
-from datetime import datetime
+import re
+import csv
+import json
+from datetime import date, datetime
 import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+
+from reliability import ReliabilityEngine, now_timestamp, report_event_time
+from alert_rules import AlertRuleEngine, normalize_scope_value
+from dimensions import DimensionStore, ENDOSCOPE_DIMENSIONS, REPORT_DIMENSIONS
+from recall import RecallTracer, TRACE_COLUMNS
+from risk_scoring import risk_scorer
+from query_log import QUERY_LOG
+
+INIT_SQL_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'init.sql')
+
+# Columns read before/after inventory writes to keep derived state in sync
+ENDOSCOPE_TRACKED_COLUMNS = ['numero_serie', 'etat', 'designation', 'localisation']
+# Inventory columns that can be changed from the batch editor
+ENDOSCOPE_EDITABLE_COLUMNS = ['designation', 'marque', 'modele', 'numero_serie', 'etat',
+                              'observation', 'localisation']
+REPORT_TRACKED_COLUMNS = ['id', 'numero_serie', 'etat_endoscope', 'test_etancheite', 'cycle',
+                          'date_desinfection', 'heure_fin']
+
+# Rows fetched per cursor batch on the Arrow read path
+ARROW_BATCH_SIZE = 10000
+
+# Typed columns of the Arrow read path; other columns keep their inferred type
+ENDOSCOPE_ARROW_TYPES = {
+    'timestamps': ['created_at', 'updated_at', 'last_reprocessed_at'],
+    'categories': ['designation', 'marque', 'modele', 'etat', 'localisation', 'created_by'],
+}
+STERILISATION_ARROW_TYPES = {
+    'dates': ['date_desinfection'],
+    'timestamps': ['created_at', 'updated_at'],
+    'categories': ['nom_operateur', 'endoscope', 'numero_serie', 'medecin_responsable', 'type_desinfection',
+                   'cycle', 'test_etancheite', 'procedure_medicale', 'salle', 'type_acte', 'etat_endoscope',
+                   'created_by'],
+}
+# Nullable pandas dtypes of the typed loaders; dictionary columns become categoricals
+TYPED_FRAME_DTYPES = {pa.int64(): pd.Int64Dtype(), pa.float64(): pd.Float64Dtype(), pa.string(): pd.StringDtype()}
+
+# Inventory columns shown to the app; the dimension keys stay internal
+ENDOSCOPE_SELECT = """
+    SELECT id, designation, marque, modele, numero_serie, etat, observation, localisation,
+           created_by, created_at, updated_at, last_reprocessed_at, last_report_id
+    FROM endoscopes"""
+# Report columns in their original order; salle / type_acte are read as entered, the keys stay internal
+STERILISATION_REPORT_SELECT = """
+    SELECT r.id, r.nom_operateur, r.endoscope, r.numero_serie, r.medecin_responsable, r.date_desinfection,
+           r.type_desinfection, r.cycle, r.test_etancheite, r.heure_debut, r.heure_fin, r.procedure_medicale,
+           r.salle, r.type_acte, r.etat_endoscope, r.nature_panne, r.created_by, r.created_at, r.updated_at
+    FROM sterilisation_reports r"""
+
+
+# Allowed values of the CHECK constraints of sterilisation_reports
+STERILISATION_REPORT_CHOICES = {
+    'type_desinfection': ['manuel', 'automatique'],
+    'cycle': ['complet', 'incomplet'],
+    'test_etancheite': ['réussi', 'échoué'],
+    'etat_endoscope': ['fonctionnel', 'en panne'],
+}
+# Fields the report forms mark as mandatory (*)
+STERILISATION_REPORT_REQUIRED = ['nom_operateur', 'endoscope', 'numero_serie', 'medecin_responsable',
+                                 'date_desinfection', 'heure_debut', 'heure_fin', 'salle', 'type_acte',
+                                 'created_by'] + list(STERILISATION_REPORT_CHOICES)
+_REPORT_TIME = re.compile(r"^(\d{1,2}):(\d{2})(?::\d{2})?$")
+
+
+def validate_sterilisation_report(report):
+    """Messages for everything the report forms would reject; empty when the report can be saved"""
+    errors = [f"Champ obligatoire manquant : {field}" for field in STERILISATION_REPORT_REQUIRED
+              if not str(report.get(field) or '').strip()]
+    for field, choices in STERILISATION_REPORT_CHOICES.items():
+        value = report.get(field)
+        if value and value not in choices:
+            errors.append(f"Valeur invalide pour {field} : {value!r} (attendu : {', '.join(choices)})")
+    if report.get('date_desinfection'):
+        try:
+            date.fromisoformat(str(report['date_desinfection'])[:10])
+        except ValueError:
+            errors.append(f"Date de désinfection invalide : {report['date_desinfection']!r}")
+    times = {}
+    for field in ('heure_debut', 'heure_fin'):
+        match = _REPORT_TIME.match(str(report.get(field) or '').strip())
+        if match and int(match.group(1)) < 24 and int(match.group(2)) < 60:
+            times[field] = (int(match.group(1)), int(match.group(2)))
+        elif report.get(field):
+            errors.append(f"Heure invalide pour {field} : {report[field]!r}")
+    if len(times) == 2 and times['heure_debut'] >= times['heure_fin']:
+        errors.append("L'heure de fin doit être postérieure à l'heure de début")
+    if report.get('etat_endoscope') == 'en panne' and not str(report.get('nature_panne') or '').strip():
+        errors.append("Veuillez spécifier la nature de la panne pour un endoscope en panne")
+    return errors
+
+
+def _arrow_column(arrays, dates, timestamps, categories, name):
+    """Concatenate the per-batch arrays of one column and apply its declared type"""
+    types = {array.type for array in arrays if array.type != pa.null()}
+    target = types.pop() if len(types) == 1 else (pa.string() if types else pa.null())
+    column = pa.chunked_array([array.cast(target) for array in arrays], type=target)
+    if name in dates:
+        column = pc.cast(pc.strptime(column, format='%Y-%m-%d', unit='s', error_is_null=True), pa.date32())
+    elif name in timestamps:
+        column = pc.strptime(column, format='%Y-%m-%d %H:%M:%S', unit='s', error_is_null=True)
+    elif name in categories:
+        column = pc.dictionary_encode(column)
+    return column
+
+
+def typed_frame(table):
+    """pandas DataFrame of an Arrow table: categoricals, datetime64 and nullable dtypes.
+
+    Parsing and encoding happen once at load, so a cached frame is several
+    times smaller than the all-object frame read_sql_query returns
+    (see benchmarks/bench_typed_frames.py).
+    """
+    return table.to_pandas(date_as_object=False, types_mapper=TYPED_FRAME_DTYPES.get)
 
 
 class DatabaseManager:
 
-    def __init__(self, db_path="endotrace.db"):
+    def __init__(self, db_path="endotrace.db", query_log=None, pool=None):
         self.db_path = db_path
+        self.query_log = query_log or QUERY_LOG
+        self.pool = pool
+        self.alert_throttle_minutes = int(os.getenv("ALERT_THROTTLE_MINUTES", "60"))
+        self.reliability = ReliabilityEngine()
+        self.alert_rules = AlertRuleEngine()
+        self.dimensions = DimensionStore()
+        self.recall = RecallTracer()
+        # Shared by the managers of this file: the app builds a new one at every full rerun
+        self.risk = risk_scorer(db_path)
         self.init_database()
 
     def init_database(self):
         """Initialize database with schema from init.sql"""
-        conn = sqlite3.connect(self.db_path)
+        conn = self.get_connection()
         try:
             # Read and execute init.sql
-            with open('init.sql', 'r', encoding='utf-8') as f:
+            with open(INIT_SQL_PATH, 'r', encoding='utf-8') as f:
                 sql_script = f.read()
             conn.executescript(sql_script)
+            self.dimensions.ensure_initialized(conn)
+            self.recall.ensure_initialized(conn)
+            self.reliability.ensure_initialized(conn)
+            self.alert_rules.ensure_initialized(conn)
+            self._ensure_report_pointers(conn)
+            self._ensure_washer_log_generation(conn)
             conn.commit()
         except Exception as e:
             print(f"Error initializing database: {e}")
@@ -25,7 +157,11 @@ class DatabaseManager:
             conn.close()
 
     def get_connection(self):
-        """Get database connection"""
+        """Get database connection (from the pool if any, instrumented while the query log is enabled)"""
+        if self.pool is not None:
+            return self.pool.acquire()
+        if self.query_log.enabled:
+            return self.query_log.connect(self.db_path)
         return sqlite3.connect(self.db_path)
 
     def authenticate_user(self, username, password):
@@ -101,6 +237,11 @@ class DatabaseManager:
                    VALUES (?, ?, ?, ?, ?, ?, ?, ?)""",
                 (designation, marque, modele, numero_serie, etat, observation,
                  localisation, created_by))
+            self.dimensions.link_endoscopes(conn, [cursor.lastrowid])
+            self._after_endoscope_write(
+                conn, cursor.lastrowid, None,
+                {'numero_serie': numero_serie, 'etat': etat, 'designation': designation,
+                 'localisation': localisation})
             conn.commit()
             return True
         except sqlite3.IntegrityError:
@@ -108,12 +249,103 @@ class DatabaseManager:
         finally:
             conn.close()
 
-    def get_all_endoscopes(self):
-        """Get all endoscopes"""
+    def get_all_endoscopes(self, typed=False):
+        """Get all endoscopes; typed=True returns categoricals, datetime64 and nullable dtypes"""
+        if typed:
+            return typed_frame(self.get_all_endoscopes_arrow())
         conn = self.get_connection()
         try:
             return pd.read_sql_query(
-                "SELECT * FROM endoscopes ORDER BY created_at DESC", conn)
+                f"{ENDOSCOPE_SELECT} ORDER BY created_at DESC", conn)
+        finally:
+            conn.close()
+
+    def get_all_endoscopes_arrow(self):
+        """Get all endoscopes as a typed pyarrow Table"""
+        conn = self.get_connection()
+        try:
+            return self._query_arrow(
+                conn, f"{ENDOSCOPE_SELECT} ORDER BY created_at DESC", **ENDOSCOPE_ARROW_TYPES)
+        finally:
+            conn.close()
+
+    def _query_arrow(self, conn, sql, params=(), dates=(), timestamps=(), categories=(),
+                     batch_size=ARROW_BATCH_SIZE):
+        """Build a pyarrow Table straight from cursor batches, without a pandas round trip"""
+        cursor = conn.execute(sql, params)
+        names = [description[0] for description in cursor.description]
+        chunks = [[] for _ in names]
+        while True:
+            rows = cursor.fetchmany(batch_size)
+            if not rows:
+                break
+            for chunk, values in zip(chunks, zip(*rows)):
+                chunk.append(pa.array(values))
+        if not chunks or not chunks[0]:
+            chunks = [[pa.array([], type=pa.string())] for _ in names]
+        table = pa.table({name: _arrow_column(arrays, dates, timestamps, categories, name)
+                          for name, arrays in zip(names, chunks)})
+        return table.unify_dictionaries()
+
+    def get_endoscope_index(self):
+        """Get a compact {id: (designation, numero_serie)} index of the inventory"""
+        conn = self.get_connection()
+        try:
+            cursor = conn.cursor()
+            cursor.execute(
+                "SELECT id, designation, numero_serie FROM endoscopes ORDER BY designation, numero_serie")
+            return {endoscope_id: (designation, numero_serie)
+                    for endoscope_id, designation, numero_serie in cursor.fetchall()}
+        finally:
+            conn.close()
+
+    def search_endoscopes(self, text, limit=50):
+        """Get ids of endoscopes whose serial number or designation starts with text"""
+        prefix = text.strip().replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_') + '%'
+        conn = self.get_connection()
+        try:
+            cursor = conn.cursor()
+            cursor.execute(
+                """SELECT id FROM endoscopes WHERE numero_serie LIKE ? ESCAPE '\\'
+                   UNION
+                   SELECT id FROM endoscopes WHERE designation LIKE ? ESCAPE '\\'
+                   LIMIT ?""",
+                (prefix, prefix, limit))
+            return [row[0] for row in cursor.fetchall()]
+        finally:
+            conn.close()
+
+    def get_endoscope(self, endoscope_id):
+        """Get one endoscope as a dict (primary-key lookup)"""
+        conn = self.get_connection()
+        try:
+            conn.row_factory = sqlite3.Row
+            cursor = conn.cursor()
+            cursor.execute(f"{ENDOSCOPE_SELECT} WHERE id = ?", (endoscope_id, ))
+            row = cursor.fetchone()
+            return dict(row) if row else None
+        finally:
+            conn.close()
+
+    def find_endoscope(self, endoscope_id=None, numero_serie=None):
+        """Resolve a scanned endoscope by id and/or serial number (indexed lookups)"""
+        conn = self.get_connection()
+        try:
+            conn.row_factory = sqlite3.Row
+            cursor = conn.cursor()
+            if endoscope_id is not None:
+                cursor.execute(f"{ENDOSCOPE_SELECT} WHERE id = ?", (endoscope_id, ))
+                row = cursor.fetchone()
+                # A QR code whose serial no longer matches the id is stale: fall back to the serial
+                if row and (numero_serie is None or row['numero_serie'].lower() == numero_serie.lower()):
+                    return dict(row)
+            if numero_serie:
+                cursor.execute(
+                    f"{ENDOSCOPE_SELECT} WHERE numero_serie = ? COLLATE NOCASE LIMIT 1",
+                    (numero_serie.strip(), ))
+                row = cursor.fetchone()
+                return dict(row) if row else None
+            return None
         finally:
             conn.close()
 
@@ -122,14 +354,21 @@ class DatabaseManager:
         conn = self.get_connection()
         try:
             cursor = conn.cursor()
+            previous = self._fetch_endoscope_state(cursor, endoscope_id)
             set_clause = ", ".join([f"{key} = ?" for key in kwargs.keys()])
             values = list(kwargs.values()) + [endoscope_id]
 
             cursor.execute(
                 f"UPDATE endoscopes SET {set_clause}, updated_at = CURRENT_TIMESTAMP WHERE id = ?",
                 values)
-            conn.commit()
             result = cursor.rowcount > 0
+            if result and set(ENDOSCOPE_DIMENSIONS) & set(kwargs):
+                self.dimensions.link_endoscopes(conn, [endoscope_id])
+            if result and previous:
+                current = {**previous, **{key: value for key, value in kwargs.items()
+                                          if key in ENDOSCOPE_TRACKED_COLUMNS}}
+                self._after_endoscope_write(conn, endoscope_id, previous, current)
+            conn.commit()
             print(f"Update endoscope {endoscope_id}: {result} rows affected")
             return result
         except Exception as e:
@@ -138,13 +377,107 @@ class DatabaseManager:
         finally:
             conn.close()
 
+    def bulk_update_endoscopes(self, changes):
+        """Apply {endoscope_id: {column: value}} edits in a single transaction.
+
+        Rows changing the same set of columns share one executemany call.
+        Returns the number of updated endoscopes, or None if nothing was saved.
+        """
+        changes = {int(endoscope_id): fields for endoscope_id, fields in changes.items() if fields}
+        if not changes:
+            return 0
+        for fields in changes.values():
+            unknown = set(fields) - set(ENDOSCOPE_EDITABLE_COLUMNS)
+            if unknown:
+                print(f"Error bulk updating endoscopes: unknown columns {sorted(unknown)}")
+                return None
+
+        conn = self.get_connection()
+        try:
+            cursor = conn.cursor()
+            ids = list(changes)
+            cursor.execute(
+                f"""SELECT id, {', '.join(ENDOSCOPE_TRACKED_COLUMNS)} FROM endoscopes
+                    WHERE id IN ({', '.join('?' * len(ids))})""", ids)
+            previous = {row[0]: dict(zip(ENDOSCOPE_TRACKED_COLUMNS, row[1:])) for row in cursor.fetchall()}
+
+            groups = {}
+            for endoscope_id, fields in changes.items():
+                if endoscope_id in previous:
+                    groups.setdefault(tuple(sorted(fields)), []).append(endoscope_id)
+            for columns, group_ids in groups.items():
+                set_clause = ", ".join(f"{column} = ?" for column in columns)
+                cursor.executemany(
+                    f"UPDATE endoscopes SET {set_clause}, updated_at = CURRENT_TIMESTAMP WHERE id = ?",
+                    [[changes[endoscope_id][column] for column in columns] + [endoscope_id]
+                     for endoscope_id in group_ids])
+            self.dimensions.link_endoscopes(
+                conn, [endoscope_id for endoscope_id in previous
+                       if set(ENDOSCOPE_DIMENSIONS) & set(changes[endoscope_id])])
+
+            for endoscope_id, before in previous.items():
+                current = {**before, **{key: value for key, value in changes[endoscope_id].items()
+                                        if key in ENDOSCOPE_TRACKED_COLUMNS}}
+                self._after_endoscope_write(conn, endoscope_id, before, current)
+            conn.commit()
+            print(f"Bulk update endoscopes: {len(previous)} rows in {len(groups)} statement(s)")
+            return len(previous)
+        except Exception as e:
+            conn.rollback()
+            print(f"Error bulk updating endoscopes: {e}")
+            return None
+        finally:
+            conn.close()
+
+    def _fetch_endoscope_state(self, cursor, endoscope_id):
+        cursor.execute(
+            f"SELECT {', '.join(ENDOSCOPE_TRACKED_COLUMNS)} FROM endoscopes WHERE id = ?",
+            (endoscope_id, ))
+        row = cursor.fetchone()
+        return dict(zip(ENDOSCOPE_TRACKED_COLUMNS, row)) if row else None
+
+    def _after_endoscope_write(self, conn, endoscope_id, previous, current):
+        """Keep reliability history, alert counters and rate alerts in sync with an inventory write"""
+        if previous is None:
+            self.reliability.record_event(conn, current['numero_serie'], current['etat'],
+                                          now_timestamp(), 'inventaire', endoscope_id)
+        elif current is None:
+            self.reliability.forget_device(conn, previous['numero_serie'])
+        else:
+            if current['numero_serie'] != previous['numero_serie']:
+                self.reliability.rename_device(conn, previous['numero_serie'], current['numero_serie'])
+            if current['etat'] != previous['etat']:
+                self.reliability.record_event(conn, current['numero_serie'], current['etat'],
+                                              now_timestamp(), 'inventaire', endoscope_id)
+
+        def counter_key(state):
+            return (state['designation'], state['localisation'], state['etat']) if state else None
+
+        fired = self.alert_rules.on_endoscope_change(conn, counter_key(previous), counter_key(current))
+        self._notify_rate_alerts(conn, fired)
+
+    def _notify_rate_alerts(self, conn, fired):
+        """Email critical malfunction-rate alerts through the outbox"""
+        for alert in fired:
+            rule = alert['rule']
+            if rule['severity'] == 'critique':
+                self._enqueue_email_alert(
+                    conn, 'malfunction_rate',
+                    {'percentage': alert['percentage'], 'broken_count': alert['broken_count'],
+                     'total_count': alert['total_count'], 'threshold': rule['threshold'],
+                     'scope': rule['scope'], 'scope_value': rule['scope_value']},
+                    f"malfunction_rate:{rule['scope']}:{rule['scope_value']}")
+
     def delete_endoscope(self, endoscope_id):
         """Delete endoscope"""
         conn = self.get_connection()
         try:
             cursor = conn.cursor()
+            previous = self._fetch_endoscope_state(cursor, endoscope_id)
             cursor.execute("DELETE FROM endoscopes WHERE id = ?",
                            (endoscope_id, ))
+            if previous and cursor.rowcount > 0:
+                self._after_endoscope_write(conn, endoscope_id, previous, None)
             conn.commit()
             result = cursor.rowcount > 0
             print(f"Delete endoscope {endoscope_id}: {result} rows affected")
@@ -197,9 +530,11 @@ class DatabaseManager:
                 "SELECT etat, COUNT(*) as count FROM endoscopes GROUP BY etat",
                 conn)
 
-            # Get location statistics, grouping by lowercase to avoid duplicates
+            # Get location statistics, grouped on the localisation key so spelling variants merge
             location_stats = pd.read_sql_query(
-                "SELECT TRIM(LOWER(localisation)) as localisation, COUNT(*) as count FROM endoscopes GROUP BY TRIM(LOWER(localisation))",
+                """SELECT l.label as localisation, c.count FROM
+                   (SELECT localisation_id, COUNT(*) as count FROM endoscopes GROUP BY localisation_id) c
+                   JOIN dim_localisation l ON l.id = c.localisation_id""",
                 conn)
 
             # Get total counts
@@ -234,6 +569,16 @@ class DatabaseManager:
         finally:
             conn.close()
     
+    def get_table_versions(self):
+        """Get the change counter of each table (bumped by triggers on every write)"""
+        conn = self.get_connection()
+        try:
+            cursor = conn.cursor()
+            cursor.execute("SELECT table_name, version FROM table_versions")
+            return dict(cursor.fetchall())
+        finally:
+            conn.close()
+    
     def get_user_usage_reports(self, username):
         """Get usage reports created by specific user"""
         conn = self.get_connection()
@@ -295,8 +640,12 @@ class DatabaseManager:
         try:
             cursor = conn.cursor()
             cursor.execute("DELETE FROM endoscopes")
+            deleted = cursor.rowcount
+            cursor.execute("DELETE FROM etat_events WHERE source = 'inventaire'")
+            self.reliability.rebuild(conn)
+            self.alert_rules.rebuild_counters(conn)
             conn.commit()
-            return cursor.rowcount
+            return deleted
         finally:
             conn.close()
     
@@ -332,10 +681,35 @@ class DatabaseManager:
             # Users by role
             result = pd.read_sql_query("SELECT role, COUNT(*) as count FROM users GROUP BY role", conn)
             stats['users_by_role'] = result
-            
+
+            stats['storage'] = self._storage_statistics(conn)
+            # Size of each table and index (None when SQLite is built without dbstat)
+            try:
+                stats['object_sizes'] = pd.read_sql_query(
+                    """SELECT d.name, COALESCE(m.type, 'table') AS type, COUNT(*) AS pages,
+                              SUM(d.pgsize) AS bytes, SUM(d.unused) AS unused_bytes
+                       FROM dbstat d LEFT JOIN sqlite_master m ON m.name = d.name
+                       GROUP BY d.name ORDER BY bytes DESC""", conn)
+            except pd.errors.DatabaseError:
+                stats['object_sizes'] = None
+            stats['maintenance'] = pd.read_sql_query(
+                """SELECT task, started_at, finished_at, duration_ms, steps, longest_step_ms, status, detail
+                   FROM maintenance_log ORDER BY id DESC LIMIT 50""", conn)
+
             return stats
         finally:
             conn.close()
+
+    def _storage_statistics(self, conn):
+        """Page counts, free pages and file sizes of the database"""
+        storage = {pragma: conn.execute(f"PRAGMA {pragma}").fetchone()[0]
+                   for pragma in ('page_size', 'page_count', 'freelist_count', 'auto_vacuum', 'journal_mode')}
+        storage['auto_vacuum'] = {0: 'none', 1: 'full', 2: 'incremental'}.get(storage['auto_vacuum'])
+        storage['free_ratio'] = storage['freelist_count'] / storage['page_count'] if storage['page_count'] else 0.0
+        storage['db_bytes'] = os.path.getsize(self.db_path) if os.path.exists(self.db_path) else 0
+        wal_path = self.db_path + '-wal'
+        storage['wal_bytes'] = os.path.getsize(wal_path) if os.path.exists(wal_path) else 0
+        return storage
     
     def add_sterilisation_report(self, nom_operateur, endoscope, numero_serie, medecin_responsable,
                                 date_desinfection, type_desinfection, cycle, test_etancheite,
@@ -344,19 +718,13 @@ class DatabaseManager:
         """Add sterilization report"""
         conn = self.get_connection()
         try:
-            cursor = conn.cursor()
-            cursor.execute(
-                """INSERT INTO sterilisation_reports 
-                   (nom_operateur, endoscope, numero_serie, medecin_responsable,
-                    date_desinfection, type_desinfection, cycle, test_etancheite,
-                    heure_debut, heure_fin, procedure_medicale, salle, type_acte,
-                    etat_endoscope, nature_panne, created_by)
-                   VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)""",
-                (nom_operateur, endoscope, numero_serie, medecin_responsable,
-                 str(date_desinfection), type_desinfection, cycle, test_etancheite,
-                 str(heure_debut), str(heure_fin), procedure_medicale, salle, type_acte,
-                 etat_endoscope, nature_panne, created_by)
-            )
+            self._insert_sterilisation_report(conn, {
+                'nom_operateur': nom_operateur, 'endoscope': endoscope, 'numero_serie': numero_serie,
+                'medecin_responsable': medecin_responsable, 'date_desinfection': date_desinfection,
+                'type_desinfection': type_desinfection, 'cycle': cycle, 'test_etancheite': test_etancheite,
+                'heure_debut': heure_debut, 'heure_fin': heure_fin, 'procedure_medicale': procedure_medicale,
+                'salle': salle, 'type_acte': type_acte, 'etat_endoscope': etat_endoscope,
+                'nature_panne': nature_panne, 'created_by': created_by})
             conn.commit()
             return True
         except Exception as e:
@@ -364,43 +732,273 @@ class DatabaseManager:
             return False
         finally:
             conn.close()
+
+    def add_sterilisation_reports(self, reports):
+        """Add several sterilization reports in a single transaction (all or nothing)"""
+        conn = self.get_connection()
+        try:
+            replays = set()
+            report_ids = [self._insert_sterilisation_report(conn, report, replays) for report in reports]
+            for numero_serie in replays:
+                self.reliability.replay_device(conn, numero_serie)
+            conn.commit()
+            return report_ids
+        except Exception as e:
+            conn.rollback()
+            print(f"Error adding sterilization reports: {e}")
+            return None
+        finally:
+            conn.close()
+
+    def ingest_sterilisation_reports(self, reports, source):
+        """Add reports from an automated source once per (source, idempotency_key), in one transaction.
+
+        Returns [(idempotency_key, report_id, created)] in input order, where a
+        key already received gives the report created the first time; None on
+        failure (nothing inserted).
+        """
+        conn = self.get_connection()
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            results = self._insert_keyed_reports(conn, reports, source)
+            conn.commit()
+            return results
+        except Exception as e:
+            conn.rollback()
+            print(f"Error ingesting sterilization reports from {source}: {e}")
+            return None
+        finally:
+            conn.close()
+
+    def _insert_keyed_reports(self, conn, reports, source):
+        cursor = conn.cursor()
+        results = []
+        replays = set()
+        for report in reports:
+            key = str(report['idempotency_key'])
+            cursor.execute(
+                "INSERT OR IGNORE INTO ingestion_keys (source, idempotency_key) VALUES (?, ?)", (source, key))
+            if not cursor.rowcount:
+                cursor.execute(
+                    "SELECT report_id FROM ingestion_keys WHERE source = ? AND idempotency_key = ?", (source, key))
+                results.append((key, cursor.fetchone()[0], False))
+                continue
+            report_id = self._insert_sterilisation_report(conn, report, replays)
+            cursor.execute(
+                "UPDATE ingestion_keys SET report_id = ? WHERE source = ? AND idempotency_key = ?",
+                (report_id, source, key))
+            results.append((key, report_id, True))
+        for numero_serie in replays:
+            self.reliability.replay_device(conn, numero_serie)
+        return results
+
+    def ingest_washer_log_batch(self, reports, source, checkpoints, rejects=()):
+        """Add parsed washer cycles and advance the read offsets of their files in one transaction.
+
+        checkpoints are dicts with path, position, size, mtime, finished,
+        generation, cycles and rejected (counts added by this batch); rejects are (path, position,
+        errors, record) tuples kept for review. Returns the number of reports
+        created, or None on failure (nothing inserted, offsets unchanged).
+        """
+        conn = self.get_connection()
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            results = self._insert_keyed_reports(conn, reports, source)
+            cursor = conn.cursor()
+            cursor.executemany(
+                """INSERT INTO washer_log_rejects (path, position, errors, record) VALUES (?, ?, ?, ?)""",
+                [(path, position, json.dumps(errors, ensure_ascii=False), json.dumps(record, ensure_ascii=False))
+                 for path, position, errors, record in rejects])
+            cursor.executemany(
+                """INSERT INTO washer_log_files (path, position, size, mtime, cycles, rejected, finished, generation)
+                   VALUES (:path, :position, :size, :mtime, :cycles, :rejected, :finished, :generation)
+                   ON CONFLICT(path) DO UPDATE SET
+                       position = excluded.position, size = excluded.size, mtime = excluded.mtime,
+                       cycles = cycles + excluded.cycles, rejected = rejected + excluded.rejected,
+                       finished = excluded.finished, generation = excluded.generation,
+                       updated_at = CURRENT_TIMESTAMP""",
+                checkpoints)
+            conn.commit()
+            return sum(1 for _, _, created in results if created)
+        except Exception as e:
+            conn.rollback()
+            print(f"Error ingesting washer logs from {source}: {e}")
+            return None
+        finally:
+            conn.close()
+
+    def get_washer_log_checkpoints(self):
+        """Get {path: (position, size, mtime, finished, generation)} for every washer log file already read"""
+        conn = self.get_connection()
+        try:
+            cursor = conn.cursor()
+            cursor.execute("SELECT path, position, size, mtime, finished, generation FROM washer_log_files")
+            return {path: (position, size, mtime, bool(finished), generation)
+                    for path, position, size, mtime, finished, generation in cursor.fetchall()}
+        finally:
+            conn.close()
+
+    def _insert_sterilisation_report(self, conn, report, replays=None):
+        """Insert one report and update everything derived from it; returns the report id.
+
+        Batch inserts pass a replays set: devices whose reliability history
+        must be replayed are collected there for the caller to replay once.
+        """
+        cursor = conn.cursor()
+        keys = self.dimensions.key_ids(cursor, report, REPORT_DIMENSIONS)
+        cursor.execute(
+            """INSERT INTO sterilisation_reports 
+               (nom_operateur, endoscope, numero_serie, medecin_responsable,
+                date_desinfection, type_desinfection, cycle, test_etancheite,
+                heure_debut, heure_fin, procedure_medicale, salle, type_acte, salle_id, type_acte_id,
+                etat_endoscope, nature_panne, created_by)
+               VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)""",
+            (report['nom_operateur'], report['endoscope'], report['numero_serie'],
+             report['medecin_responsable'], str(report['date_desinfection']), report['type_desinfection'],
+             report['cycle'], report['test_etancheite'], str(report['heure_debut']), str(report['heure_fin']),
+             report.get('procedure_medicale', 'N/A'), report['salle'], report['type_acte'],
+             keys['salle_id'], keys['type_acte_id'],
+             report['etat_endoscope'], report.get('nature_panne'), report['created_by'])
+        )
+        report_id = cursor.lastrowid
+        self.reliability.record_event(
+            conn, report['numero_serie'], report['etat_endoscope'],
+            report_event_time(report['date_desinfection'], report['heure_fin']),
+            'sterilisation', report_id, deferred=replays)
+        self._sync_endoscope_with_reports(conn, report['numero_serie'], report_id)
+        if report['etat_endoscope'] == 'en panne':
+            self._enqueue_email_alert(
+                conn, 'breakdown',
+                {'report_id': report_id, 'endoscope': report['endoscope'],
+                 'numero_serie': report['numero_serie'],
+                 'date_desinfection': str(report['date_desinfection']),
+                 'nom_operateur': report['nom_operateur'], 'nature_panne': report.get('nature_panne'),
+                 'salle': report['salle']},
+                f"breakdown:{report['numero_serie']}:{(report.get('nature_panne') or '').strip().lower()}")
+        self.alert_rules.on_sterilisation_report(conn, {**report, 'id': report_id})
+        return report_id
     
-    def get_all_sterilisation_reports(self):
-        """Get all sterilization reports"""
+    def get_all_sterilisation_reports(self, typed=False):
+        """Get all sterilization reports; typed=True returns categoricals, datetime64 and nullable dtypes"""
+        if typed:
+            return typed_frame(self.get_all_sterilisation_reports_arrow())
         conn = self.get_connection()
         try:
             return pd.read_sql_query(
-                """SELECT * FROM sterilisation_reports 
-                   ORDER BY date_desinfection DESC, created_at DESC""",
+                f"""{STERILISATION_REPORT_SELECT}
+                    ORDER BY date_desinfection DESC, created_at DESC""",
                 conn
             )
         finally:
             conn.close()
     
-    def get_user_sterilisation_reports(self, username):
+    def get_all_sterilisation_reports_arrow(self):
+        """Get all sterilization reports as a typed pyarrow Table"""
+        conn = self.get_connection()
+        try:
+            return self._query_arrow(
+                conn,
+                f"""{STERILISATION_REPORT_SELECT}
+                    ORDER BY date_desinfection DESC, created_at DESC""",
+                **STERILISATION_ARROW_TYPES)
+        finally:
+            conn.close()
+
+    def get_user_sterilisation_reports(self, username, typed=False):
         """Get sterilization reports created by specific user"""
+        if typed:
+            return typed_frame(self.get_user_sterilisation_reports_arrow(username))
         conn = self.get_connection()
         try:
             return pd.read_sql_query(
-                """SELECT * FROM sterilisation_reports 
-                   WHERE created_by = ? 
-                   ORDER BY date_desinfection DESC""",
+                f"""{STERILISATION_REPORT_SELECT}
+                    WHERE created_by = ? 
+                    ORDER BY date_desinfection DESC""",
                 conn, params=[username]
             )
         finally:
             conn.close()
+
+    def get_user_sterilisation_reports_arrow(self, username):
+        """Get sterilization reports created by specific user as a typed pyarrow Table"""
+        conn = self.get_connection()
+        try:
+            return self._query_arrow(
+                conn,
+                f"""{STERILISATION_REPORT_SELECT}
+                    WHERE created_by = ? 
+                    ORDER BY date_desinfection DESC""",
+                (username,), **STERILISATION_ARROW_TYPES)
+        finally:
+            conn.close()
     
+    def get_recall_trace(self, numero_serie, start, end, neighbour_days=0):
+        """Get every report that touched a device over a period, plus same-room cycles, in time order"""
+        conn = self.get_connection()
+        try:
+            rows = list(self.recall.trace(conn, numero_serie, start, end, neighbour_days))
+            return pd.DataFrame(rows, columns=TRACE_COLUMNS)
+        except Exception as e:
+            print(f"Error building recall trace for {numero_serie}: {e}")
+            return pd.DataFrame(columns=TRACE_COLUMNS)
+        finally:
+            conn.close()
+
+    def export_recall_trace_csv(self, numero_serie, start, end, output, neighbour_days=0):
+        """Stream a recall trace as CSV into a text file object; returns the number of rows"""
+        conn = self.get_connection()
+        try:
+            writer = csv.writer(output)
+            writer.writerow(TRACE_COLUMNS)
+            count = 0
+            for row in self.recall.trace(conn, numero_serie, start, end, neighbour_days):
+                writer.writerow(row)
+                count += 1
+            return count
+        except Exception as e:
+            print(f"Error exporting recall trace for {numero_serie}: {e}")
+            return None
+        finally:
+            conn.close()
+
+    def search_sterilisation_reports(self, text=None, start=None, end=None, etat=None, limit=500):
+        """Get the latest reports whose serial number or endoscope starts with text, within dates and state"""
+        conditions, params = [], []
+        if text and text.strip():
+            prefix = text.strip().replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_') + '%'
+            conditions.append("(r.numero_serie LIKE ? ESCAPE '\\' OR r.endoscope LIKE ? ESCAPE '\\')")
+            params += [prefix, prefix]
+        if start:
+            conditions.append("r.date_desinfection >= ?")
+            params.append(str(start))
+        if end:
+            conditions.append("r.date_desinfection <= ?")
+            params.append(str(end))
+        if etat:
+            conditions.append("r.etat_endoscope = ?")
+            params.append(etat)
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+        conn = self.get_connection()
+        try:
+            return pd.read_sql_query(
+                f"""{STERILISATION_REPORT_SELECT}
+                    {where}
+                    ORDER BY r.date_desinfection DESC, r.id DESC
+                    LIMIT ?""", conn, params=params + [int(limit)])
+        finally:
+            conn.close()
+
     def get_recent_breakdowns(self, days=7):
         """Get endoscopes reported as broken in sterilization reports in the last N days."""
         conn = self.get_connection()
         try:
-            query = f"""
-                SELECT endoscope, numero_serie, date_desinfection, nom_operateur, nature_panne
-                FROM sterilisation_reports
-                WHERE etat_endoscope = 'en panne' AND date_desinfection >= date('now', '-{days} days')
+            query = """
+                SELECT r.endoscope, r.numero_serie, r.date_desinfection, r.nom_operateur, r.nature_panne, r.salle
+                FROM sterilisation_reports r
+                WHERE r.etat_endoscope = 'en panne' AND r.date_desinfection >= date('now', ?)
                 ORDER BY date_desinfection DESC
             """
-            return pd.read_sql_query(query, conn)
+            return pd.read_sql_query(query, conn, params=[f"-{int(days)} days"])
         except Exception as e:
             print(f"Error getting recent breakdowns: {e}")
             return pd.DataFrame()
@@ -412,6 +1010,9 @@ class DatabaseManager:
         conn = self.get_connection()
         try:
             cursor = conn.cursor()
+            previous = self._fetch_report_state(cursor, report_id)
+            changed_dimensions = [dimension for dimension in REPORT_DIMENSIONS if dimension in kwargs]
+            kwargs.update(self.dimensions.key_ids(cursor, kwargs, changed_dimensions))
             set_clause = ", ".join([f"{key} = ?" for key in kwargs.keys()])
             values = list(kwargs.values()) + [report_id]
             
@@ -419,8 +1020,17 @@ class DatabaseManager:
                 f"UPDATE sterilisation_reports SET {set_clause}, updated_at = CURRENT_TIMESTAMP WHERE id = ?",
                 values
             )
-            conn.commit()
             result = cursor.rowcount > 0
+            if result and set(REPORT_TRACKED_COLUMNS) & set(kwargs):
+                current = self._fetch_report_state(cursor, report_id)
+                self.reliability.update_source_event(
+                    conn, 'sterilisation', report_id, current['numero_serie'], current['etat_endoscope'],
+                    report_event_time(current['date_desinfection'], current['heure_fin']))
+                if previous and previous['numero_serie'] != current['numero_serie']:
+                    self._sync_endoscope_with_reports(conn, previous['numero_serie'])
+                self._sync_endoscope_with_reports(conn, current['numero_serie'], report_id)
+                self.alert_rules.on_sterilisation_report(conn, current, previous)
+            conn.commit()
             print(f"Update sterilization report {report_id}: {result} rows affected")
             return result
         except Exception as e:
@@ -429,14 +1039,81 @@ class DatabaseManager:
         finally:
             conn.close()
     
+    def _sync_endoscope_with_reports(self, conn, numero_serie, report_id=None):
+        """Point the endoscope at its latest sterilisation report and take that report's état.
+
+        report_id is the report just written; without it (deletions, backfill)
+        only the pointer moves, so a manual état set afterwards is kept.
+        Back-dated reports never become the latest one.
+        """
+        cursor = conn.cursor()
+        cursor.execute(
+            """SELECT id, etat, designation, localisation, last_report_id, last_reprocessed_at
+               FROM endoscopes WHERE numero_serie = ?""",
+            (numero_serie, ))
+        endoscope = cursor.fetchone()
+        if endoscope is None:
+            return
+        endoscope_id, etat, designation, localisation, last_report_id, last_reprocessed_at = endoscope
+        cursor.execute(
+            """SELECT source_id, event_at, etat FROM etat_events
+               WHERE numero_serie = ? AND source = 'sterilisation'
+               ORDER BY event_at DESC, id DESC LIMIT 1""",
+            (numero_serie, ))
+        latest = cursor.fetchone() or (None, None, None)
+        moved = (latest[0], latest[1]) != (last_report_id, last_reprocessed_at)
+        if not moved and (report_id is None or latest[0] != report_id):
+            return
+        new_etat = latest[2] if report_id is not None and latest[0] is not None else etat
+        cursor.execute(
+            "UPDATE endoscopes SET etat = ?, last_report_id = ?, last_reprocessed_at = ? WHERE id = ?",
+            (new_etat, latest[0], latest[1], endoscope_id))
+        if new_etat != etat:
+            fired = self.alert_rules.on_endoscope_change(
+                conn, (designation, localisation, etat), (designation, localisation, new_etat))
+            self._notify_rate_alerts(conn, fired)
+
+    def _ensure_report_pointers(self, conn):
+        """Add the latest-report pointer to older inventories and fill it for devices missing it"""
+        cursor = conn.cursor()
+        cursor.execute("PRAGMA table_info(endoscopes)")
+        columns = {row[1] for row in cursor.fetchall()}
+        for column, column_type in (('last_reprocessed_at', 'TIMESTAMP'), ('last_report_id', 'INTEGER')):
+            if column not in columns:
+                cursor.execute(f"ALTER TABLE endoscopes ADD COLUMN {column} {column_type}")
+        cursor.execute(
+            """SELECT numero_serie FROM endoscopes e
+               WHERE last_report_id IS NULL AND EXISTS (
+                   SELECT 1 FROM etat_events WHERE numero_serie = e.numero_serie AND source = 'sterilisation')""")
+        for (numero_serie, ) in cursor.fetchall():
+            self._sync_endoscope_with_reports(conn, numero_serie)
+
+    def _ensure_washer_log_generation(self, conn):
+        """Add the file generation to washer log checkpoints saved before it existed"""
+        cursor = conn.cursor()
+        cursor.execute("PRAGMA table_info(washer_log_files)")
+        if 'generation' not in {row[1] for row in cursor.fetchall()}:
+            cursor.execute("ALTER TABLE washer_log_files ADD COLUMN generation INTEGER NOT NULL DEFAULT 0")
+
+    def _fetch_report_state(self, cursor, report_id):
+        cursor.execute(
+            f"SELECT {', '.join(REPORT_TRACKED_COLUMNS)} FROM sterilisation_reports WHERE id = ?",
+            (report_id, ))
+        row = cursor.fetchone()
+        return dict(zip(REPORT_TRACKED_COLUMNS, row)) if row else None
+    
     def delete_sterilisation_report(self, report_id):
         """Delete sterilization report"""
         conn = self.get_connection()
         try:
             cursor = conn.cursor()
+            previous = self._fetch_report_state(cursor, report_id)
             cursor.execute("DELETE FROM sterilisation_reports WHERE id = ?", (report_id,))
-            conn.commit()
             result = cursor.rowcount > 0
+            if result:
+                self.reliability.delete_source_events(conn, 'sterilisation', report_id)
+                self._sync_endoscope_with_reports(conn, previous['numero_serie'])
+            conn.commit()
             print(f"Delete sterilization report {report_id}: {result} rows affected")
             return result
         except Exception as e:
@@ -477,15 +1154,16 @@ class DatabaseManager:
         try:
             query = """
             SELECT 
-                TRIM(designation) as type,
+                d.label as type,
                 COUNT(*) as total,
-                SUM(CASE WHEN etat = 'fonctionnel' THEN 1 ELSE 0 END) as fonctionnel,
-                SUM(CASE WHEN etat = 'en panne' THEN 1 ELSE 0 END) as en_panne,
-                ROUND(SUM(CASE WHEN etat = 'fonctionnel' THEN 1 ELSE 0 END) * 100.0 / COUNT(*), 1) as disponibilite_pct,
-                ROUND(SUM(CASE WHEN etat = 'en panne' THEN 1 ELSE 0 END) * 100.0 / COUNT(*), 1) as indisponibilite_pct
-            FROM endoscopes 
-            GROUP BY TRIM(designation)
-            ORDER BY TRIM(designation)
+                SUM(CASE WHEN e.etat = 'fonctionnel' THEN 1 ELSE 0 END) as fonctionnel,
+                SUM(CASE WHEN e.etat = 'en panne' THEN 1 ELSE 0 END) as en_panne,
+                ROUND(SUM(CASE WHEN e.etat = 'fonctionnel' THEN 1 ELSE 0 END) * 100.0 / COUNT(*), 1) as disponibilite_pct,
+                ROUND(SUM(CASE WHEN e.etat = 'en panne' THEN 1 ELSE 0 END) * 100.0 / COUNT(*), 1) as indisponibilite_pct
+            FROM endoscopes e
+            JOIN dim_designation d ON d.id = e.designation_id
+            GROUP BY e.designation_id
+            ORDER BY d.label
             """
             return pd.read_sql_query(query, conn)
         
@@ -493,4 +1171,220 @@ class DatabaseManager:
             print(f"Error getting availability by designation: {e}")
             return pd.DataFrame()
         finally:
-            conn.close()
\ No newline at end of file
+            conn.close()
+
+    def get_reliability_by_device(self):
+        """Get MTBF, MTTR and availability for each endoscope"""
+        conn = self.get_connection()
+        try:
+            return self.reliability.device_metrics(conn)
+        except Exception as e:
+            print(f"Error getting reliability by device: {e}")
+            return pd.DataFrame()
+        finally:
+            conn.close()
+
+    def get_reliability_by_group(self, by='designation'):
+        """Get MTBF, MTTR and availability aggregated by designation or marque"""
+        if by not in ('designation', 'marque'):
+            raise ValueError(f"Unsupported reliability grouping: {by}")
+        return self.reliability.group_metrics(self.get_reliability_by_device(), by)
+
+    def get_failure_risk(self):
+        """Get the failure risk score of each endoscope, highest first"""
+        conn = self.get_connection()
+        try:
+            return self.risk.scores(conn)
+        except Exception as e:
+            print(f"Error getting failure risk scores: {e}")
+            return pd.DataFrame()
+        finally:
+            conn.close()
+
+    def rebuild_reliability(self, backfill=False):
+        """Recompute reliability metrics from the full state history"""
+        conn = self.get_connection()
+        try:
+            self.reliability.rebuild(conn, backfill=backfill)
+            conn.commit()
+            return True
+        except Exception as e:
+            print(f"Error rebuilding reliability metrics: {e}")
+            return False
+        finally:
+            conn.close()
+
+    def _enqueue_email_alert(self, conn, kind, payload, dedup_key, throttle_minutes=None):
+        """Queue an email alert in the outbox unless an identical one was queued recently"""
+        if throttle_minutes is None:
+            throttle_minutes = self.alert_throttle_minutes
+        cursor = conn.cursor()
+        cursor.execute(
+            """SELECT 1 FROM email_outbox
+               WHERE dedup_key = ? AND status != 'failed' AND created_at >= datetime('now', ?)
+               LIMIT 1""",
+            (dedup_key, f"-{int(throttle_minutes)} minutes"))
+        if cursor.fetchone():
+            return None
+        cursor.execute(
+            "INSERT INTO email_outbox (kind, dedup_key, payload) VALUES (?, ?, ?)",
+            (kind, dedup_key, json.dumps(payload, ensure_ascii=False, default=str)))
+        return cursor.lastrowid
+
+    def enqueue_email_alert(self, kind, payload, dedup_key, throttle_minutes=None):
+        """Queue an email alert; returns the outbox id or None when throttled"""
+        conn = self.get_connection()
+        try:
+            alert_id = self._enqueue_email_alert(conn, kind, payload, dedup_key, throttle_minutes)
+            conn.commit()
+            return alert_id
+        finally:
+            conn.close()
+
+    def claim_due_email_alerts(self, limit=20, lease_seconds=300):
+        """Lease the next pending alerts so that only one worker sends them"""
+        conn = self.get_connection()
+        try:
+            conn.execute("BEGIN IMMEDIATE")
+            cursor = conn.cursor()
+            cursor.execute(
+                """SELECT id, kind, payload, attempts FROM email_outbox
+                   WHERE status = 'pending' AND next_attempt_at <= datetime('now')
+                   ORDER BY next_attempt_at, id LIMIT ?""",
+                (limit, ))
+            rows = cursor.fetchall()
+            cursor.executemany(
+                "UPDATE email_outbox SET next_attempt_at = datetime('now', ?) WHERE id = ?",
+                [(f"+{int(lease_seconds)} seconds", row[0]) for row in rows])
+            conn.commit()
+            return [{'id': alert_id, 'kind': kind, 'payload': json.loads(payload), 'attempts': attempts}
+                    for alert_id, kind, payload, attempts in rows]
+        finally:
+            conn.close()
+
+    def mark_email_alerts_sent(self, alert_ids):
+        """Mark outbox entries as delivered"""
+        conn = self.get_connection()
+        try:
+            cursor = conn.cursor()
+            cursor.executemany(
+                """UPDATE email_outbox SET status = 'sent', attempts = attempts + 1,
+                   sent_at = CURRENT_TIMESTAMP, last_error = NULL WHERE id = ?""",
+                [(alert_id, ) for alert_id in alert_ids])
+            conn.commit()
+            return cursor.rowcount
+        finally:
+            conn.close()
+
+    def reschedule_email_alert(self, alert_id, error, delay_seconds=None):
+        """Record a failed delivery attempt; without a delay the alert is given up"""
+        conn = self.get_connection()
+        try:
+            cursor = conn.cursor()
+            if delay_seconds is None:
+                cursor.execute(
+                    """UPDATE email_outbox SET status = 'failed', attempts = attempts + 1,
+                       last_error = ? WHERE id = ?""",
+                    (str(error), alert_id))
+            else:
+                cursor.execute(
+                    """UPDATE email_outbox SET attempts = attempts + 1, last_error = ?,
+                       next_attempt_at = datetime('now', ?) WHERE id = ?""",
+                    (str(error), f"+{int(delay_seconds)} seconds", alert_id))
+            conn.commit()
+            return cursor.rowcount > 0
+        finally:
+            conn.close()
+
+    def get_email_outbox(self, limit=100):
+        """Get the most recent outbox entries (admin only)"""
+        conn = self.get_connection()
+        try:
+            return pd.read_sql_query(
+                """SELECT id, kind, dedup_key, status, attempts, next_attempt_at, last_error,
+                          created_at, sent_at
+                   FROM email_outbox ORDER BY id DESC LIMIT ?""",
+                conn, params=[limit])
+        finally:
+            conn.close()
+
+    def get_active_alerts(self, limit=20):
+        """Get the most recent active alerts (read by the dashboard through idx_alerts_status)"""
+        conn = self.get_connection()
+        try:
+            return pd.read_sql_query(
+                """SELECT id, rule_type, severity, scope, scope_value, numero_serie, message,
+                          report_id, created_at
+                   FROM alerts WHERE status = 'active' ORDER BY id DESC LIMIT ?""",
+                conn, params=[limit])
+        finally:
+            conn.close()
+
+    def acknowledge_alert(self, alert_id, username):
+        """Acknowledge an active alert"""
+        conn = self.get_connection()
+        try:
+            cursor = conn.cursor()
+            cursor.execute(
+                """UPDATE alerts SET status = 'acquittee', acknowledged_by = ?,
+                   closed_at = CURRENT_TIMESTAMP WHERE id = ? AND status = 'active'""",
+                (username, alert_id))
+            conn.commit()
+            return cursor.rowcount > 0
+        finally:
+            conn.close()
+
+    def get_alert_rules(self):
+        """Get all alert rules (admin only)"""
+        conn = self.get_connection()
+        try:
+            return pd.read_sql_query(
+                """SELECT id, rule_type, scope, scope_value, threshold, window_days, severity, enabled
+                   FROM alert_rules ORDER BY rule_type, scope, scope_value""",
+                conn)
+        finally:
+            conn.close()
+
+    def save_alert_rule(self, rule_type, scope, scope_value, threshold, window_days, severity, enabled=True):
+        """Create or update the rule for a (type, scope, value) triple"""
+        conn = self.get_connection()
+        try:
+            cursor = conn.cursor()
+            scope_value = '' if scope == 'global' else normalize_scope_value(scope_value)
+            cursor.execute(
+                """INSERT INTO alert_rules (rule_type, scope, scope_value, threshold, window_days, severity, enabled)
+                   VALUES (?, ?, ?, ?, ?, ?, ?)
+                   ON CONFLICT(rule_type, scope, scope_value) DO UPDATE SET
+                       threshold = excluded.threshold, window_days = excluded.window_days,
+                       severity = excluded.severity, enabled = excluded.enabled""",
+                (rule_type, scope, scope_value, threshold, window_days, severity, int(enabled)))
+            if not enabled:
+                cursor.execute(
+                    """UPDATE alerts SET status = 'resolue', closed_at = CURRENT_TIMESTAMP
+                       WHERE status = 'active' AND rule_id =
+                           (SELECT id FROM alert_rules WHERE rule_type = ? AND scope = ? AND scope_value = ?)""",
+                    (rule_type, scope, scope_value))
+            elif rule_type == 'taux_panne':
+                self._notify_rate_alerts(conn, self.alert_rules.evaluate_rates(conn))
+            conn.commit()
+            return True
+        except Exception as e:
+            print(f"Error saving alert rule: {e}")
+            return False
+        finally:
+            conn.close()
+
+    def delete_alert_rule(self, rule_id):
+        """Delete an alert rule and resolve its active alerts"""
+        conn = self.get_connection()
+        try:
+            cursor = conn.cursor()
+            cursor.execute(
+                """UPDATE alerts SET status = 'resolue', closed_at = CURRENT_TIMESTAMP
+                   WHERE rule_id = ? AND status = 'active'""",
+                (rule_id, ))
+            cursor.execute("DELETE FROM alert_rules WHERE id = ?", (rule_id, ))
+            conn.commit()
+            return cursor.rowcount > 0
+        finally:
+            conn.close()
@@ -0,0 +1,132 @@
+from collections import Counter
+
+
+# dimension -> (fact table, key column); labels live in dim_<dimension>
+DIMENSIONS = {
+    'designation': ('endoscopes', 'designation_id'),
+    'marque': ('endoscopes', 'marque_id'),
+    'localisation': ('endoscopes', 'localisation_id'),
+    'salle': ('sterilisation_reports', 'salle_id'),
+    'type_acte': ('sterilisation_reports', 'type_acte_id'),
+}
+ENDOSCOPE_DIMENSIONS = ['designation', 'marque', 'localisation']
+REPORT_DIMENSIONS = ['salle', 'type_acte']
+
+
+def normalize_label(value):
+    """Key under which spelling variants are merged: trimmed, single-spaced, lowercase"""
+    return ' '.join(str(value or '').split()).lower()
+
+
+class DimensionStore:
+    """Integer keys for the free-text categories of the inventory and reports.
+
+    Every distinct normalized spelling gets one row in its dim_* table; the
+    label kept is the most frequent spelling seen when the row was created.
+    Endoscopes and reports keep their text as entered and carry the keys
+    next to it, so dashboards and counters group on indexed integers instead
+    of TRIM(LOWER(text)) while tools reading the text columns keep working.
+    Report readers return that text without joining the dim tables; the
+    keys cost a few bytes per row instead of saving the repeated strings.
+    """
+
+    def ensure_initialized(self, conn):
+        """Add the key columns next to the text ones, then link rows inserted without keys"""
+        cursor = conn.cursor()
+        for dimension, (table, key_column) in DIMENSIONS.items():
+            if key_column not in self._columns(cursor, table):
+                cursor.execute(f"ALTER TABLE {table} ADD COLUMN {key_column} INTEGER REFERENCES dim_{dimension}(id)")
+        self._restore_report_labels(cursor)
+        for dimension, (table, key_column) in DIMENSIONS.items():
+            # Inventory keys cover etat too, so availability and counter rebuilds read only the index
+            columns = f"{key_column}, etat" if table == 'endoscopes' else key_column
+            cursor.execute(f"CREATE INDEX IF NOT EXISTS idx_{table}_{key_column} ON {table}({columns})")
+        self.link_endoscopes(conn)
+        self.link_reports(conn)
+
+    @staticmethod
+    def _columns(cursor, table):
+        cursor.execute(f"PRAGMA table_info({table})")
+        return {row[1] for row in cursor.fetchall()}
+
+    def _restore_report_labels(self, cursor):
+        """Put back the salle / type_acte text on databases created while reports only had the keys"""
+        report_columns = self._columns(cursor, 'sterilisation_reports')
+        for dimension in REPORT_DIMENSIONS:
+            if dimension in report_columns:
+                continue
+            key_column = DIMENSIONS[dimension][1]
+            cursor.execute(f"ALTER TABLE sterilisation_reports ADD COLUMN {dimension} TEXT")
+            cursor.execute(
+                f"""UPDATE sterilisation_reports
+                    SET {dimension} = (SELECT label FROM dim_{dimension} WHERE id = {key_column})""")
+
+    def link_reports(self, conn):
+        """Set the dimension keys of the reports missing one from their text"""
+        cursor = conn.cursor()
+        for dimension in REPORT_DIMENSIONS:
+            key_column = DIMENSIONS[dimension][1]
+            cursor.execute(
+                f"""SELECT {dimension}, COUNT(*) FROM sterilisation_reports
+                    WHERE {key_column} IS NULL AND {dimension} IS NOT NULL GROUP BY {dimension}""")
+            counts = dict(cursor.fetchall())
+            if not counts:
+                continue
+            ids = self.resolve(cursor, dimension, counts)
+            cursor.executemany(
+                f"UPDATE sterilisation_reports SET {key_column} = ? WHERE {dimension} = ? AND {key_column} IS NULL",
+                [(ids[value], value) for value in counts])
+
+    def resolve(self, cursor, dimension, values):
+        """Map raw values (an iterable, or {value: count}) to dimension ids, creating missing rows"""
+        counts = values if isinstance(values, dict) else Counter(values)
+        keys = {}
+        for value, count in counts.items():
+            keys.setdefault(normalize_label(value), Counter())[str(value or '').strip()] += count
+        ids = self._ids(cursor, dimension, keys)
+        missing = [(spellings.most_common(1)[0][0], key) for key, spellings in keys.items() if key not in ids]
+        if missing:
+            cursor.executemany(f"INSERT OR IGNORE INTO dim_{dimension} (label, norm_key) VALUES (?, ?)", missing)
+            ids.update(self._ids(cursor, dimension, [key for _, key in missing]))
+        return {value: ids[normalize_label(value)] for value in counts}
+
+    @staticmethod
+    def _ids(cursor, dimension, keys):
+        keys = list(keys)
+        ids = {}
+        for start in range(0, len(keys), 500):
+            chunk = keys[start:start + 500]
+            cursor.execute(
+                f"SELECT norm_key, id FROM dim_{dimension} WHERE norm_key IN ({', '.join('?' * len(chunk))})",
+                chunk)
+            ids.update(cursor.fetchall())
+        return ids
+
+    def key_ids(self, cursor, row, dimensions):
+        """{key column: id} for the dimension values of one row"""
+        return {DIMENSIONS[dimension][1]: self.resolve(cursor, dimension, [row[dimension]])[row[dimension]]
+                for dimension in dimensions}
+
+    def link_endoscopes(self, conn, endoscope_ids=None):
+        """Set the dimension keys of the given endoscopes (default: every row missing one)"""
+        cursor = conn.cursor()
+        columns = ', '.join(ENDOSCOPE_DIMENSIONS)
+        if endoscope_ids is None:
+            missing = ' OR '.join(f"{DIMENSIONS[dimension][1]} IS NULL" for dimension in ENDOSCOPE_DIMENSIONS)
+            cursor.execute(f"SELECT id, {columns} FROM endoscopes WHERE {missing}")
+        else:
+            endoscope_ids = list(endoscope_ids)
+            if not endoscope_ids:
+                return
+            cursor.execute(
+                f"SELECT id, {columns} FROM endoscopes WHERE id IN ({', '.join('?' * len(endoscope_ids))})",
+                endoscope_ids)
+        rows = cursor.fetchall()
+        if not rows:
+            return
+        ids = [self.resolve(cursor, dimension, [row[i + 1] for row in rows])
+               for i, dimension in enumerate(ENDOSCOPE_DIMENSIONS)]
+        key_columns = ', '.join(f"{DIMENSIONS[dimension][1]} = ?" for dimension in ENDOSCOPE_DIMENSIONS)
+        cursor.executemany(
+            f"UPDATE endoscopes SET {key_columns} WHERE id = ?",
+            [[ids[i][row[i + 1]] for i in range(len(ENDOSCOPE_DIMENSIONS))] + [row[0]] for row in rows])
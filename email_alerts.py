@@ -1,47 +1,77 @@
+import html
 import smtplib
 import os
+import threading
+import time
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
 from datetime import datetime
 
 class EmailAlertManager:
-    def __init__(self):
-        self.smtp_server = os.getenv("SMTP_SERVER", "smtp.gmail.com")
-        self.smtp_port = int(os.getenv("SMTP_PORT", "587"))
+    def __init__(self, smtp_server=None, smtp_port=None, use_starttls=None):
+        self.smtp_server = smtp_server or os.getenv("SMTP_SERVER", "smtp.gmail.com")
+        self.smtp_port = int(smtp_port or os.getenv("SMTP_PORT", "587"))
         self.email_user = os.getenv("EMAIL_USER", "your_email@gmail.com")
         self.email_password = os.getenv("EMAIL_PASSWORD", "your_app_password")
         self.alert_recipients = os.getenv("ALERT_RECIPIENTS", "admin@hospital.com").split(",")
-    
-    def send_malfunction_alert(self, percentage, broken_count, total_count):
-        """Send email alert when malfunction rate exceeds 50%"""
-        try:
-            # Create message
-            msg = MIMEMultipart()
-            msg['From'] = self.email_user
-            msg['To'] = ", ".join(self.alert_recipients)
-            msg['Subject'] = "🚨 ALERTE EndoTrace - Taux de panne élevé"
-            
-            # Email body
-            body = f"""
+        if use_starttls is None:
+            use_starttls = os.getenv("SMTP_STARTTLS", "true").lower() == "true"
+        self.use_starttls = use_starttls
+
+    def connect(self):
+        """Open an authenticated SMTP session"""
+        server = smtplib.SMTP(self.smtp_server, self.smtp_port, timeout=30)
+        # has_extn only knows the extensions of the last EHLO, and STARTTLS forgets them
+        server.ehlo()
+        if self.use_starttls:
+            server.starttls()
+            server.ehlo()
+        # Local relays and test stand-ins usually do not offer AUTH
+        if self.email_password and server.has_extn('auth'):
+            server.login(self.email_user, self.email_password)
+        return server
+
+    def send_message(self, server, msg):
+        """Send a prepared message over an open SMTP session"""
+        server.sendmail(self.email_user, self.alert_recipients, msg.as_string())
+
+    def _wrap_message(self, subject, body):
+        msg = MIMEMultipart()
+        msg['From'] = self.email_user
+        msg['To'] = ", ".join(self.alert_recipients)
+        msg['Subject'] = subject
+        msg.attach(MIMEText(body, 'html'))
+        return msg
+
+    def build_malfunction_alert(self, percentage, broken_count, total_count, threshold=50, scope='global',
+                                scope_value=None):
+        """Build the alert sent when the malfunction rate of a rule's scope exceeds its threshold"""
+        scope_label = ("l'ensemble du parc" if scope == 'global'
+                       else f"{html.escape(scope)} « {html.escape(str(scope_value))} »")
+        # Email body
+        body = f"""
             <html>
             <body>
                 <h2>🚨 Alerte Système EndoTrace</h2>
                 <p><strong>Date:</strong> {datetime.now().strftime('%d/%m/%Y %H:%M:%S')}</p>
-                
+
                 <div style="background-color: #ffebee; padding: 15px; border-left: 4px solid #f44336; margin: 10px 0;">
                     <h3 style="color: #d32f2f; margin-top: 0;">Taux de panne critique détecté</h3>
                     <ul>
+                        <li><strong>Périmètre:</strong> {scope_label}</li>
                         <li><strong>Pourcentage d'endoscopes en panne:</strong> {percentage:.1f}%</li>
                         <li><strong>Nombre d'endoscopes en panne:</strong> {broken_count}</li>
                         <li><strong>Total d'endoscopes:</strong> {total_count}</li>
+                        <li><strong>Seuil de la règle:</strong> {threshold:g}%</li>
                     </ul>
                 </div>
-                
-                <p><strong>Action requise:</strong> Le taux de panne des endoscopes a dépassé le seuil critique de 50%. 
+
+                <p><strong>Action requise:</strong> Le taux de panne ({scope_label}) a dépassé le seuil critique de
+                {threshold:g}%.
                 Une intervention immédiate est recommandée pour évaluer et réparer les équipements défaillants.</p>
-                
+
                 <p>Veuillez vous connecter au système EndoTrace pour plus de détails.</p>
-                
+
                 <hr>
                 <p style="font-size: 12px; color: #666;">
                     Cet email a été généré automatiquement par le système EndoTrace.
@@ -49,31 +79,182 @@ class EmailAlertManager:
             </body>
             </html>
             """
-            
-            msg.attach(MIMEText(body, 'html'))
-            
+        subject = "🚨 ALERTE EndoTrace - Taux de panne élevé"
+        if scope != 'global':
+            subject += f" ({scope} {scope_value})"
+        return self._wrap_message(subject, body)
+
+    def build_breakdown_alert(self, report):
+        """Build the alert sent when a sterilisation report flags an endoscope as broken"""
+        # Report fields are typed by agents: escape them before putting them in the HTML body
+        field = {key: html.escape(str(value)) if value else None for key, value in report.items()}
+        body = f"""
+            <html>
+            <body>
+                <h2>🚨 Alerte Système EndoTrace</h2>
+                <p><strong>Date:</strong> {datetime.now().strftime('%d/%m/%Y %H:%M:%S')}</p>
+
+                <div style="background-color: #ffebee; padding: 15px; border-left: 4px solid #f44336; margin: 10px 0;">
+                    <h3 style="color: #d32f2f; margin-top: 0;">Endoscope signalé en panne</h3>
+                    <ul>
+                        <li><strong>Endoscope:</strong> {field.get('endoscope')} (N/S: {field.get('numero_serie')})</li>
+                        <li><strong>Date de désinfection:</strong> {field.get('date_desinfection')}</li>
+                        <li><strong>Signalé par:</strong> {field.get('nom_operateur')}</li>
+                        <li><strong>Nature de la panne:</strong> {field.get('nature_panne') or 'Non spécifiée'}</li>
+                        <li><strong>Salle:</strong> {field.get('salle') or 'Non spécifiée'}</li>
+                    </ul>
+                </div>
+
+                <p>Veuillez vous connecter au système EndoTrace pour plus de détails.</p>
+
+                <hr>
+                <p style="font-size: 12px; color: #666;">
+                    Cet email a été généré automatiquement par le système EndoTrace.
+                </p>
+            </body>
+            </html>
+            """
+        return self._wrap_message(
+            f"🚨 ALERTE EndoTrace - Panne {report.get('endoscope')} ({report.get('numero_serie')})", body)
+
+    def build_message(self, kind, payload):
+        """Build the message for an outbox entry"""
+        if kind == 'malfunction_rate':
+            # Entries queued before rules carried their threshold and scope fall back to the former fixed 50%
+            return self.build_malfunction_alert(
+                payload['percentage'], payload['broken_count'], payload['total_count'],
+                payload.get('threshold', 50), payload.get('scope', 'global'), payload.get('scope_value'))
+        if kind == 'breakdown':
+            return self.build_breakdown_alert(payload)
+        raise ValueError(f"Unknown alert kind: {kind}")
+
+    def send_malfunction_alert(self, percentage, broken_count, total_count, threshold=50, scope='global',
+                               scope_value=None):
+        """Send email alert when the malfunction rate of a rule's scope exceeds its threshold"""
+        try:
+            msg = self.build_malfunction_alert(percentage, broken_count, total_count, threshold, scope, scope_value)
+
             # Send email
-            server = smtplib.SMTP(self.smtp_server, self.smtp_port)
-            server.starttls()
-            server.login(self.email_user, self.email_password)
-            text = msg.as_string()
-            server.sendmail(self.email_user, self.alert_recipients, text)
+            server = self.connect()
+            self.send_message(server, msg)
             server.quit()
-            
+
             return True
-            
+
         except Exception as e:
             print(f"Erreur lors de l'envoi de l'email: {e}")
             return False
-    
+
     def test_email_configuration(self):
         """Test email configuration"""
         try:
-            server = smtplib.SMTP(self.smtp_server, self.smtp_port)
-            server.starttls()
-            server.login(self.email_user, self.email_password)
+            server = self.connect()
             server.quit()
             return True
         except Exception as e:
             print(f"Erreur de configuration email: {e}")
             return False
+
+
+class EmailAlertDispatcher:
+    """Background worker draining the email_outbox table.
+
+    Alerts are written to the outbox by DatabaseManager in the same
+    transaction as the report that triggered them; this worker sends them in
+    batches over a single SMTP session that is kept open between batches,
+    and retries failed deliveries with exponential backoff.
+    """
+
+    def __init__(self, db, manager=None, batch_size=20, poll_interval=5.0,
+                 max_attempts=6, base_delay=30, max_delay=3600, idle_timeout=60):
+        self.db = db
+        self.manager = manager or EmailAlertManager()
+        self.batch_size = batch_size
+        self.poll_interval = poll_interval
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.idle_timeout = idle_timeout
+        self._server = None
+        self._last_used = 0.0
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        """Start the worker thread (idempotent)"""
+        if self._thread is None or not self._thread.is_alive():
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name="email-alert-dispatcher", daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self, timeout=10):
+        """Stop the worker and close the SMTP session"""
+        self._stop.set()
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+        self._close_server()
+
+    def notify(self):
+        """Wake the worker up after new alerts were queued"""
+        self._wake.set()
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                sent = self.run_once()
+            except Exception as e:
+                print(f"Erreur du répartiteur d'alertes email: {e}")
+                sent = 0
+            if sent < self.batch_size:
+                if self._server is not None and time.monotonic() - self._last_used > self.idle_timeout:
+                    self._close_server()
+                self._wake.wait(self.poll_interval)
+                self._wake.clear()
+
+    def run_once(self):
+        """Send one batch of due alerts; returns the number delivered"""
+        alerts = self.db.claim_due_email_alerts(limit=self.batch_size)
+        sent_ids = []
+        for alert in alerts:
+            try:
+                msg = self.manager.build_message(alert['kind'], alert['payload'])
+                self._send(msg)
+                sent_ids.append(alert['id'])
+            except Exception as e:
+                attempts = alert['attempts'] + 1
+                if attempts >= self.max_attempts:
+                    self.db.reschedule_email_alert(alert['id'], e)
+                else:
+                    delay = min(self.base_delay * 2 ** (attempts - 1), self.max_delay)
+                    self.db.reschedule_email_alert(alert['id'], e, delay_seconds=delay)
+        if sent_ids:
+            self.db.mark_email_alerts_sent(sent_ids)
+        return len(sent_ids)
+
+    def _send(self, msg):
+        """Send over the shared session, reconnecting once if it was dropped"""
+        for attempt in range(2):
+            if self._server is None:
+                self._server = self.manager.connect()
+            try:
+                self.manager.send_message(self._server, msg)
+                self._last_used = time.monotonic()
+                return
+            except (smtplib.SMTPServerDisconnected, ConnectionError, TimeoutError):
+                self._server = None
+                if attempt:
+                    raise
+            except smtplib.SMTPException:
+                self._close_server()
+                raise
+
+    def _close_server(self):
+        if self._server is not None:
+            try:
+                self._server.quit()
+            except Exception:
+                pass
+            self._server = None
@@ -0,0 +1,242 @@
+"""Regional view over several hospital databases.
+
+FederatedDatabaseManager answers the read queries of the dashboards and
+archives like DatabaseManager, by sending each query to every site database
+in parallel on a thread pool and merging the answers. Row results get a
+`site` column; counts and availability are summed across sites. The
+parallelism pays off when the sites sit behind the network (file shares,
+remote volumes): on local files the queries are bound by the interpreter
+and take about as long as asking each site in turn.
+
+Each site has a timeout: a site that has not answered in time (or fails) is
+left out and the others are returned. Every query returns its result
+together with the outcome of each site, ({...}, status); the page merges the
+statuses of its queries with merge_site_status to say which sites are
+missing. The status is not kept on the manager, which is shared by every
+session.
+
+Sites are read from FEDERATION_SITES as "label=path;label=path". A site
+given as a path is opened read-only and never initialized (no init.sql, no
+migration on another hospital's file); a path that does not exist is
+reported as a site error instead of creating an empty database, and so is a
+site whose schema lacks a table or column of this version's init.sql (some
+DatabaseManager reads swallow their errors and would return empty results).
+"""
+import os
+import sqlite3
+import time
+from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor, TimeoutError
+
+import pandas as pd
+
+from database import INIT_SQL_PATH, DatabaseManager
+
+FEDERATION_TIMEOUT = float(os.getenv("FEDERATION_TIMEOUT", "5"))
+# Worst outcome first when merging the statuses of several queries
+STATUS_SEVERITY = {'ok': 0, 'timeout': 1, 'error': 2}
+_EXPECTED_SCHEMA = None
+
+
+def expected_schema():
+    """{table: {columns}} of a database created from this version's init.sql"""
+    global _EXPECTED_SCHEMA
+    if _EXPECTED_SCHEMA is None:
+        conn = sqlite3.connect(':memory:')
+        try:
+            with open(INIT_SQL_PATH, 'r', encoding='utf-8') as f:
+                conn.executescript(f.read())
+            _EXPECTED_SCHEMA = _schema(conn)
+        finally:
+            conn.close()
+    return _EXPECTED_SCHEMA
+
+
+def _schema(conn):
+    tables = [row[0] for row in conn.execute(
+        "SELECT name FROM sqlite_master WHERE type = 'table' AND name NOT LIKE 'sqlite_%'")]
+    return {table: {row[1] for row in conn.execute(f'PRAGMA table_info("{table}")')} for table in tables}
+
+
+def merge_site_status(*statuses):
+    """One row per site with the worst outcome of several queries, as a frame"""
+    merged = {}
+    for status in statuses:
+        for label, outcome in status.items():
+            previous = merged.get(label)
+            if previous is None or STATUS_SEVERITY[outcome['status']] > STATUS_SEVERITY[previous['status']]:
+                merged[label] = dict(outcome)
+            elif outcome['ms'] is not None and previous['ms'] is not None:
+                previous['ms'] = max(previous['ms'], outcome['ms'])
+    return pd.DataFrame([{'site': label, **outcome} for label, outcome in merged.items()],
+                        columns=['site', 'status', 'ms', 'error'])
+
+
+def parse_sites(value):
+    """{label: db_path} from "label=path;label=path" """
+    sites = {}
+    for pair in (value or '').split(';'):
+        label, _, path = pair.strip().partition('=')
+        if label.strip() and path.strip():
+            sites[label.strip()] = path.strip()
+    return sites
+
+
+class ReadOnlySite(DatabaseManager):
+    """DatabaseManager reading another site's database file without writing to it"""
+
+    def __init__(self, db_path):
+        self._checked_schema_version = None
+        super().__init__(db_path)
+
+    def init_database(self):
+        """The site's own application keeps its schema up to date"""
+
+    def check_schema(self):
+        """Raise when the site's schema lacks a table or column of this version (checked again when it changes)"""
+        conn = self.get_connection()
+        try:
+            schema_version = conn.execute("PRAGMA schema_version").fetchone()[0]
+            if schema_version == self._checked_schema_version:
+                return
+            actual = _schema(conn)
+        finally:
+            conn.close()
+        missing = [f"{table}.{column}" if table in actual else table
+                   for table, columns in expected_schema().items()
+                   for column in (sorted(columns - actual[table]) if table in actual else [None])]
+        if missing:
+            raise RuntimeError(f"Schéma de la base incompatible, manquant : {', '.join(missing)}")
+        self._checked_schema_version = schema_version
+
+    def get_connection(self):
+        if not os.path.isfile(self.db_path):
+            raise FileNotFoundError(f"Base introuvable : {self.db_path}")
+        return sqlite3.connect(f"{Path(self.db_path).absolute().as_uri()}?mode=ro", uri=True)
+
+
+class FederatedDatabaseManager:
+    """Read-only DatabaseManager façade fanning queries out to several sites; results come with the site status"""
+
+    def __init__(self, sites, timeout=FEDERATION_TIMEOUT, site_timeouts=None, max_workers=None):
+        self.sites = {label: db if hasattr(db, 'get_connection') else ReadOnlySite(db)
+                      for label, db in sites.items()}
+        self.timeout = timeout
+        self.site_timeouts = site_timeouts or {}
+        # Enough workers for every site to be queried at once, plus those still stuck on a slow site
+        self._executor = ThreadPoolExecutor(max_workers=max_workers or 2 * len(self.sites) + 4,
+                                            thread_name_prefix="federation")
+
+    def close(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+    def fan_out(self, method, *args, **kwargs):
+        """({site: result}, status) of one DatabaseManager method on the sites answering in time.
+
+        status gives, per site, the outcome ('ok', 'timeout' or 'error'), the
+        duration in ms and the error message.
+        """
+        started = time.monotonic()
+        futures = {label: self._executor.submit(self._call, db, method, args, kwargs)
+                   for label, db in self.sites.items()}
+        results, status = {}, {}
+        for label, future in futures.items():
+            deadline = started + self.site_timeouts.get(label, self.timeout)
+            try:
+                results[label], duration = future.result(timeout=max(deadline - time.monotonic(), 0))
+                status[label] = {'status': 'ok', 'ms': round(duration * 1000, 1), 'error': None}
+            except TimeoutError:
+                future.cancel()
+                status[label] = {'status': 'timeout', 'ms': None, 'error': "Délai dépassé"}
+            except Exception as e:
+                status[label] = {'status': 'error', 'ms': None, 'error': str(e)}
+        return results, status
+
+    @staticmethod
+    def _call(db, method, args, kwargs):
+        start = time.perf_counter()
+        if hasattr(db, 'check_schema'):
+            db.check_schema()
+        result = getattr(db, method)(*args, **kwargs)
+        return result, time.perf_counter() - start
+
+    def _concat(self, results):
+        frames = [frame.assign(site=label) for label, frame in results.items() if frame is not None and len(frame)]
+        if not frames:
+            return pd.DataFrame()
+        frame = pd.concat(frames, ignore_index=True)
+        return frame[['site'] + [column for column in frame.columns if column != 'site']]
+
+    def _sum_by(self, results, key, value='count'):
+        frames = [frame for frame in results.values() if frame is not None and len(frame)]
+        if not frames:
+            return pd.DataFrame(columns=[key, value])
+        return pd.concat(frames, ignore_index=True).groupby(key, as_index=False)[value].sum()
+
+    # Dashboard: every method returns (result, status)
+
+    def get_dashboard_stats(self):
+        results, status = self.fan_out('get_dashboard_stats')
+        return {
+            'status_stats': self._sum_by({label: stats['status_stats'] for label, stats in results.items()}, 'etat'),
+            'location_stats': self._sum_by({label: stats['location_stats'] for label, stats in results.items()},
+                                           'localisation'),
+            'total_endoscopes': sum(int(stats['total_endoscopes']) for stats in results.values()),
+            'by_site': pd.DataFrame([{'site': label, 'total_endoscopes': int(stats['total_endoscopes'])}
+                                     for label, stats in results.items()], columns=['site', 'total_endoscopes']),
+        }, status
+
+    def get_malfunction_percentage(self):
+        results, status = self.fan_out('get_malfunction_percentage')
+        broken = sum(int(result[1]) for result in results.values())
+        total = sum(int(result[2]) for result in results.values())
+        return ((broken / total * 100 if total else 0), broken, total), status
+
+    def get_endoscope_availability_by_type(self, by_site=False):
+        """Availability per designation over all sites (per site and designation with by_site=True)"""
+        results, status = self.fan_out('get_endoscope_availability_by_type')
+        frame = self._concat(results)
+        if frame.empty:
+            return frame, status
+        keys = ['site', 'type'] if by_site else ['type']
+        merged = frame.groupby(keys, as_index=False)[['total', 'fonctionnel', 'en_panne']].sum()
+        merged['disponibilite_pct'] = (merged['fonctionnel'] * 100.0 / merged['total']).round(1)
+        merged['indisponibilite_pct'] = (merged['en_panne'] * 100.0 / merged['total']).round(1)
+        return merged.sort_values(keys, ignore_index=True), status
+
+    def get_recent_breakdowns(self, days=7):
+        results, status = self.fan_out('get_recent_breakdowns', days)
+        frame = self._concat(results)
+        if frame.empty:
+            return frame, status
+        return frame.sort_values('date_desinfection', ascending=False, ignore_index=True), status
+
+    def get_table_versions(self):
+        """Change counters summed over the sites answering"""
+        results, status = self.fan_out('get_table_versions')
+        versions = {}
+        for site_versions in results.values():
+            for table, version in site_versions.items():
+                versions[table] = versions.get(table, 0) + version
+        return versions, status
+
+    # Archives
+
+    def search_sterilisation_reports(self, text=None, start=None, end=None, etat=None, limit=500):
+        """Latest matching reports of all sites (at most limit in total)"""
+        results, status = self.fan_out('search_sterilisation_reports', text, start, end, etat, limit)
+        frame = self._concat(results)
+        if frame.empty:
+            return frame, status
+        return frame.sort_values(['date_desinfection', 'id'], ascending=False, ignore_index=True).head(limit), status
+
+    def get_all_endoscopes(self):
+        results, status = self.fan_out('get_all_endoscopes')
+        return self._concat(results), status
+
+    def get_recall_trace(self, numero_serie, start, end, neighbour_days=0):
+        results, status = self.fan_out('get_recall_trace', numero_serie, start, end, neighbour_days)
+        frame = self._concat(results)
+        if frame.empty:
+            return frame, status
+        return frame.sort_values('event_at', ignore_index=True), status
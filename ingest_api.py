@@ -0,0 +1,190 @@
+"""HTTP/JSON ingestion service for washer-disinfectors and tracking systems.
+
+Runs next to the Streamlit app on the same database. Each request posts a
+batch of sterilisation cycles, validated with the rules of the report
+forms and saved in a single transaction: either every cycle of the batch
+is accepted or none is. Every cycle carries an idempotency_key chosen by
+the client, so a batch resent after a timeout creates nothing twice.
+
+    POST /api/v1/sterilisation-reports   {"cycles": [{...}, ...]}  (or a bare list)
+    GET  /health
+
+Clients authenticate with "Authorization: Bearer <token>"; the tokens are
+read from INGEST_API_TOKENS as "source:token,source:token", and the source
+is recorded as created_by when a cycle has none.
+
+Usage: python ingest_api.py [--db endotrace.db] [--host 0.0.0.0] [--port 8502] [--pool-size 4]
+"""
+import argparse
+import json
+import os
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from connection_pool import ConnectionPool
+from database import DatabaseManager, validate_sterilisation_report
+
+API_PATH = '/api/v1/sterilisation-reports'
+MAX_BODY_BYTES = int(os.getenv("INGEST_API_MAX_BODY_BYTES", str(5 * 1024 * 1024)))
+MAX_BATCH_SIZE = int(os.getenv("INGEST_API_MAX_BATCH", "1000"))
+
+
+def parse_tokens(value):
+    """{token: source} from "source:token,source:token" """
+    tokens = {}
+    for pair in (value or '').split(','):
+        source, _, token = pair.strip().partition(':')
+        if source and token:
+            tokens[token.strip()] = source.strip()
+    return tokens
+
+
+class IngestService:
+    """Validation and storage of posted cycles, shared by the request threads"""
+
+    def __init__(self, db, tokens):
+        self.db = db
+        self.tokens = tokens
+        self._designations = None
+        self._lock = threading.Lock()
+
+    def source_for(self, authorization):
+        scheme, _, token = (authorization or '').partition(' ')
+        if scheme.lower() != 'bearer':
+            return None
+        return self.tokens.get(token.strip())
+
+    def _designation(self, numero_serie):
+        """Designation of an inventoried serial number, reloading the index once on a miss"""
+        with self._lock:
+            if self._designations is None or numero_serie not in self._designations:
+                self._designations = {serie: designation
+                                      for designation, serie in self.db.get_endoscope_index().values()}
+            return self._designations.get(numero_serie)
+
+    def prepare(self, cycles, source):
+        """Cycles completed with their defaults, and {index: errors} for the invalid ones"""
+        reports, errors = [], {}
+        for index, cycle in enumerate(cycles):
+            if not isinstance(cycle, dict):
+                errors[index] = ["Un cycle doit être un objet JSON"]
+                continue
+            report = {key: value.strip() if isinstance(value, str) else value for key, value in cycle.items()}
+            report.setdefault('created_by', source)
+            report.setdefault('procedure_medicale', 'N/A')
+            if not report.get('endoscope') and report.get('numero_serie'):
+                report['endoscope'] = self._designation(report['numero_serie'])
+            problems = validate_sterilisation_report(report)
+            if not str(report.get('idempotency_key') or '').strip():
+                problems.insert(0, "Champ obligatoire manquant : idempotency_key")
+            if problems:
+                errors[index] = problems
+            reports.append(report)
+        return reports, errors
+
+    def ingest(self, payload, source):
+        """(HTTP status, response body) for a posted batch"""
+        cycles = payload.get('cycles') if isinstance(payload, dict) else payload
+        if not isinstance(cycles, list) or not cycles:
+            return 400, {'error': "Le corps doit contenir une liste non vide de cycles"}
+        if len(cycles) > MAX_BATCH_SIZE:
+            return 413, {'error': f"Au plus {MAX_BATCH_SIZE} cycles par requête"}
+        reports, errors = self.prepare(cycles, source)
+        if errors:
+            return 422, {'error': "Cycles invalides, aucun cycle enregistré",
+                         'details': [{'index': index, 'errors': problems} for index, problems in errors.items()]}
+        results = self.db.ingest_sterilisation_reports(reports, source)
+        if results is None:
+            return 500, {'error': "Erreur lors de l'enregistrement, aucun cycle enregistré"}
+        created = sum(1 for _, _, is_new in results if is_new)
+        return 200, {
+            'created': created, 'duplicates': len(results) - created,
+            'results': [{'idempotency_key': key, 'report_id': report_id, 'status': 'cree' if is_new else 'doublon'}
+                        for key, report_id, is_new in results],
+        }
+
+
+class IngestRequestHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    server_version = 'EndoCareIngest/1.0'
+    # Headers and body are written separately: without TCP_NODELAY keep-alive clients wait for delayed ACKs
+    disable_nagle_algorithm = True
+
+    def do_GET(self):
+        if self.path != '/health':
+            return self._send(404, {'error': "Ressource introuvable"})
+        self._send(200, {'status': 'ok'})
+
+    def do_POST(self):
+        service = self.server.service
+        source = service.source_for(self.headers.get('Authorization'))
+        try:
+            length = int(self.headers.get('Content-Length', ''))
+        except ValueError:
+            length = None
+        # Refusals sent before reading the body close the connection: the unread body would follow
+        if self.path != API_PATH:
+            return self._refuse(404, "Ressource introuvable")
+        if source is None:
+            return self._refuse(401, "Jeton d'accès invalide")
+        if length is None:
+            return self._refuse(411, "En-tête Content-Length requis")
+        if length > MAX_BODY_BYTES:
+            return self._refuse(413, f"Corps de requête limité à {MAX_BODY_BYTES} octets")
+        try:
+            payload = json.loads(self.rfile.read(length))
+        except (ValueError, UnicodeDecodeError):
+            return self._send(400, {'error': "JSON invalide"})
+        self._send(*service.ingest(payload, source))
+
+    def _refuse(self, status, message):
+        self.close_connection = True
+        self._send(status, {'error': message})
+
+    def _send(self, status, body):
+        data = json.dumps(body, ensure_ascii=False).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json; charset=utf-8')
+        self.send_header('Content-Length', str(len(data)))
+        if self.close_connection:
+            self.send_header('Connection', 'close')
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        if os.getenv("INGEST_API_ACCESS_LOG", "false").lower() == "true":
+            super().log_message(format, *args)
+
+
+def create_server(db_path="endotrace.db", host='0.0.0.0', port=8502, pool_size=4, tokens=None):
+    """HTTP server bound to host:port, not yet serving"""
+    db = DatabaseManager(db_path, pool=ConnectionPool(db_path, size=pool_size))
+    server = ThreadingHTTPServer((host, port), IngestRequestHandler)
+    server.daemon_threads = True
+    server.service = IngestService(db, parse_tokens(os.getenv("INGEST_API_TOKENS")) if tokens is None else tokens)
+    return server
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--db', default='endotrace.db')
+    parser.add_argument('--host', default='0.0.0.0')
+    parser.add_argument('--port', type=int, default=8502)
+    parser.add_argument('--pool-size', type=int, default=4)
+    args = parser.parse_args()
+
+    server = create_server(args.db, args.host, args.port, args.pool_size)
+    if not server.service.tokens:
+        print("Warning: INGEST_API_TOKENS is empty, every request will be refused")
+    print(f"Ingestion API listening on http://{args.host}:{args.port}{API_PATH}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        server.service.db.pool.close()
+
+
+if __name__ == '__main__':
+    main()
@@ -1,5 +1,9 @@
 -- Initialize database schema for Endotrace medical device traceability system
 
+-- Free pages can be returned to the file system in small steps (maintenance.py).
+-- Only applies to a new database; existing files are converted by python maintenance.py --convert-vacuum.
+PRAGMA auto_vacuum = INCREMENTAL;
+
 -- Users table for role-based access control
 CREATE TABLE IF NOT EXISTS users (
     id INTEGER PRIMARY KEY AUTOINCREMENT,
@@ -9,6 +13,39 @@ CREATE TABLE IF NOT EXISTS users (
     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
 );
 
+-- Lookup tables for the free-text categories; norm_key merges spelling variants
+-- (trimmed, single-spaced, lowercase). The fact tables reference them by id;
+-- the key column indexes are created by dimensions.py once legacy rows are migrated.
+CREATE TABLE IF NOT EXISTS dim_designation (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    label TEXT NOT NULL,
+    norm_key TEXT UNIQUE NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS dim_marque (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    label TEXT NOT NULL,
+    norm_key TEXT UNIQUE NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS dim_localisation (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    label TEXT NOT NULL,
+    norm_key TEXT UNIQUE NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS dim_salle (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    label TEXT NOT NULL,
+    norm_key TEXT UNIQUE NOT NULL
+);
+
+CREATE TABLE IF NOT EXISTS dim_type_acte (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    label TEXT NOT NULL,
+    norm_key TEXT UNIQUE NOT NULL
+);
+
 -- Endoscope inventory table
 CREATE TABLE IF NOT EXISTS endoscopes (
     id INTEGER PRIMARY KEY AUTOINCREMENT,
@@ -21,9 +58,19 @@ CREATE TABLE IF NOT EXISTS endoscopes (
     localisation TEXT NOT NULL,
     created_by TEXT NOT NULL,
     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    -- Latest sterilisation report of the device, kept by DatabaseManager on report writes
+    last_reprocessed_at TIMESTAMP,
+    last_report_id INTEGER,
+    designation_id INTEGER REFERENCES dim_designation(id),
+    marque_id INTEGER REFERENCES dim_marque(id),
+    localisation_id INTEGER REFERENCES dim_localisation(id)
 );
 
+-- Prefix search for the endoscope picker (LIKE 'abc%' uses NOCASE indexes)
+CREATE INDEX IF NOT EXISTS idx_endoscopes_serie_nocase ON endoscopes(numero_serie COLLATE NOCASE);
+CREATE INDEX IF NOT EXISTS idx_endoscopes_designation_nocase ON endoscopes(designation COLLATE NOCASE);
+
 -- Usage reports table for sterilization agents  
 CREATE TABLE IF NOT EXISTS usage_reports (
     id INTEGER PRIMARY KEY AUTOINCREMENT,
@@ -67,9 +114,232 @@ CREATE TABLE IF NOT EXISTS sterilisation_reports (
     -- Métadonnées
     created_by TEXT NOT NULL,
     created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+
+    -- Keys of salle and type_acte in dim_salle / dim_type_acte, kept by DatabaseManager
+    salle_id INTEGER REFERENCES dim_salle(id),
+    type_acte_id INTEGER REFERENCES dim_type_acte(id)
+);
+
+-- State observations (inventory changes and sterilisation reports) used for reliability metrics
+CREATE TABLE IF NOT EXISTS etat_events (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    numero_serie TEXT NOT NULL,
+    etat TEXT CHECK(etat IN ('fonctionnel', 'en panne')) NOT NULL,
+    event_at TIMESTAMP NOT NULL,
+    source TEXT CHECK(source IN ('inventaire', 'sterilisation')) NOT NULL,
+    source_id INTEGER,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+CREATE INDEX IF NOT EXISTS idx_etat_events_serie_time ON etat_events(numero_serie, event_at, id);
+CREATE INDEX IF NOT EXISTS idx_etat_events_source ON etat_events(source, source_id);
+
+-- Incrementally maintained up/down totals per endoscope (MTBF / MTTR)
+CREATE TABLE IF NOT EXISTS reliability_state (
+    numero_serie TEXT PRIMARY KEY,
+    etat TEXT NOT NULL,
+    etat_since TIMESTAMP NOT NULL,
+    first_event_at TIMESTAMP NOT NULL,
+    last_event_at TIMESTAMP NOT NULL,
+    uptime_seconds REAL NOT NULL DEFAULT 0,
+    downtime_seconds REAL NOT NULL DEFAULT 0,
+    failures INTEGER NOT NULL DEFAULT 0,
+    repairs INTEGER NOT NULL DEFAULT 0
+);
+
+-- Durable outbox for email alerts, drained by the background dispatcher
+CREATE TABLE IF NOT EXISTS email_outbox (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    kind TEXT CHECK(kind IN ('malfunction_rate', 'breakdown')) NOT NULL,
+    dedup_key TEXT NOT NULL,
+    payload TEXT NOT NULL,
+    status TEXT CHECK(status IN ('pending', 'sent', 'failed')) NOT NULL DEFAULT 'pending',
+    attempts INTEGER NOT NULL DEFAULT 0,
+    next_attempt_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    last_error TEXT,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    sent_at TIMESTAMP
+);
+
+CREATE INDEX IF NOT EXISTS idx_email_outbox_due ON email_outbox(status, next_attempt_at);
+CREATE INDEX IF NOT EXISTS idx_email_outbox_dedup ON email_outbox(dedup_key, created_at);
+
+-- Client keys of the cycles received from washers and scanners: one report per (source, key)
+CREATE TABLE IF NOT EXISTS ingestion_keys (
+    source TEXT NOT NULL,
+    idempotency_key TEXT NOT NULL,
+    report_id INTEGER,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (source, idempotency_key)
+);
+
+-- Read offsets of the washer cycle logs (bytes for CSV, records for XML), saved with the cycles they produced
+CREATE TABLE IF NOT EXISTS washer_log_files (
+    path TEXT PRIMARY KEY,
+    position INTEGER NOT NULL DEFAULT 0,
+    size INTEGER,
+    mtime REAL,
+    cycles INTEGER NOT NULL DEFAULT 0,
+    rejected INTEGER NOT NULL DEFAULT 0,
+    finished INTEGER NOT NULL DEFAULT 0,
+    -- Bumped each time the file shrinks (rotated or rewritten); part of the idempotency keys of its cycles
+    generation INTEGER NOT NULL DEFAULT 0,
     updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
 );
 
+-- Washer log records that failed validation, kept for review instead of blocking the file
+CREATE TABLE IF NOT EXISTS washer_log_rejects (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    path TEXT NOT NULL,
+    position INTEGER NOT NULL,
+    errors TEXT NOT NULL,
+    record TEXT,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+);
+
+-- Runs of the off-peak maintenance tasks (maintenance.py)
+CREATE TABLE IF NOT EXISTS maintenance_log (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    task TEXT NOT NULL,
+    started_at TIMESTAMP NOT NULL,
+    finished_at TIMESTAMP NOT NULL,
+    duration_ms REAL,
+    steps INTEGER,
+    longest_step_ms REAL,
+    status TEXT CHECK(status IN ('ok', 'interrupted', 'error')) NOT NULL,
+    detail TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_maintenance_log_finished ON maintenance_log(finished_at);
+
+-- Configurable alert rules (thresholds per designation / localisation)
+CREATE TABLE IF NOT EXISTS alert_rules (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    rule_type TEXT CHECK(rule_type IN ('taux_panne', 'pannes_repetees', 'test_etancheite', 'cycle_incomplet')) NOT NULL,
+    scope TEXT CHECK(scope IN ('global', 'designation', 'localisation')) NOT NULL DEFAULT 'global',
+    scope_value TEXT NOT NULL DEFAULT '',
+    threshold REAL,
+    window_days INTEGER,
+    severity TEXT CHECK(severity IN ('critique', 'avertissement')) NOT NULL DEFAULT 'avertissement',
+    enabled INTEGER NOT NULL DEFAULT 1,
+    UNIQUE(rule_type, scope, scope_value)
+);
+
+-- Inventory counters maintained on every write, read by the rate rules
+CREATE TABLE IF NOT EXISTS alert_counters (
+    scope TEXT NOT NULL,
+    scope_value TEXT NOT NULL,
+    total INTEGER NOT NULL DEFAULT 0,
+    en_panne INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (scope, scope_value)
+);
+
+-- Alerts fired by the rule engine
+CREATE TABLE IF NOT EXISTS alerts (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    rule_id INTEGER,
+    rule_type TEXT NOT NULL,
+    severity TEXT NOT NULL,
+    scope TEXT NOT NULL,
+    scope_value TEXT NOT NULL DEFAULT '',
+    numero_serie TEXT,
+    message TEXT NOT NULL,
+    report_id INTEGER,
+    status TEXT CHECK(status IN ('active', 'acquittee', 'resolue')) NOT NULL DEFAULT 'active',
+    acknowledged_by TEXT,
+    created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+    closed_at TIMESTAMP
+);
+
+CREATE INDEX IF NOT EXISTS idx_alerts_status ON alerts(status, id);
+CREATE INDEX IF NOT EXISTS idx_alerts_rule ON alerts(rule_id, status);
+
+INSERT OR IGNORE INTO alert_rules (rule_type, scope, scope_value, threshold, window_days, severity)
+VALUES ('taux_panne', 'global', '', 50, NULL, 'critique');
+INSERT OR IGNORE INTO alert_rules (rule_type, scope, scope_value, threshold, window_days, severity)
+VALUES ('pannes_repetees', 'global', '', 3, 30, 'avertissement');
+INSERT OR IGNORE INTO alert_rules (rule_type, scope, scope_value, threshold, window_days, severity)
+VALUES ('test_etancheite', 'global', '', NULL, NULL, 'critique');
+INSERT OR IGNORE INTO alert_rules (rule_type, scope, scope_value, threshold, window_days, severity)
+VALUES ('cycle_incomplet', 'global', '', NULL, NULL, 'avertissement');
+
+-- Per-table change counters polled by auto-refreshing dashboards
+CREATE TABLE IF NOT EXISTS table_versions (
+    table_name TEXT PRIMARY KEY,
+    version INTEGER NOT NULL DEFAULT 0
+);
+
+INSERT OR IGNORE INTO table_versions (table_name, version) VALUES ('users', 0);
+INSERT OR IGNORE INTO table_versions (table_name, version) VALUES ('endoscopes', 0);
+INSERT OR IGNORE INTO table_versions (table_name, version) VALUES ('usage_reports', 0);
+INSERT OR IGNORE INTO table_versions (table_name, version) VALUES ('sterilisation_reports', 0);
+INSERT OR IGNORE INTO table_versions (table_name, version) VALUES ('alerts', 0);
+
+CREATE TRIGGER IF NOT EXISTS trg_users_version_ins AFTER INSERT ON users
+BEGIN
+    UPDATE table_versions SET version = version + 1 WHERE table_name = 'users';
+END;
+CREATE TRIGGER IF NOT EXISTS trg_users_version_upd AFTER UPDATE ON users
+BEGIN
+    UPDATE table_versions SET version = version + 1 WHERE table_name = 'users';
+END;
+CREATE TRIGGER IF NOT EXISTS trg_users_version_del AFTER DELETE ON users
+BEGIN
+    UPDATE table_versions SET version = version + 1 WHERE table_name = 'users';
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_endoscopes_version_ins AFTER INSERT ON endoscopes
+BEGIN
+    UPDATE table_versions SET version = version + 1 WHERE table_name = 'endoscopes';
+END;
+CREATE TRIGGER IF NOT EXISTS trg_endoscopes_version_upd AFTER UPDATE ON endoscopes
+BEGIN
+    UPDATE table_versions SET version = version + 1 WHERE table_name = 'endoscopes';
+END;
+CREATE TRIGGER IF NOT EXISTS trg_endoscopes_version_del AFTER DELETE ON endoscopes
+BEGIN
+    UPDATE table_versions SET version = version + 1 WHERE table_name = 'endoscopes';
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_usage_reports_version_ins AFTER INSERT ON usage_reports
+BEGIN
+    UPDATE table_versions SET version = version + 1 WHERE table_name = 'usage_reports';
+END;
+CREATE TRIGGER IF NOT EXISTS trg_usage_reports_version_upd AFTER UPDATE ON usage_reports
+BEGIN
+    UPDATE table_versions SET version = version + 1 WHERE table_name = 'usage_reports';
+END;
+CREATE TRIGGER IF NOT EXISTS trg_usage_reports_version_del AFTER DELETE ON usage_reports
+BEGIN
+    UPDATE table_versions SET version = version + 1 WHERE table_name = 'usage_reports';
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_sterilisation_reports_version_ins AFTER INSERT ON sterilisation_reports
+BEGIN
+    UPDATE table_versions SET version = version + 1 WHERE table_name = 'sterilisation_reports';
+END;
+CREATE TRIGGER IF NOT EXISTS trg_sterilisation_reports_version_upd AFTER UPDATE ON sterilisation_reports
+BEGIN
+    UPDATE table_versions SET version = version + 1 WHERE table_name = 'sterilisation_reports';
+END;
+CREATE TRIGGER IF NOT EXISTS trg_sterilisation_reports_version_del AFTER DELETE ON sterilisation_reports
+BEGIN
+    UPDATE table_versions SET version = version + 1 WHERE table_name = 'sterilisation_reports';
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_alerts_version_ins AFTER INSERT ON alerts
+BEGIN
+    UPDATE table_versions SET version = version + 1 WHERE table_name = 'alerts';
+END;
+CREATE TRIGGER IF NOT EXISTS trg_alerts_version_upd AFTER UPDATE ON alerts
+BEGIN
+    UPDATE table_versions SET version = version + 1 WHERE table_name = 'alerts';
+END;
+CREATE TRIGGER IF NOT EXISTS trg_alerts_version_del AFTER DELETE ON alerts
+BEGIN
+    UPDATE table_versions SET version = version + 1 WHERE table_name = 'alerts';
+END;
+
 -- Insert default admin user
 INSERT OR IGNORE INTO users (username, password, role) 
 VALUES ('admin', 'admin123', 'admin');
@@ -0,0 +1,296 @@
+"""Off-peak database maintenance.
+
+A background worker that, once a day inside a quiet time window, checkpoints
+the WAL, refreshes the planner statistics (ANALYZE one table at a time with
+a bounded analysis_limit, then PRAGMA optimize) and gives the free pages left
+by deletions and purges back to the file system with incremental vacuum.
+
+Incremental vacuum needs auto_vacuum=INCREMENTAL, which a database created
+before it was set in init.sql only gets from a full VACUUM. That rewrites the
+whole file in one exclusive transaction, so the scheduler never runs it: it
+is an explicit action (--convert-vacuum), to run while nobody uses the
+application.
+
+Every task is cut into short steps. Before each step the worker checks the
+table change counters; when users wrote since the previous step (or the
+database is locked) it backs off, exponentially, and resumes the same task
+afterwards. Each run is recorded in maintenance_log.
+
+Usage: python maintenance.py [--db endotrace.db] [--window 01:00-05:00] [--now | --convert-vacuum]
+"""
+import argparse
+import os
+import sqlite3
+import threading
+import time
+from datetime import datetime
+
+from database import DatabaseManager
+
+MAINTENANCE_WINDOW = os.getenv("MAINTENANCE_WINDOW", "01:00-05:00")
+TASKS = ['wal_checkpoint', 'analyze', 'optimize', 'incremental_vacuum']
+
+
+def parse_window(text):
+    """((h, m), (h, m)) from 'HH:MM-HH:MM'; the window may span midnight"""
+    start, _, end = text.partition('-')
+    return tuple(tuple(int(part) for part in bound.strip().split(':')) for bound in (start, end))
+
+
+def in_window(window, now=None):
+    now = now or datetime.now()
+    current = (now.hour, now.minute)
+    start, end = window
+    if start <= end:
+        return start <= current < end
+    return current >= start or current < end
+
+
+class UserActivity(Exception):
+    """Raised between steps when users are writing to the database"""
+
+
+class MaintenanceScheduler:
+    """Background worker running the maintenance tasks in bounded steps"""
+
+    def __init__(self, db, window=MAINTENANCE_WINDOW, poll_interval=300.0, vacuum_pages=256, analysis_limit=1000,
+                 busy_timeout=1.0, base_backoff=30.0, max_backoff=900.0):
+        self.db = db
+        self.window = parse_window(window) if isinstance(window, str) else window
+        self.poll_interval = poll_interval
+        self.vacuum_pages = vacuum_pages
+        self.analysis_limit = analysis_limit
+        self.busy_timeout = busy_timeout
+        self.base_backoff = base_backoff
+        self.max_backoff = max_backoff
+        self.backoffs = 0
+        self._streak = 0
+        self._activity = None
+        self._force = False
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        """Start the worker thread (idempotent)"""
+        if self._thread is None or not self._thread.is_alive():
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name="database-maintenance", daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self, timeout=10):
+        self._stop.set()
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+
+    def request_run(self):
+        """Run every task now in the background, even outside the window and if already done today"""
+        if self._thread is not None and self._thread.is_alive():
+            self._force = True
+            self._wake.set()
+        else:
+            threading.Thread(target=self.run_once, kwargs={'force': True}, name="database-maintenance-once",
+                             daemon=True).start()
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                self.run_once()
+            except Exception as e:
+                print(f"Erreur de maintenance de la base: {e}")
+            self._wake.wait(self.poll_interval)
+            self._wake.clear()
+
+    def due_tasks(self):
+        """Tasks not completed yet today"""
+        conn = self.db.get_connection()
+        try:
+            cursor = conn.cursor()
+            cursor.execute(
+                """SELECT DISTINCT task FROM maintenance_log
+                   WHERE status = 'ok' AND date(finished_at) = date('now', 'localtime')""")
+            done = {row[0] for row in cursor.fetchall()}
+        finally:
+            conn.close()
+        return [task for task in TASKS if task not in done]
+
+    def run_once(self, force=False):
+        """Run the due tasks if inside the window (or forced); returns {task: detail}"""
+        force = force or self._force
+        self._force = False
+        if not force and not in_window(self.window):
+            return {}
+        results = {}
+        for task in (TASKS if force else self.due_tasks()):
+            if self._stop.is_set() or (not force and not in_window(self.window)):
+                break
+            results[task] = self._run_task(task, force)
+        return results
+
+    def _run_task(self, task, force):
+        conn = sqlite3.connect(self.db.db_path, timeout=self.busy_timeout)
+        started_at = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        started = time.perf_counter()
+        steps, longest, detail = 0, 0.0, None
+        try:
+            self._activity = self._activity_counter(conn)
+            step_iter = getattr(self, f"_{task}")(conn)
+            while True:
+                self._wait_until_quiet(conn, force)
+                step_started = time.perf_counter()
+                try:
+                    detail = next(step_iter)
+                except StopIteration:
+                    break
+                except sqlite3.OperationalError as e:
+                    if 'locked' not in str(e) and 'busy' not in str(e):
+                        raise
+                    # The step gave up on a user's lock: back off and try it again
+                    self._back_off(force)
+                    step_iter = getattr(self, f"_{task}")(conn)
+                    continue
+                steps += 1
+                longest = max(longest, time.perf_counter() - step_started)
+            status = 'ok'
+        except UserActivity as e:
+            status, detail = 'interrupted', str(e)
+        except Exception as e:
+            status, detail = 'error', str(e)
+        finally:
+            conn.close()
+        self._log(task, started_at, time.perf_counter() - started, steps, longest, status, detail)
+        return detail
+
+    def convert_vacuum(self):
+        """Switch the file to auto_vacuum=INCREMENTAL with one full VACUUM; returns the detail logged.
+
+        Unbounded: the database is locked for the whole rewrite.
+        """
+        conn = sqlite3.connect(self.db.db_path, timeout=self.busy_timeout)
+        started_at = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        started = time.perf_counter()
+        try:
+            if conn.execute("PRAGMA auto_vacuum").fetchone()[0] == 2:
+                status, detail = 'ok', "auto_vacuum already incremental"
+            else:
+                free = conn.execute("PRAGMA freelist_count").fetchone()[0]
+                conn.execute("PRAGMA auto_vacuum=INCREMENTAL")
+                conn.execute("VACUUM")
+                status, detail = 'ok', f"{free} free pages reclaimed by VACUUM, auto_vacuum set to incremental"
+        except Exception as e:
+            status, detail = 'error', str(e)
+        finally:
+            conn.close()
+        duration = time.perf_counter() - started
+        self._log('convert_vacuum', started_at, duration, 1, duration, status, detail)
+        return detail
+
+    def _activity_counter(self, conn):
+        return conn.execute("SELECT COALESCE(SUM(version), 0) FROM table_versions").fetchone()[0]
+
+    def _wait_until_quiet(self, conn, force):
+        """Back off while the change counters keep moving"""
+        while not self._stop.is_set():
+            counter = self._activity_counter(conn)
+            if counter == self._activity:
+                self._streak = 0
+                return
+            self._activity = counter
+            self._back_off(force)
+        raise UserActivity("Maintenance stopped")
+
+    def _back_off(self, force):
+        self.backoffs += 1
+        self._streak += 1
+        delay = min(self.base_backoff * 2 ** min(self._streak - 1, 10), self.max_backoff)
+        self._stop.wait(delay)
+        if not force and not in_window(self.window):
+            raise UserActivity("Maintenance window over")
+
+    def _log(self, task, started_at, duration, steps, longest, status, detail):
+        conn = self.db.get_connection()
+        try:
+            conn.execute(
+                """INSERT INTO maintenance_log (task, started_at, finished_at, duration_ms, steps, longest_step_ms,
+                                                status, detail)
+                   VALUES (?, ?, ?, ?, ?, ?, ?, ?)""",
+                (task, started_at, datetime.now().strftime("%Y-%m-%d %H:%M:%S"), round(duration * 1000, 1),
+                 steps, round(longest * 1000, 1), status, None if detail is None else str(detail)))
+            conn.commit()
+        finally:
+            conn.close()
+
+    # Tasks: generators yielding a detail after each bounded step
+
+    def _wal_checkpoint(self, conn):
+        journal_mode = conn.execute("PRAGMA journal_mode").fetchone()[0]
+        if journal_mode != 'wal':
+            yield f"journal_mode={journal_mode}, no WAL"
+            return
+        busy, log_frames, checkpointed = conn.execute("PRAGMA wal_checkpoint(PASSIVE)").fetchone()
+        yield f"{checkpointed}/{log_frames} frames"
+        if not busy and checkpointed == log_frames:
+            # Everything is in the main file: empty the WAL unless a reader still uses it
+            busy, log_frames, checkpointed = conn.execute("PRAGMA wal_checkpoint(TRUNCATE)").fetchone()
+            yield f"{checkpointed}/{log_frames} frames" + (" (WAL truncated)" if not busy else "")
+
+    def _analyze(self, conn):
+        conn.execute(f"PRAGMA analysis_limit={int(self.analysis_limit)}")
+        tables = [row[0] for row in conn.execute(
+            "SELECT name FROM sqlite_master WHERE type = 'table' AND name NOT LIKE 'sqlite_%' ORDER BY name")]
+        for count, table in enumerate(tables, 1):
+            conn.execute(f'ANALYZE "{table}"')
+            conn.commit()
+            yield f"{count}/{len(tables)} tables"
+
+    def _optimize(self, conn):
+        conn.execute("PRAGMA optimize")
+        yield "ok"
+
+    def _incremental_vacuum(self, conn):
+        page_count = conn.execute("PRAGMA page_count").fetchone()[0]
+        free = conn.execute("PRAGMA freelist_count").fetchone()[0]
+        if conn.execute("PRAGMA auto_vacuum").fetchone()[0] != 2:
+            ratio = free / page_count if page_count else 0
+            yield f"{free} free pages ({ratio:.0%}), auto_vacuum off: run maintenance.py --convert-vacuum"
+            return
+        reclaimed = 0
+        while free:
+            conn.execute(f"PRAGMA incremental_vacuum({int(self.vacuum_pages)})").fetchall()
+            conn.commit()
+            remaining = conn.execute("PRAGMA freelist_count").fetchone()[0]
+            reclaimed += free - remaining
+            if remaining >= free:
+                break
+            free = remaining
+            yield f"{reclaimed} pages reclaimed, {free} free"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--db', default='endotrace.db')
+    parser.add_argument('--window', default=MAINTENANCE_WINDOW)
+    parser.add_argument('--now', action='store_true', help="run every task once now and exit")
+    parser.add_argument('--convert-vacuum', action='store_true',
+                        help="switch the database to incremental auto-vacuum with a full VACUUM and exit")
+    args = parser.parse_args()
+
+    scheduler = MaintenanceScheduler(DatabaseManager(args.db), args.window)
+    if args.convert_vacuum:
+        print(f"convert_vacuum: {scheduler.convert_vacuum()}")
+        return
+    if args.now:
+        for task, detail in scheduler.run_once(force=True).items():
+            print(f"{task}: {detail}")
+        return
+    print(f"Maintenance window {args.window}")
+    try:
+        scheduler._run()
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,223 @@
+import cProfile
+import io
+import os
+import pstats
+import re
+import tempfile
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from datetime import datetime
+
+import pandas as pd
+
+
+RERUN_LABEL = "Total"
+FRAGMENT_SUFFIX = " (fragment)"
+PERCENTILES = [0.5, 0.95]
+
+
+class _PhaseStats:
+    """Durations of one phase of one page: recent samples for percentiles, running totals for the flame graph"""
+
+    __slots__ = ('samples', 'reruns', 'calls', 'total')
+
+    def __init__(self, size):
+        self.samples = deque(maxlen=size)
+        self.reruns = 0
+        self.calls = 0
+        self.total = 0.0
+
+
+class PageProfiler:
+    """Timings of named phases of the Streamlit reruns, aggregated per page for every session.
+
+    main() runs inside rerun(); sections of the pages run inside phase(),
+    which can also decorate a function. Phases nest, so each one is
+    identified by its path from the page. A fragment rerun only runs its
+    own function: a phase entered outside a rerun is recorded as a rerun of
+    the page "<phase> (fragment)". Disabled, both context managers return
+    at once. With cprofile_dir set, every rerun also runs under cProfile
+    and the keep_profiles slowest ones are dumped there.
+    """
+
+    def __init__(self, enabled=False, size=500, cprofile_dir=None, keep_profiles=5):
+        self.enabled = enabled
+        self.size = size
+        self.cprofile_dir = cprofile_dir
+        self.keep_profiles = keep_profiles
+        self._pages = {}
+        self._profiles = []
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    @classmethod
+    def from_env(cls):
+        """Configure from PAGE_PROFILER_ENABLED, PAGE_PROFILER_SIZE, PAGE_PROFILER_CPROFILE_DIR and PAGE_PROFILER_KEEP"""
+        return cls(enabled=os.getenv("PAGE_PROFILER_ENABLED", "false").lower() == "true",
+                   size=int(os.getenv("PAGE_PROFILER_SIZE", "500")),
+                   cprofile_dir=os.getenv("PAGE_PROFILER_CPROFILE_DIR") or None,
+                   keep_profiles=int(os.getenv("PAGE_PROFILER_KEEP", "5")))
+
+    @staticmethod
+    def default_cprofile_dir():
+        return os.getenv("PAGE_PROFILER_CPROFILE_DIR") or os.path.join(tempfile.gettempdir(), "endocare_profiles")
+
+    @contextmanager
+    def rerun(self, page=None):
+        """Time one rerun; the page can be named later with set_page()"""
+        if not self.enabled or getattr(self._local, 'run', None) is not None:
+            yield
+            return
+        run = {'page': page, 'stack': [], 'phases': {}}
+        profile = self._start_cprofile()
+        self._local.run = run
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            seconds = time.perf_counter() - start
+            self._local.run = None
+            if profile is not None:
+                profile.disable()
+            self._record(run, seconds, profile)
+
+    def set_page(self, page):
+        run = getattr(self._local, 'run', None)
+        if run is not None:
+            run['page'] = page
+
+    @contextmanager
+    def phase(self, name):
+        """Time a named section of the current rerun"""
+        if not self.enabled:
+            yield
+            return
+        run = getattr(self._local, 'run', None)
+        if run is None:
+            with self.rerun(f"{name}{FRAGMENT_SUFFIX}"), self.phase(name):
+                yield
+            return
+        run['stack'].append(name)
+        path = tuple(run['stack'])
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            totals = run['phases'].setdefault(path, [0.0, 0])
+            totals[0] += time.perf_counter() - start
+            totals[1] += 1
+            run['stack'].pop()
+
+    def _start_cprofile(self):
+        if not self.cprofile_dir:
+            return None
+        profile = cProfile.Profile()
+        try:
+            profile.enable()
+        except ValueError:
+            # Another profiler is active on this thread
+            return None
+        return profile
+
+    def _record(self, run, seconds, profile):
+        page = run['page'] or '-'
+        with self._lock:
+            stats = self._pages.setdefault(page, {})
+            for path, (total, calls) in [((), (seconds, 1))] + list(run['phases'].items()):
+                phase = stats.get(path)
+                if phase is None:
+                    phase = stats[path] = _PhaseStats(self.size)
+                phase.samples.append(total)
+                phase.reruns += 1
+                phase.calls += calls
+                phase.total += total
+            if profile is not None:
+                self._keep_profile(page, seconds, profile)
+
+    def _keep_profile(self, page, seconds, profile):
+        """Dump the profile if the rerun is among the slowest kept so far"""
+        if len(self._profiles) >= self.keep_profiles and seconds <= self._profiles[-1]['duration_ms'] / 1000:
+            return
+        os.makedirs(self.cprofile_dir, exist_ok=True)
+        recorded_at = datetime.now()
+        slug = re.sub(r'[^A-Za-z0-9]+', '_', page).strip('_') or 'page'
+        path = os.path.join(self.cprofile_dir, f"{recorded_at:%Y%m%d_%H%M%S}_{slug}_{seconds * 1000:.0f}ms.prof")
+        profile.dump_stats(path)
+        self._profiles.append({'page': page, 'duration_ms': seconds * 1000, 'recorded_at': recorded_at, 'path': path})
+        self._profiles.sort(key=lambda dump: dump['duration_ms'], reverse=True)
+        for evicted in self._profiles[self.keep_profiles:]:
+            try:
+                os.remove(evicted['path'])
+            except OSError:
+                pass
+        del self._profiles[self.keep_profiles:]
+
+    def clear(self):
+        """Forget every timing and delete the cProfile dumps"""
+        with self._lock:
+            self._pages.clear()
+            for dump in self._profiles:
+                try:
+                    os.remove(dump['path'])
+                except OSError:
+                    pass
+            self._profiles.clear()
+
+    def pages(self):
+        with self._lock:
+            return sorted(self._pages)
+
+    def summary(self, page=None):
+        """Reruns, calls, p50/p95/max and total per page and phase; phases follow their parent"""
+        rows = []
+        with self._lock:
+            for name, stats in self._pages.items():
+                if page is not None and name != page:
+                    continue
+                for path, phase in stats.items():
+                    rows.append((name, path, phase.reruns, phase.calls, list(phase.samples), phase.total))
+        records = []
+        for name, path, reruns, calls, samples, total in sorted(rows, key=lambda row: (row[0], row[1])):
+            quantiles = pd.Series(samples).quantile(PERCENTILES) * 1000
+            records.append({
+                'page': name, 'phase': ' / '.join(path) or RERUN_LABEL,
+                'depth': len(path), 'reruns': reruns, 'calls': calls,
+                'p50_ms': quantiles.iloc[0], 'p95_ms': quantiles.iloc[1], 'max_ms': max(samples) * 1000,
+                'total_ms': total * 1000,
+            })
+        return pd.DataFrame(records, columns=['page', 'phase', 'depth', 'reruns', 'calls', 'p50_ms', 'p95_ms',
+                                              'max_ms', 'total_ms'])
+
+    def flame(self, page):
+        """ids, parents, labels and total ms of one page's phases, for an icicle chart.
+
+        Totals are cumulative since the last reset, so each phase's children
+        never add up to more than the phase itself.
+        """
+        with self._lock:
+            stats = {path: phase.total for path, phase in self._pages.get(page, {}).items()}
+        records = []
+        for path, total in sorted(stats.items()):
+            records.append({
+                'id': ' / '.join((page, ) + path), 'parent': ' / '.join((page, ) + path[:-1]) if path else '',
+                'label': path[-1] if path else page, 'total_ms': total * 1000,
+            })
+        return pd.DataFrame(records, columns=['id', 'parent', 'label', 'total_ms'])
+
+    def profiles(self):
+        """cProfile dumps kept, slowest first"""
+        with self._lock:
+            return pd.DataFrame(list(self._profiles), columns=['page', 'duration_ms', 'recorded_at', 'path'])
+
+    @staticmethod
+    def profile_report(path, limit=25):
+        """Top functions of a dump by cumulative time, as text"""
+        output = io.StringIO()
+        pstats.Stats(path, stream=output).sort_stats('cumulative').print_stats(limit)
+        return output.getvalue()
+
+
+# One profiler per server process, shared by every session
+PAGE_PROFILER = PageProfiler.from_env()
@@ -0,0 +1,202 @@
+import base64
+import io
+import os
+from io import BytesIO
+
+import pandas as pd
+
+from page_profiler import PAGE_PROFILER
+from qr_codes import generate_qr_code
+
+
+@PAGE_PROFILER.phase("Génération PDF")
+def generate_professional_pdf_report(data, title, report_type="sterilisation"):
+    """Generate a professional medical PDF report like the example provided"""
+    # reportlab takes ~0.1 s to import: load it with the first report, not with the app
+    from reportlab.lib import colors
+    from reportlab.lib.enums import TA_LEFT
+    from reportlab.lib.pagesizes import A4
+    from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
+    from reportlab.lib.units import inch, cm
+    from reportlab.platypus import SimpleDocTemplate, Paragraph, Spacer, Image, HRFlowable
+
+    buffer = io.BytesIO()
+    doc = SimpleDocTemplate(
+        buffer, 
+        pagesize=A4,
+        rightMargin=2*cm,
+        leftMargin=2*cm,
+        topMargin=2*cm,
+        bottomMargin=2*cm
+    )
+    
+    # Get styles
+    styles = getSampleStyleSheet()
+    
+    # Custom styles for medical report
+    title_style = ParagraphStyle(
+        'MedicalTitle',
+        parent=styles['Heading1'],
+        fontSize=18,
+        spaceAfter=20,
+        spaceBefore=10,
+        alignment=TA_LEFT,  # Left aligned like medical reports
+        textColor=colors.black,
+        fontName='Helvetica-Bold'
+    )
+    
+    record_header_style = ParagraphStyle(
+        'RecordHeader',
+        parent=styles['Heading2'],
+        fontSize=14,
+        spaceAfter=10,
+        spaceBefore=15,
+        textColor=colors.HexColor('#1f4e79'),
+        fontName='Helvetica-Bold'
+    )
+    
+    field_style = ParagraphStyle(
+        'FieldStyle',
+        parent=styles['Normal'],
+        fontSize=11,
+        spaceAfter=4,
+        fontName='Helvetica',
+        leftIndent=0
+    )
+    
+    # Content story
+    story = []
+
+    title_style = styles["Title"]
+
+    # Load and resize the logo (centered)
+    try:
+        logo_path = r'attached_assets\logo.webp'
+        if os.path.exists(logo_path):
+            logo = Image(logo_path)
+            logo.drawHeight = 1 * inch
+            logo.drawWidth = 1 * inch * logo.imageWidth / logo.imageHeight  # Maintain aspect ratio
+            logo.hAlign = 'CENTER'
+            story.append(logo)
+            story.append(Spacer(1, 10))
+    except Exception as e:
+        print(f"Logo loading error: {e}")
+
+    # Choose title
+    if report_type == "sterilisation":
+        title_text = "Rapports de Stérilisation et Désinfection"
+    elif report_type == "inventaire":
+        title_text = "Rapport d'Inventaire des Endoscopes"
+    else:
+        title_text = title
+
+    # Add centered title
+    title_paragraph = Paragraph(f"<b>{title_text}</b>", title_style)
+    title_paragraph.hAlign = 'CENTER'
+    story.append(title_paragraph)
+    story.append(Spacer(1, 6))
+
+    # Add horizontal line
+    story.append(HRFlowable(width="100%", thickness=1.2, color=colors.black))
+    story.append(Spacer(1, 15))
+    
+
+    # Main content
+    if isinstance(data, pd.DataFrame) and not data.empty:
+        # Process each record
+        for i, (_, row) in enumerate(data.iterrows(), start=1):
+            # Construire le titre de l'enregistrement
+            record_title = f"• ENREGISTREMENT {i}"
+            if report_type == "sterilisation" and 'endoscope' in row:
+                record_title += f" - {row['endoscope']}"
+            elif report_type == "inventaire" and 'designation' in row:
+                record_title += f" - {row['designation']}"
+
+            story.append(Paragraph(record_title, record_header_style))
+
+            # Générer et insérer le QR Code seulement pour les rapports d'inventaire
+            if report_type == "inventaire":
+                qr_code_base64 = generate_qr_code(row.get('id'), row.get('designation'), row.get('numero_serie'))
+                if qr_code_base64:
+                    try:
+                        qr_buffer = BytesIO(base64.b64decode(qr_code_base64))
+                        qr_img = Image(qr_buffer, width=2*cm, height=2*cm)
+                        qr_img.hAlign = 'LEFT'
+                        story.append(qr_img)
+                    except Exception as e:
+                        print(f"Erreur QR: {e}")
+
+            story.append(Spacer(1, 10))
+
+            
+            # Create simple field entries (no squares, just text)
+            for col, val in row.items():
+                if pd.notna(val) and str(val).strip():
+                    if col.lower() in ['qr', 'qr_code', 'qr_img', 'qr code']:
+                        continue  # Empêche l'affichage d'un QR code en double
+                    # Format column names in French
+                    formatted_col = col.replace('_', ' ').title()
+                    if col == 'id':
+                        formatted_col = "Id"
+                    elif col == 'date_desinfection':
+                        formatted_col = "Date de Désinfection"
+                    elif col == 'nom_operateur':
+                        formatted_col = "Nom de l'Opérateur"
+                    elif col == 'numero_serie':
+                        formatted_col = "Numéro de Série"
+                    elif col == 'medecin_responsable':
+                        formatted_col = "Médecin Responsable"
+                    elif col == 'type_desinfection':
+                        formatted_col = "Type de Désinfection"
+                    elif col == 'test_etancheite':
+                        formatted_col = "Test d'Étanchéité"
+                    elif col == 'etat_endoscope':
+                        formatted_col = "État de l'Endoscope"
+                    elif col == 'nature_panne':
+                        formatted_col = "Nature de la Panne"
+                    elif col == 'heure_debut':
+                        formatted_col = "Heure de Début"
+                    elif col == 'heure_fin':
+                        formatted_col = "Heure de Fin"
+                    elif col == 'type_acte':
+                        formatted_col = "Type d'Acte"
+                    elif col == 'salle':
+                        formatted_col = "Salle"
+                    elif col == 'cycle':
+                        formatted_col = "Cycle"
+                    elif col == 'marque':
+                        formatted_col = "Marque"
+                    elif col == 'modele':
+                        formatted_col = "Modèle"
+                    elif col == 'localisation':
+                        formatted_col = "Localisation"
+                    elif col == 'observation':
+                        formatted_col = "Observations"
+                    elif col == 'created_by':
+                        formatted_col = "Créé par"
+                    elif col == 'created_at':
+                        formatted_col = "Date de Création"
+                    elif col == 'endoscope':
+                        formatted_col = "Endoscope"
+                    elif col == 'procedure_medicale':
+                        formatted_col = "Procédure Médicale"
+                    elif col == 'designation':
+                        formatted_col = "Désignation"
+                    elif col == 'etat':
+                        formatted_col = "État"
+                    
+                    formatted_val = str(val)
+                    
+                    # Simple format like the example: ■ Field: Value
+                    # Simple clean format like medical reports: Field: Value
+                    field_text = f"<b>{formatted_col}:</b> {formatted_val}" 
+                    story.append(Paragraph(field_text, field_style))
+            
+            story.append(Spacer(1, 20))  # Space between records
+    else:
+        story.append(Paragraph("Aucune donnée disponible", field_style))
+    
+    # Build PDF
+    doc.build(story)
+    buffer.seek(0)
+    return buffer.getvalue()
@@ -0,0 +1,87 @@
+import base64
+import hashlib
+import os
+from io import BytesIO
+
+from page_profiler import PAGE_PROFILER
+from scan_intake import format_qr_payload
+
+# Streamlit serves <app dir>/static at app/static when server.enableStaticServing is on
+QR_STATIC_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'static', 'qr')
+QR_STATIC_URL = 'app/static/qr'
+
+
+@PAGE_PROFILER.phase("QR code")
+def generate_qr_code(endoscope_id, designation, numero_serie):
+    """Generate QR code for endoscope"""
+    # qrcode (and PIL) load with the first code rather than with the app
+    import qrcode
+
+    try:
+        # Create QR code data
+        qr_data = format_qr_payload(endoscope_id, designation, numero_serie)
+        
+        # Generate QR code
+        qr = qrcode.QRCode(
+            version=1,
+            error_correction=qrcode.constants.ERROR_CORRECT_L,
+            box_size=10,
+            border=4,
+        )
+        qr.add_data(qr_data)
+        qr.make(fit=True)
+        
+        # Create QR code image
+        qr_img = qr.make_image(fill_color="black", back_color="white")
+        
+        # Convert to base64 for display
+        buffer = BytesIO()
+        qr_img.save(buffer, format='PNG')
+        buffer.seek(0)
+        qr_base64 = base64.b64encode(buffer.getvalue()).decode()
+        
+        return qr_base64
+    except Exception as e:
+        print(f"Error generating QR code: {e}")
+        return None
+
+
+def qr_thumbnail_png(endoscope_id, designation, numero_serie, box_size=2):
+    """Small 1-bit PNG of the endoscope QR code, sized for table cells"""
+    import qrcode
+
+    qr = qrcode.QRCode(
+        version=None,
+        error_correction=qrcode.constants.ERROR_CORRECT_L,
+        box_size=box_size,
+        border=1,
+    )
+    qr.add_data(format_qr_payload(endoscope_id, designation, numero_serie))
+    qr.make(fit=True)
+    buffer = BytesIO()
+    qr.make_image(fill_color="black", back_color="white").save(buffer, format='PNG', optimize=True)
+    return buffer.getvalue()
+
+
+def qr_thumbnail_data_uri(endoscope_id, designation, numero_serie):
+    """Thumbnail inlined as a data URI"""
+    png = qr_thumbnail_png(endoscope_id, designation, numero_serie)
+    return f"data:image/png;base64,{base64.b64encode(png).decode()}"
+
+
+def qr_thumbnail_url(endoscope_id, designation, numero_serie):
+    """Thumbnail written once under static/qr and referenced by URL.
+
+    The file name is a hash of the QR payload, so editing an endoscope
+    yields a new file instead of a stale cached image.
+    """
+    payload = format_qr_payload(endoscope_id, designation, numero_serie)
+    name = f"{hashlib.sha1(payload.encode('utf-8')).hexdigest()[:20]}.png"
+    path = os.path.join(QR_STATIC_DIR, name)
+    if not os.path.exists(path):
+        os.makedirs(QR_STATIC_DIR, exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'wb') as f:
+            f.write(qr_thumbnail_png(endoscope_id, designation, numero_serie))
+        os.replace(tmp_path, path)
+    return f"{QR_STATIC_URL}/{name}"
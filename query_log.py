@@ -0,0 +1,247 @@
+import os
+import sqlite3
+import sys
+import threading
+import time
+from collections import deque
+from datetime import datetime
+
+import pandas as pd
+
+
+QUERY_LOG_COLUMNS = ['logged_at', 'page', 'method', 'sql', 'duration_ms', 'rows', 'plan']
+PERCENTILES = [0.5, 0.95, 0.99]
+
+
+def _caller():
+    """(page, method) running the current query: outermost show_* function of app.py and
+    outermost public function of database.py on the stack"""
+    page = method = None
+    frame = sys._getframe(2)
+    while frame is not None:
+        filename = os.path.basename(frame.f_code.co_filename)
+        name = frame.f_code.co_name
+        if filename == 'database.py' and (method is None or not name.startswith('_')):
+            method = name
+        elif filename == 'app.py' and name.startswith('show_'):
+            page = name
+        frame = frame.f_back
+    return page, method
+
+
+class InstrumentedCursor(sqlite3.Cursor):
+    """Cursor timing each statement from execute to its last fetch.
+
+    A statement is logged when its rows are exhausted, when the cursor runs
+    the next statement or is closed, or when the connection closes.
+    """
+
+    _pending = None
+
+    def execute(self, sql, parameters=()):
+        self._finish()
+        start = time.perf_counter()
+        try:
+            return super().execute(sql, parameters)
+        finally:
+            self._begin(sql, parameters, start)
+
+    def executemany(self, sql, seq_of_parameters):
+        self._finish()
+        if not isinstance(seq_of_parameters, (list, tuple)):
+            seq_of_parameters = list(seq_of_parameters)
+        start = time.perf_counter()
+        try:
+            return super().executemany(sql, seq_of_parameters)
+        finally:
+            self._begin(sql, seq_of_parameters[0] if seq_of_parameters else (), start)
+
+    def executescript(self, sql_script):
+        self._finish()
+        start = time.perf_counter()
+        try:
+            return super().executescript(sql_script)
+        finally:
+            # A script has no single plan to explain
+            self._begin(sql_script, None, start)
+
+    def fetchone(self):
+        start = time.perf_counter()
+        row = super().fetchone()
+        self._fetched(start, row is not None, row is None)
+        return row
+
+    def fetchmany(self, size=None):
+        size = self.arraysize if size is None else size
+        start = time.perf_counter()
+        rows = super().fetchmany(size)
+        self._fetched(start, len(rows), len(rows) < size)
+        return rows
+
+    def fetchall(self):
+        start = time.perf_counter()
+        rows = super().fetchall()
+        self._fetched(start, len(rows), True)
+        return rows
+
+    def __next__(self):
+        start = time.perf_counter()
+        try:
+            row = super().__next__()
+        except StopIteration:
+            self._fetched(start, 0, True)
+            raise
+        self._fetched(start, 1, False)
+        return row
+
+    def close(self):
+        self._finish()
+        super().close()
+
+    def _begin(self, sql, parameters, start):
+        page, method = _caller()
+        self._pending = {'sql': sql, 'parameters': parameters, 'seconds': time.perf_counter() - start,
+                         'rows': 0, 'page': page, 'method': method}
+        self.connection.pending_cursors.append(self)
+
+    def _fetched(self, start, rows, done):
+        if self._pending is None:
+            return
+        self._pending['seconds'] += time.perf_counter() - start
+        self._pending['rows'] += rows
+        if done:
+            self._finish()
+
+    def _finish(self):
+        pending, self._pending = self._pending, None
+        if pending is None:
+            return
+        self.connection.pending_cursors.remove(self)
+        if not pending['rows'] and self.rowcount > 0:
+            pending['rows'] = self.rowcount
+        self.connection.query_log.record(self.connection, pending)
+
+
+class InstrumentedConnection(sqlite3.Connection):
+    """Connection whose cursors (including conn.execute) report to a QueryLog"""
+
+    query_log = None
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.pending_cursors = []
+
+    def cursor(self, factory=InstrumentedCursor):
+        return super().cursor(factory)
+
+    # sqlite3.Connection shortcuts open their cursor without going through cursor()
+    def execute(self, sql, parameters=()):
+        return self.cursor().execute(sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        return self.cursor().executemany(sql, seq_of_parameters)
+
+    def executescript(self, sql_script):
+        return self.cursor().executescript(sql_script)
+
+    def close(self):
+        for cursor in list(self.pending_cursors):
+            cursor._finish()
+        super().close()
+
+
+class QueryLog:
+    """Ring buffer of the last queries run through DatabaseManager connections.
+
+    Disabled by default: connections are then plain sqlite3 connections and
+    nothing is recorded. When enabled, each statement is logged with its
+    duration (execute + fetches), row count and the app page / database
+    method that ran it; statements slower than slow_ms also keep their
+    EXPLAIN QUERY PLAN.
+    """
+
+    def __init__(self, enabled=False, slow_ms=100.0, size=1000):
+        self.enabled = enabled
+        self.slow_ms = slow_ms
+        self._entries = deque(maxlen=size)
+        self._lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls):
+        """Configure from QUERY_LOG_ENABLED, SLOW_QUERY_MS and QUERY_LOG_SIZE"""
+        return cls(enabled=os.getenv("QUERY_LOG_ENABLED", "false").lower() == "true",
+                   slow_ms=float(os.getenv("SLOW_QUERY_MS", "100")),
+                   size=int(os.getenv("QUERY_LOG_SIZE", "1000")))
+
+    @property
+    def size(self):
+        return self._entries.maxlen
+
+    def connect(self, db_path):
+        """Open an instrumented connection"""
+        conn = sqlite3.connect(db_path, factory=InstrumentedConnection)
+        conn.query_log = self
+        return conn
+
+    def record(self, conn, pending):
+        duration_ms = pending['seconds'] * 1000
+        plan = None
+        if duration_ms >= self.slow_ms and pending['parameters'] is not None:
+            plan = self._explain(conn, pending['sql'], pending['parameters'])
+        entry = (datetime.now(), pending['page'], pending['method'], ' '.join(pending['sql'].split()),
+                 duration_ms, pending['rows'], plan)
+        with self._lock:
+            self._entries.append(entry)
+
+    @staticmethod
+    def _explain(conn, sql, parameters):
+        """EXPLAIN QUERY PLAN as indented text, on a plain cursor so it is not logged itself"""
+        try:
+            cursor = sqlite3.Cursor(conn)
+            cursor.execute(f"EXPLAIN QUERY PLAN {sql}", parameters)
+            rows = cursor.fetchall()
+        except sqlite3.Error:
+            return None
+        depth = {0: 0}
+        lines = []
+        for node_id, parent, _, detail in rows:
+            depth[node_id] = depth.get(parent, 0) + 1
+            lines.append(f"{'  ' * (depth[node_id] - 1)}{detail}")
+        return "\n".join(lines) or None
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def entries(self):
+        """Logged queries, most recent first"""
+        with self._lock:
+            entries = list(self._entries)
+        return pd.DataFrame(reversed(entries), columns=QUERY_LOG_COLUMNS)
+
+    def slow_queries(self):
+        """Logged queries over the slow threshold, most recent first"""
+        entries = self.entries()
+        return entries[entries['duration_ms'] >= self.slow_ms].reset_index(drop=True)
+
+    def summary(self, by=('page', 'method')):
+        """Count, total, p50/p95/p99 and max duration per group, slowest total first"""
+        entries = self.entries()
+        by = list(by)
+        if entries.empty:
+            return pd.DataFrame(columns=by + ['count', 'total_ms', 'p50_ms', 'p95_ms', 'p99_ms', 'max_ms',
+                                              'mean_rows', 'slow'])
+        entries[by] = entries[by].fillna('-')
+        groups = entries.groupby(by)
+        summary = groups['duration_ms'].agg(count='count', total_ms='sum')
+        quantiles = groups['duration_ms'].quantile(PERCENTILES).unstack()
+        quantiles.columns = [f"p{int(q * 100)}_ms" for q in PERCENTILES]
+        summary = summary.join(quantiles)
+        summary['max_ms'] = groups['duration_ms'].max()
+        summary['mean_rows'] = groups['rows'].mean()
+        summary['slow'] = groups['duration_ms'].agg(lambda durations: int((durations >= self.slow_ms).sum()))
+        return summary.sort_values('total_ms', ascending=False).reset_index()
+
+
+# One log per server process: app.py builds a new DatabaseManager on every rerun
+QUERY_LOG = QueryLog.from_env()
@@ -0,0 +1,111 @@
+import heapq
+from datetime import date, timedelta
+
+
+TRACE_COLUMNS = ['event_at', 'source', 'lien', 'report_id', 'numero_serie', 'endoscope', 'salle', 'type_acte',
+                 'medecin', 'nom_operateur', 'type_desinfection', 'cycle', 'test_etancheite', 'etat',
+                 'nature_panne']
+
+# Start times are typed by hand: pad 'H:MM' so event_at sorts as text
+_STERILISATION_TRACE = """
+    SELECT r.date_desinfection || ' ' ||
+           CASE WHEN length(r.heure_debut) = 4 THEN '0' || r.heure_debut ELSE r.heure_debut END AS event_at,
+           'stérilisation', ?, r.id, r.numero_serie, r.endoscope, r.salle, r.type_acte, r.medecin_responsable,
+           r.nom_operateur, r.type_desinfection, r.cycle, r.test_etancheite, r.etat_endoscope, r.nature_panne
+    FROM sterilisation_reports r"""
+
+_USAGE_TRACE = """
+    SELECT substr(u.date_utilisation, 1, 16) AS event_at, 'utilisation', 'appareil', u.id, u.numero_serie,
+           u.endoscope, NULL, NULL, u.medecin, u.nom_operateur, NULL, NULL, NULL, u.etat, u.nature_panne
+    FROM usage_reports u"""
+
+
+def _as_date(value):
+    return value if isinstance(value, date) else date.fromisoformat(str(value)[:10])
+
+
+class RecallTracer:
+    """Contamination recall traces for one endoscope.
+
+    Every source is read by an indexed range scan already sorted by time:
+    the device's sterilisation reports on (numero_serie, date_desinfection),
+    its usage reports on (numero_serie, date_utilisation) and, for each room
+    it went through, the other cycles of that room around the same days on
+    (salle_id, date_desinfection). heapq.merge interleaves the cursors, so
+    rows are produced in time order without loading or sorting the tables.
+    """
+
+    def ensure_initialized(self, conn):
+        """Create the range-scan indexes (salle_id exists once the dimension migration ran)"""
+        cursor = conn.cursor()
+        cursor.execute(
+            """CREATE INDEX IF NOT EXISTS idx_sterilisation_reports_serie_date
+               ON sterilisation_reports(numero_serie, date_desinfection)""")
+        cursor.execute(
+            """CREATE INDEX IF NOT EXISTS idx_sterilisation_reports_salle_date
+               ON sterilisation_reports(salle_id, date_desinfection)""")
+        cursor.execute(
+            """CREATE INDEX IF NOT EXISTS idx_usage_reports_serie_date
+               ON usage_reports(numero_serie, date_utilisation)""")
+
+    def trace(self, conn, numero_serie, start, end, neighbour_days=0):
+        """Yield trace rows (tuples in TRACE_COLUMNS order) in time order.
+
+        Rows of the device itself come from [start, end]; room neighbours are
+        the other cycles of each room within neighbour_days of a day the
+        device was reprocessed there.
+        """
+        start, end = _as_date(start), _as_date(end)
+        streams = [
+            self._rows(conn,
+                       f"""{_STERILISATION_TRACE}
+                           WHERE r.numero_serie = ? AND r.date_desinfection BETWEEN ? AND ?
+                           ORDER BY r.date_desinfection, event_at, r.id""",
+                       ('appareil', numero_serie, str(start), str(end))),
+            self._rows(conn,
+                       f"""{_USAGE_TRACE}
+                           WHERE u.numero_serie = ? AND u.date_utilisation >= ? AND u.date_utilisation < ?
+                           ORDER BY u.date_utilisation, u.id""",
+                       (numero_serie, str(start), str(end + timedelta(days=1)))),
+        ]
+        for salle_id, first, last in self._room_windows(conn, numero_serie, start, end, neighbour_days):
+            streams.append(self._rows(
+                conn,
+                f"""{_STERILISATION_TRACE}
+                    WHERE r.salle_id = ? AND r.date_desinfection BETWEEN ? AND ? AND r.numero_serie != ?
+                    ORDER BY r.date_desinfection, event_at, r.id""",
+                ('voisinage salle', salle_id, str(first), str(last), numero_serie)))
+        return heapq.merge(*streams, key=lambda row: row[0] or '')
+
+    @staticmethod
+    def _rows(conn, sql, params):
+        cursor = conn.cursor()
+        cursor.execute(sql, params)
+        while True:
+            rows = cursor.fetchmany(500)
+            if not rows:
+                return
+            yield from rows
+
+    @staticmethod
+    def _room_windows(conn, numero_serie, start, end, neighbour_days):
+        """(salle_id, first day, last day) ranges around the device's days in each room, overlaps merged"""
+        cursor = conn.cursor()
+        cursor.execute(
+            """SELECT DISTINCT salle_id, date_desinfection FROM sterilisation_reports
+               WHERE numero_serie = ? AND date_desinfection BETWEEN ? AND ? AND salle_id IS NOT NULL
+               ORDER BY salle_id, date_desinfection""",
+            (numero_serie, str(start), str(end)))
+        margin = timedelta(days=max(int(neighbour_days), 0))
+        windows = []
+        for salle_id, day in cursor.fetchall():
+            try:
+                day = _as_date(day)
+            except ValueError:
+                continue
+            first, last = day - margin, day + margin
+            if windows and windows[-1][0] == salle_id and first <= windows[-1][2] + timedelta(days=1):
+                windows[-1][2] = max(windows[-1][2], last)
+            else:
+                windows.append([salle_id, first, last])
+        return [tuple(window) for window in windows]
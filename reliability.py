@@ -0,0 +1,256 @@
+import re
+from datetime import datetime
+
+import pandas as pd
+
+
+TIMESTAMP_FORMAT = "%Y-%m-%d %H:%M:%S"
+_TIME_PATTERN = re.compile(r"(\d{1,2})\s*[:hH]\s*(\d{2})")
+
+
+def now_timestamp():
+    """Current local time in the format stored in etat_events"""
+    return datetime.now().strftime(TIMESTAMP_FORMAT)
+
+
+def report_event_time(date_desinfection, heure_fin):
+    """Build the event timestamp of a sterilisation report (date + end time)"""
+    date_part = str(date_desinfection)[:10]
+    match = _TIME_PATTERN.search(str(heure_fin or ""))
+    if match and int(match.group(1)) < 24 and int(match.group(2)) < 60:
+        return f"{date_part} {int(match.group(1)):02d}:{match.group(2)}:00"
+    return f"{date_part} 00:00:00"
+
+
+def _seconds_between(start, end):
+    try:
+        delta = datetime.strptime(end[:19], TIMESTAMP_FORMAT) - datetime.strptime(start[:19], TIMESTAMP_FORMAT)
+        return max(delta.total_seconds(), 0.0)
+    except (TypeError, ValueError):
+        return 0.0
+
+
+def _advance(state, etat, event_at):
+    """Apply one state observation to a device state dict (in time order)"""
+    if state is None:
+        return {
+            'etat': etat,
+            'etat_since': event_at,
+            'first_event_at': event_at,
+            'last_event_at': event_at,
+            'uptime_seconds': 0.0,
+            'downtime_seconds': 0.0,
+            'failures': 0,
+            'repairs': 0,
+        }
+    if etat != state['etat']:
+        elapsed = _seconds_between(state['etat_since'], event_at)
+        if state['etat'] == 'fonctionnel':
+            state['uptime_seconds'] += elapsed
+            state['failures'] += 1
+        else:
+            state['downtime_seconds'] += elapsed
+            state['repairs'] += 1
+        state['etat'] = etat
+        state['etat_since'] = event_at
+    state['last_event_at'] = event_at
+    return state
+
+
+class ReliabilityEngine:
+    """Incremental MTBF / MTTR / availability computation per endoscope.
+
+    Every state observation (inventory change or sterilisation report) is
+    appended to etat_events and folded into the device row of
+    reliability_state. Observations arriving out of time order (back-dated
+    reports, edits, deletions) trigger a replay of that single device only.
+    """
+
+    STATE_COLUMNS = ['etat', 'etat_since', 'first_event_at', 'last_event_at',
+                     'uptime_seconds', 'downtime_seconds', 'failures', 'repairs']
+
+    def ensure_initialized(self, conn):
+        """Backfill the event log from existing data the first time it is used"""
+        cursor = conn.cursor()
+        cursor.execute("SELECT 1 FROM etat_events LIMIT 1")
+        if cursor.fetchone():
+            return
+        cursor.execute(
+            "SELECT EXISTS(SELECT 1 FROM endoscopes) OR EXISTS(SELECT 1 FROM sterilisation_reports)")
+        if cursor.fetchone()[0]:
+            self.rebuild(conn, backfill=True)
+
+    def _load_state(self, cursor, numero_serie):
+        cursor.execute(
+            f"SELECT {', '.join(self.STATE_COLUMNS)} FROM reliability_state WHERE numero_serie = ?",
+            (numero_serie, ))
+        row = cursor.fetchone()
+        return dict(zip(self.STATE_COLUMNS, row)) if row else None
+
+    def _save_state(self, cursor, numero_serie, state):
+        cursor.execute(
+            f"""INSERT OR REPLACE INTO reliability_state
+                (numero_serie, {', '.join(self.STATE_COLUMNS)})
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)""",
+            [numero_serie] + [state[col] for col in self.STATE_COLUMNS])
+
+    def record_event(self, conn, numero_serie, etat, event_at, source, source_id=None, deferred=None):
+        """Append a state observation and update the device metrics.
+
+        With a deferred set, devices needing a replay are added to it instead
+        of being replayed, so a batch replays each of them once at the end.
+        """
+        cursor = conn.cursor()
+        cursor.execute(
+            """INSERT INTO etat_events (numero_serie, etat, event_at, source, source_id)
+               VALUES (?, ?, ?, ?, ?)""",
+            (numero_serie, etat, event_at, source, source_id))
+        if deferred is not None and numero_serie in deferred:
+            return
+        state = self._load_state(cursor, numero_serie)
+        if state is not None and event_at < state['last_event_at']:
+            if deferred is None:
+                self.replay_device(conn, numero_serie)
+            else:
+                deferred.add(numero_serie)
+        else:
+            self._save_state(cursor, numero_serie, _advance(state, etat, event_at))
+
+    def update_source_event(self, conn, source, source_id, numero_serie, etat, event_at):
+        """Rewrite the observation attached to a report or inventory record"""
+        cursor = conn.cursor()
+        cursor.execute(
+            "SELECT DISTINCT numero_serie FROM etat_events WHERE source = ? AND source_id = ?",
+            (source, source_id))
+        affected = {row[0] for row in cursor.fetchall()}
+        if not affected:
+            self.record_event(conn, numero_serie, etat, event_at, source, source_id)
+            return
+        cursor.execute(
+            """UPDATE etat_events SET numero_serie = ?, etat = ?, event_at = ?
+               WHERE source = ? AND source_id = ?""",
+            (numero_serie, etat, event_at, source, source_id))
+        for serie in affected | {numero_serie}:
+            self.replay_device(conn, serie)
+
+    def delete_source_events(self, conn, source, source_id):
+        """Remove the observation attached to a deleted record"""
+        cursor = conn.cursor()
+        cursor.execute(
+            "SELECT DISTINCT numero_serie FROM etat_events WHERE source = ? AND source_id = ?",
+            (source, source_id))
+        affected = [row[0] for row in cursor.fetchall()]
+        cursor.execute("DELETE FROM etat_events WHERE source = ? AND source_id = ?",
+                       (source, source_id))
+        for serie in affected:
+            self.replay_device(conn, serie)
+
+    def rename_device(self, conn, old_numero_serie, new_numero_serie):
+        """Follow a serial number correction made in the inventory"""
+        cursor = conn.cursor()
+        cursor.execute("UPDATE etat_events SET numero_serie = ? WHERE numero_serie = ?",
+                       (new_numero_serie, old_numero_serie))
+        cursor.execute("DELETE FROM reliability_state WHERE numero_serie = ?", (old_numero_serie, ))
+        self.replay_device(conn, new_numero_serie)
+
+    def forget_device(self, conn, numero_serie):
+        """Drop the history of a device removed from the inventory"""
+        cursor = conn.cursor()
+        cursor.execute("DELETE FROM etat_events WHERE numero_serie = ?", (numero_serie, ))
+        cursor.execute("DELETE FROM reliability_state WHERE numero_serie = ?", (numero_serie, ))
+
+    def replay_device(self, conn, numero_serie):
+        """Recompute one device from its ordered event log"""
+        cursor = conn.cursor()
+        cursor.execute(
+            """SELECT etat, event_at FROM etat_events
+               WHERE numero_serie = ? ORDER BY event_at, id""",
+            (numero_serie, ))
+        state = None
+        for etat, event_at in cursor.fetchall():
+            state = _advance(state, etat, event_at)
+        if state is None:
+            cursor.execute("DELETE FROM reliability_state WHERE numero_serie = ?", (numero_serie, ))
+        else:
+            self._save_state(cursor, numero_serie, state)
+
+    def rebuild(self, conn, backfill=False):
+        """Recompute every device from scratch (optionally re-deriving the event log)"""
+        cursor = conn.cursor()
+        if backfill:
+            cursor.execute("DELETE FROM etat_events")
+            # created_at defaults to CURRENT_TIMESTAMP (UTC); live events are stamped in local time
+            cursor.execute(
+                """INSERT INTO etat_events (numero_serie, etat, event_at, source, source_id)
+                   SELECT numero_serie, etat, datetime(created_at, 'localtime'), 'inventaire', id
+                   FROM endoscopes""")
+            reports = conn.execute(
+                "SELECT id, numero_serie, etat_endoscope, date_desinfection, heure_fin FROM sterilisation_reports")
+            cursor.executemany(
+                """INSERT INTO etat_events (numero_serie, etat, event_at, source, source_id)
+                   VALUES (?, ?, ?, 'sterilisation', ?)""",
+                ((serie, etat, report_event_time(date_desinfection, heure_fin), report_id)
+                 for report_id, serie, etat, date_desinfection, heure_fin in reports))
+        cursor.execute("DELETE FROM reliability_state")
+
+        states = {}
+        events = conn.execute(
+            "SELECT numero_serie, etat, event_at FROM etat_events ORDER BY numero_serie, event_at, id")
+        for numero_serie, etat, event_at in events:
+            states[numero_serie] = _advance(states.get(numero_serie), etat, event_at)
+        cursor.executemany(
+            f"""INSERT INTO reliability_state (numero_serie, {', '.join(self.STATE_COLUMNS)})
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)""",
+            ([serie] + [state[col] for col in self.STATE_COLUMNS] for serie, state in states.items()))
+
+    def device_metrics(self, conn, now=None):
+        """MTBF, MTTR and availability for every device with a known history"""
+        df = pd.read_sql_query(
+            """SELECT r.numero_serie, e.id AS endoscope_id, e.designation, e.marque,
+                      e.designation_id, d.label AS designation_label, e.marque_id, m.label AS marque_label,
+                      r.etat, r.etat_since, r.first_event_at, r.uptime_seconds,
+                      r.downtime_seconds, r.failures, r.repairs
+               FROM reliability_state r
+               LEFT JOIN endoscopes e ON e.numero_serie = r.numero_serie
+               LEFT JOIN dim_designation d ON d.id = e.designation_id
+               LEFT JOIN dim_marque m ON m.id = e.marque_id""",
+            conn)
+        if df.empty:
+            return df
+        now = pd.Timestamp(now or datetime.now())
+        open_seconds = (now - pd.to_datetime(df['etat_since'], errors='coerce')).dt.total_seconds()
+        open_seconds = open_seconds.fillna(0).clip(lower=0)
+        df['uptime_seconds'] += open_seconds.where(df['etat'] == 'fonctionnel', 0)
+        df['downtime_seconds'] += open_seconds.where(df['etat'] == 'en panne', 0)
+        return self._with_ratios(df)
+
+    def group_metrics(self, device_df, by):
+        """Aggregate device metrics by designation or marque.
+
+        Devices are grouped on the dimension key, like the availability chart
+        and the alert counters, so spelling variants share one group shown
+        under the dimension label.
+        """
+        if device_df.empty:
+            return device_df
+        df = device_df.dropna(subset=[f"{by}_id"])
+        grouped = df.groupby(f"{by}_id", as_index=False).agg(
+            **{by: (f"{by}_label", 'first')},
+            endoscopes=('numero_serie', 'count'),
+            en_panne=('etat', lambda s: int((s == 'en panne').sum())),
+            uptime_seconds=('uptime_seconds', 'sum'),
+            downtime_seconds=('downtime_seconds', 'sum'),
+            failures=('failures', 'sum'),
+            repairs=('repairs', 'sum'),
+        )
+        return self._with_ratios(grouped.drop(columns=f"{by}_id").sort_values(by, ignore_index=True))
+
+    @staticmethod
+    def _with_ratios(df):
+        failures = df['failures'].where(df['failures'] > 0)
+        repairs = df['repairs'].where(df['repairs'] > 0)
+        observed = df['uptime_seconds'] + df['downtime_seconds']
+        df['mtbf_jours'] = (df['uptime_seconds'] / failures / 86400).round(1)
+        df['mttr_heures'] = (df['downtime_seconds'] / repairs / 3600).round(1)
+        df['disponibilite_pct'] = (df['uptime_seconds'] * 100 / observed.where(observed > 0)).round(1)
+        return df
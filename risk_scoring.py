@@ -0,0 +1,200 @@
+"""Failure risk scores per endoscope, for preventive maintenance.
+
+Each device gets a feature vector from its sterilisation reports since its
+last breakdown (cycles, failed leak tests, incomplete cycles, share of manual
+disinfections), its number of breakdowns and its age in the inventory. Each
+feature goes through a saturating curve x / (x + half), where `half` is the
+value earning half of the feature's weight, and the score is the weighted
+sum as a percentage: one matrix product over the whole fleet.
+
+The per-device counters are kept in memory and folded incrementally: a
+refresh reads only the reports added since the previous one, as long as the
+sterilisation_reports change counter moved by exactly that many rows. Edits,
+deletions and back-dated reports trigger a full recomputation instead.
+The counters live in one RiskScorer per database file and process
+(risk_scorer), shared by every DatabaseManager opened on that file.
+"""
+import os
+import threading
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+
+# feature: (weight, half) -- the weights add up to 1
+RISK_WEIGHTS = {
+    'cycles_since_breakdown': (0.30, 150),
+    'failed_leak_tests': (0.25, 1),
+    'incomplete_cycles': (0.15, 2),
+    'manual_ratio': (0.10, 0.5),
+    'breakdowns': (0.10, 3),
+    'age_years': (0.10, 5),
+}
+
+RISK_FACTOR_LABELS = {
+    'cycles_since_breakdown': "Cycles depuis la dernière panne",
+    'failed_leak_tests': "Tests d'étanchéité échoués",
+    'incomplete_cycles': "Cycles incomplets",
+    'manual_ratio': "Désinfections manuelles",
+    'breakdowns': "Pannes antérieures",
+    'age_years': "Ancienneté",
+}
+
+# Counters restarting at each breakdown, then lifetime ones
+SINCE_COUNTERS = ['cycles_since_breakdown', 'failed_leak_tests', 'incomplete_cycles', 'manual_cycles']
+COUNTERS = SINCE_COUNTERS + ['breakdowns']
+
+# End times are typed by hand: pad 'H:MM' so event_at sorts as text
+_REPORTS = """
+    SELECT id, numero_serie, type_desinfection, cycle, test_etancheite, etat_endoscope,
+           date_desinfection || ' ' ||
+           CASE WHEN length(heure_fin) = 4 THEN '0' || heure_fin ELSE heure_fin END AS event_at
+    FROM sterilisation_reports"""
+
+
+def device_features(reports):
+    """Counters, last event and last breakdown per numero_serie from a frame of reports"""
+    if reports.empty:
+        return pd.DataFrame({**{name: pd.Series(dtype='int64') for name in COUNTERS},
+                             'last_event_at': pd.Series(dtype=object), 'last_breakdown_at': pd.Series(dtype=object)},
+                            index=pd.Index([], name='numero_serie'))
+    serie_codes, series = pd.factorize(reports['numero_serie'], sort=True)
+    event_codes, _ = pd.factorize(reports['event_at'], sort=True)
+    order = np.lexsort((reports['id'].to_numpy(), event_codes, serie_codes))
+    serie = serie_codes[order]
+    breakdown = reports['etat_endoscope'].eq('en panne').to_numpy(dtype=bool)[order]
+
+    starts = np.flatnonzero(np.r_[True, serie[1:] != serie[:-1]])
+    ends = np.r_[starts[1:], len(serie)] - 1
+    # A row follows its device's last breakdown when every breakdown of the device is at or before it
+    running = np.cumsum(breakdown)
+    seen = running - (running - breakdown)[starts][serie]
+    since = ~breakdown & (seen == running[ends][serie] - (running - breakdown)[starts][serie])
+    flags = {
+        'cycles_since_breakdown': since,
+        'failed_leak_tests': since & reports['test_etancheite'].eq('échoué').to_numpy(dtype=bool)[order],
+        'incomplete_cycles': since & reports['cycle'].eq('incomplet').to_numpy(dtype=bool)[order],
+        'manual_cycles': since & reports['type_desinfection'].eq('manuel').to_numpy(dtype=bool)[order],
+        'breakdowns': breakdown,
+    }
+    columns = {name: np.bincount(serie, weights=flag, minlength=len(series)).astype('int64')
+               for name, flag in flags.items()}
+    last_breakdown = np.maximum.reduceat(np.where(breakdown, np.arange(len(serie)), -1), starts)
+    event_at = reports['event_at']
+    columns['last_event_at'] = event_at.take(order[ends]).to_numpy(dtype=object)
+    columns['last_breakdown_at'] = np.where(last_breakdown >= 0,
+                                            event_at.take(order[last_breakdown]).to_numpy(dtype=object), None)
+    return pd.DataFrame(columns, index=pd.Index(series, name='numero_serie'))
+
+
+def score_devices(devices, features, weights=RISK_WEIGHTS, now=None):
+    """Risk score (0-100) and main factor of every device, highest risk first"""
+    positions = features.index.get_indexer(devices['numero_serie'])
+    known = positions >= 0
+    counts = np.zeros((len(devices), len(COUNTERS)), dtype='int64')
+    counts[known] = features[COUNTERS].to_numpy(dtype='int64')[positions[known]]
+    columns = dict(zip(COUNTERS, counts.T))
+    cycles = columns['cycles_since_breakdown']
+    columns['manual_ratio'] = np.divide(columns['manual_cycles'], cycles, out=np.zeros(len(devices)),
+                                        where=cycles > 0)
+    now = pd.Timestamp(now or datetime.now()).to_datetime64()
+    created = pd.to_datetime(devices['created_at'], errors='coerce', format='ISO8601').to_numpy(dtype='datetime64[s]')
+    age = (now - created) / np.timedelta64(1, 'D') / 365.25
+    columns['age_years'] = np.nan_to_num(age).clip(min=0).round(1)
+
+    names = list(weights)
+    values = np.column_stack([columns[name] for name in names]).astype(float)
+    weight, half = np.array([weights[name] for name in names], dtype=float).T
+    contributions = values / (values + half) * weight * 100
+    columns['score'] = contributions.sum(axis=1).round(1)
+    columns['facteur_principal'] = np.array(names)[contributions.argmax(axis=1)]
+    order = np.lexsort((devices['numero_serie'].to_numpy(), -columns['score']))
+    return pd.concat([devices.take(order).reset_index(drop=True),
+                      pd.DataFrame({name: column[order] for name, column in columns.items()})], axis=1)
+
+
+class RiskScorer:
+    """In-memory per-device features kept up to date from sterilisation_reports"""
+
+    def __init__(self, weights=RISK_WEIGHTS):
+        self.weights = weights
+        self.full_refreshes = 0
+        self.incremental_refreshes = 0
+        self._features = None
+        self._version = None
+        self._last_id = 0
+        self._lock = threading.Lock()
+
+    def refresh(self, conn):
+        """Fold the reports added since the last refresh (or recompute); returns the features"""
+        with self._lock:
+            conn.execute("BEGIN")
+            try:
+                version = conn.execute(
+                    "SELECT version FROM table_versions WHERE table_name = 'sterilisation_reports'").fetchone()[0]
+                if self._features is not None and version == self._version:
+                    return self._features
+                if self._features is not None and version > self._version:
+                    added = pd.read_sql_query(_REPORTS + " WHERE id > ?", conn, params=(self._last_id, ))
+                    if len(added) == version - self._version and self._fold(added):
+                        self._version = version
+                        self.incremental_refreshes += 1
+                        return self._features
+                reports = pd.read_sql_query(_REPORTS, conn)
+                self._features = device_features(reports)
+                self._last_id = int(reports['id'].max()) if len(reports) else 0
+                self._version = version
+                self.full_refreshes += 1
+                return self._features
+            finally:
+                conn.rollback()
+
+    def _fold(self, added):
+        """Merge new reports into the features; False when one predates its device's history"""
+        features = self._features
+        previous_event = features['last_event_at'].reindex(added['numero_serie']).fillna('')
+        if (added['event_at'].to_numpy(dtype=object) < previous_event.to_numpy(dtype=object)).any():
+            return False
+        batch = device_features(added)
+        positions = features.index.get_indexer(batch.index)
+        known = positions >= 0
+        previous = np.zeros((len(batch), len(COUNTERS)), dtype='int64')
+        previous[known] = features[COUNTERS].to_numpy(dtype='int64')[positions[known]]
+        previous_breakdown = np.full(len(batch), None, dtype=object)
+        previous_breakdown[known] = features['last_breakdown_at'].to_numpy(dtype=object)[positions[known]]
+
+        counts = batch[COUNTERS].to_numpy(dtype='int64', copy=True)
+        reset = counts[:, -1] > 0
+        # Counters since the last breakdown start over when the batch has one; breakdowns always add up
+        counts[:, :-1] += np.where(reset[:, None], 0, previous[:, :-1])
+        counts[:, -1] += previous[:, -1]
+        merged = pd.DataFrame(
+            {**dict(zip(COUNTERS, counts.T)), 'last_event_at': batch['last_event_at'].to_numpy(dtype=object),
+             'last_breakdown_at': np.where(reset, batch['last_breakdown_at'].to_numpy(dtype=object),
+                                           previous_breakdown)},
+            index=batch.index)
+        unchanged = np.ones(len(features), dtype=bool)
+        unchanged[positions[known]] = False
+        self._features = pd.concat([features[unchanged], merged])
+        self._last_id = int(added['id'].max())
+        return True
+
+    def scores(self, conn, now=None):
+        """Scores of every endoscope in the inventory"""
+        features = self.refresh(conn)
+        devices = pd.read_sql_query(
+            """SELECT id AS endoscope_id, numero_serie, designation, marque, localisation, etat, created_at
+               FROM endoscopes""",
+            conn)
+        return score_devices(devices, features, self.weights, now)
+
+
+_SCORERS = {}
+_SCORERS_LOCK = threading.Lock()
+
+
+def risk_scorer(db_path):
+    """The RiskScorer of a database file for this process"""
+    with _SCORERS_LOCK:
+        return _SCORERS.setdefault(os.path.abspath(db_path), RiskScorer())
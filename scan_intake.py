@@ -0,0 +1,44 @@
+import re
+
+
+QR_FIELDS = {'ENDOSCOPE_ID': 'endoscope_id', 'DESIGNATION': 'designation', 'SERIE': 'numero_serie'}
+_KEY_VALUE = re.compile(r"^\s*([A-Za-z_]+)\s*:\s*(.*?)\s*$")
+
+
+def format_qr_payload(endoscope_id, designation, numero_serie):
+    """Payload encoded in the endoscope QR codes"""
+    return f"ENDOSCOPE_ID:{endoscope_id}|DESIGNATION:{designation}|SERIE:{numero_serie}"
+
+
+def parse_scan_payload(text):
+    """Parse a scanned QR payload or a bare serial number.
+
+    Returns a dict with endoscope_id (int or None), designation and
+    numero_serie, or None for empty input.
+    """
+    text = (text or '').strip()
+    if not text:
+        return None
+
+    if ':' not in text:
+        # Plain barcode / manual entry: the whole text is the serial number
+        return {'endoscope_id': None, 'designation': None, 'numero_serie': text}
+
+    parsed = {'endoscope_id': None, 'designation': None, 'numero_serie': None}
+    for part in text.split('|'):
+        match = _KEY_VALUE.match(part)
+        if match and match.group(1).upper() in QR_FIELDS:
+            parsed[QR_FIELDS[match.group(1).upper()]] = match.group(2) or None
+    try:
+        parsed['endoscope_id'] = int(parsed['endoscope_id']) if parsed['endoscope_id'] else None
+    except ValueError:
+        parsed['endoscope_id'] = None
+    if parsed['endoscope_id'] is None and not parsed['numero_serie']:
+        return {'endoscope_id': None, 'designation': None, 'numero_serie': text}
+    return parsed
+
+
+def is_qr_payload(text):
+    """True when the text looks like an endoscope QR payload rather than a search term"""
+    parsed = parse_scan_payload(text)
+    return bool(parsed) and parsed['endoscope_id'] is not None
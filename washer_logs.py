@@ -0,0 +1,339 @@
+"""Streaming ingestion of washer-disinfector cycle logs from a watched directory.
+
+Automatic washers export one CSV or XML log per cycle (or per day) to a
+shared directory. The watcher reads every new or grown file from the offset
+where it stopped (a byte offset for CSV, a record count for XML), one record
+at a time, maps the washer's columns onto sterilisation_reports and saves the
+cycles in batches. The offsets of the files are saved in the same
+transaction as the cycles they produced, and every cycle carries an
+idempotency key derived from its file, position and generation (bumped
+when the file shrinks, i.e. was rotated or rewritten), so a restart after a
+crash neither loses nor duplicates a cycle, and a rewritten file is read as
+new cycles.
+
+Records that fail the report form rules are kept in washer_log_rejects.
+Fields a washer does not export can be given with --default field=value.
+
+Usage: python washer_logs.py /mnt/laveurs [--db endotrace.db] [--source laveurs] [--batch-size 500]
+                             [--poll 5] [--settle 2] [--default salle=Bloc 1] [--once]
+"""
+import argparse
+import csv
+import os
+import re
+import threading
+import time
+import unicodedata
+import xml.etree.ElementTree as ET
+
+from database import DatabaseManager
+from ingest_api import IngestService
+
+LOG_EXTENSIONS = ('.csv', '.txt', '.xml')
+# Column names seen in washer exports, by report field (compared after normalize_name)
+FIELD_ALIASES = {
+    'numero_serie': ['numero_serie', 'n_serie', 'serie', 'serial', 'serial_number', 'sn', 'endoscope_sn',
+                     'scope_serial'],
+    'endoscope': ['endoscope', 'designation', 'scope', 'device'],
+    'nom_operateur': ['nom_operateur', 'operateur', 'operator', 'user', 'agent'],
+    'medecin_responsable': ['medecin_responsable', 'medecin', 'doctor', 'physician'],
+    'date_desinfection': ['date_desinfection', 'date', 'cycle_date'],
+    'heure_debut': ['heure_debut', 'debut', 'start', 'start_time', 'cycle_start'],
+    'heure_fin': ['heure_fin', 'fin', 'end', 'end_time', 'cycle_end'],
+    'cycle': ['cycle', 'cycle_status', 'cycle_result', 'resultat', 'result', 'statut', 'status'],
+    'test_etancheite': ['test_etancheite', 'test_d_etancheite', 'etancheite', 'leak_test', 'leak_test_result',
+                        'leak'],
+    'salle': ['salle', 'room', 'location'],
+    'type_acte': ['type_acte', 'acte', 'procedure'],
+    'etat_endoscope': ['etat_endoscope', 'etat', 'scope_status'],
+    'nature_panne': ['nature_panne', 'panne', 'fault', 'error', 'alarm'],
+    'washer': ['laveur', 'washer', 'machine', 'lave_endoscope'],
+}
+CYCLE_VALUES = {'complet': ['complet', 'complete', 'completed', 'ok', 'pass', 'passed', 'success', 'termine',
+                            'conforme', '1'],
+                'incomplet': ['incomplet', 'incomplete', 'aborted', 'abort', 'interrompu', 'annule', 'fail',
+                              'failed', 'error', 'nok', 'non_conforme', '0']}
+LEAK_TEST_VALUES = {'réussi': ['reussi', 'ok', 'pass', 'passed', 'success', 'conforme', '1'],
+                    'échoué': ['echoue', 'echec', 'fail', 'failed', 'leak', 'nok', 'non_conforme', '0']}
+ETAT_VALUES = {'fonctionnel': ['fonctionnel', 'ok', 'disponible'],
+               'en panne': ['en_panne', 'panne', 'hs', 'defectueux', 'out_of_service']}
+DEFAULT_FIELDS = {'medecin_responsable': 'Non renseigné', 'type_acte': 'Non renseigné'}
+LEAK_FAULT = "Test d'étanchéité échoué (laveur)"
+
+_DATETIME = re.compile(r"^(\d{4}-\d{2}-\d{2}|\d{1,2}/\d{1,2}/\d{4})[T ](\d{1,2}:\d{2})")
+_FR_DATE = re.compile(r"^(\d{1,2})/(\d{1,2})/(\d{4})$")
+
+
+def normalize_name(name):
+    """Lowercase ASCII identifier: 'Test d'étanchéité' -> 'test_d_etancheite'"""
+    text = unicodedata.normalize('NFKD', str(name)).encode('ascii', 'ignore').decode('ascii')
+    return re.sub(r'[^a-z0-9]+', '_', text.lower()).strip('_')
+
+
+def _value_index(values):
+    return {alias: value for value, aliases in values.items() for alias in aliases}
+
+
+ALIAS_INDEX = _value_index(FIELD_ALIASES)
+CYCLE_INDEX = _value_index(CYCLE_VALUES)
+LEAK_TEST_INDEX = _value_index(LEAK_TEST_VALUES)
+ETAT_INDEX = _value_index(ETAT_VALUES)
+for _aliases in (CYCLE_INDEX, LEAK_TEST_INDEX, ETAT_INDEX):
+    _aliases.update({normalize_name(value): value for value in set(_aliases.values())})
+
+
+def _iso_date(text):
+    match = _FR_DATE.match(text)
+    return f"{match.group(3)}-{int(match.group(2)):02d}-{int(match.group(1)):02d}" if match else text
+
+
+def map_record(raw, defaults=None):
+    """Report fields of one washer record; unknown values are left for validation to reject"""
+    cycle = {}
+    for name, value in raw.items():
+        field = ALIAS_INDEX.get(normalize_name(name))
+        if field and field not in cycle and value is not None and str(value).strip():
+            cycle[field] = str(value).strip()
+    for field in ('heure_debut', 'heure_fin'):
+        match = _DATETIME.match(cycle.get(field, ''))
+        if match:
+            cycle.setdefault('date_desinfection', match.group(1))
+            cycle[field] = match.group(2)
+    if 'date_desinfection' in cycle:
+        cycle['date_desinfection'] = _iso_date(cycle['date_desinfection'][:10])
+    for field, index in (('cycle', CYCLE_INDEX), ('test_etancheite', LEAK_TEST_INDEX),
+                         ('etat_endoscope', ETAT_INDEX)):
+        if field in cycle:
+            cycle[field] = index.get(normalize_name(cycle[field]), cycle[field])
+    cycle['type_desinfection'] = 'automatique'
+    if 'etat_endoscope' not in cycle:
+        # A scope that fails the leak test must not go back into service unnoticed
+        failed = cycle.get('test_etancheite') == 'échoué'
+        cycle['etat_endoscope'] = 'en panne' if failed else 'fonctionnel'
+        if failed:
+            cycle.setdefault('nature_panne', LEAK_FAULT)
+    if 'washer' in cycle:
+        cycle.setdefault('nom_operateur', cycle['washer'])
+    for field, value in {**DEFAULT_FIELDS, **(defaults or {})}.items():
+        cycle.setdefault(field, value)
+    cycle.pop('washer', None)
+    return cycle
+
+
+def _decode(line):
+    try:
+        return line.decode('utf-8-sig')
+    except UnicodeDecodeError:
+        # Older washer firmwares export Windows-1252
+        return line.decode('cp1252', errors='replace')
+
+
+def read_csv_records(path, position, final=False):
+    """Yield (start, end, record) for the complete lines after byte offset position.
+
+    The header is re-read from the start of the file; a last line without
+    newline is only read once the file is final (no longer written).
+    """
+    with open(path, 'rb') as f:
+        header_line = f.readline()
+        if not header_line.endswith(b'\n') and not final:
+            return
+        header_text = _decode(header_line).strip()
+        delimiter = max(';,\t', key=header_text.count)
+        header = next(csv.reader([header_text], delimiter=delimiter), [])
+        start = max(position, f.tell())
+        f.seek(start)
+        for line in f:
+            end = start + len(line)
+            if not line.endswith(b'\n') and not final:
+                return
+            text = _decode(line).strip()
+            if text:
+                values = next(csv.reader([text], delimiter=delimiter))
+                yield start, end, dict(zip(header, values))
+            start = end
+
+
+def read_xml_records(path, position, final=False):
+    """Yield (index, index + 1, record) for the <cycle> elements after the first position ones.
+
+    Elements are cleared once read, so the file is never held whole. A
+    truncated document raises ET.ParseError after its complete records.
+    """
+    index = 0
+    for _, element in ET.iterparse(path, events=('end', )):
+        if normalize_name(element.tag.rpartition('}')[2]) != 'cycle':
+            continue
+        if index >= position:
+            record = dict(element.attrib)
+            for child in element:
+                record.setdefault(child.tag.rpartition('}')[2], (child.text or '').strip())
+            yield index, index + 1, record
+        index += 1
+        element.clear()
+
+
+class WasherLogWatcher:
+    """Reads the washer logs of a directory into sterilisation_reports"""
+
+    def __init__(self, db, directory, source='laveurs', batch_size=500, poll_interval=5.0, settle_seconds=2.0,
+                 defaults=None):
+        self.db = db
+        self.directory = directory
+        self.source = source
+        self.batch_size = batch_size
+        self.poll_interval = poll_interval
+        self.settle_seconds = settle_seconds
+        self.defaults = defaults or {}
+        self.service = IngestService(db, {})
+        self.checkpoints = db.get_washer_log_checkpoints()
+        self._pending = []
+        self._files = {}
+        self._stop = threading.Event()
+
+    def pending_files(self):
+        """(relative path, path, size, mtime) of the files that are new, grown or not yet read to the end"""
+        now = time.time()
+        files = []
+        for root, _, names in os.walk(self.directory):
+            for name in names:
+                if not name.lower().endswith(LOG_EXTENSIONS):
+                    continue
+                path = os.path.join(root, name)
+                try:
+                    stat = os.stat(path)
+                except OSError:
+                    continue
+                relpath = os.path.relpath(path, self.directory).replace(os.sep, '/')
+                checkpoint = self.checkpoints.get(relpath)
+                if checkpoint and checkpoint[1] == stat.st_size and checkpoint[2] == stat.st_mtime:
+                    # Unchanged since the last read: done, or waiting for the writer to finish
+                    if checkpoint[3] or now - stat.st_mtime < self.settle_seconds:
+                        continue
+                files.append((relpath, path, stat.st_size, stat.st_mtime))
+        files.sort(key=lambda file: (file[3], file[0]))
+        return files
+
+    def run_once(self):
+        """Read every pending file; returns {'files', 'cycles', 'created', 'rejected'}"""
+        stats = {'files': 0, 'cycles': 0, 'created': 0, 'rejected': 0}
+        now = time.time()
+        for relpath, path, size, mtime in self.pending_files():
+            final = now - mtime >= self.settle_seconds
+            self._read_file(relpath, path, size, mtime, final, stats)
+            stats['files'] += 1
+        self._flush(stats)
+        return stats
+
+    def _read_file(self, relpath, path, size, mtime, final, stats):
+        checkpoint = self.checkpoints.get(relpath)
+        position = checkpoint[0] if checkpoint else 0
+        generation = checkpoint[4] if checkpoint else 0
+        if checkpoint and size < checkpoint[1]:
+            # Rotated or rewritten: its records are new cycles at positions already seen
+            print(f"Washer log {relpath} shrank, reading it again from the start")
+            position = 0
+            generation += 1
+        is_xml = path.lower().endswith('.xml')
+        reader = read_xml_records if is_xml else read_csv_records
+        # Generation 0 keeps the keys of checkpoints saved before generations existed
+        prefix = f"{relpath}~{generation}" if generation else relpath
+        self._files[relpath] = {'path': relpath, 'position': position, 'size': size, 'mtime': mtime,
+                                'finished': 0, 'generation': generation}
+        try:
+            for start, end, record in reader(path, position, final):
+                key = f"{prefix}{'#' if is_xml else '@'}{start}"
+                self._pending.append((relpath, start, {**map_record(record, self.defaults), 'idempotency_key': key}))
+                self._files[relpath]['position'] = end
+                if len(self._pending) >= self.batch_size:
+                    self._flush(stats)
+                    self._files[relpath] = {'path': relpath, 'position': end, 'size': size, 'mtime': mtime,
+                                            'finished': 0, 'generation': generation}
+        except (ET.ParseError, csv.Error) as e:
+            if not final:
+                # Still being written: read the rest at the next poll
+                self._files[relpath]['mtime'] = None
+                return
+            self._pending.append((relpath, self._files[relpath]['position'], {'_error': f"Fichier illisible : {e}"}))
+        except OSError as e:
+            print(f"Error reading washer log {relpath}: {e}")
+            self._files.pop(relpath, None)
+            return
+        self._files[relpath]['finished'] = int(final)
+
+    def _flush(self, stats):
+        """Save the pending cycles, rejects and offsets in one transaction"""
+        if not self._pending and not self._files:
+            return
+        cycles = [cycle for _, _, cycle in self._pending]
+        reports, errors = self.service.prepare(cycles, self.source)
+        counts = {relpath: [0, 0] for relpath in self._files}
+        valid, rejects = [], []
+        for index, (relpath, position, cycle) in enumerate(self._pending):
+            problems = [cycle['_error']] if '_error' in cycle else errors.get(index)
+            if problems:
+                rejects.append((relpath, position, problems, cycle))
+                counts[relpath][1] += 1
+            else:
+                valid.append(reports[index])
+                counts[relpath][0] += 1
+        checkpoints = [{**file, 'cycles': counts[relpath][0], 'rejected': counts[relpath][1]}
+                       for relpath, file in self._files.items()]
+        created = self.db.ingest_washer_log_batch(valid, self.source, checkpoints, rejects)
+        if created is None:
+            self._pending, self._files = [], {}
+            raise RuntimeError("Washer log batch not saved; the files will be read again at the next poll")
+        for file in checkpoints:
+            self.checkpoints[file['path']] = (file['position'], file['size'], file['mtime'], bool(file['finished']),
+                                              file['generation'])
+        stats['cycles'] += len(valid)
+        stats['created'] += created
+        stats['rejected'] += len(rejects)
+        self._pending, self._files = [], {}
+
+    def run_forever(self):
+        """Poll the directory until stop() is called"""
+        while not self._stop.is_set():
+            started = time.monotonic()
+            try:
+                stats = self.run_once()
+                if stats['files']:
+                    print(f"{stats['files']} washer logs read: {stats['created']} cycles created, "
+                          f"{stats['rejected']} rejected ({time.monotonic() - started:.1f} s)")
+            except Exception as e:
+                print(f"Erreur de lecture des journaux laveurs: {e}")
+            self._stop.wait(self.poll_interval)
+
+    def stop(self):
+        self._stop.set()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('directory')
+    parser.add_argument('--db', default='endotrace.db')
+    parser.add_argument('--source', default='laveurs')
+    parser.add_argument('--batch-size', type=int, default=500)
+    parser.add_argument('--poll', type=float, default=5.0)
+    parser.add_argument('--settle', type=float, default=2.0,
+                        help="seconds without change after which a file is read to its last line")
+    parser.add_argument('--default', action='append', default=[], metavar='FIELD=VALUE',
+                        help="value of a report field the washers do not export")
+    parser.add_argument('--once', action='store_true', help="read the pending files once and exit")
+    args = parser.parse_args()
+
+    defaults = dict(item.split('=', 1) for item in args.default if '=' in item)
+    watcher = WasherLogWatcher(DatabaseManager(args.db), args.directory, args.source, args.batch_size, args.poll,
+                               args.settle, defaults)
+    if args.once:
+        print(watcher.run_once())
+        return
+    print(f"Watching {args.directory} for washer logs")
+    try:
+        watcher.run_forever()
+    except KeyboardInterrupt:
+        watcher.stop()
+
+
+if __name__ == '__main__':
+    main()